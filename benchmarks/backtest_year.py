@@ -0,0 +1,68 @@
+"""Benchmark the strategy backtest on a synthetic year.
+
+Builds 365 days of price, PV and load series and runs all strategies
+through ``backtest.run_backtest``, serially and in the process pool::
+
+    python benchmarks/backtest_year.py [days]
+
+Only the pure planning modules are loaded, so Home Assistant is not needed.
+"""
+from __future__ import annotations
+
+import importlib
+import math
+import random
+import sys
+import types
+from datetime import datetime, timedelta
+from pathlib import Path
+
+PACKAGE = "custom_components.gw_smart_charging"
+PACKAGE_DIR = Path(__file__).resolve().parents[1] / "custom_components" / "gw_smart_charging"
+
+# At import time, so the pool's spawned processes resolve the package too
+for _name, _path in (("custom_components", PACKAGE_DIR.parent), (PACKAGE, PACKAGE_DIR)):
+    if _name not in sys.modules:
+        _module = types.ModuleType(_name)
+        _module.__path__ = [str(_path)]
+        sys.modules[_name] = _module
+
+backtest = importlib.import_module(f"{PACKAGE}.backtest")
+
+
+def synthetic_series(days: int, seed: int = 7):
+    """Hourly price and 15-minute PV/load/SOC samples with seasons and weather."""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    series = {"price": [], "pv": [], "load": [], "soc": []}
+    for day in range(days):
+        season = math.cos(2 * math.pi * (day - 172) / 365)  # 1 in summer
+        cloud = rng.uniform(0.2, 1.0)
+        for slot in range(96):
+            when = start + timedelta(days=day, minutes=15 * slot)
+            hour = slot / 4
+            if slot % 4 == 0:
+                price = 2.5 + 1.2 * math.sin(math.pi * (hour - 11) / 12) - 0.6 * season * (10 <= hour < 16)
+                series["price"].append((when, round(price + rng.uniform(-0.4, 0.4), 3)))
+            daylight = 7 + 3 * season
+            pv = max(0.0, 6 * cloud * (0.6 + 0.4 * season) * math.sin(math.pi * (hour - (12 - daylight)) / (2 * daylight)))
+            series["pv"].append((when, round(pv if abs(hour - 12) < daylight else 0.0, 3)))
+            series["load"].append((when, round(0.35 + 1.4 * (17 <= hour < 22) + rng.uniform(0, 0.4), 3)))
+        series["soc"].append((start + timedelta(days=day), 40.0))
+    return series
+
+
+def main(argv) -> None:
+    days = int(argv[0]) if argv else 365
+    history = backtest.build_days(synthetic_series(days))
+    config = {"battery_capacity_kwh": 10.0, "max_charge_power_kw": 5.0}
+    serial = backtest.run_backtest(config, history, workers=1)
+    pooled = backtest.run_backtest(config, history)
+    print(pooled["table"])
+    print(f"\n{len(history)} days x {len(pooled['strategies'])} strategies: "
+          f"serial {serial['elapsed_s']:.2f} s, process pool {pooled['elapsed_s']:.2f} s")
+    assert serial["strategies"] == pooled["strategies"]
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,113 @@
+"""Benchmark planning with grid export against import-only planning.
+
+Plans synthetic days (random current slot and SOC) once without export and
+once with an export limit and an evening feed-in peak, for the deterministic
+planner, the anytime optimizer and stochastic selection (when NumPy is
+installed), and reports the time per plan against the plan stage budget of
+one refresh::
+
+    python benchmarks/export_planning.py [plans] [optimizer_budget_s]
+
+Export planning re-runs the schedule once with the battery export placed;
+the optimizer and the stochastic selection keep their own budgets, so their
+runtime should stay at the import-only level.
+
+Only the pure planning modules are loaded, so Home Assistant is not needed.
+"""
+from __future__ import annotations
+
+import importlib
+import math
+import random
+import statistics
+import sys
+import time
+import types
+from pathlib import Path
+
+PACKAGE = "custom_components.gw_smart_charging"
+PACKAGE_DIR = Path(__file__).resolve().parents[1] / "custom_components" / "gw_smart_charging"
+# STAGE_BUDGETS["plan"] in coordinator.py
+PLAN_BUDGET_S = 20.0
+
+
+def _load_planning_modules():
+    """Import engine/stochastic without running the integration's __init__."""
+    for name, path in (("custom_components", PACKAGE_DIR.parent), (PACKAGE, PACKAGE_DIR)):
+        if name not in sys.modules:
+            module = types.ModuleType(name)
+            module.__path__ = [str(path)]
+            sys.modules[name] = module
+    return (
+        importlib.import_module(f"{PACKAGE}.engine"),
+        importlib.import_module(f"{PACKAGE}.stochastic"),
+        importlib.import_module(f"{PACKAGE}.const"),
+    )
+
+
+def _day(rng: random.Random):
+    """Return PV, import price, export price and load curves for 96 slots."""
+    pv, prices, export_prices, loads = [], [], [], []
+    peak_pv = rng.uniform(2.0, 7.0)
+    for slot in range(96):
+        hour = slot / 4
+        pv.append(max(0.0, peak_pv * math.sin(math.pi * (hour - 6) / 14)) if 6 <= hour <= 20 else 0.0)
+        base = 2.2 + 1.3 * math.sin(math.pi * (hour - 11) / 12)
+        prices.append(round(max(0.4, base + rng.uniform(-0.3, 0.3)), 3))
+        export_prices.append(round(max(0.1, 0.8 * base - 0.4 + (2.5 if 18 <= hour < 21 else 0.0)), 3))
+        loads.append(round(0.4 + (1.2 if 17 <= hour < 22 else 0.0) + rng.uniform(0.0, 0.5), 3))
+    return pv, prices, export_prices, loads
+
+
+def _time_plans(engine, stochastic, const, plans, mode, export, budget_s, seed):
+    rng = random.Random(seed)
+    config = {
+        const.CONF_BATTERY_CAPACITY: 10.0,
+        const.CONF_MAX_CHARGE_POWER: 5.0,
+        const.CONF_FULL_HOUR_CHARGING: False,
+    }
+    if export:
+        config[const.CONF_EXPORT_LIMIT] = 5.0
+    durations, exported = [], []
+    for _ in range(plans):
+        pv, prices, export_prices, loads = _day(rng)
+        planner = engine.ChargingPlanner(
+            config, current_slot=rng.randrange(0, 64), initial_soc_frac=rng.uniform(0.15, 0.9)
+        )
+        planner.export_prices = export_prices
+        if mode == "optimizer":
+            planner.optimizer_budget_s = budget_s
+        elif mode == "stochastic":
+            planner.uncertainty = stochastic.uncertainty_settings(0.7, [], 10.0)
+        started = time.perf_counter()
+        schedule, _ = planner.compute_plan(pv, prices, loads)
+        durations.append(time.perf_counter() - started)
+        exported.append(planner.import_summary(schedule)["planned_export_kwh"])
+    durations.sort()
+    return {
+        "mean_ms": statistics.mean(durations) * 1000.0,
+        "p95_ms": durations[int(0.95 * (len(durations) - 1))] * 1000.0,
+        "export_kwh": statistics.mean(exported),
+    }
+
+
+def main(argv) -> None:
+    plans = int(argv[0]) if argv else 50
+    budget_s = float(argv[1]) if len(argv) > 1 else 0.2
+    engine, stochastic, const = _load_planning_modules()
+    modes = ["deterministic", "optimizer"] + (["stochastic"] if stochastic.available() else [])
+    # Silence the per-plan strategy logging
+    engine._LOGGER.disabled = True
+    print(f"{'mode':>13} {'export':>6} {'mean ms':>9} {'p95 ms':>9} {'export kWh':>10} {'vs import':>9} {'budget':>7}")
+    for mode in modes:
+        baseline = None
+        for export in (False, True):
+            r = _time_plans(engine, stochastic, const, plans, mode, export, budget_s, seed=1)
+            baseline = baseline or r["mean_ms"]
+            print(f"{mode:>13} {'yes' if export else 'no':>6} {r['mean_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+                  f"{r['export_kwh']:>10.1f} {r['mean_ms'] / baseline:>8.2f}x "
+                  f"{r['p95_ms'] / 1000.0 / PLAN_BUDGET_S:>7.1%}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
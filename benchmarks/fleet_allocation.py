@@ -0,0 +1,105 @@
+"""Benchmark the joint charging allocation of batteries on one connection.
+
+Plans N synthetic batteries independently, then re-plans them jointly under
+a shared connection limit (as the fleet batch does) and reports the time
+against the plan stage budget of one refresh::
+
+    python benchmarks/fleet_allocation.py 10 25 50
+
+Only the pure planning modules are loaded, so Home Assistant is not needed.
+"""
+from __future__ import annotations
+
+import importlib
+import math
+import random
+import sys
+import time
+import types
+from pathlib import Path
+
+PACKAGE = "custom_components.gw_smart_charging"
+PACKAGE_DIR = Path(__file__).resolve().parents[1] / "custom_components" / "gw_smart_charging"
+# STAGE_BUDGETS["plan"] in coordinator.py
+PLAN_BUDGET_S = 20.0
+
+
+def _load_planning_modules():
+    """Import engine/allocation without running the integration's __init__."""
+    for name, path in (("custom_components", PACKAGE_DIR.parent), (PACKAGE, PACKAGE_DIR)):
+        if name not in sys.modules:
+            module = types.ModuleType(name)
+            module.__path__ = [str(path)]
+            sys.modules[name] = module
+    return (
+        importlib.import_module(f"{PACKAGE}.engine"),
+        importlib.import_module(f"{PACKAGE}.allocation"),
+        importlib.import_module(f"{PACKAGE}.const"),
+    )
+
+
+def _day(rng: random.Random):
+    """Return PV, price and load curves for 96 slots."""
+    pv, prices, loads = [], [], []
+    for slot in range(96):
+        hour = slot / 4
+        pv.append(max(0.0, 4.0 * math.sin(math.pi * (hour - 6) / 14)) if 6 <= hour <= 20 else 0.0)
+        base = 2.2 + 1.3 * math.sin(math.pi * (hour - 11) / 12)
+        prices.append(round(max(0.4, base + rng.uniform(-0.3, 0.3)), 3))
+        loads.append(round(0.4 + (1.2 if 17 <= hour < 22 else 0.0) + rng.uniform(0.0, 0.5), 3))
+    return pv, prices, loads
+
+
+def run(batteries: int, seed: int = 1) -> dict:
+    engine, allocation, const = _load_planning_modules()
+    rng = random.Random(seed)
+    pv, prices, shared_loads = _day(rng)
+    limit_kw = 2.5 * batteries
+    config_base = {
+        const.CONF_BATTERY_CAPACITY: 10.0,
+        const.CONF_MAX_CHARGE_POWER: 5.0,
+        const.CONF_CHARGING_STRATEGY: const.STRATEGY_PRICE_THRESHOLD,
+        const.CONF_ALWAYS_CHARGE_PRICE: 1.5,
+        const.CONF_NEVER_CHARGE_PRICE: 3.0,
+        const.CONF_CONNECTION_GROUP: "bench",
+        const.CONF_CONNECTION_LIMIT: limit_kw,
+    }
+    members = []
+    started = time.perf_counter()
+    for index in range(batteries):
+        loads = [kw * rng.uniform(0.7, 1.3) for kw in shared_loads]
+        planner = engine.ChargingPlanner(
+            dict(config_base), current_slot=0, initial_soc_frac=rng.uniform(0.15, 0.5)
+        )
+        args = (pv, prices, loads)
+        members.append((f"battery_{index}", planner, args, planner.compute_plan(*args)))
+    independent_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    allocation.coordinate_group("bench", limit_kw, members)
+    joint_s = time.perf_counter() - started
+    summary = members[0][1].fleet_allocation
+    return {
+        "batteries": batteries,
+        "limit_kw": limit_kw,
+        "peak_before_kw": summary["peak_before_kw"],
+        "peak_after_kw": summary["peak_after_kw"],
+        "unmet_kwh": summary.get("unmet_kwh", 0.0),
+        "independent_ms": round(independent_s * 1000.0, 1),
+        "joint_ms": round(joint_s * 1000.0, 1),
+        "budget_share": round((independent_s + joint_s) / PLAN_BUDGET_S, 4),
+    }
+
+
+def main(argv) -> None:
+    sizes = [int(arg) for arg in argv] or [10, 25, 50]
+    print(f"{'batteries':>9} {'limit':>7} {'peak before':>11} {'after':>7} {'unmet kWh':>9} "
+          f"{'indep ms':>9} {'joint ms':>9} {'budget':>7}")
+    for size in sizes:
+        r = run(size)
+        print(f"{r['batteries']:>9} {r['limit_kw']:>7.1f} {r['peak_before_kw']:>11.1f} {r['peak_after_kw']:>7.1f} "
+              f"{r['unmet_kwh']:>9.1f} {r['independent_ms']:>9.1f} {r['joint_ms']:>9.1f} {r['budget_share']:>7.1%}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -6,8 +6,9 @@ from pathlib import Path
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.components import frontend
+from homeassistant.helpers.start import async_at_started
 
-from .const import DOMAIN, PLATFORMS
+from .const import DATA_FLEET, DATA_FRONTEND, DOMAIN, PLATFORMS
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -23,24 +24,45 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     hass.data.setdefault(DOMAIN, {})
 
     # local imports to avoid startup side-effects
-    from .coordinator import GWSmartCoordinator
+    from .coordinator import LIVE_OPTIONS, GWSmartCoordinator
+    from .fleet import FleetPlanner
     from .services import async_setup_services
-    from .view import GWSmartChargingDashboardView
+    from .view import GWSmartChargingDashboardView, GWSmartChargingDataView
 
     coordinator = GWSmartCoordinator(hass, entry)
-    await coordinator.async_config_entry_first_refresh()
+    await coordinator.async_load_forecast_models()
+    if await coordinator.async_restore_snapshot():
+        # Entities start from the persisted plan; the full refresh waits until
+        # HA has started, so forecast/price sensors of other integrations exist
+        async def _async_deferred_refresh(_hass: HomeAssistant) -> None:
+            await coordinator.async_refresh()
 
-    hass.data[DOMAIN][entry.entry_id] = coordinator
+        entry.async_on_unload(async_at_started(hass, _async_deferred_refresh))
+    else:
+        await coordinator.async_config_entry_first_refresh()
 
-    # Register dashboard view
-    hass.http.register_view(GWSmartChargingDashboardView(hass))
-    
-    # Register custom Lovelace card
-    await _async_register_lovelace_card(hass)
-    
-    # Register panel in sidebar
-    if DOMAIN not in hass.data.get("frontend_panels", {}):
-        await _async_register_panel(hass)
+    hass.data[DOMAIN][entry.entry_id] = coordinator
+    # React to Nanogreen cheapest-hour changes immediately instead of on the next poll
+    coordinator.track_nanogreen()
+    # Integrate SOC and battery power readings as they arrive (plan start state)
+    coordinator.track_battery_state()
+    # Entries share one fleet planner (batched planning with several entries)
+    if DATA_FLEET not in hass.data:
+        hass.data[DATA_FLEET] = FleetPlanner(hass)
+    hass.data[DATA_FLEET].register(coordinator)
+
+    # Views, card and panel serve all entries; HTTP routes can only be added once
+    if not hass.data.get(DATA_FRONTEND):
+        hass.data[DATA_FRONTEND] = True
+        hass.http.register_view(GWSmartChargingDashboardView(hass))
+        hass.http.register_view(GWSmartChargingDataView(hass))
+
+        # Register custom Lovelace card
+        await _async_register_lovelace_card(hass)
+
+        # Register panel in sidebar
+        if DOMAIN not in hass.data.get("frontend_panels", {}):
+            await _async_register_panel(hass)
 
     # Forward setup for platforms (use correct HA API)
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
@@ -48,8 +70,22 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     await async_setup_services(hass)
 
     async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
-        """Handle options update."""
-        await hass.config_entries.async_reload(entry.entry_id)
+        """Handle options update.
+
+        Options are applied to the running coordinator when possible, keeping
+        entities, ML history and caches.  The listener fires for both the
+        data and the (empty) options update of the options flow, so it must be
+        a no-op when nothing changed.
+        """
+        changed = coordinator.changed_options(entry.data)
+        if not changed:
+            return
+        if not changed <= LIVE_OPTIONS:
+            _LOGGER.debug("Reloading entry for options %s", sorted(changed - LIVE_OPTIONS))
+            await hass.config_entries.async_reload(entry.entry_id)
+            return
+        coordinator.apply_config(entry.data)
+        await coordinator.async_request_refresh()
 
     entry.async_on_unload(entry.add_update_listener(_async_update_listener))
     _LOGGER.debug("GW Smart Charging setup complete")
@@ -96,5 +132,20 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id, None)
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id, None)
+        fleet = hass.data.get(DATA_FLEET)
+        if fleet is not None:
+            fleet.unregister(entry.entry_id)
+            if not fleet.members:
+                await fleet.async_stop()
+                hass.data.pop(DATA_FLEET)
+        if coordinator is not None:
+            await coordinator.async_unload()
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Delete the persisted stores (plan snapshot, PV bias) of a removed config entry."""
+    from .snapshot import async_remove_entry_stores
+
+    await async_remove_entry_stores(hass, entry.entry_id)
@@ -0,0 +1,482 @@
+"""Actuation queue for charging scripts and price-driven switches.
+
+The coordinator decides *what* the scripts and switches should do; this module
+does the service calls, off the planning path:
+
+- commands are keyed (usually by entity id) and coalesced - a newer command
+  for a key replaces one that has not started yet, and supersedes one that is
+  still retrying;
+- different keys run concurrently (bounded by ``MAX_CONCURRENCY``), the same
+  key never runs twice at once;
+- failed calls are retried with exponential backoff; the caller is told about
+  the final outcome through ``on_done`` so it can re-plan the command.
+
+``SetpointController`` sends the planned charge power to a number entity or
+script instead of switching ON/OFF, with a deadband and a rate limit.
+
+``ActuationVerifier`` closes the loop for the charging scripts: it watches
+battery power and grid import after a command and measures when (and if)
+the inverter actually changed mode.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from homeassistant.components import persistent_notification
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later, async_track_state_change_event
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+BACKOFF_SECONDS = 2.0
+COMMAND_TIMEOUT = 30.0
+MAX_CONCURRENCY = 8
+
+
+@dataclass
+class Command:
+    """One service call for an actuation key."""
+
+    key: str
+    domain: str
+    service: str
+    data: Dict[str, Any] = field(default_factory=dict)
+    # Called with True/False once the command succeeded or gave up
+    on_done: Optional[Callable[[bool], None]] = None
+
+
+class ActuationQueue:
+    """Coalescing, concurrent service-call queue with retry."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff: float = BACKOFF_SECONDS,
+        max_concurrency: int = MAX_CONCURRENCY,
+    ) -> None:
+        self._hass = hass
+        self._max_attempts = max_attempts
+        self._backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending: Dict[str, Command] = {}
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._closed = False
+        self._stats = {"submitted": 0, "coalesced": 0, "executed": 0,
+                       "retried": 0, "failed": 0, "superseded": 0}
+
+    def submit(
+        self,
+        key: str,
+        domain: str,
+        service: str,
+        data: Optional[Dict[str, Any]] = None,
+        on_done: Optional[Callable[[bool], None]] = None,
+    ) -> None:
+        """Queue a service call; returns immediately."""
+        if self._closed:
+            return
+        self._stats["submitted"] += 1
+        if key in self._pending:
+            self._stats["coalesced"] += 1
+        self._pending[key] = Command(key, domain, service, dict(data or {}), on_done)
+        if key not in self._in_flight:
+            self._start(key)
+
+    def _start(self, key: str) -> None:
+        command = self._pending.pop(key)
+        self._in_flight[key] = self._hass.async_create_background_task(
+            self._run(command), f"{DOMAIN} actuation {key}"
+        )
+
+    async def _run(self, command: Command) -> None:
+        try:
+            ok = await self._execute(command)
+        finally:
+            self._in_flight.pop(command.key, None)
+            if command.key in self._pending and not self._closed:
+                self._start(command.key)
+        if ok is not None and command.on_done is not None:
+            try:
+                command.on_done(ok)
+            except Exception:  # defensive: a callback must not kill the queue
+                _LOGGER.exception("Actuation callback for %s failed", command.key)
+
+    async def _execute(self, command: Command) -> Optional[bool]:
+        """Run a command with retries; None when a newer command superseded it."""
+        delay = self._backoff
+        for attempt in range(1, self._max_attempts + 1):
+            try:
+                async with self._semaphore:
+                    await asyncio.wait_for(
+                        self._hass.services.async_call(
+                            command.domain, command.service, command.data, blocking=True
+                        ),
+                        COMMAND_TIMEOUT,
+                    )
+                self._stats["executed"] += 1
+                return True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt >= self._max_attempts:
+                    self._stats["failed"] += 1
+                    _LOGGER.error("%s.%s for %s failed after %d attempts: %s",
+                                  command.domain, command.service, command.key, attempt, e)
+                    return False
+                _LOGGER.warning("%s.%s for %s failed (attempt %d/%d), retrying in %.0fs: %s",
+                                command.domain, command.service, command.key,
+                                attempt, self._max_attempts, delay, e)
+            self._stats["retried"] += 1
+            await asyncio.sleep(delay)
+            delay *= 2
+            if command.key in self._pending:
+                self._stats["superseded"] += 1
+                return None
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue counters for diagnostics."""
+        return {**self._stats, "pending": len(self._pending), "in_flight": len(self._in_flight)}
+
+    async def async_stop(self) -> None:
+        """Cancel queued and running commands (config entry unload)."""
+        self._closed = True
+        self._pending.clear()
+        tasks = list(self._in_flight.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._in_flight.clear()
+
+
+# ---------- charge power setpoints ----------
+
+# Domains that take a charge-power setpoint: number entities get the value,
+# scripts get it as variables (for inverters that need a service call with data)
+SETPOINT_DOMAINS = ("number", "input_number", "script")
+SETPOINT_KEY = "charge_power_setpoint"
+
+
+def setpoint_call(hass: HomeAssistant, entity_id: str, power_kw: float, max_kw: float):
+    """Return ``(domain, service, data)`` that sets the charge power to ``power_kw``.
+
+    Number entities are written in their own unit (W, kW or % of the maximum
+    charge power), clamped to their range and rounded to their step.
+    """
+    domain = entity_id.split(".", 1)[0]
+    pct = 100.0 * power_kw / max_kw if max_kw > 0 else 0.0
+    if domain == "script":
+        variables = {"power_kw": round(power_kw, 3), "power_w": round(power_kw * 1000.0), "power_pct": round(pct, 1)}
+        return "script", "turn_on", {"entity_id": entity_id, "variables": variables}
+    state = hass.states.get(entity_id)
+    attributes = state.attributes if state is not None else {}
+    unit = str(attributes.get("unit_of_measurement") or "kW")
+    value = power_kw * 1000.0 if unit == "W" else pct if unit == "%" else power_kw
+    try:
+        step = float(attributes.get("step") or 0.0)
+        if step > 0:
+            value = round(value / step) * step
+        value = min(float(attributes.get("max", value)), max(float(attributes.get("min", value)), value))
+    except (TypeError, ValueError):
+        pass
+    return domain, "set_value", {"entity_id": entity_id, "value": round(value, 3)}
+
+
+class SetpointController:
+    """Send the planned grid charge power as a setpoint instead of ON/OFF.
+
+    A new setpoint is sent when it differs from the last one by at least the
+    deadband, and at most once per ``min_interval`` seconds; a change held
+    back by the rate limit is sent when the interval has passed (the latest
+    value wins).  Starting and stopping (to or from 0 kW) are always sent at
+    once.  Commands go through the actuation queue under one key.
+    """
+
+    def __init__(self, hass: HomeAssistant, queue: ActuationQueue) -> None:
+        self._hass = hass
+        self._queue = queue
+        self.entity_id = ""
+        self.deadband_kw = 0.0
+        self.min_interval = 0.0
+        self.max_kw = 0.0
+        self._sent_kw: Optional[float] = None
+        self._sent_at = 0.0
+        self._pending_kw: Optional[float] = None
+        self._unsub_timer: Optional[Callable[[], None]] = None
+        self._stats = {"sent": 0, "within_deadband": 0, "rate_limited": 0, "failed": 0}
+
+    def configure(self, entity_id: str, deadband_kw: float, min_interval: float, max_kw: float) -> None:
+        entity_id = (entity_id or "").strip()
+        if entity_id and entity_id.split(".", 1)[0] not in SETPOINT_DOMAINS:
+            _LOGGER.warning("Charge power setpoint %s must be a number, input_number or script entity", entity_id)
+            entity_id = ""
+        if entity_id != self.entity_id:
+            self.reset()
+        self.entity_id = entity_id
+        self.deadband_kw = max(0.0, deadband_kw)
+        self.min_interval = max(0.0, min_interval)
+        self.max_kw = max(0.0, max_kw)
+
+    @property
+    def active(self) -> bool:
+        return bool(self.entity_id)
+
+    def update(self, power_kw: float) -> None:
+        """Request ``power_kw`` of grid charging (0 = no grid charging)."""
+        if not self.active:
+            return
+        target = round(min(self.max_kw, max(0.0, power_kw)), 2) if self.max_kw > 0 else round(max(0.0, power_kw), 2)
+        last = self._sent_kw
+        start_stop = last is None or (target > 0) != (last > 0)
+        if not start_stop and abs(target - last) < max(self.deadband_kw, 0.01):
+            self._stats["within_deadband"] += 1
+            self._cancel_pending()
+            return
+        wait = self.min_interval - (time.monotonic() - self._sent_at)
+        if not start_stop and wait > 0:
+            self._stats["rate_limited"] += 1
+            self._pending_kw = target
+            if self._unsub_timer is None:
+                self._unsub_timer = async_call_later(self._hass, wait, self._async_send_pending)
+            return
+        self._send(target)
+
+    @callback
+    def _async_send_pending(self, _now) -> None:
+        self._unsub_timer = None
+        target, self._pending_kw = self._pending_kw, None
+        if target is not None:
+            self._send(target)
+
+    def _send(self, target: float) -> None:
+        self._cancel_pending()
+        self._sent_kw = target
+        self._sent_at = time.monotonic()
+        self._stats["sent"] += 1
+        domain, service, data = setpoint_call(self._hass, self.entity_id, target, self.max_kw)
+        _LOGGER.info("Charge power setpoint %.2f kW (%s)", target, self.entity_id)
+        self._queue.submit(SETPOINT_KEY, domain, service, data, on_done=lambda ok: self._on_done(target, ok))
+
+    def _on_done(self, target: float, ok: bool) -> None:
+        """Re-send a failed setpoint on the next update."""
+        if not ok and self._sent_kw == target:
+            self._stats["failed"] += 1
+            self._sent_kw = None
+
+    def _cancel_pending(self) -> None:
+        self._pending_kw = None
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+
+    def reset(self) -> None:
+        """Forget the last setpoint, so the next update is sent (re-apply, option change, unload)."""
+        self._cancel_pending()
+        self._sent_kw = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return setpoint counters for diagnostics."""
+        return {**self._stats, "entity_id": self.entity_id or None, "setpoint_kw": self._sent_kw,
+                "pending_kw": self._pending_kw}
+
+
+# ---------- closed-loop verification ----------
+
+# A command took effect when battery power / grid import moved by this much (W)
+VERIFY_DELTA_W = 300.0
+# ... within this many seconds after the script was started
+VERIFY_DEADLINE = 180.0
+# Re-issue an unconfirmed command this many times before alerting
+MAX_REISSUES = 1
+LATENCY_BUCKETS = (5, 10, 20, 30, 60, 90, 120, 180)
+RECENT_LATENCIES = 200
+
+
+def _read_w(hass: HomeAssistant, entity_id: Optional[str]) -> Optional[float]:
+    if not entity_id:
+        return None
+    state = hass.states.get(entity_id)
+    if state is None:
+        return None
+    try:
+        return float(state.state)
+    except (TypeError, ValueError):
+        return None
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of command-to-effect latency (seconds)."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.recent: Deque[float] = deque(maxlen=RECENT_LATENCIES)
+
+    def add(self, seconds: float) -> None:
+        index = next((i for i, edge in enumerate(LATENCY_BUCKETS) if seconds <= edge), len(LATENCY_BUCKETS))
+        self.counts[index] += 1
+        self.total += seconds
+        self.recent.append(round(seconds, 1))
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> Dict[str, Any]:
+        count = sum(self.counts)
+        labels = [f"<={edge}s" for edge in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+        return {
+            "count": count,
+            "buckets": dict(zip(labels, self.counts)),
+            "mean_s": round(self.total / count, 1) if count else None,
+            "p50_s": self.percentile(0.5),
+            "p95_s": self.percentile(0.95),
+            "last_s": self.recent[-1] if self.recent else None,
+        }
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"counts": self.counts, "total": round(self.total, 1), "recent": list(self.recent)}
+
+    def load_dict(self, data: Optional[Dict[str, Any]]) -> None:
+        if not data:
+            return
+        try:
+            counts = [int(c) for c in data.get("counts", [])]
+            if len(counts) == len(self.counts):
+                self.counts = counts
+                self.total = float(data.get("total", 0.0))
+                self.recent = deque((float(v) for v in data.get("recent", [])), maxlen=RECENT_LATENCIES)
+        except (TypeError, ValueError):
+            _LOGGER.warning("Ignoring corrupt actuation latency data")
+
+
+class ActuationVerifier:
+    """Confirm that a charging ON/OFF script actually changed the inverter mode.
+
+    After a script call the battery power (negative = charging) and grid
+    import sensors are watched.  Charging ON is confirmed when the battery
+    starts charging harder or the grid import rises by ``VERIFY_DELTA_W``;
+    OFF by the opposite move.  The time until then goes into the latency
+    histogram.  Without an effect by the deadline the command is re-issued,
+    then reported.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self.histogram = LatencyHistogram()
+        self._stats = {"confirmed": 0, "already_in_state": 0, "reissued": 0,
+                       "unconfirmed": 0, "superseded": 0}
+        self._watch: Optional[Dict[str, Any]] = None
+        self._unsubs: List[Callable[[], None]] = []
+
+    def expect(
+        self,
+        charging: bool,
+        battery_power_sensor: Optional[str],
+        grid_import_sensor: Optional[str],
+        reissue: Callable[[], None],
+        attempt: int = 0,
+    ) -> None:
+        """Start watching for the effect of a command that was just executed."""
+        if self._watch is not None:
+            self._stats["superseded"] += 1
+        self.cancel()
+        battery = _read_w(self._hass, battery_power_sensor)
+        grid = _read_w(self._hass, grid_import_sensor)
+        if battery is None and grid is None:
+            return
+        if self._in_state(charging, battery, grid):
+            self._stats["already_in_state"] += 1
+            return
+        self._watch = {
+            "charging": charging,
+            "battery_sensor": battery_power_sensor,
+            "grid_sensor": grid_import_sensor,
+            "battery_base": battery,
+            "grid_base": grid,
+            "started": time.monotonic(),
+            "reissue": reissue,
+            "attempt": attempt,
+        }
+        entities = [e for e in (battery_power_sensor, grid_import_sensor) if e]
+        self._unsubs.append(async_track_state_change_event(self._hass, entities, self._async_state_changed))
+        self._unsubs.append(async_call_later(self._hass, VERIFY_DEADLINE, self._async_deadline))
+
+    @staticmethod
+    def _in_state(charging: bool, battery: Optional[float], grid: Optional[float]) -> bool:
+        """Return True when the readings already show the requested mode."""
+        if charging:
+            # Charging from the grid: battery charging and importing at the same time
+            return (battery is not None and battery <= -VERIFY_DELTA_W
+                    and grid is not None and grid >= VERIFY_DELTA_W)
+        return battery is not None and battery > -VERIFY_DELTA_W
+
+    def _took_effect(self) -> bool:
+        watch = self._watch
+        battery = _read_w(self._hass, watch["battery_sensor"])
+        grid = _read_w(self._hass, watch["grid_sensor"])
+        sign = 1.0 if watch["charging"] else -1.0
+        if battery is not None and watch["battery_base"] is not None:
+            if sign * (watch["battery_base"] - battery) >= VERIFY_DELTA_W:
+                return True
+        if grid is not None and watch["grid_base"] is not None:
+            if sign * (grid - watch["grid_base"]) >= VERIFY_DELTA_W:
+                return True
+        return False
+
+    @callback
+    def _async_state_changed(self, event) -> None:
+        if self._watch is None or not self._took_effect():
+            return
+        latency = time.monotonic() - self._watch["started"]
+        self.histogram.add(latency)
+        self._stats["confirmed"] += 1
+        _LOGGER.debug("Charging %s confirmed after %.1fs",
+                      "ON" if self._watch["charging"] else "OFF", latency)
+        self.cancel()
+
+    @callback
+    def _async_deadline(self, _now) -> None:
+        watch = self._watch
+        self.cancel()
+        if watch is None:
+            return
+        mode = "ON" if watch["charging"] else "OFF"
+        if watch["attempt"] < MAX_REISSUES:
+            self._stats["reissued"] += 1
+            _LOGGER.warning("Charging %s had no effect within %.0fs, re-issuing", mode, VERIFY_DEADLINE)
+            watch["reissue"]()
+            return
+        self._stats["unconfirmed"] += 1
+        _LOGGER.error("Charging %s had no effect on the inverter after %d attempts", mode, watch["attempt"] + 1)
+        persistent_notification.async_create(
+            self._hass,
+            f"Charging {mode} command had no measurable effect on battery power or grid import "
+            f"within {int(VERIFY_DEADLINE)} s after {watch['attempt'] + 1} attempts. "
+            "Check the charging scripts and the inverter connection.",
+            title="GW Smart Charging",
+            notification_id=f"{DOMAIN}_actuation_unconfirmed",
+        )
+
+    def cancel(self) -> None:
+        """Stop watching (new command, or unload)."""
+        for unsub in self._unsubs:
+            unsub()
+        self._unsubs = []
+        self._watch = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return verification counters and the latency histogram for diagnostics."""
+        return {**self._stats, "watching": self._watch is not None, "latency": self.histogram.summary()}
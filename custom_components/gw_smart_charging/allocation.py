@@ -0,0 +1,246 @@
+"""Joint grid-charging allocation for batteries behind one connection.
+
+Several entries (batteries) can share one grid connection.  Planned alone,
+each battery picks the same cheap slots and together they exceed the
+connection; this module splits the connection capacity left by the houses
+and their deferrable loads between the batteries.
+
+Every battery's own plan is cut into charge blocks.  A block asks for the
+grid energy it planned, within a window that ends at the first slot the
+battery discharges after the block (the energy has to be stored by then)::
+
+    ChargeRequest("entry_a#0", need_kwh=6.0, max_kw=5.0, soc_frac=0.3,
+                  start_slot=40, deadline_slot=72, eligible=[...], prices=[...])
+
+Slots are handed out cheapest first; within a slot the most urgent request
+(highest share of its remaining reachable energy still needed, then lowest
+SOC, then earliest deadline) is served first.  That is O(T log T + T·B log B)
+for T slots and B requests, so tens of batteries take milliseconds.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .const import (
+    CONF_CONNECTION_GROUP,
+    CONF_CONNECTION_LIMIT,
+    DEFAULT_CONNECTION_GROUP,
+    DEFAULT_CONNECTION_LIMIT,
+)
+from .peak import slot_grid_import_kw, slot_net_import_kw
+
+_LOGGER = logging.getLogger(__name__)
+
+SLOT_HOURS = 0.25
+# Schedule modes in which the battery discharges (to the house or the grid)
+DISCHARGE_MODES = ("battery_discharge", "battery_export")
+# Import within this margin of the connection limit is not re-planned
+LIMIT_TOLERANCE_KW = 0.05
+
+
+@dataclass(frozen=True)
+class ChargeRequest:
+    """Grid energy one charge block of a battery wants within its window."""
+
+    key: str
+    need_kwh: float
+    max_kw: float
+    soc_frac: float
+    start_slot: int
+    deadline_slot: int  # exclusive
+    eligible: Sequence[bool]
+    prices: Sequence[float]
+
+
+def connection_of(config: Mapping[str, Any]) -> Optional[Tuple[str, float]]:
+    """Return ``(group, limit_kw)`` of an entry sharing a connection, else None."""
+    group = str(config.get(CONF_CONNECTION_GROUP, DEFAULT_CONNECTION_GROUP) or "").strip()
+    if not group:
+        return None
+    try:
+        limit = float(config.get(CONF_CONNECTION_LIMIT, DEFAULT_CONNECTION_LIMIT) or 0.0)
+    except (TypeError, ValueError):
+        limit = 0.0
+    return group, limit
+
+
+def schedule_import_kw(schedule: Sequence[Mapping[str, Any]], slots: int = 96) -> List[float]:
+    """Return the planned grid import per slot of a schedule (zero past its end)."""
+    imports = [0.0] * slots
+    for index, slot in enumerate(schedule[:slots]):
+        imports[index] = slot_grid_import_kw(slot)
+    return imports
+
+
+def base_import_kw(schedule: Sequence[Mapping[str, Any]], slots: int = 96) -> List[float]:
+    """Return the planned grid import per slot without the battery.
+
+    While the battery charges from the grid it does not cover the house, so
+    the capacity left for charging is what the house and loads leave.
+    """
+    imports = [0.0] * slots
+    for index, slot in enumerate(schedule[:slots]):
+        imports[index] = max(0.0, slot_net_import_kw(slot) - float(slot.get("planned_charge_kW", 0.0)))
+    return imports
+
+
+def charge_blocks(
+    schedule: Sequence[Mapping[str, Any]], current_slot: int
+) -> List[Tuple[int, int, float]]:
+    """Split a schedule's grid charging into ``(start, deadline, kwh)`` blocks.
+
+    A block runs from the end of the previous block's window to the first
+    discharge after its last grid-charge slot (or the end of the day).
+    """
+    blocks: List[Tuple[int, int, float]] = []
+    slots = len(schedule)
+    start = current_slot
+    index = current_slot
+    while index < slots:
+        kwh = 0.0
+        charged = False
+        while index < slots and schedule[index].get("mode") not in DISCHARGE_MODES:
+            slot = schedule[index]
+            if str(slot.get("mode", "")).startswith("grid_charge"):
+                kwh += float(slot.get("planned_charge_kW", 0.0)) * SLOT_HOURS
+                charged = True
+            index += 1
+        if charged:
+            blocks.append((start, index, kwh))
+            start = index
+        # Skip the discharge run; the next block may start charging after it
+        while index < slots and schedule[index].get("mode") in DISCHARGE_MODES:
+            index += 1
+    return blocks
+
+
+def allocate_connection(
+    requests: Sequence[ChargeRequest],
+    capacity_kw: Sequence[float],
+    current_slot: int,
+) -> Tuple[Dict[str, List[float]], Dict[str, float]]:
+    """Split per-slot connection capacity between charge requests.
+
+    Returns ``(allocation, unmet)``: granted grid charge power per slot and
+    the energy (kWh) that did not fit, both by request key.
+    """
+    slots = len(capacity_kw)
+    capacity = [max(0.0, kw) for kw in capacity_kw]
+    allocation = {r.key: [0.0] * slots for r in requests}
+    need = {r.key: max(0.0, r.need_kwh) for r in requests}
+
+    def window(r: ChargeRequest) -> range:
+        return range(max(r.start_slot, current_slot), min(r.deadline_slot, slots))
+
+    # Energy each request could still get in its window if it had the connection alone
+    reachable = {
+        r.key: sum(min(r.max_kw, capacity[s]) * SLOT_HOURS for s in window(r) if r.eligible[s])
+        for r in requests
+    }
+    by_slot: List[List[ChargeRequest]] = [[] for _ in range(slots)]
+    for r in requests:
+        if need[r.key] > 0:
+            for s in window(r):
+                if r.eligible[s]:
+                    by_slot[s].append(r)
+
+    def slot_price(s: int) -> float:
+        wanting = by_slot[s]
+        return sum(r.prices[s] for r in wanting) / len(wanting) if wanting else 0.0
+
+    order = sorted((s for s in range(current_slot, slots) if by_slot[s]), key=lambda s: (slot_price(s), s))
+    for s in order:
+        wanting = [r for r in by_slot[s] if need[r.key] > 1e-6]
+        wanting.sort(key=lambda r: (
+            -need[r.key] / max(reachable[r.key], 1e-6), r.soc_frac, r.deadline_slot,
+        ))
+        left = capacity[s]
+        for r in wanting:
+            if left <= 1e-6:
+                break
+            kw = min(r.max_kw, left, need[r.key] / SLOT_HOURS)
+            allocation[r.key][s] = kw
+            need[r.key] -= kw * SLOT_HOURS
+            left -= kw
+        capacity[s] = left
+        for r in by_slot[s]:
+            reachable[r.key] -= min(r.max_kw, max(0.0, capacity_kw[s])) * SLOT_HOURS
+    return allocation, {key: round(kwh, 3) for key, kwh in need.items() if kwh > 1e-3}
+
+
+def coordinate_group(
+    group: str,
+    limit_kw: float,
+    members: Sequence[Tuple[str, Any, tuple, Tuple[List[Dict[str, Any]], Dict[str, Any]]]],
+    fixed_import_kw: Optional[Sequence[float]] = None,
+) -> Dict[str, Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    """Re-plan the batteries of one connection so their summed import fits ``limit_kw``.
+
+    ``members`` are ``(key, planner, compute_plan args, (schedule, plan))``
+    from the independent first pass; ``fixed_import_kw`` is the planned
+    import of group members not planned in this batch.  Members are only
+    re-planned when the first pass exceeds the limit.  Returns the results
+    by key; every planner gets a ``fleet_allocation`` summary.
+    """
+    started = time.monotonic()
+    current_slot = min((planner.current_slot for _, planner, _, _ in members), default=0)
+    fixed = list(fixed_import_kw or [0.0] * 96)
+    total = list(fixed)
+    base = list(fixed)
+    for _key, _planner, _args, (schedule, _plan) in members:
+        for s, kw in enumerate(schedule_import_kw(schedule)):
+            total[s] += kw
+        for s, kw in enumerate(base_import_kw(schedule)):
+            base[s] += kw
+    peak_before = max(total[current_slot:], default=0.0)
+    results = {key: result for key, _, _, result in members}
+    summary: Dict[str, Any] = {
+        "group": group,
+        "limit_kw": limit_kw,
+        "members": len(members),
+        "peak_before_kw": round(peak_before, 3),
+        "coordinated": False,
+    }
+
+    if limit_kw > 0 and peak_before > limit_kw + LIMIT_TOLERANCE_KW:
+        requests: List[ChargeRequest] = []
+        owners: Dict[str, str] = {}
+        for key, planner, _args, (schedule, _plan) in members:
+            for request in planner.charge_requests(schedule, key):
+                requests.append(request)
+                owners[request.key] = key
+        allocation, unmet = allocate_connection(
+            requests, [limit_kw - kw for kw in base], current_slot
+        )
+        granted: Dict[str, List[float]] = {key: [0.0] * 96 for key, *_ in members}
+        for request_key, kws in allocation.items():
+            target = granted[owners[request_key]]
+            for s, kw in enumerate(kws):
+                target[s] += kw
+        total = list(fixed)
+        for key, planner, args, _result in members:
+            results[key] = planner.replan_with_allocation(granted[key], *args)
+            for s, kw in enumerate(schedule_import_kw(results[key][0])):
+                total[s] += kw
+        summary.update(
+            coordinated=True,
+            requested_kwh=round(sum(r.need_kwh for r in requests), 3),
+            unmet_kwh=round(sum(unmet.values()), 3),
+        )
+        _LOGGER.info(
+            "Connection %s: planned import %.1f kW over the %.1f kW limit, split charging of %d batteries",
+            group, peak_before, limit_kw, len(members),
+        )
+
+    summary["peak_after_kw"] = round(max(total[current_slot:], default=0.0), 3)
+    summary["elapsed_ms"] = round((time.monotonic() - started) * 1000.0, 1)
+    for key, planner, _args, _result in members:
+        planner.fleet_allocation = {
+            **summary,
+            "granted_kwh": round(sum(planner.grid_charge_allocation or ()) * SLOT_HOURS, 3)
+            if summary["coordinated"] else None,
+        }
+    return results
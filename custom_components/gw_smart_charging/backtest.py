@@ -0,0 +1,286 @@
+"""Historical backtesting of the charging strategies.
+
+Recorded price, PV, load and SOC series (from the recorder statistics or an
+exported CSV file) are cut into days of 96 15-minute slots held in compact
+``array('d')`` buffers.  Each strategy is then run through the planner day
+by day with the realized values, carrying the simulated SOC from one day to
+the next, and costed against the same days without a battery.
+
+Work is split into (strategy, block of days) tasks that run in a process
+pool; each block starts from the recorded SOC of its first day.  A year of
+data for all nine strategies is about 3 300 planner runs.
+
+CSV files have a header row with ``time,price,pv_kw,load_kw[,soc_pct]``;
+samples hold their value until the next one, so hourly and 15-minute
+exports both work.
+"""
+from __future__ import annotations
+
+import csv
+import logging
+import os
+import time
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .const import (
+    CONF_BATTERY_CAPACITY,
+    CONF_CHARGING_STRATEGY,
+    DEFAULT_BATTERY_CAPACITY,
+    STRATEGY_4_LOWEST,
+    STRATEGY_6_LOWEST,
+    STRATEGY_ADAPTIVE_SMART,
+    STRATEGY_DYNAMIC,
+    STRATEGY_NANOGREEN_ONLY,
+    STRATEGY_PEAK_SHAVING,
+    STRATEGY_PRICE_THRESHOLD,
+    STRATEGY_SOLAR_PRIORITY,
+    STRATEGY_TOU_OPTIMIZED,
+)
+from .engine import ChargingPlanner, quiet_planning
+
+_LOGGER = logging.getLogger(__name__)
+
+SLOTS_PER_DAY = 96
+SLOT_HOURS = 0.25
+ALL_STRATEGIES = (
+    STRATEGY_DYNAMIC, STRATEGY_4_LOWEST, STRATEGY_6_LOWEST, STRATEGY_NANOGREEN_ONLY,
+    STRATEGY_PRICE_THRESHOLD, STRATEGY_ADAPTIVE_SMART, STRATEGY_SOLAR_PRIORITY,
+    STRATEGY_PEAK_SHAVING, STRATEGY_TOU_OPTIMIZED,
+)
+SERIES = ("price", "pv", "load", "soc")
+# A sample is held at most this long (sensor outage, recorder gap)
+MAX_HOLD = timedelta(hours=2)
+# Days with fewer covered slots than this share are skipped
+MIN_DAY_COVERAGE = 0.9
+# Days per pool task; each task starts from the recorded SOC of its first day
+BLOCK_DAYS = 30
+# Fewer planner runs than this are not worth starting processes for
+MIN_PARALLEL_RUNS = 200
+
+
+@dataclass
+class BacktestDay:
+    """Realized 15-minute series of one day."""
+
+    day: date
+    prices: array
+    pv_kw: array
+    load_kw: array
+    soc_start: Optional[float] = None  # fraction, recorded at midnight
+
+
+# ---------- loading ----------
+
+def load_csv(path: str) -> Dict[str, List[Tuple[datetime, float]]]:
+    """Read an exported ``time,price,pv_kw,load_kw[,soc_pct]`` file into series."""
+    columns = {"price": "price", "pv": "pv_kw", "load": "load_kw", "soc": "soc_pct"}
+    series: Dict[str, List[Tuple[datetime, float]]] = {name: [] for name in SERIES}
+    with open(path, newline="", encoding="utf-8") as handle:
+        reader = csv.DictReader(handle)
+        missing = {"time", "price", "pv_kw", "load_kw"} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"{path}: missing columns {', '.join(sorted(missing))}")
+        for row in reader:
+            try:
+                when = datetime.fromisoformat(row["time"])
+            except (TypeError, ValueError):
+                continue
+            if when.tzinfo is not None:
+                when = when.astimezone().replace(tzinfo=None)
+            for name, column in columns.items():
+                try:
+                    series[name].append((when, float(row[column])))
+                except (KeyError, TypeError, ValueError):
+                    pass
+    return series
+
+
+def build_days(
+    series: Mapping[str, Sequence[Tuple[datetime, float]]],
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> List[BacktestDay]:
+    """Sample the series (local naive times; pv/load in kW, SOC in %) into complete days."""
+    held: Dict[str, Tuple[List[datetime], List[float]]] = {}
+    for name in SERIES:
+        samples = sorted(series.get(name) or ())
+        held[name] = ([t for t, _ in samples], [v for _, v in samples])
+    if not all(held[name][0] for name in ("price", "pv", "load")):
+        return []
+    first = max(held[name][0][0] for name in ("price", "pv", "load")).date()
+    last = min(held[name][0][-1] for name in ("price", "pv", "load")).date()
+    first = max(first, start) if start else first
+    last = min(last, end) if end else last
+
+    def value_at(name: str, when: datetime) -> Optional[float]:
+        stamps, values = held[name]
+        index = bisect_right(stamps, when) - 1
+        if index < 0 or when - stamps[index] > MAX_HOLD:
+            return None
+        return values[index]
+
+    days: List[BacktestDay] = []
+    day = first
+    while day <= last:
+        midnight = datetime.combine(day, datetime.min.time())
+        columns = {name: array("d") for name in ("price", "pv", "load")}
+        covered = 0
+        for slot in range(SLOTS_PER_DAY):
+            when = midnight + timedelta(minutes=15 * slot)
+            values = [value_at(name, when) for name in ("price", "pv", "load")]
+            if None not in values:
+                covered += 1
+            for name, value in zip(("price", "pv", "load"), values):
+                if value is None:
+                    # Gaps inside a covered day repeat the previous slot
+                    value = columns[name][-1] if columns[name] else 0.0
+                elif name != "price":
+                    value = max(0.0, value)
+                columns[name].append(value)
+        if covered >= MIN_DAY_COVERAGE * SLOTS_PER_DAY:
+            soc = value_at("soc", midnight)
+            days.append(BacktestDay(
+                day, columns["price"], columns["pv"], columns["load"],
+                max(0.0, min(1.0, soc / 100.0)) if soc is not None else None,
+            ))
+        day += timedelta(days=1)
+    return days
+
+
+# ---------- simulation ----------
+
+def simulate_block(
+    config: Mapping[str, Any], strategy: str, days: Sequence[BacktestDay]
+) -> Dict[str, float]:
+    """Run one strategy over consecutive days; SOC carries over between days."""
+    totals = {"days": 0, "grid_cost": 0.0, "baseline_cost": 0.0, "grid_import_kwh": 0.0,
+              "grid_charged_kwh": 0.0, "discharged_kwh": 0.0}
+    strategy_config = {**config, CONF_CHARGING_STRATEGY: strategy}
+    soc_frac: Optional[float] = None
+    charging = False
+    previous: Optional[date] = None
+    for day in days:
+        if soc_frac is None or previous is None or day.day - previous != timedelta(days=1):
+            soc_frac = day.soc_start if day.soc_start is not None else 0.5
+            charging = False
+        planner = ChargingPlanner(strategy_config, current_slot=0, initial_soc_frac=soc_frac,
+                                  last_charging_state=charging)
+        schedule = planner.compute_schedule(list(day.pv_kw), list(day.prices), list(day.load_kw))
+        for slot in schedule:
+            price = slot["price_czk_kwh"]
+            house_kw = slot["load_kW"] - slot["pv_power_kW"]
+            charge_kw = slot["planned_charge_kW"]
+            grid_kw = max(0.0, house_kw + charge_kw)
+            totals["grid_cost"] += grid_kw * price * SLOT_HOURS
+            totals["baseline_cost"] += max(0.0, house_kw) * price * SLOT_HOURS
+            totals["grid_import_kwh"] += grid_kw * SLOT_HOURS
+            if slot["mode"].startswith("grid_charge"):
+                totals["grid_charged_kwh"] += charge_kw * SLOT_HOURS
+            elif charge_kw < 0:
+                totals["discharged_kwh"] -= charge_kw * SLOT_HOURS
+        soc_frac = schedule[-1]["soc_pct_end"] / 100.0 if schedule else soc_frac
+        charging = planner.last_charging_state
+        previous = day.day
+        totals["days"] += 1
+    return totals
+
+
+def _quiet_worker() -> None:
+    """Pool initializer: the planner logs every run (and per-run warnings).
+
+    The spawned worker only plans, so its planner logger is simply raised;
+    in this process ``quiet_planning`` keeps other threads' logging intact.
+    """
+    logging.getLogger(ChargingPlanner.__module__).setLevel(logging.ERROR)
+
+
+def run_tasks(func: Callable[[Any], Any], tasks: Sequence[Any], workers: Optional[int], runs: int) -> Tuple[List[Any], bool]:
+    """Map ``func`` over ``tasks`` in a process pool (or here for small jobs).
+
+    ``runs`` is the number of planner runs the tasks add up to.  Returns the
+    results in task order and whether the pool was used.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and runs >= MIN_PARALLEL_RUNS and len(tasks) > 1:
+        # Spawned processes: forking a threaded Home Assistant is unsafe
+        with ProcessPoolExecutor(min(workers, len(tasks)), mp_context=get_context("spawn"),
+                                 initializer=_quiet_worker) as pool:
+            return list(pool.map(func, tasks)), True
+    with quiet_planning():
+        return [func(task) for task in tasks], False
+
+
+def _run_task(task: Tuple[Mapping[str, Any], str, Sequence[BacktestDay]]) -> Tuple[str, Dict[str, float]]:
+    config, strategy, days = task
+    return strategy, simulate_block(config, strategy, days)
+
+
+def run_backtest(
+    config: Mapping[str, Any],
+    days: Sequence[BacktestDay],
+    strategies: Optional[Sequence[str]] = None,
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Backtest ``strategies`` (all by default) over ``days``; returns the comparison.
+
+    ``workers`` limits the process pool (1 = run in this process).
+    """
+    started = time.monotonic()
+    strategies = [s for s in (strategies or ALL_STRATEGIES) if s in ALL_STRATEGIES]
+    config = dict(config)
+    blocks = [days[i:i + BLOCK_DAYS] for i in range(0, len(days), BLOCK_DAYS)]
+    tasks = [(config, strategy, block) for strategy in strategies for block in blocks]
+    results: Dict[str, Dict[str, float]] = {}
+    outputs, parallel = run_tasks(_run_task, tasks, workers, len(days) * len(strategies))
+    for strategy, totals in outputs:
+        merged = results.setdefault(strategy, dict.fromkeys(totals, 0.0))
+        for key, value in totals.items():
+            merged[key] += value
+
+    capacity = float(config.get(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY)) or 1.0
+    rows = []
+    for strategy in strategies:
+        totals = results.get(strategy)
+        if not totals:
+            continue
+        savings = totals["baseline_cost"] - totals["grid_cost"]
+        rows.append({
+            "strategy": strategy,
+            "days": int(totals["days"]),
+            "grid_cost": round(totals["grid_cost"], 2),
+            "baseline_cost": round(totals["baseline_cost"], 2),
+            "savings": round(savings, 2),
+            "savings_pct": round(100.0 * savings / totals["baseline_cost"], 1) if totals["baseline_cost"] else 0.0,
+            "grid_import_kwh": round(totals["grid_import_kwh"], 1),
+            "grid_charged_kwh": round(totals["grid_charged_kwh"], 1),
+            "cycles": round(totals["discharged_kwh"] / capacity, 1),
+        })
+    rows.sort(key=lambda row: row["grid_cost"])
+    for rank, row in enumerate(rows, start=1):
+        row["rank"] = rank
+    return {
+        "days": len(days),
+        "first_day": days[0].day.isoformat() if days else None,
+        "last_day": days[-1].day.isoformat() if days else None,
+        "strategies": rows,
+        "table": format_table(rows),
+        "parallel": parallel,
+        "elapsed_s": round(time.monotonic() - started, 2),
+    }
+
+
+def format_table(rows: Sequence[Mapping[str, Any]]) -> str:
+    """Render the comparison as a fixed-width text table."""
+    lines = [f"{'#':>2} {'strategy':<16} {'cost':>10} {'savings':>10} {'%':>6} {'grid chg kWh':>12} {'cycles':>7}"]
+    for row in rows:
+        lines.append(
+            f"{row['rank']:>2} {row['strategy']:<16} {row['grid_cost']:>10.2f} {row['savings']:>10.2f} "
+            f"{row['savings_pct']:>6.1f} {row['grid_charged_kwh']:>12.1f} {row['cycles']:>7.1f}"
+        )
+    return "\n".join(lines)
@@ -21,8 +21,27 @@ from .const import (
     CONF_TODAY_BATTERY_CHARGE_SENSOR,
     CONF_TODAY_BATTERY_DISCHARGE_SENSOR,
     CONF_NANOGREEN_CHEAPEST_SENSOR,
+    CONF_EXPORT_PRICE_SENSOR,
     CONF_ADDITIONAL_SWITCHES,
     CONF_SWITCH_PRICE_THRESHOLD,
+    CONF_DEFERRABLE_LOADS,
+    CONF_SITE_POWER_LIMIT,
+    CONF_CAPACITY_TARIFF,
+    CONF_CONNECTION_GROUP,
+    CONF_CONNECTION_LIMIT,
+    CONF_PLANNER_WORKER,
+    CONF_STOCHASTIC_PLANNING,
+    CONF_SHORTFALL_RISK,
+    CONF_OPTIMIZER_BUDGET,
+    CONF_MIN_ON_MINUTES,
+    CONF_MIN_OFF_MINUTES,
+    CONF_MAX_SWITCH_EVENTS,
+    CONF_BATTERY_WEAR_COST,
+    CONF_EXPORT_PRICE,
+    CONF_EXPORT_LIMIT,
+    CONF_CHARGE_POWER_ENTITY,
+    CONF_SETPOINT_DEADBAND,
+    CONF_SETPOINT_MIN_INTERVAL,
     CONF_BATTERY_CAPACITY,
     CONF_MAX_CHARGE_POWER,
     CONF_CHARGE_EFFICIENCY,
@@ -67,12 +86,33 @@ from .const import (
     DEFAULT_SWITCH_PRICE_THRESHOLD,
     DEFAULT_CHARGING_STRATEGY,
     DEFAULT_LANGUAGE,
+    DEFAULT_EXPORT_LIMIT,
+    DEFAULT_SETPOINT_DEADBAND,
+    DEFAULT_SETPOINT_MIN_INTERVAL,
+    DEFAULT_EXPORT_PRICE,
+    DEFAULT_BATTERY_WEAR_COST,
+    DEFAULT_MAX_SWITCH_EVENTS,
+    DEFAULT_MIN_OFF_MINUTES,
+    DEFAULT_MIN_ON_MINUTES,
+    DEFAULT_OPTIMIZER_BUDGET,
+    DEFAULT_SHORTFALL_RISK,
+    DEFAULT_STOCHASTIC_PLANNING,
+    DEFAULT_PLANNER_WORKER,
+    DEFAULT_CONNECTION_GROUP,
+    DEFAULT_CONNECTION_LIMIT,
+    DEFAULT_CAPACITY_TARIFF,
+    DEFAULT_SITE_POWER_LIMIT,
+    DEFAULT_DEFERRABLE_LOADS,
     DEFAULT_FULL_HOUR_CHARGING,
     LANGUAGE_CS,
     LANGUAGE_EN,
 )
 
 
+# Options form checkbox (not stored): apply the settings found by tune_parameters
+APPLY_TUNED_SETTINGS = "apply_tuned_settings"
+
+
 class GWSmartConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     """Config flow for GW Smart Charging."""
 
@@ -154,8 +194,13 @@ class GWSmartOptionsFlow(config_entries.OptionsFlow):
     async def async_step_init(self, user_input: dict[str, Any] | None = None):
         """Manage the options for reconfiguring sensors."""
         errors: dict[str, str] = {}
+        # Settings recommended by the last tune_parameters run of this entry
+        coordinator = self.hass.data.get(DOMAIN, {}).get(self.config_entry.entry_id)
+        suggestion = getattr(coordinator, "tuning_suggestion", None)
         
         if user_input is not None:
+            if user_input.pop(APPLY_TUNED_SETTINGS, False) and suggestion:
+                user_input.update(suggestion["parameters"])
             # Update the config entry with new values
             self.hass.config_entries.async_update_entry(
                 self.config_entry, data={**self.config_entry.data, **user_input}
@@ -211,6 +256,10 @@ class GWSmartOptionsFlow(config_entries.OptionsFlow):
                     CONF_NANOGREEN_CHEAPEST_SENSOR,
                     default=current_config.get(CONF_NANOGREEN_CHEAPEST_SENSOR, "")
                 ): str,
+                vol.Optional(
+                    CONF_EXPORT_PRICE_SENSOR,
+                    default=current_config.get(CONF_EXPORT_PRICE_SENSOR, "")
+                ): str,
                 vol.Optional(
                     CONF_ADDITIONAL_SWITCHES,
                     default=current_config.get(CONF_ADDITIONAL_SWITCHES, "")
@@ -219,6 +268,78 @@ class GWSmartOptionsFlow(config_entries.OptionsFlow):
                     CONF_SWITCH_PRICE_THRESHOLD,
                     default=current_config.get(CONF_SWITCH_PRICE_THRESHOLD, DEFAULT_SWITCH_PRICE_THRESHOLD)
                 ): vol.Coerce(float),
+                vol.Optional(
+                    CONF_DEFERRABLE_LOADS,
+                    default=current_config.get(CONF_DEFERRABLE_LOADS, DEFAULT_DEFERRABLE_LOADS)
+                ): str,
+                vol.Optional(
+                    CONF_SITE_POWER_LIMIT,
+                    default=current_config.get(CONF_SITE_POWER_LIMIT, DEFAULT_SITE_POWER_LIMIT)
+                ): vol.Coerce(float),
+                vol.Optional(
+                    CONF_CAPACITY_TARIFF,
+                    default=current_config.get(CONF_CAPACITY_TARIFF, DEFAULT_CAPACITY_TARIFF)
+                ): vol.Coerce(float),
+                vol.Optional(
+                    CONF_CONNECTION_GROUP,
+                    default=current_config.get(CONF_CONNECTION_GROUP, DEFAULT_CONNECTION_GROUP)
+                ): str,
+                vol.Optional(
+                    CONF_CONNECTION_LIMIT,
+                    default=current_config.get(CONF_CONNECTION_LIMIT, DEFAULT_CONNECTION_LIMIT)
+                ): vol.Coerce(float),
+                vol.Optional(
+                    CONF_PLANNER_WORKER,
+                    default=current_config.get(CONF_PLANNER_WORKER, DEFAULT_PLANNER_WORKER)
+                ): str,
+                vol.Optional(
+                    CONF_STOCHASTIC_PLANNING,
+                    default=current_config.get(CONF_STOCHASTIC_PLANNING, DEFAULT_STOCHASTIC_PLANNING)
+                ): bool,
+                vol.Optional(
+                    CONF_SHORTFALL_RISK,
+                    default=current_config.get(CONF_SHORTFALL_RISK, DEFAULT_SHORTFALL_RISK)
+                ): vol.Coerce(float),
+                vol.Optional(
+                    CONF_OPTIMIZER_BUDGET,
+                    default=current_config.get(CONF_OPTIMIZER_BUDGET, DEFAULT_OPTIMIZER_BUDGET)
+                ): vol.Coerce(float),
+                vol.Optional(
+                    CONF_MIN_ON_MINUTES,
+                    default=current_config.get(CONF_MIN_ON_MINUTES, DEFAULT_MIN_ON_MINUTES)
+                ): vol.Coerce(int),
+                vol.Optional(
+                    CONF_MIN_OFF_MINUTES,
+                    default=current_config.get(CONF_MIN_OFF_MINUTES, DEFAULT_MIN_OFF_MINUTES)
+                ): vol.Coerce(int),
+                vol.Optional(
+                    CONF_MAX_SWITCH_EVENTS,
+                    default=current_config.get(CONF_MAX_SWITCH_EVENTS, DEFAULT_MAX_SWITCH_EVENTS)
+                ): vol.Coerce(int),
+                vol.Optional(
+                    CONF_BATTERY_WEAR_COST,
+                    default=current_config.get(CONF_BATTERY_WEAR_COST, DEFAULT_BATTERY_WEAR_COST)
+                ): vol.Coerce(float),
+                vol.Optional(
+                    CONF_EXPORT_PRICE,
+                    default=current_config.get(CONF_EXPORT_PRICE, DEFAULT_EXPORT_PRICE)
+                ): vol.Coerce(float),
+                vol.Optional(
+                    CONF_EXPORT_LIMIT,
+                    default=current_config.get(CONF_EXPORT_LIMIT, DEFAULT_EXPORT_LIMIT)
+                ): vol.Coerce(float),
+                vol.Optional(
+                    CONF_CHARGE_POWER_ENTITY,
+                    default=current_config.get(CONF_CHARGE_POWER_ENTITY, "")
+                ): str,
+                vol.Optional(
+                    CONF_SETPOINT_DEADBAND,
+                    default=current_config.get(CONF_SETPOINT_DEADBAND, DEFAULT_SETPOINT_DEADBAND)
+                ): vol.Coerce(float),
+                vol.Optional(
+                    CONF_SETPOINT_MIN_INTERVAL,
+                    default=current_config.get(CONF_SETPOINT_MIN_INTERVAL, DEFAULT_SETPOINT_MIN_INTERVAL)
+                ): vol.Coerce(int),
                 vol.Optional(
                     CONF_CHARGING_ON_SCRIPT, 
                     default=current_config.get(CONF_CHARGING_ON_SCRIPT, "script.nabijeni_on")
@@ -319,12 +440,22 @@ class GWSmartOptionsFlow(config_entries.OptionsFlow):
                 ): bool,
             }
         )
+        tuning = ""
+        if suggestion:
+            data_schema = data_schema.extend({vol.Optional(APPLY_TUNED_SETTINGS, default=False): bool})
+            tuning = "\n\n🎯 Tuned settings ({days} days: {current:.2f} → {cost:.2f} CZK): {values}".format(
+                days=suggestion["days"],
+                current=suggestion["current_grid_cost"],
+                cost=suggestion["grid_cost"],
+                values=", ".join(f"{key} = {value:g}" for key, value in suggestion["parameters"].items()),
+            )
 
         return self.async_show_form(
             step_id="init", 
             data_schema=data_schema, 
             errors=errors,
             description_placeholders={
-                "info": "Reconfigure sensors and parameters. Hysteresis: ±% buffer around price thresholds. Critical hours: maintain higher SOC during specified hours (e.g., 17-21 for evening peak). ML prediction: learn from historical consumption patterns."
+                "info": "Reconfigure sensors and parameters. Hysteresis: ±% buffer around price thresholds. Critical hours: maintain higher SOC during specified hours (e.g., 17-21 for evening peak). ML prediction: learn from historical consumption patterns.",
+                "tuning": tuning,
             }
         )
@@ -5,6 +5,16 @@ PLATFORMS = ["sensor", "switch"]
 
 DEFAULT_NAME = "GW Smart Charging"
 
+# Integration-wide state in hass.data (hass.data[DOMAIN] maps entry_id -> coordinator)
+DATA_FLEET = f"{DOMAIN}_fleet"
+DATA_FRONTEND = f"{DOMAIN}_frontend_registered"
+DATA_INGEST = f"{DOMAIN}_ingest"
+DATA_WORKER = f"{DOMAIN}_worker"
+DATA_TUNING = f"{DOMAIN}_tuning"
+
+# Persistent storage (homeassistant.helpers.storage)
+STORAGE_VERSION = 1
+
 # Sensor configuration
 CONF_FORECAST_SENSOR = "forecast_sensor"
 CONF_PRICE_SENSOR = "price_sensor"
@@ -19,8 +29,27 @@ CONF_GRID_IMPORT_SENSOR = "grid_import_sensor"
 CONF_TODAY_BATTERY_CHARGE_SENSOR = "today_battery_charge_sensor"
 CONF_TODAY_BATTERY_DISCHARGE_SENSOR = "today_battery_discharge_sensor"
 CONF_NANOGREEN_CHEAPEST_SENSOR = "nanogreen_cheapest_sensor"
+CONF_EXPORT_PRICE_SENSOR = "export_price_sensor"
 CONF_ADDITIONAL_SWITCHES = "additional_switches"
 CONF_SWITCH_PRICE_THRESHOLD = "switch_price_threshold"
+CONF_DEFERRABLE_LOADS = "deferrable_loads"
+CONF_SITE_POWER_LIMIT = "site_power_limit_kw"
+CONF_CAPACITY_TARIFF = "capacity_tariff_czk_kw"
+CONF_CONNECTION_GROUP = "connection_group"
+CONF_CONNECTION_LIMIT = "connection_limit_kw"
+CONF_PLANNER_WORKER = "planner_worker"
+CONF_STOCHASTIC_PLANNING = "stochastic_planning"
+CONF_SHORTFALL_RISK = "shortfall_risk_pct"
+CONF_OPTIMIZER_BUDGET = "optimizer_budget_s"
+CONF_MIN_ON_MINUTES = "min_charge_on_minutes"
+CONF_MIN_OFF_MINUTES = "min_charge_off_minutes"
+CONF_MAX_SWITCH_EVENTS = "max_switch_events"
+CONF_BATTERY_WEAR_COST = "battery_wear_cost_czk_kwh"
+CONF_EXPORT_PRICE = "export_price_czk_kwh"
+CONF_EXPORT_LIMIT = "export_limit_kw"
+CONF_CHARGE_POWER_ENTITY = "charge_power_entity"
+CONF_SETPOINT_DEADBAND = "setpoint_deadband_kw"
+CONF_SETPOINT_MIN_INTERVAL = "setpoint_min_interval_s"
 
 # Battery configuration
 CONF_BATTERY_CAPACITY = "battery_capacity_kwh"
@@ -84,6 +113,23 @@ DEFAULT_SWITCH_PRICE_THRESHOLD = 2.0  # CZK/kWh - threshold for turning on addit
 DEFAULT_CHARGING_STRATEGY = STRATEGY_DYNAMIC  # Default to dynamic optimization
 DEFAULT_LANGUAGE = "cs"  # Default to Czech
 DEFAULT_FULL_HOUR_CHARGING = True  # Default to full hour charging cycles
+DEFAULT_DEFERRABLE_LOADS = ""
+DEFAULT_SITE_POWER_LIMIT = 0.0  # kW, 0 = no limit
+DEFAULT_CAPACITY_TARIFF = 0.0  # CZK/kW of monthly peak, 0 = not billed
+DEFAULT_CONNECTION_GROUP = ""
+DEFAULT_CONNECTION_LIMIT = 0.0  # kW for the whole connection group, 0 = no limit
+DEFAULT_PLANNER_WORKER = ""  # "" = plan in-process, "local" or "host:port"
+DEFAULT_STOCHASTIC_PLANNING = False
+DEFAULT_SHORTFALL_RISK = 10.0  # % of scenarios allowed below the critical-hours SOC
+DEFAULT_OPTIMIZER_BUDGET = 0.0  # seconds of local search per plan, 0 = off
+DEFAULT_MIN_ON_MINUTES = 0
+DEFAULT_MIN_OFF_MINUTES = 0
+DEFAULT_MAX_SWITCH_EVENTS = 0  # starts plus stops for the rest of the day, 0 = unlimited
+DEFAULT_BATTERY_WEAR_COST = 0.0  # wear cost per kWh of battery throughput, 0 = off
+DEFAULT_EXPORT_PRICE = 0.0  # feed-in price when no export price sensor is set
+DEFAULT_EXPORT_LIMIT = 0.0  # 0 = export is not planned
+DEFAULT_SETPOINT_DEADBAND = 0.2  # kW
+DEFAULT_SETPOINT_MIN_INTERVAL = 60  # seconds between setpoint changes
 
 # Language options
 LANGUAGE_CS = "cs"
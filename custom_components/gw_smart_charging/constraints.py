@@ -0,0 +1,282 @@
+"""Switching constraints on grid-charging runs.
+
+Every start or stop of grid charging is a script call and a relay toggle on
+the inverter.  These constraints describe which on/off patterns a plan may
+have; the anytime optimizer (``optimizer.py``) only searches among them:
+
+* minimum on duration: a charging run lasts at least this long,
+* minimum off duration: a pause between two runs lasts at least this long,
+* full-hour alignment: runs start and stop on the hour,
+* maximum number of switch events (starts plus stops) for the rest of the day.
+
+A run that is already going at the current slot may stop before its minimum
+duration, and a run may end with the day.  Patterns are lists of booleans
+per 15-minute slot (True = grid charging).
+
+``repair`` turns any pattern into a feasible one without the optimizer, so
+the planner's own plan meets the constraints too: runs are widened to whole
+hours, short runs are extended and pauses shorter than the minimum off
+duration are closed (except across slots that cannot charge), as are the
+shortest pauses while there are too many switch events; what still breaks a
+rule is trimmed to whole hours or dropped, the runs with the fewest slots
+last.
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Any, List, Mapping, Sequence, Tuple
+
+from .const import (
+    CONF_FULL_HOUR_CHARGING,
+    CONF_MAX_SWITCH_EVENTS,
+    CONF_MIN_OFF_MINUTES,
+    CONF_MIN_ON_MINUTES,
+    DEFAULT_FULL_HOUR_CHARGING,
+    DEFAULT_MAX_SWITCH_EVENTS,
+    DEFAULT_MIN_OFF_MINUTES,
+    DEFAULT_MIN_ON_MINUTES,
+)
+
+SLOTS_PER_DAY = 96
+SLOT_MINUTES = 15
+SLOTS_PER_HOUR = 4
+
+
+def _slots(minutes: Any) -> int:
+    try:
+        return max(0, math.ceil(float(minutes or 0) / SLOT_MINUTES))
+    except (TypeError, ValueError):
+        return 0
+
+
+@dataclass(frozen=True)
+class SwitchingConstraints:
+    """Limits on grid-charging runs, in slots."""
+
+    min_on_slots: int = 0
+    min_off_slots: int = 0
+    full_hour: bool = False
+    max_switch_events: int = 0  # 0 = unlimited
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "SwitchingConstraints":
+        try:
+            max_events = max(0, int(config.get(CONF_MAX_SWITCH_EVENTS, DEFAULT_MAX_SWITCH_EVENTS) or 0))
+        except (TypeError, ValueError):
+            max_events = 0
+        return cls(
+            min_on_slots=_slots(config.get(CONF_MIN_ON_MINUTES, DEFAULT_MIN_ON_MINUTES)),
+            min_off_slots=_slots(config.get(CONF_MIN_OFF_MINUTES, DEFAULT_MIN_OFF_MINUTES)),
+            full_hour=bool(config.get(CONF_FULL_HOUR_CHARGING, DEFAULT_FULL_HOUR_CHARGING)),
+            max_switch_events=max_events,
+        )
+
+    @property
+    def active(self) -> bool:
+        return self.limits_switching or self.full_hour
+
+    @property
+    def limits_switching(self) -> bool:
+        """Return True when a run length, pause or switch event limit is set."""
+        return self.min_on_slots > 1 or self.min_off_slots > 1 or self.max_switch_events > 0
+
+    @property
+    def unit(self) -> int:
+        """Slots per decision unit: a whole hour with full-hour alignment."""
+        return SLOTS_PER_HOUR if self.full_hour else 1
+
+    def feasible(self, on: Sequence[bool], start: int, initially_on: bool = False) -> bool:
+        """Return True when the pattern from ``start`` on meets every constraint."""
+        end = min(len(on), SLOTS_PER_DAY)
+        runs = charge_runs(on, start)
+        if self.max_switch_events and switch_events(on, start, initially_on) > self.max_switch_events:
+            return False
+        previous_end = None
+        for begin, stop in runs:
+            ongoing = begin == start and initially_on
+            if not ongoing and stop < end and stop - begin < self.min_on_slots:
+                return False
+            if self.full_hour and ((begin != start and begin % SLOTS_PER_HOUR)
+                                   or (stop != end and stop % SLOTS_PER_HOUR)):
+                return False
+            if previous_end is not None and begin - previous_end < self.min_off_slots:
+                return False
+            previous_end = stop
+        return True
+
+    def as_dict(self) -> dict:
+        return {
+            "min_on_minutes": self.min_on_slots * SLOT_MINUTES,
+            "min_off_minutes": self.min_off_slots * SLOT_MINUTES,
+            "full_hour": self.full_hour,
+            "max_switch_events": self.max_switch_events,
+        }
+
+
+def repair(
+    constraints: SwitchingConstraints,
+    on: Sequence[bool],
+    start: int,
+    initially_on: bool = False,
+    widen: bool = True,
+    blocked: Sequence[bool] = (),
+) -> List[bool]:
+    """Return ``on`` changed as little as the rules above need to make it feasible.
+
+    With ``widen`` runs are first extended and merged, but never into a
+    ``blocked`` slot; whatever still breaks a rule is then trimmed and
+    dropped.  Without ``widen`` the result charges in a subset of the slots.
+    """
+    end = min(len(on), SLOTS_PER_DAY)
+    runs = charge_runs(on, start)
+    if widen:
+        runs = _widen(constraints, runs, start, end, initially_on, blocked)
+        if constraints.max_switch_events:
+            runs = _merge(constraints, runs, start, len(on), initially_on, blocked)
+    runs = _trim(constraints, runs, start, end, initially_on)
+    if constraints.max_switch_events:
+        pattern = _pattern(runs, len(on))
+        while runs and switch_events(pattern, start, initially_on) > constraints.max_switch_events:
+            # Dropping a run never breaks the other rules; keep an ongoing run
+            droppable = [run for run in runs if not (run[0] == start and initially_on)] or runs
+            runs.remove(min(droppable, key=lambda run: (run[1] - run[0], -run[0])))
+            pattern = _pattern(runs, len(on))
+    return _pattern(runs, len(on))
+
+
+def _widen(
+    constraints: SwitchingConstraints,
+    runs: List[Tuple[int, int]],
+    start: int,
+    end: int,
+    initially_on: bool,
+    blocked: Sequence[bool],
+) -> List[Tuple[int, int]]:
+    """Extend runs to whole hours and their minimum length, and close short pauses."""
+
+    def free(begin: int, stop: int) -> bool:
+        return not any(blocked[begin:stop])
+
+    def hour_stop(stop: int) -> int:
+        return min(end, -(-stop // SLOTS_PER_HOUR) * SLOTS_PER_HOUR) if constraints.full_hour else stop
+
+    changed = True
+    while changed:
+        widened: List[Tuple[int, int]] = []
+        for begin, stop in runs:
+            ongoing = begin == start and initially_on
+            if constraints.full_hour and begin != start:
+                aligned = max(start, begin - begin % SLOTS_PER_HOUR)
+                begin = aligned if free(aligned, begin) else begin
+            stop = hour_stop(stop) if free(stop, hour_stop(stop)) else stop
+            if not ongoing and stop < end and stop - begin < constraints.min_on_slots:
+                # Forward first, then backward where a blocked slot is in the way
+                longer = hour_stop(min(end, begin + constraints.min_on_slots))
+                if free(stop, longer):
+                    stop = longer
+                else:
+                    earlier = max(start, stop - constraints.min_on_slots)
+                    if constraints.full_hour and earlier != start:
+                        earlier -= earlier % SLOTS_PER_HOUR
+                    begin = max(start, earlier) if free(max(start, earlier), begin) else begin
+            if widened and begin - widened[-1][1] < max(1, constraints.min_off_slots) \
+                    and free(widened[-1][1], begin):
+                # Overlapping, touching or too short a pause: one run
+                previous_begin, previous_stop = widened.pop()
+                begin, stop = min(begin, previous_begin), max(stop, previous_stop)
+            widened.append((begin, stop))
+        changed = widened != runs
+        runs = widened
+    return runs
+
+
+def _merge(
+    constraints: SwitchingConstraints,
+    runs: List[Tuple[int, int]],
+    start: int,
+    length: int,
+    initially_on: bool,
+    blocked: Sequence[bool],
+) -> List[Tuple[int, int]]:
+    """Close the shortest pauses (or join the ongoing run) while there are too many switch events."""
+    runs = list(runs)
+    while switch_events(_pattern(runs, length), start, initially_on) > constraints.max_switch_events:
+        pauses = [(runs[i + 1][0] - runs[i][1], i) for i in range(len(runs) - 1)
+                  if not any(blocked[runs[i][1]:runs[i + 1][0]])]
+        if initially_on and runs and runs[0][0] > start and not any(blocked[start:runs[0][0]]):
+            pauses.append((runs[0][0] - start, -1))
+        if not pauses:
+            break
+        _gap, index = min(pauses)
+        if index < 0:
+            runs[0] = (start, runs[0][1])
+        else:
+            runs[index:index + 2] = [(runs[index][0], runs[index + 1][1])]
+    return runs
+
+
+def _trim(
+    constraints: SwitchingConstraints,
+    runs: List[Tuple[int, int]],
+    start: int,
+    end: int,
+    initially_on: bool,
+) -> List[Tuple[int, int]]:
+    """Trim runs to whole hours and drop runs too short or too close to a longer one."""
+    changed = True
+    while changed:
+        kept: List[Tuple[int, int]] = []
+        for begin, stop in runs:
+            ongoing = begin == start and initially_on
+            if constraints.full_hour:
+                if begin != start:
+                    begin = -(-begin // SLOTS_PER_HOUR) * SLOTS_PER_HOUR
+                if stop != end:
+                    stop -= stop % SLOTS_PER_HOUR
+            if stop <= begin or (not ongoing and stop < end and stop - begin < constraints.min_on_slots):
+                continue
+            if kept and begin - kept[-1][1] < constraints.min_off_slots:
+                # Too short a pause: keep the longer run (and an ongoing one)
+                previous = kept[-1]
+                if (previous[0] == start and initially_on) or previous[1] - previous[0] >= stop - begin:
+                    continue
+                kept.pop()
+            kept.append((begin, stop))
+        changed = kept != runs
+        runs = kept
+    return runs
+
+
+def _pattern(runs: Sequence[Tuple[int, int]], length: int) -> List[bool]:
+    pattern = [False] * length
+    for begin, stop in runs:
+        pattern[begin:stop] = [True] * (stop - begin)
+    return pattern
+
+
+def charge_runs(on: Sequence[bool], start: int) -> List[Tuple[int, int]]:
+    """Return the ``(begin, end)`` slot ranges (end exclusive) of the on-runs from ``start``."""
+    runs: List[Tuple[int, int]] = []
+    begin = None
+    end = min(len(on), SLOTS_PER_DAY)
+    for slot in range(start, end):
+        if on[slot] and begin is None:
+            begin = slot
+        elif not on[slot] and begin is not None:
+            runs.append((begin, slot))
+            begin = None
+    if begin is not None:
+        runs.append((begin, end))
+    return runs
+
+
+def switch_events(on: Sequence[bool], start: int, initially_on: bool = False) -> int:
+    """Count starts and stops from ``start`` on (the end of the day is not a stop)."""
+    events = 0
+    previous = initially_on
+    for slot in range(start, min(len(on), SLOTS_PER_DAY)):
+        if bool(on[slot]) != previous:
+            events += 1
+            previous = bool(on[slot])
+    return events
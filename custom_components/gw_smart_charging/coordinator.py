@@ -17,20 +17,27 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
 from datetime import timedelta, datetime, date, time as dt_time, timezone
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.helpers.event import async_track_state_change_event
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
 from .const import (
     DOMAIN,
+    DATA_INGEST,
+    DATA_WORKER,
     CONF_FORECAST_SENSOR,
     CONF_PRICE_SENSOR,
     CONF_LOAD_SENSOR,
     CONF_DAILY_LOAD_SENSOR,
+    CONF_PV_POWER_SENSOR,
     CONF_SOC_SENSOR,
     CONF_BATTERY_POWER_SENSOR,
     CONF_GRID_IMPORT_SENSOR,
@@ -38,21 +45,40 @@ from .const import (
     CONF_CHARGING_OFF_SCRIPT,
     CONF_ENABLE_AUTOMATION,
     CONF_NANOGREEN_CHEAPEST_SENSOR,
+    CONF_EXPORT_PRICE_SENSOR,
+    CONF_EXPORT_PRICE,
+    CONF_EXPORT_LIMIT,
+    CONF_CHARGE_POWER_ENTITY,
+    CONF_SETPOINT_DEADBAND,
+    CONF_SETPOINT_MIN_INTERVAL,
     CONF_ADDITIONAL_SWITCHES,
     CONF_SWITCH_PRICE_THRESHOLD,
+    CONF_DEFERRABLE_LOADS,
+    CONF_SITE_POWER_LIMIT,
+    CONF_CAPACITY_TARIFF,
+    CONF_CONNECTION_GROUP,
+    CONF_CONNECTION_LIMIT,
+    CONF_BATTERY_WEAR_COST,
+    CONF_MAX_SWITCH_EVENTS,
+    CONF_MIN_OFF_MINUTES,
+    CONF_MIN_ON_MINUTES,
+    CONF_OPTIMIZER_BUDGET,
+    CONF_PLANNER_WORKER,
+    CONF_SHORTFALL_RISK,
+    CONF_STOCHASTIC_PLANNING,
+    DEFAULT_OPTIMIZER_BUDGET,
+    DEFAULT_EXPORT_LIMIT,
+    DEFAULT_SETPOINT_DEADBAND,
+    DEFAULT_SETPOINT_MIN_INTERVAL,
+    DEFAULT_PLANNER_WORKER,
+    DEFAULT_SHORTFALL_RISK,
+    DEFAULT_STOCHASTIC_PLANNING,
     CONF_TEST_MODE,
     CONF_CHARGING_STRATEGY,
-    CONF_LANGUAGE,
     CONF_FULL_HOUR_CHARGING,
-    STRATEGY_DYNAMIC,
-    STRATEGY_4_LOWEST,
-    STRATEGY_6_LOWEST,
-    STRATEGY_NANOGREEN_ONLY,
-    STRATEGY_PRICE_THRESHOLD,
-    STRATEGY_ADAPTIVE_SMART,
-    STRATEGY_SOLAR_PRIORITY,
-    STRATEGY_PEAK_SHAVING,
-    STRATEGY_TOU_OPTIMIZED,
+    CONF_SWITCH_ON_MEANS_CHARGE,
+    CONF_TODAY_BATTERY_CHARGE_SENSOR,
+    CONF_TODAY_BATTERY_DISCHARGE_SENSOR,
     CONF_BATTERY_CAPACITY,
     CONF_MAX_CHARGE_POWER,
     CONF_CHARGE_EFFICIENCY,
@@ -67,24 +93,58 @@ from .const import (
     CONF_CRITICAL_HOURS_SOC,
     CONF_ENABLE_ML_PREDICTION,
     DEFAULT_BATTERY_CAPACITY,
-    DEFAULT_MAX_CHARGE_POWER,
     DEFAULT_CHARGE_EFFICIENCY,
-    DEFAULT_MIN_SOC,
-    DEFAULT_MAX_SOC,
-    DEFAULT_TARGET_SOC,
-    DEFAULT_ALWAYS_CHARGE_PRICE,
-    DEFAULT_NEVER_CHARGE_PRICE,
-    DEFAULT_PRICE_HYSTERESIS,
-    DEFAULT_CHARGING_STRATEGY,
-    DEFAULT_CRITICAL_HOURS_START,
-    DEFAULT_CRITICAL_HOURS_END,
-    DEFAULT_CRITICAL_HOURS_SOC,
+    DEFAULT_MAX_CHARGE_POWER,
     DEFAULT_ENABLE_ML_PREDICTION,
     DEFAULT_SWITCH_PRICE_THRESHOLD,
 )
+from .forecast_correction import PVBiasCorrector
+from .forecast_fusion import ForecastFusion, FusionInput, parse_forecast_sources
+from .ingest import (
+    KIND_ENERGY, KIND_PERCENT, KIND_POWER, KIND_PRICE, TIMESTAMPED_SHAPES, SharedTimelineCache, TimelineIngestor,
+    read_scalar,
+)
+from .actuation import ActuationQueue, ActuationVerifier, SetpointController
+from .deferrable import DeferrableLoad, parse_deferrable_loads
+from .degradation import WearModel, schedule_wear
+from .engine import ChargingPlanner
+from .peak import PeakTracker
+from .optimizer import grid_charge_profile
+from .snapshot import STORE_PV_BIAS, PlanSnapshotStore, entry_store, snapshot_is_fresh
+from .soc_estimator import SocEstimator
+from .stochastic import available as stochastic_available, uncertainty_settings
+from .tuning import TUNED_PARAMETERS
+from .whatif import PlanInputs, run_scenarios
+from .worker import PlannerWorkerClient, WorkerRegistry, WorkerUnavailable
 
 _LOGGER = logging.getLogger(__name__)
 
+# Time budget (seconds) per refresh stage; the plan stage is enforced, the
+# in-loop stages are measured and reported
+STAGE_BUDGETS = {"parse": 5.0, "predict": 5.0, "plan": 20.0, "actuate": 10.0}
+
+# Options the running coordinator applies without a config-entry reload.
+# Any other changed key (entry name, keys from a newer config flow) reloads,
+# as does the language: entity names are localized when entities are created.
+LIVE_OPTIONS = frozenset({
+    CONF_FORECAST_SENSOR, CONF_PRICE_SENSOR, CONF_LOAD_SENSOR, CONF_DAILY_LOAD_SENSOR,
+    CONF_PV_POWER_SENSOR, CONF_SOC_SENSOR, CONF_BATTERY_POWER_SENSOR, CONF_GRID_IMPORT_SENSOR,
+    CONF_TODAY_BATTERY_CHARGE_SENSOR, CONF_TODAY_BATTERY_DISCHARGE_SENSOR,
+    CONF_NANOGREEN_CHEAPEST_SENSOR, CONF_ADDITIONAL_SWITCHES, CONF_SWITCH_PRICE_THRESHOLD,
+    CONF_DEFERRABLE_LOADS, CONF_SITE_POWER_LIMIT, CONF_CAPACITY_TARIFF,
+    CONF_CONNECTION_GROUP, CONF_CONNECTION_LIMIT, CONF_PLANNER_WORKER,
+    CONF_STOCHASTIC_PLANNING, CONF_SHORTFALL_RISK, CONF_OPTIMIZER_BUDGET,
+    CONF_MIN_ON_MINUTES, CONF_MIN_OFF_MINUTES, CONF_MAX_SWITCH_EVENTS, CONF_BATTERY_WEAR_COST,
+    CONF_EXPORT_PRICE_SENSOR, CONF_EXPORT_PRICE, CONF_EXPORT_LIMIT,
+    CONF_CHARGE_POWER_ENTITY, CONF_SETPOINT_DEADBAND, CONF_SETPOINT_MIN_INTERVAL,
+    CONF_CHARGING_ON_SCRIPT, CONF_CHARGING_OFF_SCRIPT, CONF_ENABLE_AUTOMATION,
+    CONF_SWITCH_ON_MEANS_CHARGE, CONF_TEST_MODE, CONF_CHARGING_STRATEGY,
+    CONF_FULL_HOUR_CHARGING, CONF_BATTERY_CAPACITY, CONF_MAX_CHARGE_POWER, CONF_CHARGE_EFFICIENCY,
+    CONF_MIN_SOC, CONF_MAX_SOC, CONF_TARGET_SOC, CONF_ALWAYS_CHARGE_PRICE, CONF_NEVER_CHARGE_PRICE,
+    CONF_PRICE_HYSTERESIS, CONF_CRITICAL_HOURS_START, CONF_CRITICAL_HOURS_END,
+    CONF_CRITICAL_HOURS_SOC, CONF_ENABLE_ML_PREDICTION,
+})
+
 
 class GWSmartCoordinator(DataUpdateCoordinator):
     """Coordinator that reads forecast, price and load sensors and produces a charging schedule."""
@@ -97,7 +157,7 @@ class GWSmartCoordinator(DataUpdateCoordinator):
             update_interval=timedelta(minutes=2),  # Update every 2 minutes for responsive automation
         )
         self.entry = entry
-        self.config: dict[str, Any] = entry.data or {}
+        self.config: dict[str, Any] = dict(entry.data or {})
         # cache to accumulate cumulative daily deltas while running
         self._last_daily_cumulative: Optional[float] = None
         self._last_daily_date: Optional[date] = None
@@ -109,95 +169,490 @@ class GWSmartCoordinator(DataUpdateCoordinator):
         self._last_charging_state: bool = False  # For hysteresis tracking
         self._last_script_state: Optional[bool] = None  # Track last script execution state
         self._additional_switches_state: Dict[str, bool] = {}  # Track additional switches state
+        self._additional_switches_raw: Optional[str] = None
+        self._additional_switches: List[str] = []
+        # Deferrable loads: parsed option, energy delivered today, last plan
+        self._deferrable_raw: Optional[str] = None
+        self._deferrable_loads: List[DeferrableLoad] = []
+        self._deferrable_day: Optional[date] = None
+        self._deferrable_delivered: Dict[str, float] = {}
+        self._deferrable_sampled_at: Optional[datetime] = None
+        self._deferrable_plan: Dict[str, Dict[str, Any]] = {}
+        # Monthly grid import peak (capacity tariff) and the planned site import
+        self._grid_peak = PeakTracker()
+        self._site_import: Dict[str, Any] = {}
+        # Planned battery throughput and its wear cost
+        self._battery_wear: Dict[str, Any] = {}
+        # SOC estimate from SOC readings and integrated battery power (plan start state)
+        self._soc_estimator = SocEstimator()
+        self._configure_soc_estimator()
+        self._battery_unsub: Optional[Callable[[], None]] = None
+        # Share of a grid connection shared with other entries (set in fleet mode)
+        self._fleet_allocation: Optional[Dict[str, Any]] = None
+        # Script and switch service calls run off the planning path
+        self.actuator = ActuationQueue(hass)
+        # Confirms script effects on battery power / grid import, measures latency
+        self.verifier = ActuationVerifier(hass)
+        # Planned grid charge power sent as a setpoint (charge_power_entity option)
+        self.setpoint = SetpointController(hass, self.actuator)
+        self._configure_setpoint()
+        # Unified sensor ingestion - each state is parsed once per change, and
+        # once for all entries that read the same sensor (shared, ref-counted)
+        if DATA_INGEST not in hass.data:
+            hass.data[DATA_INGEST] = SharedTimelineCache()
+        self._ingest = TimelineIngestor(hass.data[DATA_INGEST], entry.entry_id)
+        # PV forecast bias correction learned from pv_power_sensor (persisted)
+        self._pv_bias = PVBiasCorrector()
+        self._forecast_fusion = ForecastFusion()
+        self._forecast_sources_raw: Any = None
+        self._forecast_sources: List[Tuple[str, str]] = []
+        self._pv_bias_store = entry_store(hass, entry.entry_id, STORE_PV_BIAS)
+        # Single-flight refresh and last good plan for stage failures
+        self._update_task: Optional[asyncio.Task] = None
+        self._last_good_data: Optional[Dict[str, Any]] = None
+        self._refresh_stats: Dict[str, Any] = {"joined": 0, "fallbacks": 0, "overruns": {}}
+        # Nanogreen cheapest-hour listener
+        self._nanogreen_unsub: Optional[Callable[[], None]] = None
+        self._nanogreen_replaced: Tuple[int, Dict[str, Any]] = (-1, {})
+        self._nanogreen_stats: Dict[str, Any] = {"reactions": 0, "last_latency_ms": None, "max_latency_ms": 0.0}
+        # Last plan + actuation state, restored on startup (warm start)
+        self._snapshot = PlanSnapshotStore(hass, entry.entry_id)
+        # Set by the FleetPlanner when the entry is registered (multi-entry batching)
+        self.fleet: Optional[Any] = None
+        # Out-of-process planner (planner_worker option), shared by entries using the same address
+        self._worker: Optional[PlannerWorkerClient] = None
+        self._worker_address = ""
+        self._acquire_worker()
+        # Settings recommended by the tune_parameters service, offered in the options flow
+        self.tuning_suggestion: Optional[Dict[str, Any]] = None
+        # Inputs of the last planning run, re-planned by what-if requests
+        self._plan_inputs: Optional[PlanInputs] = None
+        # Diagnostics of the last anytime optimizer run (optimizer_budget_s option)
+        self._optimization: Optional[Dict[str, Any]] = None
+        # Summary of the last stochastic plan selection (stochastic_planning option)
+        self._stochastic: Optional[Dict[str, Any]] = None
+        self._stochastic_warned = False
+
+    async def async_load_forecast_models(self) -> None:
+        """Restore learned PV bias factors and forecast provider accuracy from storage."""
+        try:
+            data = await self._pv_bias_store.async_load() or {}
+            self._pv_bias.load_dict(data.get("bias"))
+            self._forecast_fusion.load_dict(data.get("fusion"))
+        except Exception as e:
+            _LOGGER.warning("Failed to load PV forecast models: %s", e)
+
+    def _forecast_models_data(self) -> Dict[str, Any]:
+        """Return the persisted state of the PV forecast models."""
+        return {"bias": self._pv_bias.as_dict(), "fusion": self._forecast_fusion.as_dict()}
+
+    def changed_options(self, new_config: Mapping[str, Any]) -> Set[str]:
+        """Return the option keys whose value differs from the running config."""
+        return {
+            key for key in set(self.config) | set(new_config)
+            if self.config.get(key) != new_config.get(key)
+        }
+
+    def apply_config(self, new_config: Mapping[str, Any]) -> Set[str]:
+        """Apply changed options in place and invalidate only the dependent caches.
+
+        Thresholds, strategy and SOC targets are read on every cycle and need
+        nothing beyond the new config.  Returns the changed keys; the caller
+        must reload the entry instead when any of them is not in LIVE_OPTIONS.
+        """
+        changed = self.changed_options(new_config)
+        if not changed:
+            return changed
+        old_config, self.config = self.config, dict(new_config)
+
+        # Parsed timelines of entities that are no longer read
+        for key in changed & {CONF_PRICE_SENSOR, CONF_EXPORT_PRICE_SENSOR, CONF_LOAD_SENSOR, CONF_DAILY_LOAD_SENSOR}:
+            if old_config.get(key):
+                self._ingest.invalidate(old_config[key])
+        if CONF_FORECAST_SENSOR in changed:
+            keep = {entity_id for _, entity_id in self._get_forecast_sources()}
+            for _, entity_id in parse_forecast_sources(old_config.get(CONF_FORECAST_SENSOR)):
+                if entity_id not in keep:
+                    self._ingest.invalidate(entity_id)
+        if CONF_DAILY_LOAD_SENSOR in changed:
+            self._last_daily_cumulative = None
+            self._last_daily_date = None
+        if CONF_PV_POWER_SENSOR in changed:
+            # Do not integrate across readings of two different sensors
+            self._pv_bias.reset_sampling()
+        if CONF_GRID_IMPORT_SENSOR in changed:
+            self._grid_peak.reset_sampling()
+        if CONF_NANOGREEN_CHEAPEST_SENSOR in changed:
+            self.track_nanogreen()
+        if changed & {CONF_BATTERY_CAPACITY, CONF_CHARGE_EFFICIENCY}:
+            self._configure_soc_estimator()
+        if changed & {CONF_SOC_SENSOR, CONF_BATTERY_POWER_SENSOR}:
+            self._soc_estimator.reset()
+            self.track_battery_state()
+        if CONF_PLANNER_WORKER in changed:
+            self._release_worker()
+            self._acquire_worker()
+        if changed & set(TUNED_PARAMETERS):
+            # Measured against the old settings
+            self.tuning_suggestion = None
+
+        # Actuation: resync scripts on the next cycle, forget removed switches
+        if changed & {CONF_CHARGING_ON_SCRIPT, CONF_CHARGING_OFF_SCRIPT, CONF_ENABLE_AUTOMATION,
+                      CONF_SWITCH_ON_MEANS_CHARGE, CONF_TEST_MODE}:
+            self._last_script_state = None
+        if changed & {CONF_CHARGE_POWER_ENTITY, CONF_SETPOINT_DEADBAND, CONF_SETPOINT_MIN_INTERVAL,
+                      CONF_MAX_CHARGE_POWER, CONF_ENABLE_AUTOMATION, CONF_TEST_MODE}:
+            self._configure_setpoint()
+            self.setpoint.reset()
+        if CONF_ADDITIONAL_SWITCHES in changed:
+            configured = set(self._get_additional_switches())
+            self._additional_switches_state = {
+                entity_id: state for entity_id, state in self._additional_switches_state.items()
+                if entity_id in configured
+            }
+        if CONF_DEFERRABLE_LOADS in changed:
+            configured = {load.entity_id for load in self._get_deferrable_loads()}
+            old_loads = {load.entity_id for load in parse_deferrable_loads(old_config.get(CONF_DEFERRABLE_LOADS))}
+            for entity_id in old_loads - configured:
+                self._deferrable_delivered.pop(entity_id, None)
+                if entity_id not in self._get_additional_switches():
+                    self._additional_switches_state.pop(entity_id, None)
+        _LOGGER.info("Applied option changes without reload: %s", ", ".join(sorted(changed)))
+        return changed
+
+    async def async_unload(self) -> None:
+        """Stop listeners and queued commands and release shared inputs (entry unload)."""
+        self.untrack_nanogreen()
+        self.untrack_battery_state()
+        self.verifier.cancel()
+        self.setpoint.reset()
+        await self.actuator.async_stop()
+        self._ingest.close()
+        shared = self.hass.data.get(DATA_INGEST)
+        if shared is not None and not shared.owners:
+            self.hass.data.pop(DATA_INGEST)
+        client = self._release_worker(close=False)
+        if client is not None:
+            await client.async_close()
+
+    @property
+    def planner_worker(self) -> Optional[PlannerWorkerClient]:
+        """Return the planner worker client, None when planning in-process."""
+        return self._worker
+
+    def _acquire_worker(self) -> None:
+        """Connect to the configured planner worker (none when the option is empty)."""
+        address = str(self.config.get(CONF_PLANNER_WORKER, DEFAULT_PLANNER_WORKER) or "").strip()
+        if not address:
+            return
+        registry = self.hass.data.setdefault(DATA_WORKER, WorkerRegistry())
+        try:
+            self._worker = registry.acquire(address, self.entry.entry_id)
+        except ValueError:
+            _LOGGER.warning("Invalid planner worker '%s' (expected 'local' or host:port), planning in-process",
+                            address)
+            if not registry.owners:
+                self.hass.data.pop(DATA_WORKER)
+            return
+        self._worker_address = address
+
+    def _release_worker(self, close: bool = True) -> Optional[PlannerWorkerClient]:
+        """Stop using the worker; the last entry using it closes it (or gets it back)."""
+        registry = self.hass.data.get(DATA_WORKER)
+        client = None
+        if self._worker is not None and registry is not None:
+            client = registry.release(self._worker_address, self.entry.entry_id)
+            if not registry.owners:
+                self.hass.data.pop(DATA_WORKER)
+        self._worker, self._worker_address = None, ""
+        if client is not None and close:
+            self.hass.async_create_task(client.async_close())
+            return None
+        return client
+
+    async def async_restore_snapshot(self) -> bool:
+        """Restore the persisted plan snapshot.
+
+        Actuation, hysteresis and ML state are always restored, so the first
+        cycle after a restart does not re-fire a script whose state did not
+        change.  The plan itself is only published when it is from today;
+        returns True in that case and the first refresh can be deferred.
+        """
+        snapshot = await self._snapshot.async_load()
+        if not snapshot:
+            return False
+        try:
+            state = snapshot.get("actuation") or {}
+            script_state = state.get("last_script_state")
+            self._last_script_state = None if script_state is None else bool(script_state)
+            self._last_charging_state = bool(state.get("last_charging_state", False))
+            self._additional_switches_state = {
+                str(k): bool(v) for k, v in (state.get("additional_switches") or {}).items()
+            }
+            deferrable = state.get("deferrable") or {}
+            if deferrable.get("day") == datetime.now().date().isoformat():
+                self._deferrable_day = datetime.now().date()
+                self._deferrable_delivered = {
+                    str(k): float(v) for k, v in (deferrable.get("delivered_kwh") or {}).items()
+                }
+            ml = snapshot.get("ml_history") or {}
+            self._ml_history = [list(map(float, p)) for p in ml.get("all", [])][-30:]
+            self._ml_weekday_history = [list(map(float, p)) for p in ml.get("weekday", [])][-30:]
+            self._ml_weekend_history = [list(map(float, p)) for p in ml.get("weekend", [])][-30:]
+            self._ml_holiday_history = [list(map(float, p)) for p in ml.get("holiday", [])][-30:]
+            self._ingest.restore_shape_hints((snapshot.get("cache") or {}).get("shape_hints"))
+            self.verifier.histogram.load_dict(snapshot.get("actuation_latency"))
+            self._grid_peak.load_dict(snapshot.get("grid_peak"))
+        except (AttributeError, TypeError, ValueError) as e:
+            _LOGGER.warning("Ignoring corrupt plan snapshot: %s", e)
+            return False
+
+        data = snapshot.get("data")
+        if not isinstance(data, dict) or not data.get("schedule") or not snapshot_is_fresh(snapshot):
+            _LOGGER.debug("Plan snapshot from %s is stale, running a full refresh", snapshot.get("saved_at"))
+            return False
+        self.async_set_updated_data({**data, "status": "restored", "restored_at": snapshot.get("saved_at")})
+        _LOGGER.info("Restored charging plan saved at %s", snapshot.get("saved_at"))
+        return True
+
+    def _snapshot_data(self) -> Dict[str, Any]:
+        """Return the state persisted in the plan snapshot."""
+        now = datetime.now(timezone.utc)
+        return {
+            "saved_at": now.isoformat(),
+            "saved_local_date": datetime.now().date().isoformat(),
+            "data": self.data,
+            "actuation": {
+                "last_script_state": self._last_script_state,
+                "last_charging_state": self._last_charging_state,
+                "additional_switches": self._additional_switches_state,
+                "deferrable": {
+                    "day": self._deferrable_day.isoformat() if self._deferrable_day else None,
+                    "delivered_kwh": self._deferrable_delivered,
+                },
+            },
+            "ml_history": {
+                "all": self._ml_history,
+                "weekday": self._ml_weekday_history,
+                "weekend": self._ml_weekend_history,
+                "holiday": self._ml_holiday_history,
+            },
+            "actuation_latency": self.verifier.histogram.as_dict(),
+            "grid_peak": self._grid_peak.as_dict(),
+            "cache": {
+                "shape_hints": self._ingest.shape_hints(),
+                "forecast_sources": [list(s) for s in self._forecast_sources],
+            },
+        }
 
     async def _async_update_data(self) -> dict[str, Any]:
-        """Fetch and normalize forecast, price and load data and compute 15-min schedule."""
+        """Single-flight refresh: concurrent refresh requests share one computation."""
+        task = self._update_task
+        if task is not None and not task.done():
+            self._refresh_stats["joined"] += 1
+            return await asyncio.shield(task)
+        task = self._update_task = self.hass.async_create_task(self._async_compute_update())
+        # Shielded, so a cancelled caller does not abort the shared computation
+        return await asyncio.shield(task)
+
+    @contextmanager
+    def _stage(self, name: str, timings: Dict[str, float]) -> Iterator[None]:
+        """Time an in-loop refresh stage and count budget overruns."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            timings[name] = round(elapsed, 3)
+            if elapsed > STAGE_BUDGETS[name]:
+                self._refresh_stats["overruns"][name] = self._refresh_stats["overruns"].get(name, 0) + 1
+                _LOGGER.warning("Refresh stage %s took %.1fs (budget %.1fs)", name, elapsed, STAGE_BUDGETS[name])
+
+    async def _async_compute_update(self) -> dict[str, Any]:
+        """Fetch and normalize forecast, price and load data and compute 15-min schedule.
+
+        Stages: parse -> predict -> plan -> actuate.  The plan runs in an
+        executor under its time budget; when a stage fails or the plan
+        overruns, the last good plan is kept instead of failing the update.
+        """
+        timings: Dict[str, float] = {}
         try:
-            forecast_sensor = self.config.get(CONF_FORECAST_SENSOR)
             price_sensor = self.config.get(CONF_PRICE_SENSOR)
             load_sensor = self.config.get(CONF_LOAD_SENSOR)
             daily_load_sensor = self.config.get(CONF_DAILY_LOAD_SENSOR)
 
             # Use 96 slots for 15-minute intervals (24 hours * 4)
-            forecast_15min: List[float] = [0.0] * 96
             price_15min: List[float] = [0.0] * 96
             load_15min: List[float] = [0.0] * 96
-
-            forecast_meta = {}
-            forecast_timestamps: List[str] = []
-
-            # Parse forecast (supports 15-min data from sensor.energy_production_d2)
-            if forecast_sensor:
-                state = self.hass.states.get(forecast_sensor)
-                if state:
-                    _LOGGER.debug("Parsing forecast from %s", forecast_sensor)
-                    forecast_15min = self._parse_forecast_15min(state)
-                    forecast_timestamps = self._build_forecast_timestamps_15min(state)
-                    conf_score, conf_reason, source, slots = self._compute_forecast_confidence(state)
-                    forecast_meta = {
-                        "forecast_confidence": {"score": conf_score, "reason": conf_reason},
-                        "forecast_source": source,
-                        "forecast_slots_count": slots,
-                    }
-                else:
-                    _LOGGER.debug("Forecast sensor %s not found", forecast_sensor)
-
-            # Parse price (from sensor.current_consumption_price_czk_kwh with today/tomorrow hourly)
-            if price_sensor:
-                state = self.hass.states.get(price_sensor)
-                if state:
-                    _LOGGER.debug("Parsing prices from %s", price_sensor)
-                    price_15min = self._parse_price_15min(state)
-                else:
-                    _LOGGER.debug("Price sensor %s not found", price_sensor)
-
-            # Parse load - use ML prediction if enabled, otherwise use daily sensor
-            ml_enabled = self.config.get(CONF_ENABLE_ML_PREDICTION, DEFAULT_ENABLE_ML_PREDICTION)
-            if daily_load_sensor:
-                state_daily = self.hass.states.get(daily_load_sensor)
-                if state_daily:
-                    if ml_enabled:
-                        _LOGGER.debug("Using ML prediction for load pattern")
-                        load_15min = self._ml_predict_load_pattern(state_daily)
-                        # Update ML history with current actual consumption
-                        current_actual = self._parse_daily_load_pattern_15min(state_daily)
-                        self._update_ml_history(current_actual)
+            export_price_15min: Optional[List[float]] = None
+
+            with self._stage("parse", timings):
+                # Parse and fuse all configured PV forecast entities (today/d1/d2, several arrays/providers)
+                forecast_15min, forecast_day, forecast_meta, forecast_by_day = self._collect_forecast()
+                forecast_timestamps = self._build_timestamps_15min(forecast_day) if forecast_day else []
+
+                # Learn forecast bias from measured PV production and correct the forecast
+                bias_changed = False
+                for day, day_forecast in forecast_by_day.items():
+                    bias_changed = self._pv_bias.record_forecast(day, day_forecast) or bias_changed
+                bias_changed = self._sample_pv_production() or bias_changed
+                self._sample_grid_peak()
+                for day, actual_kwh in self._pv_bias.pop_completed_days():
+                    bias_changed = self._forecast_fusion.record_actual(day, actual_kwh) or bias_changed
+                forecast_raw_15min = forecast_15min
+                if forecast_day is not None:
+                    forecast_15min = self._pv_bias.apply(forecast_day, forecast_raw_15min)
+                    forecast_meta["forecast_bias_correction"] = self._pv_bias.summary(forecast_day)
+                if bias_changed:
+                    self._pv_bias_store.async_delay_save(self._forecast_models_data, 600)
+
+                # Parse price (from sensor.current_consumption_price_czk_kwh with today/tomorrow hourly)
+                if price_sensor:
+                    state = self.hass.states.get(price_sensor)
+                    if state:
+                        _LOGGER.debug("Parsing prices from %s", price_sensor)
+                        price_15min = self._parse_price_15min(state)
                     else:
-                        _LOGGER.debug("Parsing daily load pattern from %s", daily_load_sensor)
-                        load_15min = self._parse_daily_load_pattern_15min(state_daily)
-            
-            # Fallback to current consumption sensor
-            if not any(load_15min) and load_sensor:
-                state = self.hass.states.get(load_sensor)
-                if state:
-                    _LOGGER.debug("Using current load from %s", load_sensor)
-                    load_15min = self._parse_current_load_15min(state)
-
-            # Compute 15-min optimized schedule
-            schedule = self._compute_schedule_15min(forecast_15min, price_15min, load_15min)
-
-            # Get real-time battery and grid metrics (with W to kWh conversion)
-            battery_metrics = self._get_battery_metrics()
-            grid_metrics = self._get_grid_metrics()
-
-            # Execute charging automation if enabled
-            await self._execute_charging_automation(schedule)
-
-            return {
-                "status": "ok",
-                "forecast_15min": forecast_15min,
-                "price_15min": price_15min,
-                "load_15min": load_15min,
-                "schedule": schedule,
-                "timestamps": forecast_timestamps,
-                "battery_metrics": battery_metrics,
-                "grid_metrics": grid_metrics,
-                **forecast_meta,
-                "last_update": datetime.now(timezone.utc).isoformat(),
-            }
+                        _LOGGER.debug("Price sensor %s not found", price_sensor)
+
+                # Feed-in prices are only read when export is planned
+                export_price_sensor = self.config.get(CONF_EXPORT_PRICE_SENSOR)
+                if export_price_sensor and float(self.config.get(CONF_EXPORT_LIMIT, DEFAULT_EXPORT_LIMIT) or 0.0) > 0:
+                    state = self.hass.states.get(export_price_sensor)
+                    if state:
+                        export_price_15min = self._parse_price_15min(state)
+                    else:
+                        _LOGGER.debug("Export price sensor %s not found, using the fixed export price",
+                                      export_price_sensor)
+
+            with self._stage("predict", timings):
+                # Parse load - use ML prediction if enabled, otherwise use daily sensor
+                ml_enabled = self.config.get(CONF_ENABLE_ML_PREDICTION, DEFAULT_ENABLE_ML_PREDICTION)
+                if daily_load_sensor:
+                    state_daily = self.hass.states.get(daily_load_sensor)
+                    if state_daily:
+                        if ml_enabled:
+                            _LOGGER.debug("Using ML prediction for load pattern")
+                            load_15min = self._ml_predict_load_pattern(state_daily)
+                            # Update ML history with current actual consumption
+                            current_actual = self._parse_daily_load_pattern_15min(state_daily)
+                            self._update_ml_history(current_actual)
+                        else:
+                            _LOGGER.debug("Parsing daily load pattern from %s", daily_load_sensor)
+                            load_15min = self._parse_daily_load_pattern_15min(state_daily)
+
+                # Fallback to current consumption sensor
+                if not any(load_15min) and load_sensor:
+                    state = self.hass.states.get(load_sensor)
+                    if state:
+                        _LOGGER.debug("Using current load from %s", load_sensor)
+                        load_15min = self._parse_current_load_15min(state)
+
+            # Compute 15-min optimized schedule (executor, time-boxed)
+            schedule = await self._async_compute_schedule_15min(
+                forecast_15min, price_15min, load_15min, timings, forecast_meta, export_price_15min
+            )
         except Exception as err:
+            return await self._async_fallback_update(err, timings)
+
+        # Get real-time battery and grid metrics (with W to kWh conversion)
+        battery_metrics = self._get_battery_metrics()
+        grid_metrics = self._get_grid_metrics()
+
+        # Execute charging automation if enabled
+        await self._async_actuate(schedule, timings)
+
+        data = {
+            "status": "ok",
+            "forecast_15min": forecast_15min,
+            "forecast_raw_15min": forecast_raw_15min,
+            "price_15min": price_15min,
+            "load_15min": load_15min,
+            "schedule": schedule,
+            "deferrable_plan": self._deferrable_plan,
+            "site_import": self._site_import,
+            "battery_wear": self._battery_wear,
+            "soc_estimate": self._soc_estimator.summary(time.monotonic()),
+            "fleet_allocation": self._fleet_allocation,
+            "stochastic": self._stochastic_summary(),
+            "optimizer": self._optimization,
+            "timestamps": forecast_timestamps,
+            "battery_metrics": battery_metrics,
+            "grid_metrics": grid_metrics,
+            "ingest_stats": self._ingest.stats(),
+            "actuation_stats": self.actuator.stats(),
+            "actuation_verification": self.verifier.stats(),
+            "charge_setpoint": self.setpoint.stats(),
+            "refresh_stats": {**self._refresh_stats, "stage_timings": timings},
+            "nanogreen": dict(self._nanogreen_stats),
+            "fleet": self.fleet.stats() if self.fleet is not None else None,
+            "worker": self._worker.stats() if self._worker is not None else None,
+            "tuning_suggestion": self.tuning_suggestion,
+            **forecast_meta,
+            "last_update": datetime.now(timezone.utc).isoformat(),
+        }
+        self._last_good_data = data
+        return data
+
+    async def _async_fallback_update(self, err: Exception, timings: Dict[str, float]) -> dict[str, Any]:
+        """Keep serving (and following) the last good plan after a failed refresh."""
+        last_good = self._last_good_data or self.data
+        if not last_good or not last_good.get("schedule"):
             _LOGGER.error("Update failed: %s", err, exc_info=True)
             raise UpdateFailed(err) from err
+        self._refresh_stats["fallbacks"] += 1
+        reason = "plan stage timed out" if isinstance(err, asyncio.TimeoutError) else str(err) or type(err).__name__
+        _LOGGER.warning("Update failed (%s), keeping the last good plan from %s", reason, last_good.get("last_update"))
+        await self._async_actuate(last_good["schedule"], timings)
+        return {
+            **last_good,
+            "status": "stale",
+            "stale_reason": reason,
+            "battery_metrics": self._get_battery_metrics(),
+            "grid_metrics": self._get_grid_metrics(),
+            "actuation_stats": self.actuator.stats(),
+            "actuation_verification": self.verifier.stats(),
+            "charge_setpoint": self.setpoint.stats(),
+            "refresh_stats": {**self._refresh_stats, "stage_timings": timings},
+        }
+
+    async def _async_actuate(self, schedule: List[Dict[str, Any]], timings: Dict[str, float]) -> None:
+        """Run the actuation stage under its budget and schedule the snapshot save."""
+        actuation_before = (self._last_script_state, dict(self._additional_switches_state))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._execute_charging_automation(schedule), STAGE_BUDGETS["actuate"])
+        except asyncio.TimeoutError:
+            self._refresh_stats["overruns"]["actuate"] = self._refresh_stats["overruns"].get("actuate", 0) + 1
+            _LOGGER.warning("Actuation stage exceeded its %.0fs budget", STAGE_BUDGETS["actuate"])
+        except Exception as e:
+            _LOGGER.error("Charging automation failed: %s", e, exc_info=True)
+        timings["actuate"] = round(time.monotonic() - started, 3)
+        actuation_changed = actuation_before != (self._last_script_state, self._additional_switches_state)
+        # Persisted after this data is published; actuation changes are saved promptly
+        self._snapshot.schedule_save(self._snapshot_data, urgent=actuation_changed)
+
+    async def async_apply_schedule_now(self) -> None:
+        """Re-send the current slot's script and switch states (apply_schedule_now service)."""
+        schedule = (self.data or {}).get("schedule")
+        if not schedule:
+            _LOGGER.warning("No schedule to apply yet")
+            return
+        self._last_script_state = None
+        self._additional_switches_state = {}
+        self.setpoint.reset()
+        await self._async_actuate(schedule, {})
+
+    async def async_what_if(self, scenarios: Sequence[Mapping[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Re-plan the last planning inputs once per scenario, in the executor.
+
+        Returns None before the first plan.  Planning state, the live plan and
+        actuation are left untouched.
+        """
+        inputs = self._plan_inputs
+        if inputs is None:
+            return None
+        return await self.hass.async_add_executor_job(run_scenarios, dict(self.config), inputs, scenarios)
 
     async def _execute_charging_automation(self, schedule: List[Dict[str, Any]]) -> None:
         """Execute charging scripts based on current schedule slot.
@@ -206,6 +661,7 @@ class GWSmartCoordinator(DataUpdateCoordinator):
         - Nanogreen cheapest hours sensor
         - Additional switches based on price thresholds
         - Test mode for debugging
+        - Charge power setpoints (``charge_power_entity``), with or without the scripts
         
         Only calls scripts when state changes to avoid unnecessary calls.
         """
@@ -225,7 +681,8 @@ class GWSmartCoordinator(DataUpdateCoordinator):
         charging_on_script = self.config.get(CONF_CHARGING_ON_SCRIPT)
         charging_off_script = self.config.get(CONF_CHARGING_OFF_SCRIPT)
         
-        if not charging_on_script or not charging_off_script:
+        scripts_configured = bool(charging_on_script and charging_off_script)
+        if not scripts_configured and not self.setpoint.active:
             _LOGGER.debug("Charging scripts not configured, skipping automation")
             return
         
@@ -250,198 +707,397 @@ class GWSmartCoordinator(DataUpdateCoordinator):
             elif nanogreen_state:
                 _LOGGER.debug("Nanogreen sensor state: %s - using standard logic", nanogreen_state.state)
         
+        # Charge power follows the plan within the deadband and rate limit
+        self.setpoint.update(self.charge_setpoint_kw(current_slot, should_charge))
+        
         # Only call script if state changed
-        if self._last_script_state is None or self._last_script_state != should_charge:
-            try:
-                if should_charge:
-                    _LOGGER.info("Turning ON charging (slot %d, mode: %s, price: %.2f CZK/kWh)", 
-                                slot, current_slot.get("mode", "unknown"), 
-                                current_slot.get("price_czk_kwh", 0.0))
-                    await self.hass.services.async_call(
-                        "script", "turn_on", 
-                        {"entity_id": charging_on_script}, 
-                        blocking=False
-                    )
-                else:
-                    _LOGGER.info("Turning OFF charging (slot %d, mode: %s)", 
-                                slot, current_slot.get("mode", "unknown"))
-                    await self.hass.services.async_call(
-                        "script", "turn_on", 
-                        {"entity_id": charging_off_script}, 
-                        blocking=False
-                    )
-                
-                self._last_script_state = should_charge
-                _LOGGER.debug("Script execution successful, new state: %s", should_charge)
-                
-            except Exception as e:
-                _LOGGER.error("Failed to execute charging script: %s", e, exc_info=True)
-        else:
+        if scripts_configured and (self._last_script_state is None or self._last_script_state != should_charge):
+            if should_charge:
+                _LOGGER.info("Turning ON charging (slot %d, mode: %s, price: %.2f CZK/kWh)", 
+                            slot, current_slot.get("mode", "unknown"), 
+                            current_slot.get("price_czk_kwh", 0.0))
+            else:
+                _LOGGER.info("Turning OFF charging (slot %d, mode: %s)", 
+                            slot, current_slot.get("mode", "unknown"))
+            self._last_script_state = should_charge
+            self.submit_charging_script(should_charge)
+        elif scripts_configured:
             _LOGGER.debug("Charging state unchanged (%s), skipping script call", should_charge)
         
         # NEW v2.0: Manage additional switches based on price threshold
         await self._manage_additional_switches(current_slot)
 
-    async def _manage_additional_switches(self, current_slot: Dict[str, Any]) -> None:
-        """Manage additional switches based on electricity price.
-        
-        Turn on configured switches when price is below threshold.
-        Turn off switches when price goes above threshold.
+    def _configure_setpoint(self) -> None:
+        """Apply the setpoint options; automation off or test mode sends no setpoints."""
+        enabled = self.config.get(CONF_ENABLE_AUTOMATION, True) and not self.config.get(CONF_TEST_MODE, False)
+        try:
+            deadband = float(self.config.get(CONF_SETPOINT_DEADBAND, DEFAULT_SETPOINT_DEADBAND))
+            min_interval = float(self.config.get(CONF_SETPOINT_MIN_INTERVAL, DEFAULT_SETPOINT_MIN_INTERVAL))
+        except (TypeError, ValueError):
+            deadband, min_interval = DEFAULT_SETPOINT_DEADBAND, DEFAULT_SETPOINT_MIN_INTERVAL
+        self.setpoint.configure(
+            self.config.get(CONF_CHARGE_POWER_ENTITY, "") if enabled else "",
+            deadband,
+            min_interval,
+            float(self.config.get(CONF_MAX_CHARGE_POWER, DEFAULT_MAX_CHARGE_POWER)),
+        )
+
+    def charge_setpoint_kw(self, slot: Mapping[str, Any], should_charge: bool) -> float:
+        """Grid charge power for a slot: the planned power, full power for a Nanogreen override."""
+        if not should_charge:
+            return 0.0
+        planned_kw = float(slot.get("planned_charge_kW", 0.0) or 0.0)
+        if planned_kw <= 0.01:
+            return float(self.config.get(CONF_MAX_CHARGE_POWER, DEFAULT_MAX_CHARGE_POWER))
+        return planned_kw
+
+    def submit_charging_script(self, should_charge: bool, attempt: int = 0) -> None:
+        """Queue the charging ON/OFF script for ``should_charge`` (returns immediately)."""
+        script = self.config.get(CONF_CHARGING_ON_SCRIPT if should_charge else CONF_CHARGING_OFF_SCRIPT)
+        if not script:
+            return
+        # ON and OFF scripts share one key, so only the latest decision runs
+        self.actuator.submit(
+            "charging_script", "script", "turn_on", {"entity_id": script},
+            on_done=lambda ok: self._on_script_done(should_charge, ok, attempt),
+        )
+
+    # ---------- SOC estimate (event driven) ----------
+
+    def _configure_soc_estimator(self) -> None:
+        self._soc_estimator.configure(
+            float(self.config.get(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY)),
+            float(self.config.get(CONF_CHARGE_EFFICIENCY, DEFAULT_CHARGE_EFFICIENCY)),
+        )
+
+    def track_battery_state(self) -> None:
+        """(Re)subscribe the SOC estimator to the SOC and battery power sensors."""
+        self.untrack_battery_state()
+        entities = [e for e in (self.config.get(CONF_SOC_SENSOR), self.config.get(CONF_BATTERY_POWER_SENSOR)) if e]
+        if entities:
+            self._battery_unsub = async_track_state_change_event(
+                self.hass, entities, self._async_battery_state_changed
+            )
+
+    def untrack_battery_state(self) -> None:
+        if self._battery_unsub is not None:
+            self._battery_unsub()
+            self._battery_unsub = None
+
+    @callback
+    def _async_battery_state_changed(self, event) -> None:
+        """Feed a SOC (%) or battery power (positive = discharge) reading to the estimator."""
+        new_state = event.data.get("new_state")
+        if new_state is None:
+            return
+        entity_id = event.data.get("entity_id") or new_state.entity_id
+        if entity_id == self.config.get(CONF_SOC_SENSOR):
+            soc_pct = read_scalar(new_state, KIND_PERCENT)
+            if soc_pct is not None:
+                self._soc_estimator.add_soc(time.monotonic(), soc_pct)
+        elif entity_id == self.config.get(CONF_BATTERY_POWER_SENSOR):
+            power_kw = read_scalar(new_state, KIND_POWER)
+            if power_kw is not None:
+                self._soc_estimator.add_power(time.monotonic(), power_kw)
+
+    # ---------- Nanogreen cheapest-hour signal (event driven) ----------
+
+    def track_nanogreen(self) -> None:
+        """(Re)subscribe to state changes of the Nanogreen cheapest-hour sensor."""
+        self.untrack_nanogreen()
+        sensor = self.config.get(CONF_NANOGREEN_CHEAPEST_SENSOR)
+        if sensor:
+            self._nanogreen_unsub = async_track_state_change_event(
+                self.hass, [sensor], self._async_nanogreen_changed
+            )
+
+    def untrack_nanogreen(self) -> None:
+        if self._nanogreen_unsub is not None:
+            self._nanogreen_unsub()
+            self._nanogreen_unsub = None
+
+    @callback
+    def _async_nanogreen_changed(self, event) -> None:
+        """Apply a Nanogreen window start/end to the cached plan and actuate at once.
+
+        Only the current slot is overridden; the next refresh replans with
+        the sensor state as usual.
         """
-        # Get additional switches configuration (comma-separated entity_ids)
-        switches_config = self.config.get(CONF_ADDITIONAL_SWITCHES, "")
-        if not switches_config or not switches_config.strip():
+        new_state = event.data.get("new_state")
+        old_state = event.data.get("old_state")
+        if new_state is None:
+            return
+        active = new_state.state.lower() in ("on", "true", "1")
+        if old_state is not None and (old_state.state.lower() in ("on", "true", "1")) == active:
+            return
+        data = self.data
+        schedule = list((data or {}).get("schedule") or [])
+        now = datetime.now()
+        slot = now.hour * 4 + now.minute // 15
+        if not 0 <= slot < len(schedule):
+            return
+
+        planned = schedule[slot]
+        if active and not planned.get("should_charge"):
+            self._nanogreen_replaced = (slot, planned)
+            schedule[slot] = {**planned, "should_charge": True, "mode": "grid_charge_nanogreen",
+                              "nanogreen_override": True}
+        elif not active and planned.get("nanogreen_override") and self._nanogreen_replaced[0] == slot:
+            schedule[slot] = self._nanogreen_replaced[1]
+        else:
+            return
+        should_charge = schedule[slot].get("should_charge", False)
+
+        actuated = False
+        if (not self.config.get(CONF_TEST_MODE, False)
+                and self.config.get(CONF_ENABLE_AUTOMATION, True)
+                and self._last_script_state != should_charge):
+            self._last_script_state = should_charge
+            self.submit_charging_script(should_charge)
+            actuated = True
+        self.setpoint.update(self.charge_setpoint_kw(schedule[slot], should_charge))
+
+        latency_ms = (datetime.now(timezone.utc) - new_state.last_changed).total_seconds() * 1000.0
+        stats = self._nanogreen_stats
+        stats["reactions"] += 1
+        stats["last_latency_ms"] = round(latency_ms, 1)
+        stats["max_latency_ms"] = max(stats["max_latency_ms"], stats["last_latency_ms"])
+        _LOGGER.info("Nanogreen window %s: charging %s in slot %d (%s, reaction %.0f ms)",
+                     "started" if active else "ended", "ON" if should_charge else "OFF", slot,
+                     "actuated" if actuated else "no script change", latency_ms)
+        self.data = {**data, "schedule": schedule, "nanogreen": dict(stats)}
+        self.async_update_listeners()
+
+    def _on_script_done(self, should_charge: bool, ok: bool, attempt: int = 0) -> None:
+        """Verify the effect of an executed script; re-plan it when the call failed."""
+        if self._last_script_state != should_charge:
+            return  # superseded by a newer decision
+        if not ok:
+            self._last_script_state = None
             return
+        self.verifier.expect(
+            should_charge,
+            self.config.get(CONF_BATTERY_POWER_SENSOR),
+            self.config.get(CONF_GRID_IMPORT_SENSOR),
+            reissue=lambda: self._reissue_charging_script(should_charge, attempt + 1),
+            attempt=attempt,
+        )
+
+    def _reissue_charging_script(self, should_charge: bool, attempt: int) -> None:
+        if self._last_script_state == should_charge:
+            self.submit_charging_script(should_charge, attempt)
+
+    def _get_additional_switches(self) -> List[str]:
+        """Return configured additional switch entity ids (parsed once per config change)."""
+        raw = self.config.get(CONF_ADDITIONAL_SWITCHES, "") or ""
+        if raw != self._additional_switches_raw:
+            self._additional_switches_raw = raw
+            switches: List[str] = []
+            for entity_id in (s.strip() for s in raw.split(",")):
+                if not entity_id:
+                    continue
+                if not entity_id.startswith("switch."):
+                    _LOGGER.warning(f"Invalid switch entity_id: {entity_id}, must start with 'switch.'")
+                    continue
+                if entity_id not in switches:
+                    switches.append(entity_id)
+            self._additional_switches = switches
+        return self._additional_switches
+
+    async def _manage_additional_switches(self, current_slot: Dict[str, Any]) -> None:
+        """Manage additional switches and deferrable loads.
         
-        # Parse switch entity IDs
-        switch_entities = [s.strip() for s in switches_config.split(",") if s.strip()]
-        if not switch_entities:
+        Deferrable loads follow their planned slots (``deferrable_loads`` of
+        the current slot).  Other switches turn on when the price is below
+        the threshold and off when it goes above.
+        Commands go through the actuation queue, so this never waits for a switch.
+        """
+        deferrable = [load.entity_id for load in self._get_deferrable_loads()]
+        switch_entities = [e for e in self._get_additional_switches() if e not in deferrable]
+        if not switch_entities and not deferrable:
             return
         
         # Get price threshold
         price_threshold = float(self.config.get(CONF_SWITCH_PRICE_THRESHOLD, DEFAULT_SWITCH_PRICE_THRESHOLD))
         current_price = current_slot.get("price_czk_kwh", 999.0)
+        price_on = current_price <= price_threshold
+        planned_on = set(current_slot.get("deferrable_loads") or ())
         
-        _LOGGER.debug(f"Managing {len(switch_entities)} additional switches, current price: {current_price:.2f}, threshold: {price_threshold:.2f}")
+        _LOGGER.debug(f"Managing {len(switch_entities)} additional switches and {len(deferrable)} deferrable loads, current price: {current_price:.2f}, threshold: {price_threshold:.2f}")
         
         # Check if test mode is enabled
         test_mode = self.config.get(CONF_TEST_MODE, False)
         
-        for switch_entity in switch_entities:
-            # Validate entity_id format
-            if not switch_entity.startswith("switch."):
-                _LOGGER.warning(f"Invalid switch entity_id: {switch_entity}, must start with 'switch.'")
+        targets = [(e, price_on, "price threshold") for e in switch_entities]
+        targets += [(e, e in planned_on, "deferrable plan") for e in deferrable]
+        for switch_entity, should_be_on, reason in targets:
+            # Only change state if needed
+            if self._additional_switches_state.get(switch_entity) == should_be_on:
                 continue
-            
-            # Determine desired state
-            should_be_on = current_price <= price_threshold
-            
-            # Get current state
-            current_state = self.hass.states.get(switch_entity)
-            if not current_state:
+            if self.hass.states.get(switch_entity) is None:
                 _LOGGER.warning(f"Switch {switch_entity} not found in Home Assistant")
                 continue
-            
-            is_currently_on = current_state.state == "on"
-            
-            # Only change state if needed
-            last_state = self._additional_switches_state.get(switch_entity)
-            if last_state is None or last_state != should_be_on:
-                try:
-                    if test_mode:
-                        _LOGGER.info(f"TEST MODE: Would turn {'ON' if should_be_on else 'OFF'} switch {switch_entity} (price: {current_price:.2f} CZK/kWh)")
-                    else:
-                        service = "turn_on" if should_be_on else "turn_off"
-                        await self.hass.services.async_call(
-                            "switch", service,
-                            {"entity_id": switch_entity},
-                            blocking=False
-                        )
-                        _LOGGER.info(f"Turned {'ON' if should_be_on else 'OFF'} switch {switch_entity} (price: {current_price:.2f} CZK/kWh, threshold: {price_threshold:.2f})")
-                    
-                    self._additional_switches_state[switch_entity] = should_be_on
-                    
-                except Exception as e:
-                    _LOGGER.error(f"Failed to control switch {switch_entity}: {e}", exc_info=True)
-
-    # ---------- NEW: 15-minute interval parsing methods ----------
+            if test_mode:
+                _LOGGER.info(f"TEST MODE: Would turn {'ON' if should_be_on else 'OFF'} switch {switch_entity} (price: {current_price:.2f} CZK/kWh, {reason})")
+            else:
+                self.actuator.submit(
+                    switch_entity, switch_entity.split(".", 1)[0], "turn_on" if should_be_on else "turn_off",
+                    {"entity_id": switch_entity},
+                    on_done=lambda ok, entity_id=switch_entity, state=should_be_on:
+                        self._on_switch_done(entity_id, state, ok),
+                )
+                _LOGGER.info(f"Turning {'ON' if should_be_on else 'OFF'} switch {switch_entity} (price: {current_price:.2f} CZK/kWh, {reason})")
+            self._additional_switches_state[switch_entity] = should_be_on
+
+    def _on_switch_done(self, entity_id: str, should_be_on: bool, ok: bool) -> None:
+        """Re-plan a switch on the next cycle when its command failed."""
+        if not ok and self._additional_switches_state.get(entity_id) == should_be_on:
+            self._additional_switches_state.pop(entity_id, None)
+
+    # ---------- deferrable loads ----------
+
+    def _get_deferrable_loads(self) -> List[DeferrableLoad]:
+        """Return configured deferrable loads (parsed once per config change)."""
+        raw = self.config.get(CONF_DEFERRABLE_LOADS, "") or ""
+        if raw != self._deferrable_raw:
+            self._deferrable_raw = raw
+            self._deferrable_loads = parse_deferrable_loads(raw)
+        return self._deferrable_loads
+
+    def _sample_deferrable_delivery(self) -> Dict[str, float]:
+        """Integrate energy delivered today by deferrable loads from their on/off state.
+
+        Uses the configured power while the entity is on; gaps longer than
+        one slot (restart, outage) count at most one slot.
+        """
+        now = datetime.now()
+        if self._deferrable_day != now.date():
+            self._deferrable_day = now.date()
+            self._deferrable_delivered = {}
+            self._deferrable_sampled_at = None
+        last, self._deferrable_sampled_at = self._deferrable_sampled_at, now
+        if last is None:
+            return self._deferrable_delivered
+        elapsed_h = min((now - last).total_seconds(), 900.0) / 3600.0
+        for load in self._get_deferrable_loads():
+            state = self.hass.states.get(load.entity_id)
+            if state is not None and state.state == "on":
+                self._deferrable_delivered[load.entity_id] = round(
+                    self._deferrable_delivered.get(load.entity_id, 0.0) + load.power_kw * elapsed_h, 4
+                )
+        return self._deferrable_delivered
+
+    # ---------- 15-minute interval parsing (via the unified ingestion layer) ----------
     
-    def _parse_forecast_15min(self, state) -> List[float]:
-        """Parse solar forecast from sensor.energy_production_d2 with 15-min watts attribute."""
-        attrs = state.attributes or {}
-        watts = attrs.get("watts")
-        
-        if isinstance(watts, dict) and watts:
-            # Sort by timestamp and convert to 15-min intervals (W to kW)
-            slots = [0.0] * 96
-            for ts_str, w_value in watts.items():
-                try:
-                    ts = datetime.fromisoformat(ts_str)
-                    # Calculate 15-min slot index (0-95)
-                    hour = ts.hour
-                    minute = ts.minute
-                    slot_idx = hour * 4 + minute // 15
-                    if 0 <= slot_idx < 96:
-                        slots[slot_idx] = float(w_value) / 1000.0  # W to kW
-                except Exception as e:
-                    _LOGGER.debug("Failed to parse forecast timestamp %s: %s", ts_str, e)
-                    continue
-            return slots
-        
-        # Fallback: use hourly wh_period and distribute evenly
-        wh_period = attrs.get("wh_period")
-        if isinstance(wh_period, dict) and wh_period:
-            slots = [0.0] * 96
-            for ts_str, wh_value in wh_period.items():
-                try:
-                    ts = datetime.fromisoformat(ts_str)
-                    hour = ts.hour
-                    kw_avg = float(wh_value) / 1000.0  # Wh to kWh, then average over hour
-                    # Fill 4 slots for this hour
-                    for i in range(4):
-                        slot_idx = hour * 4 + i
-                        if 0 <= slot_idx < 96:
-                            slots[slot_idx] = kw_avg
-                except Exception:
-                    continue
-            return slots
-        
-        return [0.0] * 96
+    def _get_forecast_sources(self) -> List[Tuple[str, str]]:
+        """Return configured ``(array, entity_id)`` forecast sources (parsed once per config change)."""
+        raw = self.config.get(CONF_FORECAST_SENSOR)
+        if raw != self._forecast_sources_raw:
+            self._forecast_sources_raw = raw
+            self._forecast_sources = parse_forecast_sources(raw)
+            self._forecast_fusion.forget(entity_id for _, entity_id in self._forecast_sources)
+        return self._forecast_sources
+
+    def _collect_forecast(self) -> Tuple[List[float], Optional[date], Dict[str, Any], Dict[date, List[float]]]:
+        """Parse every forecast source and fuse them onto one 15-min timeline.
+
+        Returns (forecast for the planning day, planning day, metadata, fused forecast per covered day).
+        The planning day is today when any source covers it, otherwise the nearest covered day.
+        """
+        inputs: List[FusionInput] = []
+        for array, entity_id in self._get_forecast_sources():
+            state = self.hass.states.get(entity_id)
+            if not state:
+                _LOGGER.debug("Forecast sensor %s not found", entity_id)
+                continue
+            timeline = self._ingest.get(state, KIND_POWER)
+            if timeline is None:
+                continue
+            score, _reason, _source, _slots = self._compute_forecast_confidence(state)
+            if timeline.shape in TIMESTAMPED_SHAPES:
+                dates = timeline.dates()
+            else:
+                dates = [self._forecast_base_date(state)]
+            inputs.append(FusionInput(array, entity_id, timeline, score, dates))
+
+        if not inputs:
+            return [0.0] * 96, None, {}, {}
+
+        today = datetime.now().date()
+        covered = sorted({d for item in inputs for d in item.dates})
+        upcoming = [d for d in covered if d >= today]
+        planning_day = upcoming[0] if upcoming else covered[-1]
+
+        by_day: Dict[date, List[float]] = {}
+        details: List[Dict[str, Any]] = []
+        for day in covered:
+            if day < today - timedelta(days=1):
+                continue
+            fused, day_details = self._forecast_fusion.fuse(inputs, day)
+            by_day[day] = fused
+            if day == planning_day:
+                details = day_details
+        forecast = by_day.get(planning_day, [0.0] * 96)
+
+        if len(inputs) == 1:
+            state = self.hass.states.get(inputs[0].entity_id)
+            conf_score, conf_reason, source, slots = self._compute_forecast_confidence(state)
+        else:
+            total_weight = sum(d["weight"] for d in details) or 1.0
+            conf_score = round(sum(d["confidence"] * d["weight"] for d in details) / total_weight, 3)
+            arrays = {d["array"] for d in details}
+            conf_reason = f"Fused {len(details)} forecast sources across {len(arrays)} array(s)"
+            source = "fused"
+            slots = sum(len(item.timeline) for item in inputs)
+
+        meta = {
+            "forecast_confidence": {"score": conf_score, "reason": conf_reason},
+            "forecast_source": source,
+            "forecast_slots_count": slots,
+            "forecast_day": planning_day.isoformat(),
+            "forecast_sources": details,
+        }
+        return forecast, planning_day, meta, by_day
     
     def _parse_price_15min(self, state) -> List[float]:
-        """Parse electricity price from sensor with today/tomorrow_hourly_prices, expand to 15-min."""
-        attrs = state.attributes or {}
-        
-        # Get tomorrow prices (for planning ahead) or fallback to today
-        prices_hourly = attrs.get("tomorrow_hourly_prices")
-        if not prices_hourly or len(prices_hourly) < 24:
-            prices_hourly = attrs.get("today_hourly_prices")
-        
-        if isinstance(prices_hourly, list) and len(prices_hourly) >= 24:
-            # Expand hourly prices to 15-min slots (each hour gets 4 identical price slots)
-            slots = []
-            for price in prices_hourly[:24]:
-                for _ in range(4):
-                    slots.append(float(price))
-            return slots[:96]
+        """Return electricity prices as 96 x 15-min values.
         
-        return [0.0] * 96
+        Planning looks ahead, so the latest day published by the sensor
+        (tomorrow when available, otherwise today) is used.
+        """
+        timeline = self._ingest.get(state, KIND_PRICE)
+        if timeline is None or timeline.is_scalar:
+            return [0.0] * 96
+        dates = timeline.dates()
+        return timeline.to_slots(96, day=dates[-1] if dates else None)
     
     def _parse_daily_load_pattern_15min(self, state) -> List[float]:
-        """Parse historical daily load pattern from sensor.house_consumption_daily."""
+        """Distribute the daily consumption total (kWh) over a typical day profile."""
         # This would ideally use historical data to predict tomorrow's consumption pattern
         # For now, use a simplified approach - could be enhanced with HA history
-        attrs = state.attributes or {}
-        
-        # If we had yesterday's hourly data, we could use it
-        # For now, return flat profile - this should be enhanced
-        try:
-            # Get total daily consumption and distribute based on typical pattern
-            total_kwh = float(state.state)
-            # Simple pattern: higher during day (6-22), lower at night
-            pattern = []
-            for hour in range(24):
-                if 6 <= hour < 22:
-                    factor = 1.2  # 20% above average during day
-                else:
-                    factor = 0.5  # 50% of average at night
-                hour_kwh = (total_kwh / 24) * factor
-                # Split into 4x 15-min slots
-                for _ in range(4):
-                    pattern.append(hour_kwh / 4)
-            return pattern[:96]
-        except Exception:
+        timeline = self._ingest.get(state, KIND_ENERGY)
+        if timeline is None:
             return [0.0] * 96
+        total_kwh = timeline.scalar
+        # Simple pattern: higher during day (6-22), lower at night
+        pattern = []
+        for hour in range(24):
+            if 6 <= hour < 22:
+                factor = 1.2  # 20% above average during day
+            else:
+                factor = 0.5  # 50% of average at night
+            hour_kwh = (total_kwh / 24) * factor
+            # Split into 4x 15-min slots
+            for _ in range(4):
+                pattern.append(hour_kwh / 4)
+        return pattern[:96]
     
     def _parse_current_load_15min(self, state) -> List[float]:
-        """Parse current load from sensor.house_consumption (in W) and create flat 15-min profile."""
-        try:
-            current_w = float(state.state)
-            current_kw = current_w / 1000.0
-            # Use current value as flat forecast for all slots
-            return [current_kw] * 96
-        except Exception:
+        """Return the load sensor as a 15-min kW profile (flat when it is a plain reading)."""
+        timeline = self._ingest.get(state, KIND_POWER)
+        if timeline is None:
             return [0.0] * 96
+        return timeline.to_slots(96)
     
     def _ml_predict_load_pattern(self, daily_load_sensor_state) -> List[float]:
         """Use machine learning (weighted averaging) to predict consumption pattern from history.
@@ -582,15 +1238,40 @@ class GWSmartCoordinator(DataUpdateCoordinator):
         
         _LOGGER.debug(f"ML history updated: {len(self._ml_history)} total patterns stored")
     
-    def _build_forecast_timestamps_15min(self, state) -> List[str]:
-        """Build list of 96 ISO timestamps for 15-min intervals (for day after tomorrow if _d2 sensor)."""
-        use_day_after_tomorrow = "_d2" in (state.entity_id or "")
+    def _sample_pv_production(self) -> bool:
+        """Feed the current PV power reading into the forecast bias corrector."""
+        pv_kw = self._read_sensor(self.config.get(CONF_PV_POWER_SENSOR), KIND_POWER)
+        if pv_kw is None:
+            return False
+        return self._pv_bias.add_production_sample(datetime.now(), pv_kw)
+
+    def _sample_grid_peak(self) -> None:
+        """Feed the current grid import reading into the monthly peak tracker."""
+        import_kw = self._read_sensor(self.config.get(CONF_GRID_IMPORT_SENSOR), KIND_POWER)
+        if import_kw is None:
+            return
+        if self._grid_peak.add_sample(datetime.now(), import_kw):
+            self._snapshot.schedule_save(self._snapshot_data, urgent=True)
+
+    def _forecast_base_date(self, state) -> date:
+        """Return the day a forecast sensor describes.
+
+        Prefers the dates of the parsed timeline; falls back to the entity
+        naming convention (today/_d0, day after tomorrow for _d2, otherwise tomorrow).
+        """
+        timeline = self._ingest.get(state, KIND_POWER)
+        if timeline is not None and not timeline.is_scalar and timeline.shape in TIMESTAMPED_SHAPES:
+            return timeline.dates()[0]
+        entity_id = state.entity_id or ""
         base_date = datetime.now().date()
-        if use_day_after_tomorrow:
-            base_date += timedelta(days=2)
-        else:
-            base_date += timedelta(days=1)
-        
+        if "_d2" in entity_id:
+            return base_date + timedelta(days=2)
+        if "today" in entity_id or "_d0" in entity_id:
+            return base_date
+        return base_date + timedelta(days=1)
+
+    def _build_timestamps_15min(self, base_date: date) -> List[str]:
+        """Build list of 96 ISO timestamps for 15-min intervals of ``base_date``."""
         timestamps = []
         for hour in range(24):
             for minute in [0, 15, 30, 45]:
@@ -598,1090 +1279,164 @@ class GWSmartCoordinator(DataUpdateCoordinator):
                 timestamps.append(dt_obj.isoformat())
         return timestamps
 
-    # ---------- OLD: hourly timestamps builder (keep for compatibility) ----------
-        """Build list of 24 ISO timestamps for the forecast day (prefer tomorrow if sensor indicates it)."""
-        # Determine whether forecast is for tomorrow:
-        try:
-            use_tomorrow = False
-            if forecast_entity_id and "tomorrow" in forecast_entity_id:
-                use_tomorrow = True
-            # sensor attributes may include key 'tomorrow' or 'date'
-            attrs = state.attributes or {}
-            if any(k for k in attrs.keys() if "tomorrow" in str(k).lower()):
-                use_tomorrow = True
-            # if forecast_hourly seems to be for next-day (heuristic: state name contains 'tomorrow' or 'd2')
-            if forecast_entity_id and ("_d2" in forecast_entity_id or "d2" in forecast_entity_id):
-                # common naming for tomorrow forecast in user's setup
-                use_tomorrow = True
-        except Exception:
-            use_tomorrow = False
-
-        base_date = (datetime.now().date() + timedelta(days=1)) if use_tomorrow else datetime.now().date()
-        timestamps = []
-        # Use local time (no timezone string); Home Assistant will display appropriately.
-        for h in range(24):
-            dt_obj = datetime.combine(base_date, dt_time(hour=h))
-            # produce ISO string with offset by using datetime.isoformat() (no explicit tz here)
-            timestamps.append(dt_obj.isoformat())
-        return timestamps
-
-    # ---------- NEW: simple forecast confidence ----------
+    # ---------- simple forecast confidence ----------
     def _compute_forecast_confidence(self, state) -> Tuple[float, str, str, int]:
         """Return (score 0..1, reason, source_label, slots_count).
 
-        Heuristic rules:
-        - If attribute 'watts' is mapping with many entries (>=48) -> high confidence.
-        - If attribute 'hourly' with 24 -> good confidence.
-        - If forecast provided as list of dicts with many slots -> good confidence.
-        - If derived from scalar total -> low confidence.
+        Heuristic rules on the parsed timeline shape:
+        - 15-min 'watts' mapping with many entries (>=48) -> high confidence.
+        - Hourly list / Wh-per-period mapping -> good confidence.
+        - Forecast list of records -> good or moderate confidence.
+        - Scalar total -> low confidence.
         """
-        attrs = state.attributes or {}
-        # check watts mapping
-        watts = attrs.get("watts")
-        if isinstance(watts, dict) and watts:
-            slots = len(watts)
-            if slots >= 96:
-                return 0.95, "Detailed 15-min PV forecast (96+ slots) -> high confidence", "watts_map", slots
-            if slots >= 48:
-                return 0.9, "Detailed 15-min PV forecast (48-95 slots) -> high confidence", "watts_map", slots
-            return 0.8, "PV timeseries available (fewer slots) -> good confidence", "watts_map", slots
-
-        # hourly list attribute
-        hourly = attrs.get("hourly") or attrs.get("hourly_kw") or attrs.get("hourly_kwh")
-        if isinstance(hourly, list) and len(hourly) >= 24:
-            return 0.85, "Hourly forecast provided (24 values) -> good confidence", "hourly_list", len(hourly)
-
-        # forecast list of dicts
-        items = attrs.get("forecast") or attrs.get("values") or attrs.get("data")
-        if isinstance(items, list) and items:
-            slots = len(items)
-            if slots >= 24:
-                return 0.8, f"Forecast list with {slots} items -> good confidence", "forecast_list", slots
-            return 0.6, f"Forecast list with {slots} items -> moderate confidence", "forecast_list", slots
-
-        # fallback - scalar
-        try:
-            total = float(state.state)
-            return 0.25, "Scalar total used for forecast -> low confidence", "scalar_total", 1
-        except Exception:
+        timeline = self._ingest.get(state, KIND_POWER)
+        if timeline is None:
             return 0.0, "No forecast data available", "none", 0
+        slots = len(timeline)
+        source = timeline.shape
 
-    # ---------- existing parse methods (unchanged) ----------
-    def _parse_forecast_sensor(self, state) -> List[float]:
-        """Normalize forecast sensor to 24 hourly kW values.
-
-        Supports attribute 'watts' mapping timestamp->W, attribute 'hourly' (list kW),
-        attribute 'forecast' list, or scalar total kWh.
-        """
-        attrs = state.attributes or {}
-        # 'watts' mapping (15min -> W)
-        watts = attrs.get("watts")
-        if isinstance(watts, dict) and watts:
-            return self._aggregate_timeseries_map_to_hourly(watts, value_in_watts=True)
-
-        # already hourly list
-        hourly = attrs.get("hourly") or attrs.get("hourly_kw") or attrs.get("hourly_kwh")
-        if isinstance(hourly, list) and len(hourly) >= 24:
-            return [round(float(x), 3) for x in hourly[:24]]
-
-        # forecast list of dicts
-        items = attrs.get("forecast") or attrs.get("values") or attrs.get("data")
-        if isinstance(items, list) and items:
-            # if it's a list of numbers
-            if all(isinstance(x, (int, float)) for x in items) and len(items) >= 24:
-                return [round(float(x), 3) for x in items[:24]]
-            # otherwise parse dict items
-            result_hour = [0.0] * 24
-            cnt = [0] * 24
-            for it in items:
-                if not isinstance(it, dict):
-                    continue
-                pe = it.get("period_end") or it.get("datetime") or it.get("time")
-                val = it.get("pv_estimate") or it.get("pv_estimate_kw") or it.get("value") or it.get("pv_estimate_w")
-                if val is None or pe is None:
-                    continue
-                try:
-                    hour = None
-                    if isinstance(pe, str):
-                        try:
-                            hour = datetime.fromisoformat(pe).hour
-                        except Exception:
-                            if len(pe) >= 13:
-                                hour = int(pe[11:13])
-                    if hour is None:
-                        continue
-                    v = float(val)
-                    if isinstance(it.get("pv_estimate_w"), (int, float)) or ("pv_estimate_w" in it):
-                        v = v / 1000.0
-                    elif v > 1000:
-                        v = v / 1000.0
-                    result_hour[hour] += v
-                    cnt[hour] += 1
-                except Exception:
-                    continue
-            out = []
-            for h in range(24):
-                if cnt[h] > 0:
-                    out.append(round(result_hour[h] / cnt[h], 3))
-                else:
-                    out.append(0.0)
-            return out
-
-        # fallback: try parse state scalar as total kWh -> distribute evenly
-        try:
-            total = float(state.state)
-            per_hour = total / 24.0
-            return [round(per_hour, 3) for _ in range(24)]
-        except Exception:
-            _LOGGER.debug("Unable to parse forecast sensor %s attributes %s", state.entity_id, list(attrs.keys()))
-            return [0.0] * 24
-
-    def _parse_price_sensor(self, state) -> List[float]:
-        """Normalize price sensor to 24 hourly currency/kWh values.
+        if source == "watts_map":
+            if slots >= 96:
+                return 0.95, "Detailed 15-min PV forecast (96+ slots) -> high confidence", source, slots
+            if slots >= 48:
+                return 0.9, "Detailed 15-min PV forecast (48-95 slots) -> high confidence", source, slots
+            return 0.8, "PV timeseries available (fewer slots) -> good confidence", source, slots
 
-        Supports attributes tomorrow_hourly_prices / today_hourly_prices list or mapping timestamp->price.
-        """
-        attrs = state.attributes or {}
-        tomorrow = attrs.get("tomorrow_hourly_prices")
-        if isinstance(tomorrow, list) and len(tomorrow) >= 24:
-            return [round(float(x), 4) for x in tomorrow[:24]]
-
-        today = attrs.get("today_hourly_prices")
-        if isinstance(today, list) and len(today) >= 24:
-            return [round(float(x), 4) for x in today[:24]]
-
-        # mapping timestamp->price
-        for keyname in ("prices", "values", "prices_map", "price_map"):
-            mapping = attrs.get(keyname)
-            if isinstance(mapping, dict) and mapping:
-                return self._aggregate_timeseries_map_to_hourly(mapping, value_in_watts=False, unit=state.attributes.get("unit_of_measurement", ""))
-
-        # forecast list of dicts with period_end + price
-        items = attrs.get("forecast") or attrs.get("data") or None
-        if isinstance(items, list) and items:
-            result_hour = [0.0] * 24
-            cnt = [0] * 24
-            unit = state.attributes.get("unit_of_measurement", "")
-            for it in items:
-                if not isinstance(it, dict):
-                    continue
-                pe = it.get("period_end") or it.get("datetime") or it.get("time")
-                val = it.get("price") or it.get("value") or it.get("price_czk")
-                if val is None or pe is None:
-                    continue
-                try:
-                    hour = None
-                    if isinstance(pe, str):
-                        try:
-                            hour = datetime.fromisoformat(pe).hour
-                        except Exception:
-                            if len(pe) >= 13:
-                                hour = int(pe[11:13])
-                    if hour is None:
-                        continue
-                    v = float(val)
-                    # convert from MWh to kWh if unit indicates
-                    if unit and ("MWh" in unit or "/MWh" in unit):
-                        v = v / 1000.0
-                    result_hour[hour] += v
-                    cnt[hour] += 1
-                except Exception:
-                    continue
-            out = []
-            for h in range(24):
-                if cnt[h] > 0:
-                    out.append(round(result_hour[h] / cnt[h], 4))
-                else:
-                    out.append(0.0)
-            return out
-
-        # 4) fallback: if state is comma-separated list or JSON array
-        try:
-            s = state.state
-            if isinstance(s, str) and s.startswith("[") and s.endswith("]"):
-                import json
-                arr = json.loads(s)
-                if isinstance(arr, list) and len(arr) >= 24:
-                    return [round(float(x), 4) for x in arr[:24]]
-        except Exception:
-            pass
-
-        _LOGGER.debug("Unable to parse price sensor %s attributes %s unit=%s", state.entity_id, list(attrs.keys()), state.attributes.get("unit_of_measurement"))
-        return [0.0] * 24
-
-    def _parse_load_sensor(self, state, entity_id: Optional[str] = None) -> List[float]:
-        """Normalize load (house consumption) sensor to 24 hourly kW values.
-
-        Supported formats:
-        - attribute 'yesterday_hourly' or 'today_hourly' as list of 24 numbers (kW or W)
-        - attribute mapping timestamp->W (15min slots) in attribute 'watts' or 'values'
-        - state as single number (current power) used as flat profile (converted to kW if likely in W)
-        - OR daily cumulative sensor (reset at midnight) — detect via 'last_reset' attribute, device_class energy, or entity_id matches
-          In that case:
-            - if yesterday_hourly attribute available => use it for full profile
-            - else if current cumulative present and time is e.g. 14:00 => distribute current cumulative evenly across passed hours
-              (this gives an immediate estimate and will be refined as new readings arrive)
-        """
-        attrs = state.attributes or {}
-
-        # 1) yesterday_hourly / today_hourly lists
-        for key in ("yesterday_hourly", "today_hourly", "today_hourly_consumption", "yesterday_hourly_consumption"):
-            arr = attrs.get(key)
-            if isinstance(arr, list) and len(arr) >= 24:
-                # detect if values are in W (large) -> convert to kW
-                try:
-                    sample = float(arr[0]) if arr else 0.0
-                    factor = 1000.0 if abs(sample) > 1000 else 1.0
-                    return [round(float(x) / factor, 3) for x in arr[:24]]
-                except Exception:
-                    continue
+        if source in ("hourly_list", "wh_period_map"):
+            return 0.85, f"Hourly forecast provided ({slots} values) -> good confidence", source, slots
 
-        # 2) mapping timestamp->value (like forecast)
-        for mapkey in ("watts", "values", "consumption", "consumption_w"):
-            mapping = attrs.get(mapkey)
-            if isinstance(mapping, dict) and mapping:
-                return self._aggregate_timeseries_map_to_hourly(mapping, value_in_watts=True)
+        if source == "scalar_total":
+            return 0.25, "Scalar total used for forecast -> low confidence", source, 1
 
-        # 3) JSON array in state
-        try:
-            s = state.state
-            if isinstance(s, str) and s.startswith("[") and s.endswith("]"):
-                import json
-                arr = json.loads(s)
-                if isinstance(arr, list) and len(arr) >= 24:
-                    sample = float(arr[0]) if arr else 0.0
-                    factor = 1000.0 if abs(sample) > 1000 else 1.0
-                    return [round(float(x) / factor, 3) for x in arr[:24]]
-        except Exception:
-            pass
-
-        # 4) detect daily cumulative sensor (resets at midnight)
-        # heuristics: presence of 'last_reset' attribute, device_class 'energy', or explicit entity name
-        last_reset = attrs.get("last_reset")
-        device_class = attrs.get("device_class") or ""
-        is_daily_cumulative = False
-        if last_reset:
-            is_daily_cumulative = True
-        if isinstance(device_class, str) and "energy" in device_class:
-            is_daily_cumulative = True
-        if entity_id and entity_id.endswith("denni_spotreba_domu"):
-            is_daily_cumulative = True
-
-        if is_daily_cumulative:
-            # If sensor provides yesterday_hourly attribute, use it
-            yesterday = attrs.get("yesterday_hourly") or attrs.get("yesterday")
-            if isinstance(yesterday, list) and len(yesterday) >= 24:
-                try:
-                    sample = float(yesterday[0]) if yesterday else 0.0
-                    factor = 1000.0 if abs(sample) > 1000 else 1.0
-                    return [round(float(x) / factor, 3) for x in yesterday[:24]]
-                except Exception:
-                    pass
-
-            # Otherwise try to estimate hourly consumption from cumulative value up to now.
-            try:
-                now = datetime.now()
-                current_val = float(state.state)
-                # if likely in Wh (large) -> convert to kWh
-                if current_val > 1000:
-                    # assume value is Wh -> convert
-                    current_val = current_val / 1000.0
-                # determine hours passed today (e.g., at 14:35 -> 14 hours completed)
-                hours_passed = now.hour  # hours fully started since midnight (0..23)
-                if hours_passed <= 0:
-                    # early in day: nothing yet -> return zeros
-                    return [0.0] * 24
-                # distribute evenly across past hours as initial estimate
-                per_hour = current_val / max(1, hours_passed)
-                hourly = [0.0] * 24
-                for h in range(hours_passed):
-                    hourly[h] = round(per_hour, 3)
-                # for future hours try to use yesterday profile if available, else leave zeros
-                # if yesterday_hourly exists, use its slice for future hours
-                if isinstance(yesterday, list) and len(yesterday) >= 24:
-                    for h in range(hours_passed, 24):
-                        try:
-                            val = float(yesterday[h])
-                            factor = 1000.0 if abs(val) > 1000 else 1.0
-                            hourly[h] = round(float(val) / factor, 3)
-                        except Exception:
-                            hourly[h] = 0.0
-                # store last cumulative for incremental updates while coordinator runs
-                today_date = datetime.now().date()
-                if self._last_daily_date != today_date:
-                    self._last_daily_date = today_date
-                    self._last_daily_cumulative = current_val
-                else:
-                    # if we have previous cumulative, compute delta since last run and add to current hour bucket
-                    if self._last_daily_cumulative is not None and current_val >= self._last_daily_cumulative:
-                        delta = current_val - self._last_daily_cumulative
-                        # add delta to current hour
-                        hourly[now.hour] = round(hourly[now.hour] + delta, 3)
-                        self._last_daily_cumulative = current_val
-                return hourly
-            except Exception:
-                _LOGGER.debug("Failed to estimate hourly from cumulative daily sensor %s", entity_id)
-
-        # 5) fallback: if state is numeric current power, assume flat profile
-        try:
-            val = float(state.state)
-            if abs(val) > 1000:
-                val = val / 1000.0
-            return [round(val, 3) for _ in range(24)]
-        except Exception:
-            _LOGGER.debug("Unable to parse load sensor %s attributes %s", state.entity_id, list(attrs.keys()))
-            return [0.0] * 24
-
-    def _aggregate_timeseries_map_to_hourly(self, mapping: Dict[str, Any], value_in_watts: bool = False, unit: str = "") -> List[float]:
-        """Aggregate a mapping timestamp->value (e.g. 15min slots) into 24 hourly values."""
-        sums = [0.0] * 24
-        counts = [0] * 24
-        for k, v in mapping.items():
-            try:
-                hour = None
-                if isinstance(k, str):
-                    try:
-                        hour = datetime.fromisoformat(k).hour
-                    except Exception:
-                        if len(k) >= 13:
-                            hour = int(k[11:13])
-                if hour is None:
-                    continue
-                val = float(v)
-                if value_in_watts:
-                    val = val / 1000.0  # W -> kW
-                else:
-                    if unit and ("MWh" in unit or "/MWh" in unit):
-                        val = val / 1000.0
-                sums[hour] += val
-                counts[hour] += 1
-            except Exception:
-                continue
+        if slots >= 24:
+            return 0.8, f"Forecast list with {slots} items -> good confidence", source, slots
+        return 0.6, f"Forecast list with {slots} items -> moderate confidence", source, slots
 
-        out = []
-        for h in range(24):
-            if counts[h] > 0:
-                out.append(round(sums[h] / counts[h], 3))
-            else:
-                out.append(0.0)
-        return out
+    def _read_initial_soc_frac(self) -> float:
+        """Return the current SOC as a fraction (0.5 when unknown).
 
-    def _apply_charging_strategy(self, prices: List[float], loads: List[float], forecast: List[float],
-                                  soc_kwh: float, target_soc_kwh: float, capacity: float,
-                                  max_charge: float, eff: float, interval_hours: float = 0.25) -> List[int]:
-        """Apply the configured charging strategy to find optimal charging slots.
-        
-        NEW v2.1.0: Supports multiple charging strategies
-        
-        Args:
-            prices: List of prices for 96 slots
-            loads: List of load forecasts for 96 slots
-            forecast: List of PV forecasts for 96 slots
-            soc_kwh: Current battery SOC in kWh
-            target_soc_kwh: Target SOC to reach in kWh
-            capacity: Battery capacity in kWh
-            max_charge: Max charging power in kW
-            eff: Charging efficiency
-            interval_hours: Duration of each slot in hours (0.25 for 15min)
-            
-        Returns:
-            List of slot indices where charging should occur based on strategy
+        The SOC estimator is used once it has a reading; before that (first
+        refresh, listener not started yet) it is seeded from the SOC sensor.
         """
-        strategy = self.config.get(CONF_CHARGING_STRATEGY, DEFAULT_CHARGING_STRATEGY)
-        current_time_slot = datetime.now().hour * 4 + (datetime.now().minute // 15)
-        
-        # Calculate energy needed
-        energy_needed = max(0, target_soc_kwh - soc_kwh)
-        if energy_needed < 0.5:
-            return []
-        
-        max_energy_per_slot = max_charge * interval_hours * eff
-        slots_needed = int((energy_needed / max_energy_per_slot) + 0.5)
-        
-        if slots_needed <= 0:
-            return []
-        
-        _LOGGER.info(f"Applying charging strategy: {strategy}, need {slots_needed} slots for {energy_needed:.2f} kWh")
-        
-        if strategy == STRATEGY_4_LOWEST:
-            # Charge in the 4 lowest priced hours (16 slots)
-            return self._strategy_n_lowest_hours(prices, current_time_slot, 4)
-        
-        elif strategy == STRATEGY_6_LOWEST:
-            # Charge in the 6 lowest priced hours (24 slots)
-            return self._strategy_n_lowest_hours(prices, current_time_slot, 6)
-        
-        elif strategy == STRATEGY_NANOGREEN_ONLY:
-            # Use only Nanogreen sensor if available
-            return self._strategy_nanogreen_only(current_time_slot)
-        
-        elif strategy == STRATEGY_PRICE_THRESHOLD:
-            # Charge whenever price is below always_charge_price
-            always_charge_price = float(self.config.get(CONF_ALWAYS_CHARGE_PRICE, DEFAULT_ALWAYS_CHARGE_PRICE))
-            return self._strategy_price_threshold(prices, current_time_slot, always_charge_price)
-        
-        elif strategy == STRATEGY_ADAPTIVE_SMART:
-            # Adaptive learning from consumption patterns
-            return self._strategy_adaptive_smart(prices, loads, forecast, current_time_slot, 
-                                                 soc_kwh, target_soc_kwh, max_charge, eff, interval_hours)
-        
-        elif strategy == STRATEGY_SOLAR_PRIORITY:
-            # Maximize solar self-consumption
-            return self._strategy_solar_priority(prices, loads, forecast, current_time_slot,
-                                                 soc_kwh, target_soc_kwh, max_charge, eff, interval_hours)
-        
-        elif strategy == STRATEGY_PEAK_SHAVING:
-            # Avoid grid during peak hours
-            return self._strategy_peak_shaving(prices, loads, forecast, current_time_slot,
-                                               soc_kwh, target_soc_kwh, max_charge, eff, interval_hours)
-        
-        elif strategy == STRATEGY_TOU_OPTIMIZED:
-            # Optimized for Time-of-Use tariffs
-            return self._strategy_tou_optimized(prices, loads, forecast, current_time_slot,
-                                                soc_kwh, target_soc_kwh, max_charge, eff, interval_hours)
-        
-        else:  # STRATEGY_DYNAMIC (default)
-            # Use the smart dynamic optimization (existing behavior)
-            return self._find_optimal_charging_slots(
-                prices, loads, forecast, soc_kwh, target_soc_kwh,
-                capacity, max_charge, eff, interval_hours
-            )
-    
-    def _strategy_n_lowest_hours(self, prices: List[float], current_slot: int, n_hours: int) -> List[int]:
-        """Strategy: Charge in N lowest priced hours within next 24 hours."""
-        n_slots = n_hours * 4  # Convert hours to 15-min slots
-        
-        # Check if full hour charging is enabled
-        full_hour_charging = self.config.get(CONF_FULL_HOUR_CHARGING, True)
-        
-        if full_hour_charging:
-            # Find N cheapest HOURS (not individual slots)
-            return self._find_n_cheapest_hours(prices, current_slot, n_hours)
-        
-        # Get all valid slots with prices
-        valid_slots = []
-        for slot in range(current_slot, min(current_slot + 96, 96)):
-            if slot < len(prices) and prices[slot] > 0:
-                valid_slots.append((slot, prices[slot]))
-        
-        if not valid_slots:
-            return []
-        
-        # Sort by price and take the N cheapest hours worth of slots
-        valid_slots.sort(key=lambda x: x[1])
-        cheapest_slots = [s for s, p in valid_slots[:n_slots]]
-        
-        _LOGGER.info(f"Strategy {n_hours} lowest hours: selected {len(cheapest_slots)} slots")
-        return sorted(cheapest_slots)
-    
-    def _find_n_cheapest_hours(self, prices: List[float], current_slot: int, n_hours: int) -> List[int]:
-        """Find N cheapest full hours (4 consecutive 15-min slots each).
-        
-        NEW v2.2.0: Ensures charging happens in full hour blocks.
-        """
-        # Calculate average price for each hour
-        hour_prices = []
-        for hour_start in range(current_slot, min(current_slot + 96, 96), 4):
-            # Get 4 slots for this hour
-            hour_slots = list(range(hour_start, min(hour_start + 4, 96)))
-            if len(hour_slots) == 4 and all(s < len(prices) for s in hour_slots):
-                # Calculate average price for this hour
-                avg_price = sum(prices[s] for s in hour_slots if prices[s] > 0) / len(hour_slots)
-                if avg_price > 0:
-                    hour_prices.append((hour_start, avg_price, hour_slots))
-        
-        if not hour_prices:
-            return []
-        
-        # Sort hours by average price
-        hour_prices.sort(key=lambda x: x[1])
-        
-        # Select N cheapest hours
-        selected_slots = []
-        for i in range(min(n_hours, len(hour_prices))):
-            hour_start, avg_price, hour_slots = hour_prices[i]
-            selected_slots.extend(hour_slots)
-            _LOGGER.debug(f"Selected hour starting at slot {hour_start} with avg price {avg_price:.2f} CZK/kWh")
-        
-        _LOGGER.info(f"Full-hour charging: selected {len(selected_slots)} slots in {min(n_hours, len(hour_prices))} cheapest hours")
-        return sorted(selected_slots)
-    
-    def _strategy_nanogreen_only(self, current_slot: int) -> List[int]:
-        """Strategy: Use only Nanogreen sensor for charging decisions."""
+        now = time.monotonic()
+        if not self._soc_estimator.initialized:
+            soc_pct = self._read_sensor(self.config.get(CONF_SOC_SENSOR), KIND_PERCENT)
+            if soc_pct is not None:
+                self._soc_estimator.add_soc(now, soc_pct)
+        soc_frac = self._soc_estimator.soc_frac(now)
+        return 0.5 if soc_frac is None else soc_frac
+
+    def _nanogreen_active(self) -> bool:
+        """Return True when the Nanogreen sensor reports a cheapest period."""
         nanogreen_sensor = self.config.get(CONF_NANOGREEN_CHEAPEST_SENSOR)
         if not nanogreen_sensor:
-            _LOGGER.warning("Nanogreen-only strategy selected but no sensor configured")
-            return []
-        
+            return False
         state = self.hass.states.get(nanogreen_sensor)
-        if state and state.state.lower() in ['on', 'true', '1']:
-            # Currently in cheapest hours - charge now
-            _LOGGER.info("Nanogreen sensor indicates cheapest hours - charging now")
-            return [current_slot]
-        
-        _LOGGER.debug("Nanogreen sensor not indicating cheapest hours")
-        return []
-    
-    def _strategy_price_threshold(self, prices: List[float], current_slot: int, threshold: float) -> List[int]:
-        """Strategy: Charge whenever price is below threshold."""
-        charging_slots = []
-        
-        for slot in range(current_slot, min(current_slot + 96, 96)):
-            if slot < len(prices) and 0 < prices[slot] < threshold:
-                charging_slots.append(slot)
-        
-        _LOGGER.info(f"Price threshold strategy: found {len(charging_slots)} slots below {threshold:.2f} CZK/kWh")
-        return charging_slots
-    
-    def _strategy_adaptive_smart(self, prices: List[float], loads: List[float], forecast: List[float],
-                                  current_slot: int, soc_kwh: float, target_soc_kwh: float,
-                                  max_charge: float, eff: float, interval_hours: float = 0.25) -> List[int]:
-        """Strategy: Adaptive Smart - learns from consumption patterns.
-        
-        This strategy uses ML patterns combined with price optimization.
-        It prioritizes charging before predicted high consumption periods.
+        return bool(state and state.state.lower() in ("on", "true", "1"))
+
+    async def _async_compute_schedule_15min(
+        self, forecast: List[float], prices: List[float], loads: List[float], timings: Dict[str, float],
+        forecast_meta: Optional[Mapping[str, Any]] = None,
+        export_prices: Optional[List[float]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Run the charging planner in the executor under the plan stage budget.
+
+        In fleet mode the run is batched with the other entries' plans (and
+        re-planned when entries sharing a connection exceed its limit).
+        Deferrable loads are placed around the battery plan in the same job.
+        Raises asyncio.TimeoutError on overrun; the planner works on its own
+        inputs, so an abandoned run cannot touch coordinator state.
         """
-        # Use the standard optimizer but with enhanced ML weighting
-        slots = self._find_optimal_charging_slots(
-            prices, loads, forecast, soc_kwh, target_soc_kwh,
-            17.0, max_charge, eff, interval_hours  # Use default capacity
+        now = datetime.now()
+        deferrable = self._get_deferrable_loads()
+        inputs = PlanInputs(
+            forecast=tuple(forecast),
+            prices=tuple(prices),
+            loads=tuple(loads),
+            current_slot=now.hour * 4 + now.minute // 15,
+            initial_soc_frac=self._read_initial_soc_frac(),
+            last_charging_state=self._last_charging_state,
+            nanogreen_active=self._nanogreen_active(),
+            monthly_peak_kw=self._grid_peak.monthly_peak_kw(now),
+            deferrable=tuple(deferrable),
+            delivered_kwh=dict(self._sample_deferrable_delivery()) if deferrable else {},
+            planned_at=now.isoformat(),
+            export_prices=tuple(export_prices or ()),
         )
-        
-        # Filter to only charge in periods with price below average
-        if len(prices) > 0:
-            avg_price = sum(p for p in prices if p > 0) / len([p for p in prices if p > 0])
-            slots = [s for s in slots if s < len(prices) and prices[s] < avg_price * 1.1]
-        
-        _LOGGER.info(f"Adaptive smart strategy: selected {len(slots)} slots based on ML patterns")
-        return slots
-    
-    def _strategy_solar_priority(self, prices: List[float], loads: List[float], forecast: List[float],
-                                  current_slot: int, soc_kwh: float, target_soc_kwh: float,
-                                  max_charge: float, eff: float, interval_hours: float = 0.25) -> List[int]:
-        """Strategy: Solar Priority - maximize solar self-consumption.
-        
-        Charges mainly when solar forecast is high and price is reasonable.
-        Avoids grid charging unless absolutely necessary.
-        """
-        charging_slots = []
-        energy_needed = max(0, target_soc_kwh - soc_kwh)
-        
-        if energy_needed < 0.5:
-            return []
-        
-        # Find slots with good solar forecast
-        solar_slots = []
-        for slot in range(current_slot, min(current_slot + 96, 96)):
-            if slot < len(forecast) and forecast[slot] > 0.5:  # Good solar production
-                solar_slots.append((slot, forecast[slot], prices[slot] if slot < len(prices) else 999.0))
-        
-        # Sort by solar forecast (descending) and price (ascending)
-        solar_slots.sort(key=lambda x: (-x[1], x[2]))
-        
-        # Select slots until we have enough energy
-        max_energy_per_slot = max_charge * interval_hours * eff
-        slots_needed = int((energy_needed / max_energy_per_slot) + 0.5)
-        
-        for slot, solar, price in solar_slots[:slots_needed]:
-            charging_slots.append(slot)
-        
-        _LOGGER.info(f"Solar priority strategy: selected {len(charging_slots)} slots with good solar forecast")
-        return sorted(charging_slots)
-    
-    def _strategy_peak_shaving(self, prices: List[float], loads: List[float], forecast: List[float],
-                                current_slot: int, soc_kwh: float, target_soc_kwh: float,
-                                max_charge: float, eff: float, interval_hours: float = 0.25) -> List[int]:
-        """Strategy: Peak Shaving - avoid grid during peak hours.
-        
-        Ensures battery is charged before peak consumption hours.
-        Prioritizes charging during lowest price periods outside peak.
-        """
-        charging_slots = []
-        energy_needed = max(0, target_soc_kwh - soc_kwh)
-        
-        if energy_needed < 0.5:
-            return []
-        
-        # Define peak hours (typically 17-21, configurable via critical hours)
-        peak_start = self.config.get(CONF_CRITICAL_HOURS_START, DEFAULT_CRITICAL_HOURS_START)
-        peak_end = self.config.get(CONF_CRITICAL_HOURS_END, DEFAULT_CRITICAL_HOURS_END)
-        
-        # Find slots outside peak hours with good prices
-        off_peak_slots = []
-        for slot in range(current_slot, min(current_slot + 96, 96)):
-            hour = (slot // 4) % 24
-            if hour < peak_start or hour >= peak_end:  # Outside peak
-                if slot < len(prices) and prices[slot] > 0:
-                    off_peak_slots.append((slot, prices[slot]))
-        
-        # Sort by price and select cheapest
-        off_peak_slots.sort(key=lambda x: x[1])
-        
-        max_energy_per_slot = max_charge * interval_hours * eff
-        slots_needed = int((energy_needed / max_energy_per_slot) + 0.5)
-        
-        for slot, price in off_peak_slots[:slots_needed]:
-            charging_slots.append(slot)
-        
-        _LOGGER.info(f"Peak shaving strategy: selected {len(charging_slots)} off-peak slots")
-        return sorted(charging_slots)
-    
-    def _strategy_tou_optimized(self, prices: List[float], loads: List[float], forecast: List[float],
-                                 current_slot: int, soc_kwh: float, target_soc_kwh: float,
-                                 max_charge: float, eff: float, interval_hours: float = 0.25) -> List[int]:
-        """Strategy: Time-of-Use Optimized - for TOU tariffs.
-        
-        Optimized for time-of-use tariffs with distinct price tiers.
-        Charges only during lowest tier and avoids high-price periods.
-        """
-        charging_slots = []
-        energy_needed = max(0, target_soc_kwh - soc_kwh)
-        
-        if energy_needed < 0.5:
-            return []
-        
-        # Identify price tiers
-        valid_prices = [p for p in prices if p > 0]
-        if not valid_prices:
-            return []
-        
-        # Assume TOU has 2-3 tiers, find the lowest tier
-        min_price = min(valid_prices)
-        max_price = max(valid_prices)
-        
-        # Low tier = bottom 40% of price range
-        low_tier_threshold = min_price + (max_price - min_price) * 0.4
-        
-        # Find all slots in low tier
-        low_tier_slots = []
-        for slot in range(current_slot, min(current_slot + 96, 96)):
-            if slot < len(prices) and 0 < prices[slot] <= low_tier_threshold:
-                low_tier_slots.append((slot, prices[slot]))
-        
-        # Sort by price within low tier
-        low_tier_slots.sort(key=lambda x: x[1])
-        
-        max_energy_per_slot = max_charge * interval_hours * eff
-        slots_needed = int((energy_needed / max_energy_per_slot) + 0.5)
-        
-        for slot, price in low_tier_slots[:slots_needed]:
-            charging_slots.append(slot)
-        
-        _LOGGER.info(f"TOU optimized strategy: selected {len(charging_slots)} low-tier slots (threshold: {low_tier_threshold:.2f} CZK/kWh)")
-        return sorted(charging_slots)
-
-    def _find_optimal_charging_slots(self, prices: List[float], loads: List[float], forecast: List[float],
-                                     soc_kwh: float, target_soc_kwh: float, capacity: float,
-                                     max_charge: float, eff: float, interval_hours: float = 0.25) -> List[int]:
-        """Find optimal charging slots considering price trends and energy needs.
-        
-        ENHANCED v2.1.0: Improved 12-hour lookahead to find absolute lowest prices.
-        
-        Args:
-            prices: List of prices for 96 slots
-            loads: List of load forecasts for 96 slots
-            forecast: List of PV forecasts for 96 slots
-            soc_kwh: Current battery SOC in kWh
-            target_soc_kwh: Target SOC to reach in kWh
-            capacity: Battery capacity in kWh
-            max_charge: Max charging power in kW
-            eff: Charging efficiency
-            interval_hours: Duration of each slot in hours (0.25 for 15min)
-            
-        Returns:
-            List of slot indices where charging should occur
-        """
-        # Calculate energy deficit that needs to be covered by grid charging
-        energy_needed = max(0, target_soc_kwh - soc_kwh)
-        
-        if energy_needed < 0.5:  # Less than 0.5 kWh needed, no charging
-            return []
-        
-        # Calculate how many slots we need to charge
-        max_energy_per_slot = max_charge * interval_hours * eff
-        slots_needed = int((energy_needed / max_energy_per_slot) + 0.5)
-        
-        if slots_needed <= 0:
-            return []
-        
-        # Find charging windows with price trend analysis
-        charging_slots = []
-        
-        # Group prices into windows and find decreasing trends
-        current_time_slot = datetime.now().hour * 4 + (datetime.now().minute // 15)
-        
-        # ENHANCED v2.1.0: Look ahead for next 12 hours (48 slots) specifically
-        lookahead_slots = 48  # 12 hours * 4 slots/hour
-        valid_slots = []
-        for slot in range(current_time_slot, min(current_time_slot + lookahead_slots, 96)):
-            price = prices[slot] if slot < len(prices) else 999.0
-            if price > 0:  # Valid price
-                valid_slots.append((slot, price))
-        
-        if not valid_slots:
-            return []
-        
-        # Sort by price to find absolute cheapest slots
-        valid_slots.sort(key=lambda x: x[1])
-        
-        # ENHANCED v2.1.0: Improved decreasing price trend detection
-        # Check if prices are decreasing by comparing current vs future averages
-        is_decreasing_trend = False
-        prices_later = False
-        
-        if len(valid_slots) >= 8:  # Need at least 2 hours of data
-            # Get current price (first available slot)
-            current_price = prices[current_time_slot] if current_time_slot < len(prices) else valid_slots[0][1]
-            
-            # Calculate average of cheapest slots in the 12-hour window
-            num_cheap_slots = min(slots_needed * 2, len(valid_slots) // 2)
-            cheapest_avg = sum(p for _, p in valid_slots[:num_cheap_slots]) / num_cheap_slots if num_cheap_slots > 0 else current_price
-            
-            # Calculate when the cheapest slots occur (early vs late in window)
-            cheapest_slot_times = [s for s, p in valid_slots[:num_cheap_slots]]
-            avg_cheapest_time = sum(cheapest_slot_times) / len(cheapest_slot_times) if cheapest_slot_times else current_time_slot
-            
-            is_decreasing_trend = cheapest_avg < current_price * 0.90  # Prices will drop by at least 10%
-            prices_later = avg_cheapest_time > current_time_slot + 4  # Cheapest prices are at least 1 hour away
-            
-            if is_decreasing_trend and prices_later:
-                _LOGGER.info(
-                    f"Detected decreasing price trend: current={current_price:.2f}, "
-                    f"cheapest_avg={cheapest_avg:.2f} - waiting for absolute minimum prices"
-                )
-                # Wait for the absolute cheapest slots within the 12-hour window
-                # Take only the absolutely cheapest slots needed
-                cheapest_slots = [s for s, p in valid_slots[:slots_needed]]
-            else:
-                # Normal case: take cheapest available slots but prefer sooner if prices are similar
-                # This prevents waiting unnecessarily if prices aren't significantly different
-                _LOGGER.info(f"No significant decreasing trend - charging at earliest cheap slots")
-                cheapest_slots = [s for s, p in valid_slots[:slots_needed]]
-        else:
-            # Not enough data - just take cheapest available
-            cheapest_slots = [s for s, p in valid_slots[:slots_needed]]
-        
-        # Verify slots are within reasonable time window
-        # For decreasing trend, allow waiting up to 12 hours
-        # For normal case, prefer within 8 hours
-        max_wait_slots = lookahead_slots if is_decreasing_trend and prices_later else 32  # 12 or 8 hours
-        filtered_slots = [s for s in cheapest_slots if s <= current_time_slot + max_wait_slots]
-        
-        if not filtered_slots and cheapest_slots:
-            # If all slots are too far, take at least the closest cheapest one
-            filtered_slots = sorted(cheapest_slots)[:max(1, slots_needed // 2)]
-        
-        return sorted(filtered_slots)
-    
-    def _compute_schedule_15min(self, forecast: List[float], prices: List[float], loads: List[float]) -> List[Dict[str, Any]]:
-        """Compute optimized 15-min charging schedule with hysteresis and critical hours support.
-        
-        Returns list[96] with dicts for each 15-min slot:
-        { slot, time, mode, pv_power_kW, load_kW, net_pv_kW, price_czk_kwh, 
-          planned_charge_kW, soc_kwh_end, soc_pct_end, should_charge }
-        
-        Logic (ENHANCED v1.9.5):
-        1. Always use solar energy first (self-consumption priority)
-        2. Find optimal charging windows considering price trends (NEW)
-        3. Wait for cheapest prices in decreasing trend scenarios (NEW)
-        4. Charge from grid only when price is below threshold AND battery needs charging
-        5. Never charge if price above never_charge_price threshold
-        6. Always charge if price below always_charge_price AND battery below target
-        7. Respect min/max SOC limits
-        8. Consider solar forecast to avoid charging from grid if solar will cover needs
-        9. Apply hysteresis to prevent rapid switching near price thresholds
-        10. Maintain higher SOC during critical hours
-        """
-        # Read config params
-        capacity = float(self.config.get(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY))
-        max_charge = float(self.config.get(CONF_MAX_CHARGE_POWER, DEFAULT_MAX_CHARGE_POWER))
-        eff = float(self.config.get(CONF_CHARGE_EFFICIENCY, DEFAULT_CHARGE_EFFICIENCY))
-        
-        min_soc_pct = float(self.config.get(CONF_MIN_SOC, DEFAULT_MIN_SOC))
-        max_soc_pct = float(self.config.get(CONF_MAX_SOC, DEFAULT_MAX_SOC))
-        target_soc_pct = float(self.config.get(CONF_TARGET_SOC, DEFAULT_TARGET_SOC))
-        
-        always_charge_price = float(self.config.get(CONF_ALWAYS_CHARGE_PRICE, DEFAULT_ALWAYS_CHARGE_PRICE))
-        never_charge_price = float(self.config.get(CONF_NEVER_CHARGE_PRICE, DEFAULT_NEVER_CHARGE_PRICE))
-        hysteresis_pct = float(self.config.get(CONF_PRICE_HYSTERESIS, DEFAULT_PRICE_HYSTERESIS))
-        
-        # Critical hours configuration
-        critical_start = int(self.config.get(CONF_CRITICAL_HOURS_START, DEFAULT_CRITICAL_HOURS_START))
-        critical_end = int(self.config.get(CONF_CRITICAL_HOURS_END, DEFAULT_CRITICAL_HOURS_END))
-        critical_soc_pct = float(self.config.get(CONF_CRITICAL_HOURS_SOC, DEFAULT_CRITICAL_HOURS_SOC))
-        
-        # Calculate hysteresis bands
-        hysteresis_factor = hysteresis_pct / 100.0
-        if self._last_charging_state:
-            # If we were charging, make it harder to stop (upper band)
-            always_charge_threshold = always_charge_price * (1 + hysteresis_factor)
-            never_charge_threshold = never_charge_price * (1 + hysteresis_factor)
-        else:
-            # If we were not charging, make it harder to start (lower band)
-            always_charge_threshold = always_charge_price * (1 - hysteresis_factor)
-            never_charge_threshold = never_charge_price * (1 - hysteresis_factor)
+        previous_inputs, self._plan_inputs = self._plan_inputs, inputs
+        planner = inputs.planner(dict(self.config))
+        planner.uncertainty = self._uncertainty(forecast_meta or {})
+        planner.optimizer_budget_s = float(self.config.get(CONF_OPTIMIZER_BUDGET, DEFAULT_OPTIMIZER_BUDGET) or 0.0)
+        if planner.optimizer_budget_s > 0 and previous_inputs is not None \
+                and previous_inputs.planned_at[:10] == inputs.planned_at[:10]:
+            # Warm start from the previous cycle's plan of the same day (slots are times of day)
+            previous_schedule = (self._last_good_data or {}).get("schedule") or []
+            planner.warm_start = grid_charge_profile(previous_schedule, inputs.current_slot) if previous_schedule else None
+        started = time.monotonic()
+        try:
+            schedule, self._deferrable_plan = await asyncio.wait_for(
+                self._async_run_planner(planner, *inputs.args()),
+                STAGE_BUDGETS["plan"] + planner.search_budget_s,
+            )
+        except asyncio.TimeoutError:
+            self._refresh_stats["overruns"]["plan"] = self._refresh_stats["overruns"].get("plan", 0) + 1
+            raise
+        finally:
+            timings["plan"] = round(time.monotonic() - started, 3)
+        self._last_charging_state = planner.last_charging_state
+        self._site_import = {**planner.import_summary(schedule), "monthly_peak": self._grid_peak.summary()}
+        self._battery_wear = schedule_wear(WearModel.from_config(self.config), schedule, planner.current_slot)
+        self._fleet_allocation = planner.fleet_allocation
+        self._stochastic = planner.stochastic
+        self._optimization = planner.optimization
+        return schedule
 
-        # Get initial SOC
-        initial_soc_frac = 0.5  # default 50%
-        soc_sensor = self.config.get(CONF_SOC_SENSOR)
-        if soc_sensor:
-            st = self.hass.states.get(soc_sensor)
-            if st:
-                try:
-                    val = float(st.state)
-                    initial_soc_frac = max(0.0, min(1.0, val / 100.0))
-                except Exception:
-                    pass
-
-        soc_kwh = capacity * initial_soc_frac
-        min_soc_kwh = capacity * (min_soc_pct / 100.0)
-        max_soc_kwh = capacity * (max_soc_pct / 100.0)
-        target_soc_kwh = capacity * (target_soc_pct / 100.0)
-        critical_soc_kwh = capacity * (critical_soc_pct / 100.0)
-
-        schedule: List[Dict[str, Any]] = []
-        current_should_charge = False
-        
-        # ENHANCED v2.1.0: Pre-compute optimal charging slots using configured strategy
-        optimal_charging_slots = self._apply_charging_strategy(
-            prices, loads, forecast, soc_kwh, target_soc_kwh, 
-            capacity, max_charge, eff, interval_hours=0.25
+    def _stochastic_summary(self) -> Optional[Dict[str, Any]]:
+        """Return the last stochastic plan selection, or why stochastic planning is not running."""
+        if self._stochastic is None and self.config.get(CONF_STOCHASTIC_PLANNING, DEFAULT_STOCHASTIC_PLANNING) \
+                and not stochastic_available():
+            return {"available": False, "reason": "NumPy is not installed; the forecast is planned as is"}
+        return self._stochastic
+
+    def _uncertainty(self, forecast_meta: Mapping[str, Any]) -> Optional[Dict[str, float]]:
+        """Return the planner's forecast uncertainty settings in stochastic mode, else None."""
+        if not self.config.get(CONF_STOCHASTIC_PLANNING, DEFAULT_STOCHASTIC_PLANNING):
+            return None
+        if not stochastic_available():
+            if not self._stochastic_warned:
+                _LOGGER.warning("Stochastic planning needs NumPy, which is not installed; planning the forecast as is")
+                self._stochastic_warned = True
+            return None
+        return uncertainty_settings(
+            (forecast_meta.get("forecast_confidence") or {}).get("score"),
+            [source.get("historical_error") for source in forecast_meta.get("forecast_sources") or []],
+            float(self.config.get(CONF_SHORTFALL_RISK, DEFAULT_SHORTFALL_RISK)),
         )
-        _LOGGER.debug(f"Optimal charging slots identified: {optimal_charging_slots}")
-        
-        # First pass: identify cheap charging opportunities and solar surplus
-        for slot in range(96):
-            pv_kw = float(forecast[slot]) if slot < len(forecast) else 0.0
-            price = float(prices[slot]) if slot < len(prices) else 0.0
-            load_kw = float(loads[slot]) if slot < len(loads) else 0.0
-            
-            # 15-min interval = 0.25 hours
-            interval_hours = 0.25
-            
-            # Calculate time for this slot
-            hour = slot // 4
-            minute = (slot % 4) * 15
-            
-            # Check if in critical hours
-            is_critical_hour = False
-            if critical_start <= critical_end:
-                is_critical_hour = critical_start <= hour < critical_end
-            else:  # Crosses midnight
-                is_critical_hour = hour >= critical_start or hour < critical_end
-            
-            # Adjust target SOC for critical hours
-            effective_target_soc_kwh = critical_soc_kwh if is_critical_hour else target_soc_kwh
-            
-            # Net solar after house consumption
-            net_pv_kw = pv_kw - load_kw
-            
-            mode = "idle"
-            planned_charge_kw = 0.0
-            should_charge = False
-            
-            # Priority 1: Use surplus solar for charging
-            if net_pv_kw > 0.05:
-                # Can charge from solar surplus
-                available_charge_kw = min(net_pv_kw, max_charge)
-                capacity_left_kwh = max_soc_kwh - soc_kwh
-                max_charge_this_slot_kwh = available_charge_kw * interval_hours
-                
-                if capacity_left_kwh > 0.01:
-                    charge_kwh = min(max_charge_this_slot_kwh, capacity_left_kwh)
-                    stored_kwh = charge_kwh * eff
-                    soc_kwh += stored_kwh
-                    planned_charge_kw = charge_kwh / interval_hours
-                    mode = "solar_charge"
-                    should_charge = False  # No grid charging needed
-            
-            # Priority 2: Discharge to cover load (battery -> house)
-            elif load_kw > pv_kw and soc_kwh > min_soc_kwh:
-                deficit_kw = load_kw - pv_kw
-                available_discharge_kwh = soc_kwh - min_soc_kwh
-                max_discharge_this_slot_kw = min(deficit_kw, max_charge)
-                discharge_kwh = min(max_discharge_this_slot_kw * interval_hours, available_discharge_kwh)
-                
-                soc_kwh -= discharge_kwh / eff
-                planned_charge_kw = -(discharge_kwh / interval_hours)  # Negative = discharge
-                mode = "battery_discharge"
-                should_charge = False
-            
-            # Priority 3: Grid charging based on price thresholds with hysteresis
-            # NEW v1.9.5: Use optimal slot selection for grid charging
-            if soc_kwh < effective_target_soc_kwh:
-                # Check if this slot is in optimal charging slots (NEW v1.9.5)
-                is_optimal_slot = slot in optimal_charging_slots
-                
-                # Check price conditions with hysteresis
-                if price > 0:
-                    if price <= always_charge_threshold:
-                        # Very cheap - always charge
-                        capacity_left_kwh = max_soc_kwh - soc_kwh
-                        if capacity_left_kwh > 0.01:
-                            charge_kw = min(max_charge, capacity_left_kwh / interval_hours)
-                            charge_kwh = charge_kw * interval_hours
-                            stored_kwh = charge_kwh * eff
-                            soc_kwh += stored_kwh
-                            planned_charge_kw = charge_kw
-                            mode = "grid_charge_cheap"
-                            should_charge = True
-                            current_should_charge = True
-                    
-                    elif price < never_charge_threshold and is_optimal_slot:
-                        # NEW v1.9.5: Only charge in optimal slots (not just any cheap slot)
-                        # This implements "wait for cheapest price" logic
-                        capacity_left_kwh = max_soc_kwh - soc_kwh
-                        if capacity_left_kwh > 0.01:
-                            charge_kw = min(max_charge, capacity_left_kwh / interval_hours)
-                            charge_kwh = charge_kw * interval_hours
-                            stored_kwh = charge_kwh * eff
-                            soc_kwh += stored_kwh
-                            planned_charge_kw = charge_kw
-                            mode = "grid_charge_optimal" if not is_critical_hour else "grid_charge_critical"
-                            should_charge = True
-                            current_should_charge = True
-                            
-                            _LOGGER.debug(
-                                f"Grid charging optimal slot {slot}: price={price:.2f}, "
-                                f"is_optimal={is_optimal_slot}, "
-                                f"charging={charge_kwh:.2f} kWh"
-                            )
-            
-            # Ensure SOC stays within bounds
-            soc_kwh = max(min_soc_kwh, min(max_soc_kwh, soc_kwh))
-            soc_pct = (soc_kwh / capacity) * 100.0
-            
-            # Update charging state for next iteration's hysteresis
-            if should_charge:
-                self._last_charging_state = True
-            
-            # Time calculation
-            hour = slot // 4
-            minute = (slot % 4) * 15
-            time_str = f"{hour:02d}:{minute:02d}"
-            
-            schedule.append({
-                "slot": slot,
-                "time": time_str,
-                "mode": mode,
-                "pv_power_kW": round(pv_kw, 3),
-                "load_kW": round(load_kw, 3),
-                "net_pv_kW": round(net_pv_kw, 3),
-                "price_czk_kwh": round(price, 4),
-                "planned_charge_kW": round(planned_charge_kw, 3),
-                "soc_kwh_end": round(soc_kwh, 3),
-                "soc_pct_end": round(soc_pct, 2),
-                "should_charge": should_charge,
-                "is_critical_hour": is_critical_hour,
-            })
-        
-        # Update final charging state after all slots computed
-        if schedule:
-            self._last_charging_state = schedule[-1].get("should_charge", False)
-        
-        return schedule
 
-    def _compute_schedule(self, forecast: List[float], prices: List[float], loads: List[float]) -> List[Dict[str, Any]]:
-        """Compute a simple hourly plan that includes house load.
+    def _async_run_planner(self, planner: ChargingPlanner, *args: Any) -> Any:
+        """Run ``planner.compute_plan`` in the fleet batch, the worker or its own executor job.
 
-        Returns list[24] with dicts:
-        { hour, mode, pv_power_kW, load_kW, net_pv_kW, price_czk_kwh, planned_power_kW, soc_kwh_end, soc_pct_end }
+        The fleet gets the planner itself so it can re-plan entries sharing
+        a grid connection with their allocation; it sends the plan to the
+        entry's worker when one is configured.
         """
-        # Read config params
-        capacity = float(self.config.get(CONF_BATTERY_CAPACITY, 17.0))  # kWh
-        max_charge = float(self.config.get(CONF_MAX_CHARGE_POWER, 3.7))  # kW
-        eff = float(self.config.get(CONF_CHARGE_EFFICIENCY, 0.95))
-        min_reserve_pct = float(self.config.get(CONF_MIN_RESERVE, 10.0)) / 100.0
-
-        # initial SOC: from configured SOC sensor if present
-        initial_soc_frac = 0.5  # default 50%
-        soc_sensor = self.config.get(CONF_SOC_SENSOR)
-        if soc_sensor:
-            st = self.hass.states.get(soc_sensor)
-            if st:
-                try:
-                    val = float(st.state)
-                    if val > 1.0:
-                        initial_soc_frac = max(0.0, min(1.0, val / 100.0))
-                    else:
-                        initial_soc_frac = max(0.0, min(1.0, val))
-                except Exception:
-                    pass
-
-        soc_kwh = capacity * initial_soc_frac
-        min_reserve_kwh = capacity * min_reserve_pct
-
-        # compute price threshold (25th percentile) for "cheap" hours
-        sorted_prices = sorted([p for p in prices if p and p > 0.0])
-        if sorted_prices:
-            idx = max(0, int(len(sorted_prices) * 0.25) - 1)
-            price_threshold = sorted_prices[idx]
-        else:
-            price_threshold = 0.0
-
-        schedule: List[Dict[str, Any]] = []
-        for h in range(24):
-            pv = float(forecast[h]) if h < len(forecast) else 0.0
-            price = float(prices[h]) if h < len(prices) else 0.0
-            load = float(loads[h]) if h < len(loads) else 0.0
-
-            # net PV available for charging after household consumption
-            net_pv = pv - load  # kW (positive = surplus, negative = deficit)
-
-            mode = "idle"
-            planned_power = 0.0  # positive = charge into battery, negative = discharge to supply home/grid
-            # Use surplus PV first for charging (self-consumption)
-            if net_pv > 0.05:
-                # can use net_pv up to max_charge to charge battery
-                charge_power = min(net_pv, max_charge)
-                # limit to capacity remaining (kWh)
-                capacity_left_kwh = capacity - soc_kwh
-                max_possible_charge = capacity_left_kwh  # over 1 hour
-                charge_power = min(charge_power, max_possible_charge)
-                stored_kwh = charge_power * eff
-                soc_kwh += stored_kwh
-                planned_power = charge_power
-                mode = "pv"
-            else:
-                # no surplus PV: consider discharging to cover home load (to avoid grid import)
-                capacity_above_reserve = soc_kwh - min_reserve_kwh
-                if capacity_above_reserve > 0.1:
-                    discharge_power = min(max_charge, load, capacity_above_reserve)
-                    soc_kwh -= discharge_power / eff
-                    planned_power = -discharge_power
-                    mode = "battery"
-                else:
-                    # If price is cheap and battery has space, charge from grid
-                    capacity_left_kwh = capacity - soc_kwh
-                    if price_threshold > 0 and price > 0 and price <= price_threshold and capacity_left_kwh > 0.01:
-                        charge_power = min(max_charge, capacity_left_kwh)
-                        stored_kwh = charge_power * eff
-                        soc_kwh += stored_kwh
-                        planned_power = charge_power
-                        mode = "grid"
-                    else:
-                        mode = "idle"
-                        planned_power = 0.0
-
-            soc_kwh = max(0.0, min(capacity, soc_kwh))
-            soc_pct = round((soc_kwh / capacity) * 100.0, 2)
-
-            schedule.append({
-                "hour": h,
-                "mode": mode,
-                "pv_power_kW": round(pv, 3),
-                "load_kW": round(load, 3),
-                "net_pv_kW": round(net_pv, 3),
-                "price_czk_kwh": round(price, 4),
-                "planned_power_kW": round(planned_power, 3),
-                "soc_kwh_end": round(soc_kwh, 3),
-                "soc_pct_end": soc_pct,
-            })
-
-        return schedule
+        if self.fleet is not None:
+            return self.fleet.async_plan(self.entry.entry_id, planner, *args)
+        if self._worker is not None:
+            return self._async_plan_in_worker(self._worker, planner, *args)
+        return self.hass.async_add_executor_job(planner.compute_plan, *args)
+
+    async def _async_plan_in_worker(self, worker: PlannerWorkerClient, planner: ChargingPlanner, *args: Any) -> Any:
+        """Plan in the worker process; plan in the executor when it does not answer in time."""
+        try:
+            return await worker.async_plan(planner, *args)
+        except WorkerUnavailable as err:
+            _LOGGER.debug("Planner worker unavailable (%s), planning in-process", err)
+            worker.record_fallback()
+            return await self.hass.async_add_executor_job(planner.compute_plan, *args)
 
     def _get_battery_metrics(self) -> Dict[str, Any]:
-        """Get real-time battery metrics with W to kWh conversion.
+        """Get real-time battery metrics, converted by each sensor's unit.
         
         Returns battery power, state of charge, and today's charge/discharge.
         Note: battery_power is positive when discharging, negative when charging.
@@ -1703,62 +1458,47 @@ class GWSmartCoordinator(DataUpdateCoordinator):
             "today_discharge_kwh": 0.0,
         }
         
-        # Get battery power (W) - positive = discharge, negative = charge
-        if battery_power_sensor:
-            state = self.hass.states.get(battery_power_sensor)
-            if state:
-                try:
-                    power_w = float(state.state)
-                    metrics["battery_power_w"] = power_w
-                    metrics["battery_power_kw"] = round(power_w / 1000.0, 3)
-                    if power_w > 10:
-                        metrics["battery_status"] = "discharging"
-                    elif power_w < -10:
-                        metrics["battery_status"] = "charging"
-                    else:
-                        metrics["battery_status"] = "idle"
-                except (ValueError, TypeError):
-                    pass
+        # Get battery power - positive = discharge, negative = charge
+        power_kw = self._read_sensor(battery_power_sensor, KIND_POWER)
+        if power_kw is not None:
+            power_w = power_kw * 1000.0
+            metrics["battery_power_w"] = round(power_w, 1)
+            metrics["battery_power_kw"] = round(power_kw, 3)
+            if power_w > 10:
+                metrics["battery_status"] = "discharging"
+            elif power_w < -10:
+                metrics["battery_status"] = "charging"
+            else:
+                metrics["battery_status"] = "idle"
         
         # Get SOC (%)
-        if soc_sensor:
-            state = self.hass.states.get(soc_sensor)
-            if state:
-                try:
-                    soc_pct = float(state.state)
-                    metrics["soc_pct"] = soc_pct
-                    # Calculate kWh from percentage
-                    capacity = float(self.config.get(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY))
-                    metrics["soc_kwh"] = round((soc_pct / 100.0) * capacity, 3)
-                except (ValueError, TypeError):
-                    pass
-        
-        # Get today's charge (kWh)
-        if today_charge_sensor:
-            state = self.hass.states.get(today_charge_sensor)
-            if state:
-                try:
-                    metrics["today_charge_kwh"] = round(float(state.state), 3)
-                except (ValueError, TypeError):
-                    pass
-        
-        # Get today's discharge (kWh)
-        if today_discharge_sensor:
-            state = self.hass.states.get(today_discharge_sensor)
-            if state:
-                try:
-                    metrics["today_discharge_kwh"] = round(float(state.state), 3)
-                except (ValueError, TypeError):
-                    pass
+        soc_pct = self._read_sensor(soc_sensor, KIND_PERCENT)
+        if soc_pct is not None:
+            metrics["soc_pct"] = soc_pct
+            # Calculate kWh from percentage
+            capacity = float(self.config.get(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY))
+            metrics["soc_kwh"] = round((soc_pct / 100.0) * capacity, 3)
+        
+        # Get today's charge and discharge (kWh)
+        charge_kwh = self._read_sensor(today_charge_sensor, KIND_ENERGY)
+        if charge_kwh is not None:
+            metrics["today_charge_kwh"] = round(charge_kwh, 3)
+        discharge_kwh = self._read_sensor(today_discharge_sensor, KIND_ENERGY)
+        if discharge_kwh is not None:
+            metrics["today_discharge_kwh"] = round(discharge_kwh, 3)
         
         return metrics
+
+    def _read_sensor(self, entity_id: Optional[str], kind: str) -> Optional[float]:
+        """Return the current reading of a configured sensor in the unit of ``kind``, None if unavailable."""
+        state = self.hass.states.get(entity_id) if entity_id else None
+        return read_scalar(state, kind) if state else None
     
     def _get_grid_metrics(self) -> Dict[str, Any]:
-        """Get real-time grid import metrics with W to kWh conversion."""
+        """Get real-time grid import, house load and PV power, converted by each sensor's unit."""
         grid_import_sensor = self.config.get(CONF_GRID_IMPORT_SENSOR)
         load_sensor = self.config.get(CONF_LOAD_SENSOR)
         
-        from .const import CONF_PV_POWER_SENSOR
         pv_power_sensor = self.config.get(CONF_PV_POWER_SENSOR)
         
         metrics = {
@@ -1770,37 +1510,11 @@ class GWSmartCoordinator(DataUpdateCoordinator):
             "pv_power_kw": 0.0,
         }
         
-        # Get grid import (W)
-        if grid_import_sensor:
-            state = self.hass.states.get(grid_import_sensor)
-            if state:
-                try:
-                    import_w = float(state.state)
-                    metrics["grid_import_w"] = import_w
-                    metrics["grid_import_kw"] = round(import_w / 1000.0, 3)
-                except (ValueError, TypeError):
-                    pass
-        
-        # Get house load (W)
-        if load_sensor:
-            state = self.hass.states.get(load_sensor)
-            if state:
-                try:
-                    load_w = float(state.state)
-                    metrics["house_load_w"] = load_w
-                    metrics["house_load_kw"] = round(load_w / 1000.0, 3)
-                except (ValueError, TypeError):
-                    pass
-        
-        # Get PV power (W)
-        if pv_power_sensor:
-            state = self.hass.states.get(pv_power_sensor)
-            if state:
-                try:
-                    pv_w = float(state.state)
-                    metrics["pv_power_w"] = pv_w
-                    metrics["pv_power_kw"] = round(pv_w / 1000.0, 3)
-                except (ValueError, TypeError):
-                    pass
+        for sensor, name in ((grid_import_sensor, "grid_import"), (load_sensor, "house_load"),
+                             (pv_power_sensor, "pv_power")):
+            power_kw = self._read_sensor(sensor, KIND_POWER)
+            if power_kw is not None:
+                metrics[f"{name}_w"] = round(power_kw * 1000.0, 1)
+                metrics[f"{name}_kw"] = round(power_kw, 3)
         
         return metrics
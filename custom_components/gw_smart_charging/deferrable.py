@@ -0,0 +1,162 @@
+"""Deferrable-load scheduling for the additional switches.
+
+A deferrable load (boiler, pool pump, dishwasher socket) needs a given amount
+of energy per day at a fixed power, somewhere between an earliest start and a
+deadline.  The option is a ``;``- or newline-separated list of::
+
+    switch.boiler: 2.0 kW, 3 kWh, 06:00-20:00
+
+Loads are placed after the battery plan, into the cheapest feasible 15-minute
+slots, without pushing the site above its power cap:
+
+- loads are served tightest-first (fewest spare slots in the window, then
+  highest power), so flexible loads do not take the only slots a constrained
+  one can use;
+- a slot costs the grid price for the part of the load not covered by PV
+  surplus left after the battery and the loads placed before, plus the
+  capacity tariff for any import above the planned monthly peak;
+- the slot capacity is the site import cap minus the planned import of the
+  house, the battery and the loads placed before.
+
+Each load is O(W log W) for a window of W slots, so dozens of loads take well
+under a millisecond per refresh.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+from .peak import slot_net_import_kw
+
+_LOGGER = logging.getLogger(__name__)
+
+SLOTS_PER_DAY = 96
+SLOT_HOURS = 0.25
+
+_SPEC_RE = re.compile(
+    r"^\s*(?P<entity>[\w.]+)\s*[:=]\s*"
+    r"(?P<power>[\d.]+)\s*kW\s*,\s*"
+    r"(?P<energy>[\d.]+)\s*kWh"
+    r"(?:\s*,\s*(?P<start>\d{1,2}:\d{2})\s*-\s*(?P<end>\d{1,2}:\d{2}))?\s*$",
+    re.IGNORECASE,
+)
+
+
+@dataclass(frozen=True)
+class DeferrableLoad:
+    """A switchable load that needs ``energy_kwh`` at ``power_kw`` within a window."""
+
+    entity_id: str
+    power_kw: float
+    energy_kwh: float
+    earliest_slot: int = 0
+    deadline_slot: int = SLOTS_PER_DAY  # exclusive
+
+
+def _time_to_slot(value: str) -> int:
+    hours, minutes = (int(part) for part in value.split(":"))
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or (hours == 24 and minutes):
+        raise ValueError(value)
+    return hours * 4 + minutes // 15
+
+
+def parse_deferrable_loads(value: Any) -> List[DeferrableLoad]:
+    """Parse the deferrable loads option; malformed entries are logged and skipped."""
+    loads: List[DeferrableLoad] = []
+    for item in re.split(r"[;\n]", str(value or "")):
+        if not item.strip():
+            continue
+        match = _SPEC_RE.match(item)
+        try:
+            if not match:
+                raise ValueError("expected 'switch.x: 2 kW, 3 kWh, 06:00-20:00'")
+            power = float(match["power"])
+            energy = float(match["energy"])
+            start = _time_to_slot(match["start"]) if match["start"] else 0
+            end = _time_to_slot(match["end"]) if match["end"] else SLOTS_PER_DAY
+            if power <= 0 or energy <= 0 or end <= start:
+                raise ValueError("power/energy must be positive and the deadline after the start")
+        except ValueError as e:
+            _LOGGER.warning("Ignoring deferrable load '%s': %s", item.strip(), e)
+            continue
+        if any(load.entity_id == match["entity"] for load in loads):
+            _LOGGER.warning("Deferrable load %s configured twice, using the first entry", match["entity"])
+            continue
+        loads.append(DeferrableLoad(match["entity"], power, energy, start, end))
+    return loads
+
+
+def schedule_deferrable_loads(
+    loads: Sequence[DeferrableLoad],
+    schedule: List[Dict[str, Any]],
+    current_slot: int,
+    site_limit_kw: float = 0.0,
+    delivered_kwh: Optional[Dict[str, float]] = None,
+    peak_kw: float = 0.0,
+    capacity_tariff: float = 0.0,
+) -> Dict[str, Dict[str, Any]]:
+    """Allocate loads to slots of ``schedule`` (battery plan) from ``current_slot`` on.
+
+    ``site_limit_kw`` <= 0 means no cap.  ``delivered_kwh`` holds energy already
+    delivered today per entity.  Import above ``peak_kw`` costs
+    ``capacity_tariff`` per kW.  Adds ``deferrable_kW`` / ``deferrable_loads``
+    to each schedule slot and returns the plan per entity.
+    """
+    delivered_kwh = delivered_kwh or {}
+    slots = len(schedule)
+    unlimited = site_limit_kw <= 0
+    # Planned net grid import per slot (negative = PV surplus exported)
+    net: List[float] = []
+    for slot in schedule:
+        slot["deferrable_kW"] = 0.0
+        slot["deferrable_loads"] = []
+        net.append(slot_net_import_kw(slot))
+
+    def window(load: DeferrableLoad) -> range:
+        return range(max(load.earliest_slot, current_slot), min(load.deadline_slot, slots))
+
+    pending = []
+    for load in loads:
+        remaining_kwh = max(0.0, load.energy_kwh - delivered_kwh.get(load.entity_id, 0.0))
+        needed = math.ceil(remaining_kwh / (load.power_kw * SLOT_HOURS) - 1e-9)
+        pending.append((len(window(load)) - needed, -load.power_kw, load, needed, remaining_kwh))
+    pending.sort(key=lambda item: item[:2])
+
+    plan: Dict[str, Dict[str, Any]] = {}
+    for _slack, _power, load, needed, remaining_kwh in pending:
+        candidates = []
+        for slot in window(load):
+            new_net = net[slot] + load.power_kw
+            if not unlimited and new_net > site_limit_kw + 1e-9:
+                continue
+            from_grid_kw = max(0.0, new_net) - max(0.0, net[slot])
+            price = float(schedule[slot].get("price_czk_kwh", 0.0))
+            peak_cost = capacity_tariff * max(0.0, new_net - peak_kw)
+            candidates.append((price * from_grid_kw * SLOT_HOURS + peak_cost, slot))
+        candidates.sort()
+        chosen = sorted(slot for _, slot in candidates[:needed])
+        cost = 0.0
+        for slot in chosen:
+            from_grid_kw = max(0.0, net[slot] + load.power_kw) - max(0.0, net[slot])
+            net[slot] += load.power_kw
+            peak_kw = max(peak_kw, net[slot])
+            cost += from_grid_kw * SLOT_HOURS * float(schedule[slot].get("price_czk_kwh", 0.0))
+            schedule[slot]["deferrable_kW"] = round(schedule[slot]["deferrable_kW"] + load.power_kw, 3)
+            schedule[slot]["deferrable_loads"].append(load.entity_id)
+        scheduled_kwh = min(remaining_kwh, len(chosen) * load.power_kw * SLOT_HOURS)
+        plan[load.entity_id] = {
+            "power_kw": load.power_kw,
+            "energy_kwh": load.energy_kwh,
+            "delivered_kwh": round(delivered_kwh.get(load.entity_id, 0.0), 3),
+            "slots": chosen,
+            "scheduled_kwh": round(scheduled_kwh, 3),
+            "unmet_kwh": round(max(0.0, remaining_kwh - scheduled_kwh), 3),
+            "grid_cost": round(cost, 2),
+        }
+        if plan[load.entity_id]["unmet_kwh"] > 0:
+            _LOGGER.info("Deferrable load %s: %.2f kWh cannot be placed before its deadline",
+                         load.entity_id, plan[load.entity_id]["unmet_kwh"])
+    return plan
@@ -0,0 +1,135 @@
+"""Battery wear cost of charging and discharging.
+
+Every kWh through the battery (charged or discharged) costs a configured
+base amount, ``battery_wear_cost_czk_kwh`` (battery price divided by twice
+the kWh it delivers over its life, for example).  Cycling at the ends of the
+SOC range and at high C-rates wears the cells faster, so the base cost is
+scaled by two stress factors:
+
+* SOC window: 1.0 inside 20-80 %, rising quadratically to 2.0 at 0 and 100 %,
+* C-rate: 1.0 up to 0.5 C, then ``1 + (C - 0.5)²``.
+
+Both factors are precomputed into lookup tables (per SOC percent and per
+0.05 C step), so the planners can price a slot with two list lookups::
+
+    wear = WearModel.from_config(config)
+    cost = wear.per_kwh(soc_kwh, power_kw) * kwh
+
+A base cost of 0 turns the model off and the planners behave as before.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Mapping, Sequence
+
+from .const import (
+    CONF_BATTERY_CAPACITY,
+    CONF_BATTERY_WEAR_COST,
+    DEFAULT_BATTERY_CAPACITY,
+    DEFAULT_BATTERY_WEAR_COST,
+)
+
+SLOTS_PER_DAY = 96
+SLOT_HOURS = 0.25
+# SOC range (%) without extra stress, and the extra factor at 0 / 100 %
+SOC_WINDOW = (20.0, 80.0)
+SOC_STRESS = 1.0
+# C-rate table resolution and range, and the rate above which stress grows
+RATE_STEP_C = 0.05
+MAX_RATE_C = 3.0
+RATE_KNEE_C = 0.5
+RATE_STRESS = 1.0
+
+
+def _soc_factor(pct: float) -> float:
+    low, high = SOC_WINDOW
+    below = max(0.0, low - pct) / low
+    above = max(0.0, pct - high) / (100.0 - high)
+    return 1.0 + SOC_STRESS * (below * below + above * above)
+
+
+def _rate_factor(c_rate: float) -> float:
+    over = max(0.0, c_rate - RATE_KNEE_C)
+    return 1.0 + RATE_STRESS * over * over
+
+
+class WearModel:
+    """Wear cost per kWh of throughput with precomputed stress tables."""
+
+    def __init__(self, cost_per_kwh: float, capacity_kwh: float) -> None:
+        self.cost_per_kwh = max(0.0, cost_per_kwh)
+        self.capacity_kwh = max(0.1, capacity_kwh)
+        # Indexed by SOC percent (0-100) and by C-rate step
+        self.soc_factor = tuple(_soc_factor(float(pct)) for pct in range(101))
+        self.rate_factor = tuple(
+            _rate_factor(step * RATE_STEP_C) for step in range(int(MAX_RATE_C / RATE_STEP_C) + 1)
+        )
+        self.rate_step_kw = RATE_STEP_C * self.capacity_kwh
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "WearModel":
+        try:
+            cost = float(config.get(CONF_BATTERY_WEAR_COST, DEFAULT_BATTERY_WEAR_COST) or 0.0)
+        except (TypeError, ValueError):
+            cost = 0.0
+        return cls(cost, float(config.get(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY)))
+
+    @property
+    def active(self) -> bool:
+        return self.cost_per_kwh > 0
+
+    def soc_index(self, soc_kwh: float) -> int:
+        return min(100, max(0, int(soc_kwh / self.capacity_kwh * 100.0 + 0.5)))
+
+    def rate_index(self, power_kw: float) -> int:
+        return min(len(self.rate_factor) - 1, int(abs(power_kw) / self.rate_step_kw + 0.5))
+
+    def per_kwh(self, soc_kwh: float, power_kw: float) -> float:
+        """Wear cost (CZK) of one kWh charged or discharged at this SOC and power."""
+        return self.cost_per_kwh * self.soc_factor[self.soc_index(soc_kwh)] * self.rate_factor[self.rate_index(power_kw)]
+
+    def grid_charge_pays(self, price: float, value: float, soc_kwh: float, power_kw: float, eff: float) -> bool:
+        """Return True when buying a kWh at ``price`` and using it later at ``value`` beats its wear.
+
+        A kWh bought stores ``eff`` and delivers ``eff²``; both the charge and
+        the later discharge (estimated at the same power) cost wear.
+        """
+        charge_wear = self.per_kwh(soc_kwh, power_kw)
+        discharge_wear = self.per_kwh(soc_kwh + power_kw * SLOT_HOURS * eff, power_kw)
+        return value * eff * eff > price + charge_wear + discharge_wear * eff * eff
+
+
+def later_deficit_prices(prices: Sequence[float], loads: Sequence[float], forecast: Sequence[float]) -> List[float]:
+    """Per slot, the average price of the later slots where the house draws more than PV.
+
+    That is the import a kWh stored now would displace (0 when there is none).
+    """
+    slots = min(len(prices), len(loads), len(forecast))
+    result = [0.0] * max(len(prices), SLOTS_PER_DAY)
+    total = 0.0
+    count = 0
+    for slot in range(slots - 1, -1, -1):
+        result[slot] = total / count if count else 0.0
+        price = float(prices[slot])
+        if float(loads[slot]) > float(forecast[slot]) and price > 0:
+            total += price
+            count += 1
+    return result
+
+
+def schedule_wear(wear: WearModel, schedule: Sequence[Mapping[str, Any]], current_slot: int) -> Dict[str, Any]:
+    """Battery throughput and wear cost of a schedule from ``current_slot`` on."""
+    throughput = cost = 0.0
+    soc_kwh = None
+    for slot in schedule[current_slot:]:
+        power_kw = abs(float(slot.get("planned_charge_kW", 0.0)))
+        end_kwh = float(slot.get("soc_kwh_end", 0.0))
+        kwh = power_kw * SLOT_HOURS
+        throughput += kwh
+        cost += wear.per_kwh(end_kwh if soc_kwh is None else soc_kwh, power_kw) * kwh
+        soc_kwh = end_kwh
+    return {
+        "cost_per_kwh": wear.cost_per_kwh,
+        "throughput_kwh": round(throughput, 2),
+        "equivalent_cycles": round(throughput / (2.0 * wear.capacity_kwh), 3),
+        "wear_cost": round(cost, 2),
+    }
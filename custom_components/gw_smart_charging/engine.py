@@ -0,0 +1,1067 @@
+"""Charging plan engine.
+
+Pure planning code: strategies, optimal slot selection and the 15-minute
+schedule simulation.  It takes plain lists and a config mapping and never
+touches Home Assistant state, so it can run in an executor thread under a
+time budget (and later in backtests or what-if runs).  Sensor readings the
+plan depends on (SOC, Nanogreen flag) are read by the caller and passed in.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .const import (
+    CONF_ALWAYS_CHARGE_PRICE,
+    CONF_BATTERY_CAPACITY,
+    CONF_CAPACITY_TARIFF,
+    CONF_CHARGE_EFFICIENCY,
+    CONF_CHARGING_STRATEGY,
+    CONF_CRITICAL_HOURS_END,
+    CONF_CRITICAL_HOURS_SOC,
+    CONF_CRITICAL_HOURS_START,
+    CONF_EXPORT_LIMIT,
+    CONF_EXPORT_PRICE,
+    CONF_FULL_HOUR_CHARGING,
+    CONF_MAX_CHARGE_POWER,
+    CONF_MAX_SOC,
+    CONF_MIN_SOC,
+    CONF_NANOGREEN_CHEAPEST_SENSOR,
+    CONF_NEVER_CHARGE_PRICE,
+    CONF_PRICE_HYSTERESIS,
+    CONF_SITE_POWER_LIMIT,
+    CONF_TARGET_SOC,
+    DEFAULT_ALWAYS_CHARGE_PRICE,
+    DEFAULT_BATTERY_CAPACITY,
+    DEFAULT_CAPACITY_TARIFF,
+    DEFAULT_CHARGE_EFFICIENCY,
+    DEFAULT_CHARGING_STRATEGY,
+    DEFAULT_CRITICAL_HOURS_END,
+    DEFAULT_CRITICAL_HOURS_SOC,
+    DEFAULT_CRITICAL_HOURS_START,
+    DEFAULT_EXPORT_LIMIT,
+    DEFAULT_EXPORT_PRICE,
+    DEFAULT_MAX_CHARGE_POWER,
+    DEFAULT_MAX_SOC,
+    DEFAULT_MIN_SOC,
+    DEFAULT_NEVER_CHARGE_PRICE,
+    DEFAULT_PRICE_HYSTERESIS,
+    DEFAULT_SITE_POWER_LIMIT,
+    DEFAULT_TARGET_SOC,
+    STRATEGY_4_LOWEST,
+    STRATEGY_6_LOWEST,
+    STRATEGY_ADAPTIVE_SMART,
+    STRATEGY_NANOGREEN_ONLY,
+    STRATEGY_PEAK_SHAVING,
+    STRATEGY_PRICE_THRESHOLD,
+    STRATEGY_SOLAR_PRIORITY,
+    STRATEGY_TOU_OPTIMIZED,
+)
+from . import optimizer, stochastic
+from .allocation import ChargeRequest, charge_blocks
+from .degradation import WearModel, later_deficit_prices
+from .deferrable import DeferrableLoad, schedule_deferrable_loads
+from .peak import slot_grid_import_kw, slot_net_import_kw
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _QuietThreads(logging.Filter):
+    """Drop planner records below ERROR logged from a thread inside ``quiet_planning``."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.local = threading.local()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.ERROR or not getattr(self.local, "depth", 0)
+
+
+_QUIET = _QuietThreads()
+_LOGGER.addFilter(_QUIET)
+
+
+@contextmanager
+def quiet_planning() -> Iterator[None]:
+    """Keep planner runs in this thread quiet (what-if and backtest runs).
+
+    Every run logs its summary and per-strategy warnings; the live plan's
+    runs in other threads keep logging as configured.
+    """
+    _QUIET.local.depth = getattr(_QUIET.local, "depth", 0) + 1
+    try:
+        yield
+    finally:
+        _QUIET.local.depth -= 1
+
+
+class ChargingPlanner:
+    """Compute the charging schedule for one planning run.
+
+    A planner instance holds the inputs of a single run; the hysteresis state
+    it ends with is read back from ``last_charging_state``.
+    """
+
+    def __init__(
+        self,
+        config: Mapping[str, Any],
+        current_slot: int,
+        initial_soc_frac: float = 0.5,
+        last_charging_state: bool = False,
+        nanogreen_active: bool = False,
+        monthly_peak_kw: float = 0.0,
+    ) -> None:
+        self.config = config
+        self.current_slot = current_slot
+        self.initial_soc_frac = initial_soc_frac
+        self.last_charging_state = last_charging_state
+        self._initial_charging_state = last_charging_state
+        self.nanogreen_active = nanogreen_active
+        self.monthly_peak_kw = monthly_peak_kw
+        self.site_limit_kw = float(config.get(CONF_SITE_POWER_LIMIT, DEFAULT_SITE_POWER_LIMIT))
+        self.capacity_tariff = float(config.get(CONF_CAPACITY_TARIFF, DEFAULT_CAPACITY_TARIFF))
+        self.never_charge_price = float(config.get(CONF_NEVER_CHARGE_PRICE, DEFAULT_NEVER_CHARGE_PRICE))
+        # Highest grid import (kW) of the plan so far, starting at the monthly peak
+        self.planned_peak_kw = monthly_peak_kw
+        # Import peak grid charging may raise it to under a capacity tariff, and
+        # the days of the billing month (from today) a raised peak serves
+        self.charge_peak_kw = monthly_peak_kw
+        self.billing_days_left = 1
+        self.import_limited_slots = 0
+        # Grid charge power per slot granted by the fleet for a shared connection
+        # (None = not coordinated); set through ``replan_with_allocation``
+        self.grid_charge_allocation: Optional[List[float]] = None
+        self.fleet_allocation: Optional[Dict[str, Any]] = None
+        # Hysteresis thresholds of the last run, used to build allocation requests
+        self.never_charge_threshold = self.never_charge_price
+        # Forecast spread and risk limit for stochastic plan selection
+        # (``stochastic.uncertainty_settings``; None = plan the forecast as is)
+        self.uncertainty: Optional[Dict[str, float]] = None
+        self.stochastic: Optional[Dict[str, Any]] = None
+        # Anytime optimizer budget (0 = off) and the previous cycle's grid charge kW per slot
+        self.optimizer_budget_s = 0.0
+        self.warm_start: Optional[List[float]] = None
+        self.optimization: Optional[Dict[str, Any]] = None
+        # Feed-in: export limit (0 = export is not planned), export price per slot
+        # from the export price sensor (None = the fixed export price) and the
+        # battery-to-grid kW per slot placed by ``_plan_battery_export``
+        self.export_limit_kw = float(config.get(CONF_EXPORT_LIMIT, DEFAULT_EXPORT_LIMIT) or 0.0)
+        self.fixed_export_price = float(config.get(CONF_EXPORT_PRICE, DEFAULT_EXPORT_PRICE) or 0.0)
+        self.export_prices: Optional[List[float]] = None
+        self.battery_export: Optional[List[float]] = None
+
+    def copy_with_config(self, config: Mapping[str, Any]) -> "ChargingPlanner":
+        """Return a planner for the same run inputs with another configuration."""
+        planner = ChargingPlanner(
+            config,
+            current_slot=self.current_slot,
+            initial_soc_frac=self.initial_soc_frac,
+            last_charging_state=self._initial_charging_state,
+            nanogreen_active=self.nanogreen_active,
+            monthly_peak_kw=self.monthly_peak_kw,
+        )
+        planner.export_prices = self.export_prices
+        planner.billing_days_left = self.billing_days_left
+        return planner
+
+    @property
+    def search_budget_s(self) -> float:
+        """Return the time the optimizer and stochastic plan selection may spend on one plan."""
+        budget = min(max(0.0, self.optimizer_budget_s), optimizer.MAX_BUDGET_S)
+        if self.uncertainty and stochastic.available():
+            budget += float(self.uncertainty.get("budget_s", stochastic.DEFAULT_BUDGET_S))
+        return budget
+
+    def export_price(self, slot: int) -> float:
+        """Return the feed-in price (CZK/kWh) of a slot."""
+        if self.export_prices and slot < len(self.export_prices):
+            return float(self.export_prices[slot])
+        return self.fixed_export_price
+
+    def _apply_charging_strategy(self, prices: List[float], loads: List[float], forecast: List[float],
+                                  soc_kwh: float, target_soc_kwh: float, capacity: float,
+                                  max_charge: float, eff: float, interval_hours: float = 0.25) -> List[int]:
+        """Apply the configured charging strategy to find optimal charging slots.
+        
+        NEW v2.1.0: Supports multiple charging strategies
+        
+        Args:
+            prices: List of prices for 96 slots
+            loads: List of load forecasts for 96 slots
+            forecast: List of PV forecasts for 96 slots
+            soc_kwh: Current battery SOC in kWh
+            target_soc_kwh: Target SOC to reach in kWh
+            capacity: Battery capacity in kWh
+            max_charge: Max charging power in kW
+            eff: Charging efficiency
+            interval_hours: Duration of each slot in hours (0.25 for 15min)
+            
+        Returns:
+            List of slot indices where charging should occur based on strategy
+        """
+        strategy = self.config.get(CONF_CHARGING_STRATEGY, DEFAULT_CHARGING_STRATEGY)
+        current_time_slot = self.current_slot
+        
+        # Calculate energy needed
+        energy_needed = max(0, target_soc_kwh - soc_kwh)
+        if energy_needed < 0.5:
+            return []
+        
+        max_energy_per_slot = max_charge * interval_hours * eff
+        slots_needed = int((energy_needed / max_energy_per_slot) + 0.5)
+        
+        if slots_needed <= 0:
+            return []
+        
+        _LOGGER.info(f"Applying charging strategy: {strategy}, need {slots_needed} slots for {energy_needed:.2f} kWh")
+        
+        if strategy == STRATEGY_4_LOWEST:
+            # Charge in the 4 lowest priced hours (16 slots)
+            return self._strategy_n_lowest_hours(prices, current_time_slot, 4)
+        
+        elif strategy == STRATEGY_6_LOWEST:
+            # Charge in the 6 lowest priced hours (24 slots)
+            return self._strategy_n_lowest_hours(prices, current_time_slot, 6)
+        
+        elif strategy == STRATEGY_NANOGREEN_ONLY:
+            # Use only Nanogreen sensor if available
+            return self._strategy_nanogreen_only(current_time_slot)
+        
+        elif strategy == STRATEGY_PRICE_THRESHOLD:
+            # Charge whenever price is below always_charge_price
+            always_charge_price = float(self.config.get(CONF_ALWAYS_CHARGE_PRICE, DEFAULT_ALWAYS_CHARGE_PRICE))
+            return self._strategy_price_threshold(prices, current_time_slot, always_charge_price)
+        
+        elif strategy == STRATEGY_ADAPTIVE_SMART:
+            # Adaptive learning from consumption patterns
+            return self._strategy_adaptive_smart(prices, loads, forecast, current_time_slot, 
+                                                 soc_kwh, target_soc_kwh, max_charge, eff, interval_hours)
+        
+        elif strategy == STRATEGY_SOLAR_PRIORITY:
+            # Maximize solar self-consumption
+            return self._strategy_solar_priority(prices, loads, forecast, current_time_slot,
+                                                 soc_kwh, target_soc_kwh, max_charge, eff, interval_hours)
+        
+        elif strategy == STRATEGY_PEAK_SHAVING:
+            # Avoid grid during peak hours
+            return self._strategy_peak_shaving(prices, loads, forecast, current_time_slot,
+                                               soc_kwh, target_soc_kwh, max_charge, eff, interval_hours)
+        
+        elif strategy == STRATEGY_TOU_OPTIMIZED:
+            # Optimized for Time-of-Use tariffs
+            return self._strategy_tou_optimized(prices, loads, forecast, current_time_slot,
+                                                soc_kwh, target_soc_kwh, max_charge, eff, interval_hours)
+        
+        else:  # STRATEGY_DYNAMIC (default)
+            # Use the smart dynamic optimization (existing behavior)
+            return self._find_optimal_charging_slots(
+                prices, loads, forecast, soc_kwh, target_soc_kwh,
+                capacity, max_charge, eff, interval_hours
+            )
+    
+    def _strategy_n_lowest_hours(self, prices: List[float], current_slot: int, n_hours: int) -> List[int]:
+        """Strategy: Charge in N lowest priced hours within next 24 hours."""
+        n_slots = n_hours * 4  # Convert hours to 15-min slots
+        
+        # Check if full hour charging is enabled
+        full_hour_charging = self.config.get(CONF_FULL_HOUR_CHARGING, True)
+        
+        if full_hour_charging:
+            # Find N cheapest HOURS (not individual slots)
+            return self._find_n_cheapest_hours(prices, current_slot, n_hours)
+        
+        # Get all valid slots with prices
+        valid_slots = []
+        for slot in range(current_slot, min(current_slot + 96, 96)):
+            if slot < len(prices) and prices[slot] > 0:
+                valid_slots.append((slot, prices[slot]))
+        
+        if not valid_slots:
+            return []
+        
+        # Sort by price and take the N cheapest hours worth of slots
+        valid_slots.sort(key=lambda x: x[1])
+        cheapest_slots = [s for s, p in valid_slots[:n_slots]]
+        
+        _LOGGER.info(f"Strategy {n_hours} lowest hours: selected {len(cheapest_slots)} slots")
+        return sorted(cheapest_slots)
+    
+    def _find_n_cheapest_hours(self, prices: List[float], current_slot: int, n_hours: int) -> List[int]:
+        """Find N cheapest full hours (4 consecutive 15-min slots each).
+        
+        NEW v2.2.0: Ensures charging happens in full hour blocks.
+        """
+        # Calculate average price for each hour
+        hour_prices = []
+        for hour_start in range(current_slot, min(current_slot + 96, 96), 4):
+            # Get 4 slots for this hour
+            hour_slots = list(range(hour_start, min(hour_start + 4, 96)))
+            if len(hour_slots) == 4 and all(s < len(prices) for s in hour_slots):
+                # Calculate average price for this hour
+                avg_price = sum(prices[s] for s in hour_slots if prices[s] > 0) / len(hour_slots)
+                if avg_price > 0:
+                    hour_prices.append((hour_start, avg_price, hour_slots))
+        
+        if not hour_prices:
+            return []
+        
+        # Sort hours by average price
+        hour_prices.sort(key=lambda x: x[1])
+        
+        # Select N cheapest hours
+        selected_slots = []
+        for i in range(min(n_hours, len(hour_prices))):
+            hour_start, avg_price, hour_slots = hour_prices[i]
+            selected_slots.extend(hour_slots)
+            _LOGGER.debug(f"Selected hour starting at slot {hour_start} with avg price {avg_price:.2f} CZK/kWh")
+        
+        _LOGGER.info(f"Full-hour charging: selected {len(selected_slots)} slots in {min(n_hours, len(hour_prices))} cheapest hours")
+        return sorted(selected_slots)
+    
+    def _strategy_nanogreen_only(self, current_slot: int) -> List[int]:
+        """Strategy: Use only Nanogreen sensor for charging decisions."""
+        nanogreen_sensor = self.config.get(CONF_NANOGREEN_CHEAPEST_SENSOR)
+        if not nanogreen_sensor:
+            _LOGGER.warning("Nanogreen-only strategy selected but no sensor configured")
+            return []
+        
+        if self.nanogreen_active:
+            # Currently in cheapest hours - charge now
+            _LOGGER.info("Nanogreen sensor indicates cheapest hours - charging now")
+            return [current_slot]
+        
+        _LOGGER.debug("Nanogreen sensor not indicating cheapest hours")
+        return []
+    
+    def _strategy_price_threshold(self, prices: List[float], current_slot: int, threshold: float) -> List[int]:
+        """Strategy: Charge whenever price is below threshold."""
+        charging_slots = []
+        
+        for slot in range(current_slot, min(current_slot + 96, 96)):
+            if slot < len(prices) and 0 < prices[slot] < threshold:
+                charging_slots.append(slot)
+        
+        _LOGGER.info(f"Price threshold strategy: found {len(charging_slots)} slots below {threshold:.2f} CZK/kWh")
+        return charging_slots
+    
+    def _strategy_adaptive_smart(self, prices: List[float], loads: List[float], forecast: List[float],
+                                  current_slot: int, soc_kwh: float, target_soc_kwh: float,
+                                  max_charge: float, eff: float, interval_hours: float = 0.25) -> List[int]:
+        """Strategy: Adaptive Smart - learns from consumption patterns.
+        
+        This strategy uses ML patterns combined with price optimization.
+        It prioritizes charging before predicted high consumption periods.
+        """
+        # Use the standard optimizer but with enhanced ML weighting
+        slots = self._find_optimal_charging_slots(
+            prices, loads, forecast, soc_kwh, target_soc_kwh,
+            17.0, max_charge, eff, interval_hours  # Use default capacity
+        )
+        
+        # Filter to only charge in periods with price below average
+        if len(prices) > 0:
+            avg_price = sum(p for p in prices if p > 0) / len([p for p in prices if p > 0])
+            slots = [s for s in slots if s < len(prices) and prices[s] < avg_price * 1.1]
+        
+        _LOGGER.info(f"Adaptive smart strategy: selected {len(slots)} slots based on ML patterns")
+        return slots
+    
+    def _strategy_solar_priority(self, prices: List[float], loads: List[float], forecast: List[float],
+                                  current_slot: int, soc_kwh: float, target_soc_kwh: float,
+                                  max_charge: float, eff: float, interval_hours: float = 0.25) -> List[int]:
+        """Strategy: Solar Priority - maximize solar self-consumption.
+        
+        Charges mainly when solar forecast is high and price is reasonable.
+        Avoids grid charging unless absolutely necessary.
+        """
+        charging_slots = []
+        energy_needed = max(0, target_soc_kwh - soc_kwh)
+        
+        if energy_needed < 0.5:
+            return []
+        
+        # Find slots with good solar forecast
+        solar_slots = []
+        for slot in range(current_slot, min(current_slot + 96, 96)):
+            if slot < len(forecast) and forecast[slot] > 0.5:  # Good solar production
+                solar_slots.append((slot, forecast[slot], prices[slot] if slot < len(prices) else 999.0))
+        
+        # Sort by solar forecast (descending) and price (ascending)
+        solar_slots.sort(key=lambda x: (-x[1], x[2]))
+        
+        # Select slots until we have enough energy
+        max_energy_per_slot = max_charge * interval_hours * eff
+        slots_needed = int((energy_needed / max_energy_per_slot) + 0.5)
+        
+        for slot, solar, price in solar_slots[:slots_needed]:
+            charging_slots.append(slot)
+        
+        _LOGGER.info(f"Solar priority strategy: selected {len(charging_slots)} slots with good solar forecast")
+        return sorted(charging_slots)
+    
+    def _strategy_peak_shaving(self, prices: List[float], loads: List[float], forecast: List[float],
+                                current_slot: int, soc_kwh: float, target_soc_kwh: float,
+                                max_charge: float, eff: float, interval_hours: float = 0.25) -> List[int]:
+        """Strategy: Peak Shaving - avoid grid during peak hours.
+        
+        Ensures battery is charged before peak consumption hours.
+        Prioritizes charging during lowest price periods outside peak.
+        """
+        charging_slots = []
+        energy_needed = max(0, target_soc_kwh - soc_kwh)
+        
+        if energy_needed < 0.5:
+            return []
+        
+        # Define peak hours (typically 17-21, configurable via critical hours)
+        peak_start = self.config.get(CONF_CRITICAL_HOURS_START, DEFAULT_CRITICAL_HOURS_START)
+        peak_end = self.config.get(CONF_CRITICAL_HOURS_END, DEFAULT_CRITICAL_HOURS_END)
+        
+        # Find slots outside peak hours with good prices
+        off_peak_slots = []
+        for slot in range(current_slot, min(current_slot + 96, 96)):
+            hour = (slot // 4) % 24
+            if hour < peak_start or hour >= peak_end:  # Outside peak
+                if slot < len(prices) and prices[slot] > 0:
+                    off_peak_slots.append((slot, prices[slot]))
+        
+        # Sort by price and select cheapest
+        off_peak_slots.sort(key=lambda x: x[1])
+        
+        max_energy_per_slot = max_charge * interval_hours * eff
+        slots_needed = int((energy_needed / max_energy_per_slot) + 0.5)
+        
+        for slot, price in off_peak_slots[:slots_needed]:
+            charging_slots.append(slot)
+        
+        _LOGGER.info(f"Peak shaving strategy: selected {len(charging_slots)} off-peak slots")
+        return sorted(charging_slots)
+    
+    def _strategy_tou_optimized(self, prices: List[float], loads: List[float], forecast: List[float],
+                                 current_slot: int, soc_kwh: float, target_soc_kwh: float,
+                                 max_charge: float, eff: float, interval_hours: float = 0.25) -> List[int]:
+        """Strategy: Time-of-Use Optimized - for TOU tariffs.
+        
+        Optimized for time-of-use tariffs with distinct price tiers.
+        Charges only during lowest tier and avoids high-price periods.
+        """
+        charging_slots = []
+        energy_needed = max(0, target_soc_kwh - soc_kwh)
+        
+        if energy_needed < 0.5:
+            return []
+        
+        # Identify price tiers
+        valid_prices = [p for p in prices if p > 0]
+        if not valid_prices:
+            return []
+        
+        # Assume TOU has 2-3 tiers, find the lowest tier
+        min_price = min(valid_prices)
+        max_price = max(valid_prices)
+        
+        # Low tier = bottom 40% of price range
+        low_tier_threshold = min_price + (max_price - min_price) * 0.4
+        
+        # Find all slots in low tier
+        low_tier_slots = []
+        for slot in range(current_slot, min(current_slot + 96, 96)):
+            if slot < len(prices) and 0 < prices[slot] <= low_tier_threshold:
+                low_tier_slots.append((slot, prices[slot]))
+        
+        # Sort by price within low tier
+        low_tier_slots.sort(key=lambda x: x[1])
+        
+        max_energy_per_slot = max_charge * interval_hours * eff
+        slots_needed = int((energy_needed / max_energy_per_slot) + 0.5)
+        
+        for slot, price in low_tier_slots[:slots_needed]:
+            charging_slots.append(slot)
+        
+        _LOGGER.info(f"TOU optimized strategy: selected {len(charging_slots)} low-tier slots (threshold: {low_tier_threshold:.2f} CZK/kWh)")
+        return sorted(charging_slots)
+
+    def _find_optimal_charging_slots(self, prices: List[float], loads: List[float], forecast: List[float],
+                                     soc_kwh: float, target_soc_kwh: float, capacity: float,
+                                     max_charge: float, eff: float, interval_hours: float = 0.25) -> List[int]:
+        """Find optimal charging slots considering price trends and energy needs.
+        
+        ENHANCED v2.1.0: Improved 12-hour lookahead to find absolute lowest prices.
+        
+        Args:
+            prices: List of prices for 96 slots
+            loads: List of load forecasts for 96 slots
+            forecast: List of PV forecasts for 96 slots
+            soc_kwh: Current battery SOC in kWh
+            target_soc_kwh: Target SOC to reach in kWh
+            capacity: Battery capacity in kWh
+            max_charge: Max charging power in kW
+            eff: Charging efficiency
+            interval_hours: Duration of each slot in hours (0.25 for 15min)
+            
+        Returns:
+            List of slot indices where charging should occur
+        """
+        # Calculate energy deficit that needs to be covered by grid charging
+        energy_needed = max(0, target_soc_kwh - soc_kwh)
+        
+        if energy_needed < 0.5:  # Less than 0.5 kWh needed, no charging
+            return []
+        
+        # Calculate how many slots we need to charge
+        max_energy_per_slot = max_charge * interval_hours * eff
+        slots_needed = int((energy_needed / max_energy_per_slot) + 0.5)
+        
+        if slots_needed <= 0:
+            return []
+        
+        # Find charging windows with price trend analysis
+        charging_slots = []
+        
+        # Group prices into windows and find decreasing trends
+        current_time_slot = self.current_slot
+        
+        # ENHANCED v2.1.0: Look ahead for next 12 hours (48 slots) specifically
+        lookahead_slots = 48  # 12 hours * 4 slots/hour
+        valid_slots = []
+        for slot in range(current_time_slot, min(current_time_slot + lookahead_slots, 96)):
+            price = prices[slot] if slot < len(prices) else 999.0
+            if price > 0:  # Valid price
+                valid_slots.append((slot, price))
+        
+        if not valid_slots:
+            return []
+        
+        # Sort by price to find absolute cheapest slots
+        valid_slots.sort(key=lambda x: x[1])
+        
+        # ENHANCED v2.1.0: Improved decreasing price trend detection
+        # Check if prices are decreasing by comparing current vs future averages
+        is_decreasing_trend = False
+        prices_later = False
+        
+        if len(valid_slots) >= 8:  # Need at least 2 hours of data
+            # Get current price (first available slot)
+            current_price = prices[current_time_slot] if current_time_slot < len(prices) else valid_slots[0][1]
+            
+            # Calculate average of cheapest slots in the 12-hour window
+            num_cheap_slots = min(slots_needed * 2, len(valid_slots) // 2)
+            cheapest_avg = sum(p for _, p in valid_slots[:num_cheap_slots]) / num_cheap_slots if num_cheap_slots > 0 else current_price
+            
+            # Calculate when the cheapest slots occur (early vs late in window)
+            cheapest_slot_times = [s for s, p in valid_slots[:num_cheap_slots]]
+            avg_cheapest_time = sum(cheapest_slot_times) / len(cheapest_slot_times) if cheapest_slot_times else current_time_slot
+            
+            is_decreasing_trend = cheapest_avg < current_price * 0.90  # Prices will drop by at least 10%
+            prices_later = avg_cheapest_time > current_time_slot + 4  # Cheapest prices are at least 1 hour away
+            
+            if is_decreasing_trend and prices_later:
+                _LOGGER.info(
+                    f"Detected decreasing price trend: current={current_price:.2f}, "
+                    f"cheapest_avg={cheapest_avg:.2f} - waiting for absolute minimum prices"
+                )
+                # Wait for the absolute cheapest slots within the 12-hour window
+                # Take only the absolutely cheapest slots needed
+                cheapest_slots = [s for s, p in valid_slots[:slots_needed]]
+            else:
+                # Normal case: take cheapest available slots but prefer sooner if prices are similar
+                # This prevents waiting unnecessarily if prices aren't significantly different
+                _LOGGER.info(f"No significant decreasing trend - charging at earliest cheap slots")
+                cheapest_slots = [s for s, p in valid_slots[:slots_needed]]
+        else:
+            # Not enough data - just take cheapest available
+            cheapest_slots = [s for s, p in valid_slots[:slots_needed]]
+        
+        # Verify slots are within reasonable time window
+        # For decreasing trend, allow waiting up to 12 hours
+        # For normal case, prefer within 8 hours
+        max_wait_slots = lookahead_slots if is_decreasing_trend and prices_later else 32  # 12 or 8 hours
+        filtered_slots = [s for s in cheapest_slots if s <= current_time_slot + max_wait_slots]
+        
+        if not filtered_slots and cheapest_slots:
+            # If all slots are too far, take at least the closest cheapest one
+            filtered_slots = sorted(cheapest_slots)[:max(1, slots_needed // 2)]
+        
+        return sorted(filtered_slots)
+    
+    def _choose_charge_peak(self, prices: List[float], loads: List[float], forecast: List[float],
+                            charge_slots: Sequence[int], max_charge: float, need_kwh: float) -> float:
+        """Return the import peak (kW) grid charging may raise the monthly peak to.
+
+        The tariff is paid once per kW for the month, so each candidate peak
+        is weighed against all the grid-charge energy of the plan it makes
+        room for: up to ``need_kwh``, taken in ``charge_slots`` with the
+        biggest saving against ``never_charge_price`` first.  A raised peak
+        also serves the rest of the month, so today's plan bears the tariff
+        spread over ``billing_days_left``.  Returns the planned peak itself
+        when raising it does not pay.
+        """
+        base = self.planned_peak_kw
+        slots = []
+        for s in charge_slots:
+            if self.current_slot <= s < min(len(prices), len(loads), len(forecast)):
+                saving = self.never_charge_price - float(prices[s])
+                if saving > 0:
+                    slots.append((saving, max(0.0, float(loads[s]) - float(forecast[s]))))
+        slots.sort(reverse=True)
+
+        def value(peak_kw: float) -> float:
+            left, total = need_kwh, 0.0
+            for saving, house_kw in slots:
+                if left <= 0:
+                    break
+                kwh = min(left, min(max_charge, max(0.0, peak_kw - house_kw)) * 0.25)
+                total += kwh * saving
+                left -= kwh
+            return total
+
+        tariff_per_kw = self.capacity_tariff / max(1, self.billing_days_left)
+        best_kw, best_gain = base, value(base)
+        for peak_kw in sorted({house_kw + max_charge for _, house_kw in slots}):
+            if peak_kw > base:
+                gain = value(peak_kw) - tariff_per_kw * (peak_kw - base)
+                if gain > best_gain:
+                    best_kw, best_gain = peak_kw, gain
+        return best_kw
+
+    def _limit_grid_charge(self, slot: int, charge_kw: float, house_net_kw: float) -> float:
+        """Reduce grid charge power to the site import limit and the capacity-tariff peak.
+
+        ``house_net_kw`` is house load minus PV.  The site limit is hard, and so
+        is the fleet allocation of a shared connection.  With a capacity
+        tariff, grid charging stays below the planned peak or the charging
+        peak chosen for the whole plan by :meth:`_choose_charge_peak`.
+        """
+        house_kw = max(0.0, house_net_kw)
+        limited = charge_kw
+        if self.grid_charge_allocation is not None:
+            granted = self.grid_charge_allocation[slot] if slot < len(self.grid_charge_allocation) else 0.0
+            limited = min(limited, granted)
+        if self.site_limit_kw > 0:
+            limited = min(limited, max(0.0, self.site_limit_kw - house_kw))
+        if self.capacity_tariff > 0:
+            limited = min(limited, max(0.0, max(self.planned_peak_kw, self.charge_peak_kw) - house_kw))
+        if limited < charge_kw:
+            self.import_limited_slots += 1
+        self.planned_peak_kw = max(self.planned_peak_kw, house_kw + limited)
+        return limited
+
+    def compute_schedule(self, forecast: List[float], prices: List[float], loads: List[float]) -> List[Dict[str, Any]]:
+        """Compute optimized 15-min charging schedule with hysteresis and critical hours support.
+        
+        Returns list[96] with dicts for each 15-min slot:
+        { slot, time, mode, pv_power_kW, load_kW, net_pv_kW, price_czk_kwh, 
+          planned_charge_kW, soc_kwh_end, soc_pct_end, should_charge }
+        
+        Logic (ENHANCED v1.9.5):
+        1. Always use solar energy first (self-consumption priority)
+        2. Find optimal charging windows considering price trends (NEW)
+        3. Wait for cheapest prices in decreasing trend scenarios (NEW)
+        4. Charge from grid only when price is below threshold AND battery needs charging
+        5. Never charge if price above never_charge_price threshold
+        6. Always charge if price below always_charge_price AND battery below target
+        7. Respect min/max SOC limits
+        8. Consider solar forecast to avoid charging from grid if solar will cover needs
+        9. Apply hysteresis to prevent rapid switching near price thresholds
+        10. Maintain higher SOC during critical hours
+        """
+        # Read config params
+        capacity = float(self.config.get(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY))
+        max_charge = float(self.config.get(CONF_MAX_CHARGE_POWER, DEFAULT_MAX_CHARGE_POWER))
+        eff = float(self.config.get(CONF_CHARGE_EFFICIENCY, DEFAULT_CHARGE_EFFICIENCY))
+        
+        min_soc_pct = float(self.config.get(CONF_MIN_SOC, DEFAULT_MIN_SOC))
+        max_soc_pct = float(self.config.get(CONF_MAX_SOC, DEFAULT_MAX_SOC))
+        target_soc_pct = float(self.config.get(CONF_TARGET_SOC, DEFAULT_TARGET_SOC))
+        
+        always_charge_price = float(self.config.get(CONF_ALWAYS_CHARGE_PRICE, DEFAULT_ALWAYS_CHARGE_PRICE))
+        never_charge_price = float(self.config.get(CONF_NEVER_CHARGE_PRICE, DEFAULT_NEVER_CHARGE_PRICE))
+        hysteresis_pct = float(self.config.get(CONF_PRICE_HYSTERESIS, DEFAULT_PRICE_HYSTERESIS))
+        
+        # Critical hours configuration
+        critical_start = int(self.config.get(CONF_CRITICAL_HOURS_START, DEFAULT_CRITICAL_HOURS_START))
+        critical_end = int(self.config.get(CONF_CRITICAL_HOURS_END, DEFAULT_CRITICAL_HOURS_END))
+        critical_soc_pct = float(self.config.get(CONF_CRITICAL_HOURS_SOC, DEFAULT_CRITICAL_HOURS_SOC))
+        
+        # Calculate hysteresis bands
+        hysteresis_factor = hysteresis_pct / 100.0
+        if self.last_charging_state:
+            # If we were charging, make it harder to stop (upper band)
+            always_charge_threshold = always_charge_price * (1 + hysteresis_factor)
+            never_charge_threshold = never_charge_price * (1 + hysteresis_factor)
+        else:
+            # If we were not charging, make it harder to start (lower band)
+            always_charge_threshold = always_charge_price * (1 - hysteresis_factor)
+            never_charge_threshold = never_charge_price * (1 - hysteresis_factor)
+        self.never_charge_threshold = never_charge_threshold
+
+        # Get initial SOC (read from the SOC sensor by the caller)
+        initial_soc_frac = self.initial_soc_frac
+
+        soc_kwh = capacity * initial_soc_frac
+        min_soc_kwh = capacity * (min_soc_pct / 100.0)
+        max_soc_kwh = capacity * (max_soc_pct / 100.0)
+        target_soc_kwh = capacity * (target_soc_pct / 100.0)
+        critical_soc_kwh = capacity * (critical_soc_pct / 100.0)
+
+        # Battery wear (off at zero cost): discharging, and grid charging above the
+        # critical-hours reserve, must be worth more than the wear they cause
+        wear = WearModel.from_config(self.config)
+        later_value = later_deficit_prices(prices, loads, forecast) if wear.active else []
+        battery_export = self.battery_export
+
+        schedule: List[Dict[str, Any]] = []
+        current_should_charge = False
+
+        # Import the house draws from the grid anyway sets the free peak level
+        self.planned_peak_kw = max(
+            [self.monthly_peak_kw]
+            + [max(0.0, float(loads[s]) - float(forecast[s]))
+               for s in range(self.current_slot, min(len(loads), len(forecast), 96))]
+        )
+        self.import_limited_slots = 0
+        
+        # ENHANCED v2.1.0: Pre-compute optimal charging slots using configured strategy
+        optimal_charging_slots = self._apply_charging_strategy(
+            prices, loads, forecast, soc_kwh, target_soc_kwh, 
+            capacity, max_charge, eff, interval_hours=0.25
+        )
+        if self.grid_charge_allocation is not None:
+            # A shared connection: charge where the fleet granted power
+            optimal_charging_slots = [
+                s for s, kw in enumerate(self.grid_charge_allocation) if kw > 0.01
+            ]
+        _LOGGER.debug(f"Optimal charging slots identified: {optimal_charging_slots}")
+        self.charge_peak_kw = self.planned_peak_kw
+        if self.capacity_tariff > 0:
+            charge_slots = set(optimal_charging_slots) | {
+                s for s in range(self.current_slot, min(len(prices), 96))
+                if 0 < float(prices[s]) <= always_charge_threshold
+            }
+            self.charge_peak_kw = self._choose_charge_peak(
+                prices, loads, forecast, sorted(charge_slots), max_charge, max(0.0, max_soc_kwh - soc_kwh) / eff
+            )
+        
+        # First pass: identify cheap charging opportunities and solar surplus
+        for slot in range(96):
+            pv_kw = float(forecast[slot]) if slot < len(forecast) else 0.0
+            price = float(prices[slot]) if slot < len(prices) else 0.0
+            load_kw = float(loads[slot]) if slot < len(loads) else 0.0
+            
+            # 15-min interval = 0.25 hours
+            interval_hours = 0.25
+            
+            # Calculate time for this slot
+            hour = slot // 4
+            minute = (slot % 4) * 15
+            
+            # Check if in critical hours
+            is_critical_hour = False
+            if critical_start <= critical_end:
+                is_critical_hour = critical_start <= hour < critical_end
+            else:  # Crosses midnight
+                is_critical_hour = hour >= critical_start or hour < critical_end
+            
+            # Adjust target SOC for critical hours
+            effective_target_soc_kwh = critical_soc_kwh if is_critical_hour else target_soc_kwh
+            
+            # Net solar after house consumption
+            net_pv_kw = pv_kw - load_kw
+            
+            mode = "idle"
+            planned_charge_kw = 0.0
+            should_charge = False
+            
+            # Priority 1: Use surplus solar for charging
+            if net_pv_kw > 0.05:
+                # Can charge from solar surplus
+                available_charge_kw = min(net_pv_kw, max_charge)
+                capacity_left_kwh = max_soc_kwh - soc_kwh
+                max_charge_this_slot_kwh = available_charge_kw * interval_hours
+                
+                if capacity_left_kwh > 0.01:
+                    charge_kwh = min(max_charge_this_slot_kwh, capacity_left_kwh)
+                    stored_kwh = charge_kwh * eff
+                    soc_kwh += stored_kwh
+                    planned_charge_kw = charge_kwh / interval_hours
+                    mode = "solar_charge"
+                    should_charge = False  # No grid charging needed
+                elif self.export_limit_kw > 0:
+                    # Battery full: the surplus goes to the grid
+                    mode = "solar_export"
+            
+            # Priority 2: Discharge to cover load (battery -> house)
+            elif load_kw > pv_kw and soc_kwh > min_soc_kwh and not (
+                wear.active and price < wear.per_kwh(soc_kwh, min(load_kw - pv_kw, max_charge))
+            ):
+                deficit_kw = load_kw - pv_kw
+                available_discharge_kwh = soc_kwh - min_soc_kwh
+                max_discharge_this_slot_kw = min(deficit_kw, max_charge)
+                discharge_kwh = min(max_discharge_this_slot_kw * interval_hours, available_discharge_kwh)
+                
+                soc_kwh -= discharge_kwh / eff
+                planned_charge_kw = -(discharge_kwh / interval_hours)  # Negative = discharge
+                mode = "battery_discharge"
+                should_charge = False
+            
+            # Priority 3: Grid charging based on price thresholds with hysteresis
+            # NEW v1.9.5: Use optimal slot selection for grid charging
+            if soc_kwh < effective_target_soc_kwh:
+                # Check if this slot is in optimal charging slots (NEW v1.9.5)
+                is_optimal_slot = slot in optimal_charging_slots
+                
+                # Check price conditions with hysteresis
+                if price > 0:
+                    if price <= always_charge_threshold:
+                        # Very cheap - always charge
+                        capacity_left_kwh = max_soc_kwh - soc_kwh
+                        charge_kw = self._limit_grid_charge(
+                            slot, min(max_charge, capacity_left_kwh / interval_hours), load_kw - pv_kw
+                        )
+                        if capacity_left_kwh > 0.01 and charge_kw > 0.01:
+                            charge_kwh = charge_kw * interval_hours
+                            stored_kwh = charge_kwh * eff
+                            soc_kwh += stored_kwh
+                            planned_charge_kw = charge_kw
+                            mode = "grid_charge_cheap"
+                            should_charge = True
+                            current_should_charge = True
+                    
+                    elif price < never_charge_threshold and is_optimal_slot and (
+                        not wear.active or soc_kwh < critical_soc_kwh
+                        or wear.grid_charge_pays(price, later_value[slot], soc_kwh, max_charge, eff)
+                    ):
+                        # NEW v1.9.5: Only charge in optimal slots (not just any cheap slot)
+                        # This implements "wait for cheapest price" logic
+                        capacity_left_kwh = max_soc_kwh - soc_kwh
+                        charge_kw = self._limit_grid_charge(
+                            slot, min(max_charge, capacity_left_kwh / interval_hours), load_kw - pv_kw
+                        )
+                        if capacity_left_kwh > 0.01 and charge_kw > 0.01:
+                            charge_kwh = charge_kw * interval_hours
+                            stored_kwh = charge_kwh * eff
+                            soc_kwh += stored_kwh
+                            planned_charge_kw = charge_kw
+                            mode = "grid_charge_optimal" if not is_critical_hour else "grid_charge_critical"
+                            should_charge = True
+                            current_should_charge = True
+                            
+                            _LOGGER.debug(
+                                f"Grid charging optimal slot {slot}: price={price:.2f}, "
+                                f"is_optimal={is_optimal_slot}, "
+                                f"charging={charge_kwh:.2f} kWh"
+                            )
+            
+            # Priority 4: sell stored energy where the export plan placed it
+            if battery_export is not None and battery_export[slot] > 0.01 \
+                    and planned_charge_kw <= 0 and net_pv_kw <= 0.05:
+                floor_kwh = max(min_soc_kwh, critical_soc_kwh) if is_critical_hour else min_soc_kwh
+                export_kwh = min(
+                    min(battery_export[slot], max_charge + planned_charge_kw) * interval_hours,
+                    max(0.0, soc_kwh - floor_kwh) * eff,
+                )
+                if export_kwh > 0.0025:
+                    soc_kwh -= export_kwh / eff
+                    planned_charge_kw -= export_kwh / interval_hours
+                    mode = "battery_export"
+
+            # Ensure SOC stays within bounds
+            soc_kwh = max(min_soc_kwh, min(max_soc_kwh, soc_kwh))
+            soc_pct = (soc_kwh / capacity) * 100.0
+            
+            # Update charging state for next iteration's hysteresis
+            if should_charge:
+                self.last_charging_state = True
+            
+            # Time calculation
+            hour = slot // 4
+            minute = (slot % 4) * 15
+            time_str = f"{hour:02d}:{minute:02d}"
+            
+            schedule.append({
+                "slot": slot,
+                "time": time_str,
+                "mode": mode,
+                "pv_power_kW": round(pv_kw, 3),
+                "load_kW": round(load_kw, 3),
+                "net_pv_kW": round(net_pv_kw, 3),
+                "price_czk_kwh": round(price, 4),
+                "planned_charge_kW": round(planned_charge_kw, 3),
+                "soc_kwh_end": round(soc_kwh, 3),
+                "soc_pct_end": round(soc_pct, 2),
+                "should_charge": should_charge,
+                "is_critical_hour": is_critical_hour,
+            })
+        
+        # Update final charging state after all slots computed
+        if schedule:
+            self.last_charging_state = schedule[-1].get("should_charge", False)
+        
+        return schedule
+
+    def compute_plan(
+        self,
+        forecast: List[float],
+        prices: List[float],
+        loads: List[float],
+        deferrable: Sequence[DeferrableLoad] = (),
+        delivered_kwh: Optional[Dict[str, float]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """Compute the battery schedule, then place deferrable loads around it.
+
+        With ``uncertainty`` set, the plan is the candidate that does best
+        across sampled forecast scenarios; with ``optimizer_budget_s`` the
+        plan is then improved by the anytime optimizer, and a plan breaking
+        the switching constraints is repaired.  None of this applies when
+        re-planning a fleet allocation, which is already a joint decision.
+        """
+        args = (forecast, prices, loads, deferrable, delivered_kwh)
+        if self.grid_charge_allocation is not None:
+            return self.compute_plan_deterministic(*args)
+        chosen: ChargingPlanner = self
+        if self.uncertainty and stochastic.available():
+            chosen, result, self.stochastic = stochastic.choose_plan(self, args)
+        else:
+            result = self.compute_plan_deterministic(*args)
+        if self.optimizer_budget_s > 0:
+            chosen, result, self.optimization = optimizer.improve_plan(
+                chosen, args, result, self.optimizer_budget_s, self.warm_start
+            )
+        # The switching constraints hold with or without the optimizer
+        chosen, result, repaired = optimizer.repair_plan(chosen, args, result)
+        if repaired is not None:
+            self.optimization = {**(self.optimization or {}), "repair": repaired}
+        if chosen is not self:
+            for field in ("last_charging_state", "planned_peak_kw", "charge_peak_kw", "import_limited_slots",
+                          "never_charge_threshold", "battery_export"):
+                setattr(self, field, getattr(chosen, field))
+        return result
+
+    def compute_plan_deterministic(
+        self,
+        forecast: List[float],
+        prices: List[float],
+        loads: List[float],
+        deferrable: Sequence[DeferrableLoad] = (),
+        delivered_kwh: Optional[Dict[str, float]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """Plan the forecast as is.
+
+        The battery plan has priority: deferrable loads only get the site
+        capacity it leaves free.  With an export limit the schedule is planned
+        a second time with the battery-to-grid export placed on the first.
+        """
+        self.battery_export = None
+        schedule = self.compute_schedule(forecast, prices, loads)
+        if self.export_limit_kw > 0:
+            battery_export = self._plan_battery_export(schedule, prices)
+            if battery_export is not None:
+                self.battery_export = battery_export
+                self.last_charging_state = self._initial_charging_state
+                schedule = self.compute_schedule(forecast, prices, loads)
+        plan = schedule_deferrable_loads(
+            deferrable, schedule, self.current_slot, self.site_limit_kw, delivered_kwh,
+            peak_kw=self.planned_peak_kw, capacity_tariff=self.capacity_tariff,
+        ) if deferrable else {}
+        for index, slot in enumerate(schedule):
+            slot["grid_import_kW"] = round(slot_grid_import_kw(slot), 3)
+            export_kw = max(0.0, -slot_net_import_kw(slot))
+            if self.export_limit_kw > 0:
+                export_kw = min(export_kw, self.export_limit_kw)
+            slot["grid_export_kW"] = round(export_kw, 3)
+            slot["export_price_czk_kwh"] = round(self.export_price(index), 4)
+        return schedule, plan
+
+    def _plan_battery_export(self, schedule: List[Dict[str, Any]], prices: List[float]) -> Optional[List[float]]:
+        """Place battery-to-grid export in the best-paid slots the planned SOC can spare.
+
+        Greedy by export price: each slot sells what keeps the rest of the SOC
+        path above its floor (the critical-hours SOC in critical hours, else
+        the minimum SOC), and only when the price beats buying the energy back
+        at the cheapest import price through both conversion losses, plus
+        battery wear.  Returns the export kW per slot, or None.
+        """
+        capacity = float(self.config.get(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY))
+        max_charge = float(self.config.get(CONF_MAX_CHARGE_POWER, DEFAULT_MAX_CHARGE_POWER))
+        eff = float(self.config.get(CONF_CHARGE_EFFICIENCY, DEFAULT_CHARGE_EFFICIENCY)) or 1.0
+        min_soc_kwh = capacity * float(self.config.get(CONF_MIN_SOC, DEFAULT_MIN_SOC)) / 100.0
+        critical_soc_kwh = max(
+            min_soc_kwh, capacity * float(self.config.get(CONF_CRITICAL_HOURS_SOC, DEFAULT_CRITICAL_HOURS_SOC)) / 100.0
+        )
+        buy_prices = [float(price) for price in prices if float(price) > 0]
+        if not buy_prices:
+            return None
+        buy_back = min(buy_prices)
+        wear = WearModel.from_config(self.config)
+        interval_hours = 0.25
+
+        headroom = [
+            slot["soc_kwh_end"] - (critical_soc_kwh if slot["is_critical_hour"] else min_soc_kwh)
+            for slot in schedule
+        ]
+        candidates = []
+        for index in range(self.current_slot, len(schedule)):
+            slot = schedule[index]
+            if slot["mode"] not in ("battery_discharge", "idle") or slot["net_pv_kW"] > 0.05:
+                continue
+            power_kw = min(self.export_limit_kw, max_charge + min(0.0, slot["planned_charge_kW"]))
+            if power_kw <= 0.01:
+                continue
+            slot_wear = wear.per_kwh(slot["soc_kwh_end"], power_kw)
+            price = self.export_price(index)
+            if price > (buy_back + slot_wear) / (eff * eff) + slot_wear:
+                candidates.append((price, index, power_kw))
+        if not candidates:
+            return None
+
+        battery_export = [0.0] * len(schedule)
+        for _price, index, power_kw in sorted(candidates, key=lambda c: (-c[0], c[1])):
+            export_kwh = min(power_kw * interval_hours, min(headroom[index:]) * eff)
+            if export_kwh <= 0.0025:
+                continue
+            battery_export[index] = export_kwh / interval_hours
+            for later in range(index, len(schedule)):
+                headroom[later] -= export_kwh / eff
+        return battery_export if any(battery_export) else None
+
+    def replan_with_allocation(
+        self, allocation: List[float], *args: Any
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """Re-run :meth:`compute_plan` charging from the grid only as ``allocation`` grants."""
+        self.grid_charge_allocation = list(allocation)
+        self.last_charging_state = self._initial_charging_state
+        return self.compute_plan(*args)
+
+    def charge_requests(self, schedule: List[Dict[str, Any]], key: str) -> List[ChargeRequest]:
+        """Return the grid charging of ``schedule`` as requests for a shared connection."""
+        max_charge = float(self.config.get(CONF_MAX_CHARGE_POWER, DEFAULT_MAX_CHARGE_POWER))
+        prices = [float(slot.get("price_czk_kwh", 0.0)) for slot in schedule]
+        eligible = [0 < price < self.never_charge_threshold for price in prices]
+        return [
+            ChargeRequest(f"{key}#{index}", kwh, max_charge, self.initial_soc_frac,
+                          start, deadline, eligible, prices)
+            for index, (start, deadline, kwh) in enumerate(charge_blocks(schedule, self.current_slot))
+        ]
+
+    def import_summary(self, schedule: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the planned site import peak and its capacity-tariff cost, and the planned export."""
+        remaining = schedule[self.current_slot:]
+        planned_peak = max((slot.get("grid_import_kW", 0.0) for slot in remaining), default=0.0)
+        export_kwh = sum(slot.get("grid_export_kW", 0.0) for slot in remaining) * 0.25
+        # Feed-in only earns money where export is planned (and allowed)
+        export_revenue = sum(
+            slot.get("grid_export_kW", 0.0) * slot.get("export_price_czk_kwh", 0.0) for slot in remaining
+        ) * 0.25 if self.export_limit_kw > 0 else 0.0
+        return {
+            "site_limit_kw": self.site_limit_kw,
+            "monthly_peak_kw": round(self.monthly_peak_kw, 3),
+            "planned_peak_kw": round(planned_peak, 3),
+            "capacity_tariff": self.capacity_tariff,
+            "capacity_cost": round(self.capacity_tariff * max(0.0, planned_peak - self.monthly_peak_kw), 2),
+            "import_limited_slots": self.import_limited_slots,
+            "export_limit_kw": self.export_limit_kw,
+            "planned_export_kwh": round(export_kwh, 2),
+            "export_revenue": round(export_revenue, 2),
+        }
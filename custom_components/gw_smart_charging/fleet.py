@@ -0,0 +1,296 @@
+"""Multi-entry (fleet) support.
+
+Several config entries (batteries, sites) can run in one Home Assistant.
+This module resolves the entities and coordinator of a given entry for the
+services, views and card, and batches the planning work of all entries:
+with more than one entry the fleet drives the refresh cycle and runs every
+entry's plan in a single executor job instead of one job per entry.  Entries
+with a planner worker (``worker.py``) plan there instead, and join the
+executor job only when the worker does not answer.
+
+Entries with the same connection group share one grid connection; when
+their independent plans together exceed the group limit (the lowest limit
+set by a member), the batch re-plans them with a joint allocation of the
+connection (``allocation.py``).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.event import async_track_time_interval
+
+from .allocation import connection_of, coordinate_group, schedule_import_kw
+from .const import DOMAIN
+from .worker import WorkerUnavailable
+
+_LOGGER = logging.getLogger(__name__)
+
+# Plans submitted during a fleet cycle are flushed at the latest after this
+BATCH_WINDOW = 0.5  # seconds
+
+# Fallback entity ids of the first entry (entities created before entry lookup)
+DEFAULT_ENTITY_IDS = {
+    "forecast": "sensor.gw_smart_charging_forecast",
+    "schedule": "sensor.gw_smart_charging_schedule",
+    "soc_forecast": "sensor.gw_smart_charging_soc_forecast",
+    "diagnostics": "sensor.gw_smart_charging_diagnostics",
+    "battery_power": "sensor.gw_smart_charging_battery_power",
+    "daily_statistics": "sensor.gw_smart_charging_daily_statistics",
+    "next_charge": "sensor.gw_smart_charging_next_charge",
+    "auto_charging": "switch.gw_smart_charging_auto_charging",
+}
+
+
+def get_coordinators(hass: HomeAssistant) -> Dict[str, Any]:
+    """Return the running coordinators by entry id."""
+    return dict(hass.data.get(DOMAIN, {}))
+
+
+def entry_entity_ids(hass: HomeAssistant, entry_id: str) -> Dict[str, str]:
+    """Return ``{role: entity_id}`` of an entry's entities (role = unique id suffix)."""
+    registry = er.async_get(hass)
+    prefix = f"{entry_id}_"
+    return {
+        entity.unique_id[len(prefix):]: entity.entity_id
+        for entity in er.async_entries_for_config_entry(registry, entry_id)
+        if entity.unique_id.startswith(prefix)
+    }
+
+
+def entity_ids_with_defaults(hass: HomeAssistant, entry_id: Optional[str]) -> Dict[str, str]:
+    """Return the entry's entity ids, falling back to the single-entry defaults."""
+    ids = dict(DEFAULT_ENTITY_IDS)
+    if entry_id:
+        ids.update(entry_entity_ids(hass, entry_id))
+    return ids
+
+
+def _run_batch(
+    jobs: List[Tuple[str, Any, tuple]],
+    connections: Dict[str, Tuple[float, List[float]]],
+    planned: Optional[List[Optional[Tuple[bool, Any]]]] = None,
+) -> List[Tuple[bool, Any]]:
+    """Run planning jobs in one executor thread; one failure does not affect the others.
+
+    ``connections`` maps a connection group to its limit and the planned
+    import of its members outside this batch.  Groups over their limit are
+    re-planned jointly; if that fails the independent plans are kept.
+    ``planned`` holds results already planned elsewhere (a worker), None
+    for the jobs still to plan here.
+    """
+    results: List[Tuple[bool, Any]] = []
+    for index, (_entry_id, planner, args) in enumerate(jobs):
+        if planned is not None and planned[index] is not None:
+            results.append(planned[index])
+            continue
+        try:
+            results.append((True, planner.compute_plan(*args)))
+        except Exception as err:  # handed back to the submitting coordinator
+            results.append((False, err))
+
+    groups: Dict[str, List[int]] = {}
+    for index, (_entry_id, planner, _args) in enumerate(jobs):
+        connection = connection_of(planner.config)
+        if connection is not None and results[index][0]:
+            groups.setdefault(connection[0], []).append(index)
+    for group, indexes in groups.items():
+        limit_kw, fixed_import = connections.get(group, (0.0, []))
+        members = [(jobs[i][0], jobs[i][1], jobs[i][2], results[i][1]) for i in indexes]
+        try:
+            joint = coordinate_group(group, limit_kw, members, fixed_import or None)
+        except Exception:  # keep the independent plans
+            _LOGGER.exception("Joint planning of connection %s failed", group)
+            continue
+        for i in indexes:
+            results[i] = (True, joint[jobs[i][0]])
+    return results
+
+
+class FleetPlanner:
+    """Drive the refresh cycle of several entries and batch their plans."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self._members: Dict[str, Any] = {}
+        self._intervals: Dict[str, Optional[timedelta]] = {}
+        self._unsub_tick: Optional[Callable[[], None]] = None
+        # Entries refreshing in the current fleet cycle that have not planned yet
+        self._expected: Set[str] = set()
+        self._pending: List[Tuple[str, Any, tuple, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._stats: Dict[str, Any] = {
+            "cycles": 0, "batches": 0, "plans": 0, "max_batch": 0,
+            "last_batch_size": 0, "last_batch_ms": None,
+        }
+
+    @property
+    def members(self) -> List[str]:
+        return list(self._members)
+
+    # ---------- membership ----------
+
+    def register(self, coordinator: Any) -> None:
+        """Add an entry's coordinator; with two or more entries the fleet drives refreshes."""
+        entry_id = coordinator.entry.entry_id
+        self._members[entry_id] = coordinator
+        self._intervals[entry_id] = coordinator.update_interval
+        coordinator.fleet = self
+        self._update_driver()
+
+    def unregister(self, entry_id: str) -> None:
+        coordinator = self._members.pop(entry_id, None)
+        interval = self._intervals.pop(entry_id, None)
+        self._expected.discard(entry_id)
+        if coordinator is not None:
+            coordinator.fleet = None
+            coordinator.update_interval = interval
+        self._update_driver()
+        self._maybe_flush()
+
+    def _update_driver(self) -> None:
+        """Own the refresh timer while more than one entry is running."""
+        if len(self._members) > 1:
+            for coordinator in self._members.values():
+                coordinator.update_interval = None
+            if self._unsub_tick is None:
+                interval = min((i for i in self._intervals.values() if i), default=timedelta(minutes=2))
+                self._unsub_tick = async_track_time_interval(self.hass, self._async_tick, interval)
+                _LOGGER.info("Fleet mode: planning %d entries together every %s", len(self._members), interval)
+            return
+        if self._unsub_tick is not None:
+            self._unsub_tick()
+            self._unsub_tick = None
+        # A single entry refreshes on its own timer again
+        for entry_id, coordinator in self._members.items():
+            if coordinator.update_interval is None:
+                coordinator.update_interval = self._intervals.get(entry_id)
+                self.hass.async_create_task(coordinator.async_request_refresh())
+
+    async def async_stop(self) -> None:
+        if self._unsub_tick is not None:
+            self._unsub_tick()
+            self._unsub_tick = None
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+    # ---------- refresh cycle ----------
+
+    async def _async_tick(self, _now: datetime) -> None:
+        """Refresh all entries together so their plans land in one batch."""
+        self._stats["cycles"] += 1
+        members = dict(self._members)
+        self._expected = set(members)
+
+        async def _refresh(entry_id: str, coordinator: Any) -> None:
+            try:
+                await coordinator.async_refresh()
+            finally:
+                # Entries that finished (or failed) without planning do not hold the batch
+                self._expected.discard(entry_id)
+                self._maybe_flush()
+
+        await asyncio.gather(*(_refresh(e, c) for e, c in members.items()))
+
+    # ---------- batched planning ----------
+
+    def async_plan(self, entry_id: str, planner: Any, *args: Any) -> asyncio.Future:
+        """Queue ``planner.compute_plan(*args)`` for the next batch; returns a future with its result."""
+        future = self.hass.loop.create_future()
+        self._pending.append((entry_id, planner, args, future))
+        if not self._maybe_flush() and self._flush_handle is None:
+            self._flush_handle = self.hass.loop.call_later(BATCH_WINDOW, self._flush)
+        return future
+
+    @callback
+    def _maybe_flush(self) -> bool:
+        """Flush when every entry expected in this cycle has submitted its plan."""
+        if not self._pending:
+            return False
+        submitted = {entry_id for entry_id, *_ in self._pending}
+        if self._expected - submitted:
+            return False
+        self._flush()
+        return True
+
+    @callback
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        jobs, self._pending = self._pending, []
+        if jobs:
+            self.hass.async_create_background_task(self._async_run(jobs), f"{DOMAIN} fleet plan batch")
+
+    def _connections(self, batch: Set[str]) -> Dict[str, Tuple[float, List[float]]]:
+        """Return limit and out-of-batch planned import of every connection group."""
+        connections: Dict[str, Tuple[float, List[float]]] = {}
+        for entry_id, coordinator in self._members.items():
+            connection = connection_of(coordinator.config)
+            if connection is None:
+                continue
+            group, limit_kw = connection
+            current_limit, fixed = connections.get(group, (0.0, [0.0] * 96))
+            if limit_kw > 0 and (current_limit <= 0 or limit_kw < current_limit):
+                current_limit = limit_kw
+            if entry_id not in batch and coordinator.data:
+                for slot, kw in enumerate(schedule_import_kw(coordinator.data.get("schedule") or [])):
+                    fixed[slot] += kw
+            connections[group] = (current_limit, fixed)
+        return connections
+
+    async def _async_plan_in_workers(self, jobs: List[Tuple[str, Any, tuple]]) -> List[Optional[Tuple[bool, Any]]]:
+        """Plan the jobs of entries with a planner worker there; None where the executor has to plan."""
+
+        async def _plan(entry_id: str, planner: Any, args: tuple) -> Optional[Tuple[bool, Any]]:
+            worker = getattr(self._members.get(entry_id), "planner_worker", None)
+            if worker is None:
+                return None
+            try:
+                return True, await worker.async_plan(planner, *args)
+            except WorkerUnavailable as err:
+                _LOGGER.debug("Planner worker unavailable (%s), planning %s in-process", err, entry_id)
+                worker.record_fallback()
+                return None
+
+        return list(await asyncio.gather(*(_plan(*job) for job in jobs)))
+
+    async def _async_run(self, jobs: List[Tuple[str, Any, tuple, asyncio.Future]]) -> None:
+        started = time.monotonic()
+        batch = [(entry_id, planner, args) for entry_id, planner, args, _ in jobs]
+        try:
+            planned = await self._async_plan_in_workers(batch)
+            connections = self._connections({entry_id for entry_id, *_ in jobs})
+            if all(result is not None for result in planned) and not any(
+                connection_of(planner.config) for _, planner, _ in batch
+            ):
+                results = planned
+            else:
+                # Plans left to the executor, and the joint re-planning of shared connections
+                results = await self.hass.async_add_executor_job(_run_batch, batch, connections, planned)
+        except Exception as err:
+            results = [(False, err)] * len(jobs)
+        elapsed_ms = round((time.monotonic() - started) * 1000.0, 1)
+        stats = self._stats
+        stats["batches"] += 1
+        stats["plans"] += len(jobs)
+        stats["max_batch"] = max(stats["max_batch"], len(jobs))
+        stats["last_batch_size"] = len(jobs)
+        stats["last_batch_ms"] = elapsed_ms
+        _LOGGER.debug("Fleet batch: %d plans in %.1f ms", len(jobs), elapsed_ms)
+        for (_, _, _, future), (ok, value) in zip(jobs, results):
+            if future.done():  # caller gave up (plan budget)
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "entries": len(self._members), "driving": self._unsub_tick is not None}
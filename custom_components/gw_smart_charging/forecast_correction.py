@@ -0,0 +1,280 @@
+"""PV forecast bias correction learned from measured production.
+
+The forecast providers we read (Forecast.Solar, Solcast, ...) are often
+systematically off for a given roof: shading in the morning, a different
+azimuth than configured, snow in winter.  This module compares the forecast
+that was planned for each 15-minute slot with the energy actually integrated
+from the PV power sensor and learns a multiplicative correction factor per
+slot and per season.
+
+State is kept in flat ``array('d')`` buffers (4 seasons x 96 slots) so every
+update is O(1) and the whole model serialises to a few kilobytes.
+"""
+from __future__ import annotations
+
+import logging
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+SLOTS_PER_DAY = 96
+SLOT_MINUTES = 15
+SLOT_HOURS = SLOT_MINUTES / 60.0
+SEASONS = ("winter", "spring", "summer", "autumn")
+
+# Exponential smoothing factor for forecast/actual energy per slot
+DEFAULT_ALPHA = 0.15
+# Correction factors are clamped to this range to survive sensor glitches
+MIN_FACTOR = 0.3
+MAX_FACTOR = 1.5
+# Slots with less forecast energy than this (kWh) are not learned (night, dawn)
+MIN_SLOT_ENERGY_KWH = 0.02
+# Number of samples after which a slot factor is trusted fully
+FULL_TRUST_SAMPLES = 10
+# A slot is only learned when at least this share of it was observed
+MIN_SLOT_COVERAGE = 0.8
+# Sampling gaps longer than this are not integrated (HA restart, sensor outage)
+MAX_SAMPLE_GAP = timedelta(minutes=15)
+# How many forecast days are remembered for later comparison
+MAX_PENDING_DAYS = 4
+# A day total is only reported when at least this share of the day was observed
+MIN_DAY_COVERAGE = 0.8
+
+
+def season_index(day: date) -> int:
+    """Return meteorological season index (0=winter .. 3=autumn) for a date."""
+    return (day.month % 12) // 3
+
+
+class PVBiasCorrector:
+    """Learn and apply per-slot, per-season PV forecast correction factors."""
+
+    def __init__(self, alpha: float = DEFAULT_ALPHA) -> None:
+        self._alpha = alpha
+        size = len(SEASONS) * SLOTS_PER_DAY
+        # Smoothed forecast / measured energy per (season, slot) in kWh
+        self._forecast_kwh = array("d", [0.0] * size)
+        self._actual_kwh = array("d", [0.0] * size)
+        self._samples = array("I", [0] * size)
+        # Raw (uncorrected) forecast per ISO date, kW per slot
+        self._pending: Dict[str, List[float]] = {}
+        # Production integration state
+        self._last_sample_time: Optional[datetime] = None
+        self._last_sample_kw: float = 0.0
+        self._slot_key: Optional[Tuple[date, int]] = None
+        self._slot_kwh: float = 0.0
+        self._slot_seconds: float = 0.0
+        # Daily production totals (used to score forecast providers)
+        self._day: Optional[date] = None
+        self._day_kwh: float = 0.0
+        self._day_seconds: float = 0.0
+        self._completed_days: List[Tuple[date, float]] = []
+
+    # ---------- learning ----------
+
+    def record_forecast(self, day: date, forecast_kw: List[float]) -> bool:
+        """Remember the raw forecast for ``day`` so it can be scored later.
+
+        Returns True when the stored forecast changed.
+        """
+        if len(forecast_kw) < SLOTS_PER_DAY or not any(forecast_kw):
+            return False
+        key = day.isoformat()
+        values = [round(float(v), 4) for v in forecast_kw[:SLOTS_PER_DAY]]
+        if self._pending.get(key) == values:
+            return False
+        self._pending[key] = values
+        if len(self._pending) > MAX_PENDING_DAYS:
+            for old_key in sorted(self._pending)[:-MAX_PENDING_DAYS]:
+                del self._pending[old_key]
+        return True
+
+    def add_production_sample(self, now: datetime, pv_kw: float) -> bool:
+        """Integrate a PV power reading (kW) into the per-slot energy buckets.
+
+        Uses trapezoidal integration between consecutive samples and splits the
+        interval across slot boundaries.  Returns True when at least one slot
+        was completed and learned from.
+        """
+        pv_kw = max(0.0, pv_kw)
+        learned = False
+        last_time = self._last_sample_time
+        last_kw = self._last_sample_kw
+        self._last_sample_time = now
+        self._last_sample_kw = pv_kw
+
+        if last_time is None or now <= last_time:
+            return False
+        if now - last_time > MAX_SAMPLE_GAP:
+            # Outage - whatever was accumulated for the open slot is incomplete
+            self._reset_slot()
+            return False
+
+        avg_kw = (last_kw + pv_kw) / 2.0
+        cursor = last_time
+        while cursor < now:
+            slot_start = cursor.replace(
+                minute=(cursor.minute // SLOT_MINUTES) * SLOT_MINUTES, second=0, microsecond=0
+            )
+            slot_end = slot_start + timedelta(minutes=SLOT_MINUTES)
+            segment_end = min(now, slot_end)
+            key = (cursor.date(), cursor.hour * 4 + cursor.minute // SLOT_MINUTES)
+            if self._slot_key != key:
+                self._reset_slot()
+                self._slot_key = key
+            if self._day != key[0]:
+                self._close_day()
+                self._day = key[0]
+            seconds = (segment_end - cursor).total_seconds()
+            energy_kwh = avg_kw * seconds / 3600.0
+            self._slot_kwh += energy_kwh
+            self._slot_seconds += seconds
+            self._day_kwh += energy_kwh
+            self._day_seconds += seconds
+            if segment_end >= slot_end:
+                learned = self._finalize_slot() or learned
+            cursor = segment_end
+        return learned
+
+    def reset_sampling(self) -> None:
+        """Forget the open integration interval (e.g. the PV sensor was replaced)."""
+        self._last_sample_time = None
+        self._last_sample_kw = 0.0
+        self._reset_slot()
+        self._day = None
+        self._day_kwh = 0.0
+        self._day_seconds = 0.0
+
+    def _close_day(self) -> None:
+        if self._day is not None and self._day_seconds >= MIN_DAY_COVERAGE * 86400:
+            self._completed_days.append((self._day, round(self._day_kwh, 3)))
+        self._day = None
+        self._day_kwh = 0.0
+        self._day_seconds = 0.0
+
+    def pop_completed_days(self) -> List[Tuple[date, float]]:
+        """Return ``(day, measured kWh)`` for days completed since the last call."""
+        completed, self._completed_days = self._completed_days, []
+        return completed
+
+    def _reset_slot(self) -> None:
+        self._slot_key = None
+        self._slot_kwh = 0.0
+        self._slot_seconds = 0.0
+
+    def _finalize_slot(self) -> bool:
+        """Compare a completed slot with its forecast and update the model."""
+        key = self._slot_key
+        actual_kwh = self._slot_kwh
+        coverage = self._slot_seconds / (SLOT_MINUTES * 60.0)
+        self._reset_slot()
+        if key is None or coverage < MIN_SLOT_COVERAGE:
+            return False
+
+        day, slot = key
+        forecast = self._pending.get(day.isoformat())
+        if not forecast:
+            return False
+        forecast_kwh = forecast[slot] * SLOT_HOURS
+        if forecast_kwh < MIN_SLOT_ENERGY_KWH:
+            return False
+
+        idx = season_index(day) * SLOTS_PER_DAY + slot
+        if self._samples[idx] == 0:
+            self._forecast_kwh[idx] = forecast_kwh
+            self._actual_kwh[idx] = actual_kwh
+        else:
+            a = self._alpha
+            self._forecast_kwh[idx] += a * (forecast_kwh - self._forecast_kwh[idx])
+            self._actual_kwh[idx] += a * (actual_kwh - self._actual_kwh[idx])
+        self._samples[idx] += 1
+        _LOGGER.debug(
+            "PV bias slot %s/%d: forecast=%.3f kWh actual=%.3f kWh factor=%.3f",
+            day, slot, forecast_kwh, actual_kwh, self.factor(day, slot),
+        )
+        return True
+
+    # ---------- applying ----------
+
+    def factor(self, day: date, slot: int) -> float:
+        """Return the correction factor for a slot of ``day`` (1.0 when unknown)."""
+        idx = season_index(day) * SLOTS_PER_DAY + slot
+        samples = self._samples[idx]
+        forecast_kwh = self._forecast_kwh[idx]
+        if samples == 0 or forecast_kwh < MIN_SLOT_ENERGY_KWH:
+            return 1.0
+        ratio = max(MIN_FACTOR, min(MAX_FACTOR, self._actual_kwh[idx] / forecast_kwh))
+        # Shrink towards 1.0 until the slot has enough observations
+        trust = min(1.0, samples / FULL_TRUST_SAMPLES)
+        return 1.0 + (ratio - 1.0) * trust
+
+    def apply(self, day: date, forecast_kw: List[float]) -> List[float]:
+        """Return the forecast for ``day`` with learned factors applied."""
+        return [
+            round(float(value) * self.factor(day, slot), 3) if value else 0.0
+            for slot, value in enumerate(forecast_kw[:SLOTS_PER_DAY])
+        ]
+
+    def summary(self, day: date) -> Dict[str, Any]:
+        """Return a compact description of the model for diagnostics."""
+        season = season_index(day)
+        base = season * SLOTS_PER_DAY
+        learned = [s for s in range(SLOTS_PER_DAY) if self._samples[base + s] > 0]
+        factors = [self.factor(day, s) for s in learned]
+        return {
+            "season": SEASONS[season],
+            "learned_slots": len(learned),
+            "total_samples": sum(self._samples[base + s] for s in learned),
+            "mean_factor": round(sum(factors) / len(factors), 3) if factors else 1.0,
+            "min_factor": round(min(factors), 3) if factors else 1.0,
+            "max_factor": round(max(factors), 3) if factors else 1.0,
+        }
+
+    # ---------- persistence ----------
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Serialise model state for HA storage."""
+        return {
+            "forecast_kwh": [round(v, 5) for v in self._forecast_kwh],
+            "actual_kwh": [round(v, 5) for v in self._actual_kwh],
+            "samples": list(self._samples),
+            "pending": self._pending,
+            "day": self._day.isoformat() if self._day else None,
+            "day_kwh": round(self._day_kwh, 4),
+            "day_seconds": round(self._day_seconds, 1),
+        }
+
+    def load_dict(self, data: Optional[Dict[str, Any]]) -> None:
+        """Restore model state saved by :meth:`as_dict`."""
+        if not data:
+            return
+        size = len(SEASONS) * SLOTS_PER_DAY
+        try:
+            forecast_kwh = [float(v) for v in data.get("forecast_kwh", [])]
+            actual_kwh = [float(v) for v in data.get("actual_kwh", [])]
+            samples = [int(v) for v in data.get("samples", [])]
+        except (TypeError, ValueError):
+            _LOGGER.warning("Ignoring corrupt PV bias correction data")
+            return
+        if len(forecast_kwh) != size or len(actual_kwh) != size or len(samples) != size:
+            _LOGGER.warning("Ignoring PV bias correction data with unexpected shape")
+            return
+        self._forecast_kwh = array("d", forecast_kwh)
+        self._actual_kwh = array("d", actual_kwh)
+        self._samples = array("I", samples)
+        pending = data.get("pending") or {}
+        if isinstance(pending, dict):
+            self._pending = {
+                str(k): [float(x) for x in v]
+                for k, v in pending.items()
+                if isinstance(v, list) and len(v) == SLOTS_PER_DAY
+            }
+        try:
+            if data.get("day"):
+                self._day = date.fromisoformat(data["day"])
+                self._day_kwh = float(data.get("day_kwh", 0.0))
+                self._day_seconds = float(data.get("day_seconds", 0.0))
+        except (TypeError, ValueError):
+            self._day = None
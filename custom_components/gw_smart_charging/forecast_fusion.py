@@ -0,0 +1,186 @@
+"""Fusion of several PV forecast entities into one 15-minute forecast.
+
+The forecast option accepts a comma-separated list of entities.  Each entry may
+carry an array prefix (``south=sensor.solcast_today``); entries without one
+belong to the ``default`` array.
+
+- Entities of the same array that cover the same slots (two providers for the
+  same roof, or overlapping today/d1/d2 sensors) are blended with weights
+  ``confidence / (ERROR_FLOOR + historical error)``.
+- Arrays (roof orientations) are added up slot by slot.
+
+Historical error per entity is learned from the daily PV energy measured by
+the bias corrector: for each day we remember what the site total would have
+been if that entity was right, and compare it with the measured total.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import date
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .ingest import TIMESTAMPED_SHAPES, Timeline
+
+_LOGGER = logging.getLogger(__name__)
+
+SLOTS_PER_DAY = 96
+SLOT_HOURS = 0.25
+DEFAULT_ARRAY = "default"
+
+# Relative daily error assumed for entities without history
+DEFAULT_ERROR = 0.3
+# Keeps weights finite for a (lucky) perfect provider
+ERROR_FLOOR = 0.1
+ERROR_ALPHA = 0.2
+# Days below this measured total are too dull to score providers on
+MIN_SCORING_KWH = 0.5
+MAX_ESTIMATE_DAYS = 4
+
+
+class FusionInput(NamedTuple):
+    """One parsed forecast entity taking part in the fusion."""
+
+    array: str
+    entity_id: str
+    timeline: Timeline
+    confidence: float
+    dates: List[date]
+
+
+def parse_forecast_sources(value: Any) -> List[Tuple[str, str]]:
+    """Parse the forecast option into ``(array, entity_id)`` pairs."""
+    if isinstance(value, (list, tuple)):
+        items: Iterable[str] = (str(v) for v in value)
+    else:
+        items = str(value or "").replace("\n", ",").split(",")
+    sources: List[Tuple[str, str]] = []
+    for item in items:
+        item = item.strip()
+        if not item:
+            continue
+        array, sep, entity_id = item.partition("=")
+        if not sep:
+            array, entity_id = DEFAULT_ARRAY, item
+        array, entity_id = array.strip() or DEFAULT_ARRAY, entity_id.strip()
+        if entity_id and (array, entity_id) not in sources:
+            sources.append((array, entity_id))
+    return sources
+
+
+class ForecastFusion:
+    """Align, blend and sum forecast timelines; learn provider accuracy."""
+
+    def __init__(self) -> None:
+        # (entity_id, day) -> (timeline, values, coverage); reused while the timeline object is unchanged
+        self._slot_cache: Dict[Tuple[str, Optional[date]], Tuple[Timeline, List[float], List[bool]]] = {}
+        # entity_id -> smoothed relative daily error
+        self._error: Dict[str, float] = {}
+        # entity_id -> ISO day -> site total (kWh) implied by that entity
+        self._estimates: Dict[str, Dict[str, float]] = {}
+
+    def _slots(self, source: FusionInput, day: date) -> Tuple[List[float], List[bool]]:
+        timestamped = source.timeline.shape in TIMESTAMPED_SHAPES
+        key_day = day if timestamped else None
+        key = (source.entity_id, key_day)
+        cached = self._slot_cache.get(key)
+        if cached is not None and cached[0] is source.timeline:
+            return cached[1], cached[2]
+        values = source.timeline.to_slots(SLOTS_PER_DAY, day=key_day)
+        coverage = source.timeline.slot_coverage(SLOTS_PER_DAY, day=key_day)
+        self._slot_cache[key] = (source.timeline, values, coverage)
+        return values, coverage
+
+    def weight(self, entity_id: str, confidence: float) -> float:
+        """Return the blending weight of an entity."""
+        error = self._error.get(entity_id, DEFAULT_ERROR)
+        return max(confidence, 0.01) / (ERROR_FLOOR + error)
+
+    def fuse(self, sources: List[FusionInput], day: date) -> Tuple[List[float], List[Dict[str, Any]]]:
+        """Return the fused site forecast (kW per slot) for ``day`` and per-source details."""
+        arrays: Dict[str, List[float]] = {}
+        array_weights: Dict[str, List[float]] = {}
+        per_source: List[Tuple[FusionInput, float, List[float]]] = []
+
+        for source in sources:
+            if day not in source.dates:
+                continue
+            values, coverage = self._slots(source, day)
+            w = self.weight(source.entity_id, source.confidence)
+            sums = arrays.setdefault(source.array, [0.0] * SLOTS_PER_DAY)
+            weights = array_weights.setdefault(source.array, [0.0] * SLOTS_PER_DAY)
+            for slot in range(SLOTS_PER_DAY):
+                if coverage[slot]:
+                    sums[slot] += w * values[slot]
+                    weights[slot] += w
+            per_source.append((source, w, values))
+
+        array_totals: Dict[str, List[float]] = {
+            name: [sums[i] / array_weights[name][i] if array_weights[name][i] else 0.0 for i in range(SLOTS_PER_DAY)]
+            for name, sums in arrays.items()
+        }
+        fused = [round(sum(series[i] for series in array_totals.values()), 3) for i in range(SLOTS_PER_DAY)]
+
+        # Remember what each entity implies for the site total, for later scoring
+        site_kwh = sum(fused) * SLOT_HOURS
+        details: List[Dict[str, Any]] = []
+        for source, w, values in per_source:
+            own_kwh = sum(values) * SLOT_HOURS
+            array_kwh = sum(array_totals[source.array]) * SLOT_HOURS
+            estimates = self._estimates.setdefault(source.entity_id, {})
+            estimates[day.isoformat()] = round(site_kwh - array_kwh + own_kwh, 3)
+            if len(estimates) > MAX_ESTIMATE_DAYS:
+                for old in sorted(estimates)[:-MAX_ESTIMATE_DAYS]:
+                    del estimates[old]
+            details.append({
+                "entity_id": source.entity_id,
+                "array": source.array,
+                "shape": source.timeline.shape,
+                "confidence": round(source.confidence, 3),
+                "weight": round(w, 3),
+                "historical_error": round(self._error[source.entity_id], 3) if source.entity_id in self._error else None,
+                "energy_kwh": round(own_kwh, 2),
+            })
+        return fused, details
+
+    def record_actual(self, day: date, actual_kwh: float) -> bool:
+        """Score every entity that forecast ``day`` against the measured total."""
+        if actual_kwh < MIN_SCORING_KWH:
+            return False
+        key = day.isoformat()
+        updated = False
+        for entity_id, estimates in self._estimates.items():
+            estimate = estimates.pop(key, None)
+            if estimate is None:
+                continue
+            error = abs(estimate - actual_kwh) / actual_kwh
+            previous = self._error.get(entity_id)
+            self._error[entity_id] = error if previous is None else previous + ERROR_ALPHA * (error - previous)
+            _LOGGER.debug("Forecast %s for %s: estimate %.2f kWh, actual %.2f kWh, error %.1f%%",
+                          entity_id, key, estimate, actual_kwh, error * 100)
+            updated = True
+        return updated
+
+    def forget(self, keep: Iterable[str]) -> None:
+        """Drop cached state of entities that are no longer configured."""
+        keep = set(keep)
+        for key in [k for k in self._slot_cache if k[0] not in keep]:
+            del self._slot_cache[key]
+        for entity_id in [e for e in self._estimates if e not in keep]:
+            del self._estimates[entity_id]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"error": self._error, "estimates": self._estimates}
+
+    def load_dict(self, data: Optional[Dict[str, Any]]) -> None:
+        if not data:
+            return
+        try:
+            self._error = {str(k): float(v) for k, v in (data.get("error") or {}).items()}
+            self._estimates = {
+                str(k): {str(d): float(x) for d, x in v.items()}
+                for k, v in (data.get("estimates") or {}).items()
+                if isinstance(v, dict)
+            }
+        except (AttributeError, TypeError, ValueError):
+            _LOGGER.warning("Ignoring corrupt forecast fusion data")
+            self._error, self._estimates = {}, {}
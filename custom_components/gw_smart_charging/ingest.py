@@ -0,0 +1,664 @@
+"""Unified time-series ingestion for forecast, price and load sensors.
+
+Every supported attribute shape (15-min ``watts`` maps, hourly lists,
+timestamp->value mappings, Solcast-style record lists, JSON arrays in the
+state, plain scalars) is turned into one typed :class:`Timeline` with
+normalised units:
+
+- ``KIND_POWER``  -> kW  (W inputs are divided by 1000, Wh per period -> average kW)
+- ``KIND_PRICE``  -> currency/kWh (MWh prices are divided by 1000)
+- ``KIND_ENERGY`` -> kWh (Wh inputs are divided by 1000)
+
+Plain current readings (grid import, PV power, battery SOC) are read with
+:func:`read_scalar`, which applies the same unit rules without caching.
+
+Shape parsers are registered per kind with :func:`register_shape` and tried
+in a fixed order: registration order (most specific shape first), fallback
+shapes such as the plain scalar last.  The shape that matched last time for
+an entity is tried first as a shortcut, as long as the entity still has the
+same attribute keys; fallback matches are never remembered, so a richer
+attribute showing up later is always found.  Parsed timelines are cached by
+state fingerprint, so each state object is parsed exactly once no matter how
+many consumers read it; with several config entries the cache is shared
+(see :class:`SharedTimelineCache`).
+"""
+from __future__ import annotations
+
+import json
+import logging
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+KIND_POWER = "power"
+KIND_PRICE = "price"
+KIND_ENERGY = "energy"
+# Plain percentages (battery SOC); only read with ``read_scalar``
+KIND_PERCENT = "percent"
+
+UNIT_BY_KIND = {
+    KIND_POWER: "kW",
+    KIND_PRICE: "currency/kWh",
+    KIND_ENERGY: "kWh",
+    KIND_PERCENT: "%",
+}
+
+# Divisor to the normalised unit, per explicit unit_of_measurement
+POWER_UNITS = {"kW": 1.0, "W": 1000.0, "MW": 0.001}
+ENERGY_UNITS = {"kWh": 1.0, "Wh": 1000.0, "MWh": 0.001}
+
+SLOTS_PER_DAY = 96
+
+# Shapes whose timestamps come from the sensor itself (positional lists and
+# scalars get synthetic timestamps anchored at today's midnight)
+TIMESTAMPED_SHAPES = frozenset({
+    "watts_map",
+    "wh_period_map",
+    "consumption_map",
+    "forecast_list",
+    "price_map",
+    "price_records",
+})
+
+
+@dataclass(frozen=True)
+class Timeline:
+    """Normalised time series parsed from one sensor state."""
+
+    timestamps: Tuple[datetime, ...]
+    values: array
+    unit: str
+    resolution: int  # minutes per point, 0 for a scalar
+    shape: str
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def is_scalar(self) -> bool:
+        return self.resolution == 0
+
+    @property
+    def scalar(self) -> float:
+        """Return the single value of a scalar timeline (or the first point)."""
+        return self.values[0] if self.values else 0.0
+
+    def dates(self) -> List[date]:
+        """Return the sorted distinct dates covered by the timeline."""
+        if self.is_scalar:
+            return []
+        return sorted({ts.date() for ts in self.timestamps})
+
+    def to_slots(self, slots: int = SLOTS_PER_DAY, day: Optional[date] = None) -> List[float]:
+        """Bucket the timeline into ``slots`` equal time-of-day slots.
+
+        Points coarser than a slot are repeated over every slot they cover,
+        finer points are averaged.  With ``day`` set only points of that date
+        are used; otherwise all points are folded by time of day.
+        """
+        if self.is_scalar:
+            return [self.scalar] * slots
+        slot_minutes = 1440 // slots
+        span = max(1, self.resolution // slot_minutes) if self.resolution else 1
+        sums = [0.0] * slots
+        counts = [0] * slots
+        for ts, value in zip(self.timestamps, self.values):
+            if day is not None and ts.date() != day:
+                continue
+            first = (ts.hour * 60 + ts.minute) // slot_minutes
+            for idx in range(first, min(first + span, slots)):
+                sums[idx] += value
+                counts[idx] += 1
+        return [round(sums[i] / counts[i], 4) if counts[i] else 0.0 for i in range(slots)]
+
+    def slot_coverage(self, slots: int = SLOTS_PER_DAY, day: Optional[date] = None) -> List[bool]:
+        """Return which of the ``slots`` time-of-day slots have at least one point."""
+        if self.is_scalar:
+            return [True] * slots
+        slot_minutes = 1440 // slots
+        span = max(1, self.resolution // slot_minutes) if self.resolution else 1
+        covered = [False] * slots
+        for ts in self.timestamps:
+            if day is not None and ts.date() != day:
+                continue
+            first = (ts.hour * 60 + ts.minute) // slot_minutes
+            for idx in range(first, min(first + span, slots)):
+                covered[idx] = True
+        return covered
+
+
+ShapeParser = Callable[[Any], Optional[Timeline]]
+
+# kind -> list of (shape name, parser), most specific first
+_SHAPES: Dict[str, List[Tuple[str, ShapeParser]]] = {KIND_POWER: [], KIND_PRICE: [], KIND_ENERGY: []}
+# Shapes that accept almost any state; tried last and never used as a hint
+_FALLBACK_SHAPES: Set[str] = set()
+
+
+def register_shape(name: str, *kinds: str, fallback: bool = False) -> Callable[[ShapeParser], ShapeParser]:
+    """Register ``func`` as the parser for attribute shape ``name``.
+
+    Shapes are tried in registration order; ``fallback`` shapes go after
+    every other shape of the kind.
+    """
+
+    def decorator(func: ShapeParser) -> ShapeParser:
+        for kind in kinds:
+            shapes = _SHAPES[kind]
+            if fallback:
+                shapes.append((name, func))
+            else:
+                index = next((i for i, (n, _) in enumerate(shapes) if n in _FALLBACK_SHAPES), len(shapes))
+                shapes.insert(index, (name, func))
+        if fallback:
+            _FALLBACK_SHAPES.add(name)
+        return func
+
+    return decorator
+
+
+# ---------- helpers ----------
+
+def _parse_ts(value: Any) -> Optional[datetime]:
+    """Parse an ISO timestamp, tolerating the odd formats seen in the wild."""
+    if isinstance(value, datetime):
+        return value
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        pass
+    if len(value) >= 13:
+        try:
+            return datetime.fromisoformat(value[:10]).replace(hour=int(value[11:13]))
+        except ValueError:
+            return None
+    return None
+
+
+def _unit_of(state) -> str:
+    return str((state.attributes or {}).get("unit_of_measurement") or "").strip()
+
+
+def _attribute_keys(state) -> frozenset:
+    return frozenset((state.attributes or {}).keys())
+
+
+def _scale_for_unit(kind: str, unit: str) -> Optional[float]:
+    """Return the divisor implied by an explicit unit, or None if unknown."""
+    if kind == KIND_PRICE:
+        return 1000.0 if "MWh" in unit else 1.0
+    if kind == KIND_POWER:
+        return POWER_UNITS.get(unit)
+    if kind == KIND_ENERGY:
+        return ENERGY_UNITS.get(unit)
+    return None
+
+
+def _resolution(timestamps: Sequence[datetime], default: int = 60) -> int:
+    """Infer the resolution in minutes from the smallest positive spacing."""
+    best: Optional[float] = None
+    for prev, cur in zip(timestamps, timestamps[1:]):
+        try:
+            delta = (cur - prev).total_seconds() / 60.0
+        except TypeError:  # mixed naive / aware timestamps
+            continue
+        if delta > 0 and (best is None or delta < best):
+            best = delta
+    return int(best) if best else default
+
+
+def _from_map(mapping: Dict[Any, Any], divisor: float, unit: str, shape: str) -> Optional[Timeline]:
+    points: List[Tuple[datetime, float]] = []
+    for key, raw in mapping.items():
+        ts = _parse_ts(key)
+        if ts is None:
+            continue
+        try:
+            points.append((ts, float(raw) / divisor))
+        except (TypeError, ValueError):
+            continue
+    if not points:
+        return None
+    try:
+        points.sort(key=lambda p: p[0])
+    except TypeError:
+        pass
+    timestamps = tuple(p[0] for p in points)
+    return Timeline(timestamps, array("d", (p[1] for p in points)), unit, _resolution(timestamps), shape)
+
+
+def _from_list(values: Sequence[Any], base: date, divisor: float, unit: str, shape: str,
+               resolution: Optional[int] = None) -> Optional[Timeline]:
+    """Build a timeline from a positional list starting at midnight of ``base``."""
+    try:
+        parsed = [float(v) / divisor for v in values]
+    except (TypeError, ValueError):
+        return None
+    if not parsed:
+        return None
+    step = resolution or max(1, 1440 // len(parsed))
+    start = datetime.combine(base, dt_time())
+    timestamps = tuple(start + timedelta(minutes=step * i) for i in range(len(parsed)))
+    return Timeline(timestamps, array("d", parsed), unit, step, shape)
+
+
+def _first_present(item: Dict[str, Any], keys: Sequence[str]) -> Any:
+    """Return the first non-None value of ``keys`` (0 is a valid reading)."""
+    for key in keys:
+        value = item.get(key)
+        if value is not None:
+            return value
+    return None
+
+
+def _magnitude_divisor(values: Sequence[Any]) -> float:
+    """Detect W vs kW lists by magnitude of the first sample (legacy heuristic)."""
+    try:
+        return 1000.0 if values and abs(float(values[0])) > 1000 else 1.0
+    except (TypeError, ValueError):
+        return 1.0
+
+
+# ---------- power shapes (PV forecast, load) ----------
+
+@register_shape("watts_map", KIND_POWER)
+def _shape_watts_map(state) -> Optional[Timeline]:
+    watts = (state.attributes or {}).get("watts")
+    if isinstance(watts, dict) and watts:
+        return _from_map(watts, 1000.0, "kW", "watts_map")
+    return None
+
+
+@register_shape("wh_period_map", KIND_POWER)
+def _shape_wh_period_map(state) -> Optional[Timeline]:
+    wh_period = (state.attributes or {}).get("wh_period")
+    if not isinstance(wh_period, dict) or not wh_period:
+        return None
+    timeline = _from_map(wh_period, 1000.0, "kW", "wh_period_map")
+    if timeline is None:
+        return None
+    # Energy per period -> average power over the period
+    hours = (timeline.resolution or 60) / 60.0
+    return Timeline(timeline.timestamps, array("d", (v / hours for v in timeline.values)),
+                    "kW", timeline.resolution, "wh_period_map")
+
+
+@register_shape("hourly_list", KIND_POWER)
+def _shape_hourly_list(state) -> Optional[Timeline]:
+    attrs = state.attributes or {}
+    hourly = attrs.get("hourly") or attrs.get("hourly_kw") or attrs.get("hourly_kwh")
+    if isinstance(hourly, list) and len(hourly) >= 24:
+        return _from_list(hourly[:24], datetime.now().date(), 1.0, "kW", "hourly_list", 60)
+    return None
+
+
+@register_shape("daily_lists", KIND_POWER)
+def _shape_daily_lists(state) -> Optional[Timeline]:
+    attrs = state.attributes or {}
+    for key in ("yesterday_hourly", "today_hourly", "today_hourly_consumption", "yesterday_hourly_consumption"):
+        arr = attrs.get(key)
+        if isinstance(arr, list) and len(arr) >= 24:
+            timeline = _from_list(arr[:24], datetime.now().date(), _magnitude_divisor(arr), "kW", "daily_lists", 60)
+            if timeline is not None:
+                return timeline
+    return None
+
+
+@register_shape("consumption_map", KIND_POWER)
+def _shape_consumption_map(state) -> Optional[Timeline]:
+    attrs = state.attributes or {}
+    for key in ("values", "consumption", "consumption_w"):
+        mapping = attrs.get(key)
+        if isinstance(mapping, dict) and mapping:
+            return _from_map(mapping, 1000.0, "kW", "consumption_map")
+    return None
+
+
+@register_shape("forecast_list", KIND_POWER)
+def _shape_power_records(state) -> Optional[Timeline]:
+    attrs = state.attributes or {}
+    items = attrs.get("forecast") or attrs.get("values") or attrs.get("data")
+    if not isinstance(items, list) or not items:
+        return None
+    if all(isinstance(x, (int, float)) for x in items):
+        if len(items) >= 24:
+            return _from_list(items[:24], datetime.now().date(), 1.0, "kW", "forecast_values", 60)
+        return None
+    points: List[Tuple[datetime, float]] = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        ts = _parse_ts(_first_present(item, ("period_end", "datetime", "time")))
+        raw = _first_present(item, ("pv_estimate", "pv_estimate_kw", "value", "pv_estimate_w"))
+        if ts is None or raw is None:
+            continue
+        try:
+            value = float(raw)
+        except (TypeError, ValueError):
+            continue
+        if "pv_estimate_w" in item or value > 1000:
+            value /= 1000.0
+        points.append((ts, value))
+    if not points:
+        return None
+    timestamps = tuple(p[0] for p in points)
+    return Timeline(timestamps, array("d", (p[1] for p in points)), "kW", _resolution(timestamps), "forecast_list")
+
+
+# ---------- price shapes ----------
+
+@register_shape("hourly_price_lists", KIND_PRICE)
+def _shape_price_lists(state) -> Optional[Timeline]:
+    attrs = state.attributes or {}
+    today = datetime.now().date()
+    parts = []
+    for key, day in (("today_hourly_prices", today), ("tomorrow_hourly_prices", today + timedelta(days=1))):
+        prices = attrs.get(key)
+        if isinstance(prices, list) and len(prices) >= 24:
+            timeline = _from_list(prices[:24], day, 1.0, "currency/kWh", "hourly_price_lists", 60)
+            if timeline is not None:
+                parts.append(timeline)
+    if not parts:
+        return None
+    timestamps = tuple(ts for part in parts for ts in part.timestamps)
+    values = array("d", (v for part in parts for v in part.values))
+    return Timeline(timestamps, values, "currency/kWh", 60, "hourly_price_lists")
+
+
+@register_shape("price_map", KIND_PRICE)
+def _shape_price_map(state) -> Optional[Timeline]:
+    attrs = state.attributes or {}
+    divisor = _scale_for_unit(KIND_PRICE, _unit_of(state)) or 1.0
+    for key in ("prices", "values", "prices_map", "price_map"):
+        mapping = attrs.get(key)
+        if isinstance(mapping, dict) and mapping:
+            return _from_map(mapping, divisor, "currency/kWh", "price_map")
+    return None
+
+
+@register_shape("price_records", KIND_PRICE)
+def _shape_price_records(state) -> Optional[Timeline]:
+    attrs = state.attributes or {}
+    items = attrs.get("forecast") or attrs.get("data")
+    if not isinstance(items, list) or not items:
+        return None
+    divisor = _scale_for_unit(KIND_PRICE, _unit_of(state)) or 1.0
+    points: List[Tuple[datetime, float]] = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        ts = _parse_ts(_first_present(item, ("period_end", "datetime", "time")))
+        raw = _first_present(item, ("price", "value", "price_czk"))
+        if ts is None or raw is None:
+            continue
+        try:
+            points.append((ts, float(raw) / divisor))
+        except (TypeError, ValueError):
+            continue
+    if not points:
+        return None
+    timestamps = tuple(p[0] for p in points)
+    return Timeline(timestamps, array("d", (p[1] for p in points)), "currency/kWh", _resolution(timestamps), "price_records")
+
+
+# ---------- generic shapes ----------
+
+def _json_state(state, kind: str) -> Optional[Timeline]:
+    raw = state.state
+    if not (isinstance(raw, str) and raw.startswith("[") and raw.endswith("]")):
+        return None
+    try:
+        arr = json.loads(raw)
+    except ValueError:
+        return None
+    if not isinstance(arr, list) or len(arr) < 24:
+        return None
+    divisor = _magnitude_divisor(arr) if kind == KIND_POWER else 1.0
+    return _from_list(arr[:24], datetime.now().date(), divisor, UNIT_BY_KIND[kind], "json_state", 60)
+
+
+@register_shape("json_state", KIND_POWER)
+def _shape_power_json_state(state) -> Optional[Timeline]:
+    return _json_state(state, KIND_POWER)
+
+
+@register_shape("json_state", KIND_PRICE)
+def _shape_price_json_state(state) -> Optional[Timeline]:
+    return _json_state(state, KIND_PRICE)
+
+
+def _scalar(state, kind: str, default_divisor: float) -> Optional[Timeline]:
+    try:
+        value = float(state.state)
+    except (TypeError, ValueError):
+        return None
+    divisor = _scale_for_unit(kind, _unit_of(state))
+    if divisor is None:
+        divisor = default_divisor
+    stamp = getattr(state, "last_updated", None) or datetime.now()
+    return Timeline((stamp,), array("d", [value / divisor]), UNIT_BY_KIND[kind], 0, "scalar_total")
+
+
+@register_shape("scalar_total", KIND_POWER, fallback=True)
+def _shape_power_scalar(state) -> Optional[Timeline]:
+    # An energy total (e.g. a daily PV forecast in kWh) is not a power reading
+    if _unit_of(state) in ENERGY_UNITS:
+        return None
+    # Current power sensors report W unless their unit says otherwise
+    return _scalar(state, KIND_POWER, 1000.0)
+
+
+@register_shape("scalar_total", KIND_PRICE, fallback=True)
+def _shape_price_scalar(state) -> Optional[Timeline]:
+    return _scalar(state, KIND_PRICE, 1.0)
+
+
+@register_shape("scalar_total", KIND_ENERGY, fallback=True)
+def _shape_energy_scalar(state) -> Optional[Timeline]:
+    return _scalar(state, KIND_ENERGY, 1.0)
+
+
+_SCALAR_READERS: Dict[str, ShapeParser] = {
+    KIND_POWER: _shape_power_scalar,
+    KIND_PRICE: _shape_price_scalar,
+    KIND_ENERGY: _shape_energy_scalar,
+    KIND_PERCENT: lambda state: _scalar(state, KIND_PERCENT, 1.0),
+}
+
+
+def read_scalar(state, kind: str) -> Optional[float]:
+    """Return a plain sensor reading in the unit of ``kind``, None when it is not one.
+
+    Power without a unit is taken as W, everything else as already in the
+    normalised unit; a power reading with an energy unit is rejected.
+    """
+    timeline = _SCALAR_READERS[kind](state)
+    return timeline.scalar if timeline is not None else None
+
+
+def state_fingerprint(state) -> Hashable:
+    """Return a value that changes whenever the state or its attributes change.
+
+    Positional shapes are anchored at the day they are parsed, so the date
+    is part of the fingerprint: an unchanged state is parsed again after
+    midnight.
+    """
+    return (state.state, getattr(state, "last_updated", None), datetime.now().date())
+
+
+class SharedTimelineCache:
+    """Parsed timelines shared by all config entries, reference-counted per entry.
+
+    Entries that read the same sensor share one parse per state change.  An
+    entity's timelines are dropped when the last entry reading it releases it.
+    """
+
+    def __init__(self) -> None:
+        self._cache: Dict[Tuple[str, str], Tuple[Hashable, Optional[Timeline]]] = {}
+        # (entity, kind) -> (shape, attribute keys it matched with)
+        self._shape_hint: Dict[Tuple[str, str], Tuple[str, frozenset]] = {}
+        self._owners: Dict[str, Set[str]] = {}
+        self.parses = 0
+
+    def retain(self, entity_id: str, owner: str) -> None:
+        self._owners.setdefault(entity_id, set()).add(owner)
+
+    def release(self, entity_id: str, owner: str) -> None:
+        """Drop ``owner``'s reference; the entity is evicted when nobody reads it."""
+        owners = self._owners.get(entity_id)
+        if owners is None:
+            return
+        owners.discard(owner)
+        if not owners:
+            del self._owners[entity_id]
+            for key in [k for k in self._cache if k[0] == entity_id]:
+                self._cache.pop(key, None)
+                self._shape_hint.pop(key, None)
+
+    @property
+    def owners(self) -> Set[str]:
+        """Return all entries holding a reference."""
+        return set().union(*self._owners.values()) if self._owners else set()
+
+    def get(self, state, kind: str) -> Tuple[Optional[Timeline], bool]:
+        """Return ``(timeline, cache_hit)`` for ``state`` interpreted as ``kind``."""
+        key = (state.entity_id, kind)
+        fingerprint = state_fingerprint(state)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1], True
+        self.parses += 1
+        timeline = self._parse(state, kind, key)
+        self._cache[key] = (fingerprint, timeline)
+        return timeline, False
+
+    def _parse(self, state, kind: str, key: Tuple[str, str]) -> Optional[Timeline]:
+        parsers = _SHAPES[kind]
+        keys = _attribute_keys(state)
+        hint = self._shape_hint.get(key)
+        if hint is not None:
+            if hint[1] == keys:
+                # Shortcut: the same attributes matched this shape last time
+                parsers = sorted(parsers, key=lambda p: p[0] != hint[0])
+            else:
+                del self._shape_hint[key]
+        for name, parser in parsers:
+            try:
+                timeline = parser(state)
+            except Exception as e:  # defensive: a bad attribute must not break the cycle
+                _LOGGER.debug("Shape %s failed for %s: %s", name, state.entity_id, e)
+                continue
+            if timeline is not None and len(timeline):
+                if name in _FALLBACK_SHAPES:
+                    self._shape_hint.pop(key, None)
+                else:
+                    self._shape_hint[key] = (name, keys)
+                return timeline
+        _LOGGER.debug("Unable to parse %s as %s (attributes %s)", state.entity_id, kind,
+                      list((state.attributes or {}).keys()))
+        return None
+
+    def shape_hint(self, entity_id: str, kind: str) -> Optional[Tuple[str, frozenset]]:
+        """Return the remembered ``(shape, attribute keys)`` of an entity, if any."""
+        return self._shape_hint.get((entity_id, kind))
+
+    def set_shape_hint(self, entity_id: str, kind: str, shape: str, keys: Sequence[str]) -> None:
+        if shape in _FALLBACK_SHAPES or not any(name == shape for name, _ in _SHAPES.get(kind, ())):
+            return
+        self._shape_hint.setdefault((entity_id, kind), (shape, frozenset(keys)))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return shared cache statistics for diagnostics."""
+        return {
+            "entries": len(self._cache),
+            "entities": len(self._owners),
+            "shared_entities": sum(1 for owners in self._owners.values() if len(owners) > 1),
+            "parses": self.parses,
+        }
+
+
+class TimelineIngestor:
+    """Parse sensor states into timelines, once per state change.
+
+    Each coordinator owns one ingestor.  Given a :class:`SharedTimelineCache`
+    the parsed timelines are shared with the other entries; otherwise the
+    ingestor keeps a private cache.
+    """
+
+    def __init__(self, shared: Optional[SharedTimelineCache] = None, owner: str = "") -> None:
+        self._shared = shared if shared is not None else SharedTimelineCache()
+        self._owner = owner
+        self._entities: Set[Tuple[str, str]] = set()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, state, kind: str) -> Optional[Timeline]:
+        """Return the timeline of ``state`` interpreted as ``kind``."""
+        key = (state.entity_id, kind)
+        if key not in self._entities:
+            self._entities.add(key)
+            self._shared.retain(state.entity_id, self._owner)
+        timeline, hit = self._shared.get(state, kind)
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return timeline
+
+    def invalidate(self, entity_id: Optional[str] = None) -> None:
+        """Stop reading an entity (or all); shared timelines go when no entry reads them."""
+        for key in [k for k in self._entities if entity_id is None or k[0] == entity_id]:
+            self._entities.discard(key)
+            if not any(k[0] == key[0] for k in self._entities):
+                self._shared.release(key[0], self._owner)
+
+    def close(self) -> None:
+        """Release every shared timeline this ingestor holds (entry unload)."""
+        self.invalidate()
+
+    def shape_hints(self) -> List[List[Any]]:
+        """Return ``[entity_id, kind, shape, attribute keys]`` for persistence."""
+        hints = []
+        for entity_id, kind in sorted(self._entities):
+            hint = self._shared.shape_hint(entity_id, kind)
+            if hint is not None:
+                hints.append([entity_id, kind, hint[0], sorted(hint[1])])
+        return hints
+
+    def restore_shape_hints(self, hints: Any) -> None:
+        """Restore shape hints saved by :meth:`shape_hints`.
+
+        Unknown and fallback shapes, and hints saved without attribute keys
+        (older snapshots), are ignored.
+        """
+        for item in hints or []:
+            try:
+                entity_id, kind, shape, keys = item
+                keys = [str(k) for k in keys]
+            except (TypeError, ValueError):
+                continue
+            self._shared.set_shape_hint(str(entity_id), str(kind), str(shape), keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache statistics for diagnostics."""
+        shapes = {}
+        for entity_id, kind in sorted(self._entities):
+            hint = self._shared.shape_hint(entity_id, kind)
+            if hint is not None:
+                shapes[f"{entity_id}:{kind}"] = hint[0]
+        return {
+            "entries": len(self._entities),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shapes": shapes,
+            "shared": self._shared.stats(),
+        }
@@ -0,0 +1,472 @@
+"""Anytime improvement of the grid-charging plan within a wall-clock budget.
+
+The decision is the grid charge power per slot.  The search starts from the
+best feasible one of: the previous cycle's plan (its grid charging from the
+current slot on; past slots drop out), this cycle's planner output, that
+output rounded to the decision unit, and no grid charging.  It then runs a
+seeded local search on a fast model of the battery and accepts strictly
+better plans, until the budget expires or no move has helped for a while.
+
+Moves work on decision units (a slot, or a whole hour with full-hour
+charging): move charge power between units, nudge a unit's power, extend or
+shrink a charging run, add a block of the minimum run length, drop or shift
+a run.  A candidate is only accepted when the charging it actually produces
+meets the switching constraints (``constraints.py``), so the search never
+leaves the feasible plans and needs no post-filtering.
+
+The objective is the grid import cost plus battery wear (``degradation.py``)
+minus feed-in revenue (with an export limit), minus the value of the energy
+left in the battery at the average price, plus a penalty per kWh below the
+critical-hours SOC.  Import and export are netted slot by slot.  The model
+follows the planner's slot logic (solar surplus charges, deficits discharge
+unless that costs more wear than it saves, grid charging only below the
+slot's target and price threshold, battery export where the planner placed
+it), and the best profile is turned into a schedule by the
+planner itself via ``replan_with_allocation``.  It is used when that
+schedule scores better than the planner's own, or when the planner's own
+breaks the switching constraints and it does not.
+
+Without a budget (or when the search found nothing feasible),
+``repair_plan`` still enforces the switching constraints: the planner's
+charging pattern is repaired by ``constraints.repair`` and re-planned the
+same way.  Slots the re-plan leaves out although granted are avoided by the
+next attempt.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .const import (
+    CONF_BATTERY_CAPACITY,
+    CONF_CHARGE_EFFICIENCY,
+    CONF_CRITICAL_HOURS_SOC,
+    CONF_MAX_CHARGE_POWER,
+    CONF_MAX_SOC,
+    CONF_MIN_SOC,
+    CONF_TARGET_SOC,
+    DEFAULT_BATTERY_CAPACITY,
+    DEFAULT_CHARGE_EFFICIENCY,
+    DEFAULT_CRITICAL_HOURS_SOC,
+    DEFAULT_MAX_CHARGE_POWER,
+    DEFAULT_MAX_SOC,
+    DEFAULT_MIN_SOC,
+    DEFAULT_TARGET_SOC,
+)
+from .constraints import SwitchingConstraints, charge_runs, repair, switch_events
+from .degradation import WearModel
+
+_LOGGER = logging.getLogger(__name__)
+
+SLOTS_PER_DAY = 96
+SLOT_HOURS = 0.25
+# Budgets above this would eat into the plan stage budget of the refresh
+MAX_BUDGET_S = 10.0
+# Charge power moved per step, as a share of the maximum charge power
+QUANTUM_SHARE = 0.25
+# Cost (CZK) per kWh below the critical-hours SOC
+SHORTFALL_PENALTY = 50.0
+# Stop early after this many moves in a row without improvement
+STALL_MOVES = 3000
+# Charging below this power (kW) counts as off
+ON_KW = 0.01
+# Re-plans of a repaired pattern before giving up (each may charge less than granted)
+REPAIR_ATTEMPTS = 6
+
+
+def grid_charge_profile(schedule: Sequence[Dict[str, Any]], current_slot: int = 0) -> List[float]:
+    """Return a schedule's planned grid charge power per slot (zero before ``current_slot``)."""
+    profile = [0.0] * SLOTS_PER_DAY
+    for index, slot in enumerate(schedule[:SLOTS_PER_DAY]):
+        if index >= current_slot and str(slot.get("mode", "")).startswith("grid_charge"):
+            profile[index] = float(slot.get("planned_charge_kW", 0.0))
+    return profile
+
+
+class PlanModel:
+    """Fast battery model of one planning run, scoring grid charge profiles."""
+
+    def __init__(self, planner: Any, schedule: Sequence[Dict[str, Any]]) -> None:
+        config = planner.config
+        capacity = float(config.get(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY))
+        self.max_charge = float(config.get(CONF_MAX_CHARGE_POWER, DEFAULT_MAX_CHARGE_POWER))
+        self.eff = float(config.get(CONF_CHARGE_EFFICIENCY, DEFAULT_CHARGE_EFFICIENCY)) or 1.0
+        self.min_kwh = capacity * float(config.get(CONF_MIN_SOC, DEFAULT_MIN_SOC)) / 100.0
+        self.max_kwh = capacity * float(config.get(CONF_MAX_SOC, DEFAULT_MAX_SOC)) / 100.0
+        target_kwh = capacity * float(config.get(CONF_TARGET_SOC, DEFAULT_TARGET_SOC)) / 100.0
+        self.critical_kwh = capacity * float(config.get(CONF_CRITICAL_HOURS_SOC, DEFAULT_CRITICAL_HOURS_SOC)) / 100.0
+        self.soc0 = capacity * planner.initial_soc_frac
+        self.wear = WearModel.from_config(config)
+        self.start = planner.current_slot
+        self.end = min(len(schedule), SLOTS_PER_DAY)
+        self.slots = range(self.start, self.end)
+
+        self.net = [float(slot["load_kW"]) - float(slot["pv_power_kW"]) for slot in schedule]
+        self.price = [float(slot["price_czk_kwh"]) for slot in schedule]
+        self.critical = [bool(slot.get("is_critical_hour")) for slot in schedule]
+        self.target = [self.critical_kwh if c else target_kwh for c in self.critical]
+        # Grid charging is possible below the never-charge threshold, within the site limit
+        self.cap = [0.0] * SLOTS_PER_DAY
+        for s in self.slots:
+            if 0 < self.price[s] < planner.never_charge_threshold:
+                cap = self.max_charge
+                if planner.site_limit_kw > 0:
+                    cap = min(cap, max(0.0, planner.site_limit_kw - max(0.0, self.net[s])))
+                self.cap[s] = cap
+        # Feed-in: the planner's battery-to-grid export is replayed as planned
+        self.export_limit = planner.export_limit_kw
+        self.export_price = [float(slot.get("export_price_czk_kwh", 0.0)) for slot in schedule]
+        self.battery_export = list(planner.battery_export or [0.0] * SLOTS_PER_DAY)
+        self.export_floor = [max(self.min_kwh, self.critical_kwh) if c else self.min_kwh for c in self.critical]
+        remaining = [p for p in self.price[self.start:] if p > 0]
+        self.stored_value = sum(remaining) / len(remaining) if remaining else 0.0
+
+    def simulate(self, profile: Sequence[float]) -> Tuple[float, List[bool]]:
+        """Return the objective of ``profile`` and the slots it actually charges in."""
+        soc = self.soc0
+        cost = shortfall = 0.0
+        eff, dt = self.eff, SLOT_HOURS
+        wear, wear_on = self.wear, self.wear.active
+        export_on = self.export_limit > 0
+        on = [False] * SLOTS_PER_DAY
+        for s in self.slots:
+            net = self.net[s]
+            discharge_kw = solar_kw = 0.0
+            if net < -0.05:
+                room = self.max_kwh - soc
+                if room > 0.01:
+                    solar = min(min(-net, self.max_charge) * dt, room)
+                    if wear_on:
+                        cost += wear.per_kwh(soc, solar / dt) * solar
+                    soc += solar * eff
+                    solar_kw = solar / dt
+            elif net > 0 and soc > self.min_kwh and not (
+                wear_on and self.price[s] < wear.per_kwh(soc, min(net, self.max_charge))
+            ):
+                discharge = min(min(net, self.max_charge) * dt, soc - self.min_kwh)
+                if wear_on:
+                    cost += wear.per_kwh(soc, discharge / dt) * discharge
+                soc -= discharge / eff
+                discharge_kw = discharge / dt
+            charge_kw = 0.0
+            if profile[s] > ON_KW and soc < self.target[s]:
+                charge_kw = min(profile[s], (self.max_kwh - soc) / dt)
+                if charge_kw > ON_KW:
+                    if wear_on:
+                        cost += wear.per_kwh(soc, charge_kw) * charge_kw * dt
+                    soc += charge_kw * dt * eff
+                    on[s] = True
+                else:
+                    charge_kw = 0.0
+            grid_kw = net - discharge_kw + charge_kw
+            if export_on:
+                export_kw = 0.0
+                if self.battery_export[s] > 0.01 and charge_kw == 0.0 and solar_kw == 0.0 and net >= -0.05:
+                    export = min(min(self.battery_export[s], self.max_charge - discharge_kw) * dt,
+                                 max(0.0, soc - self.export_floor[s]) * eff)
+                    if export > 0.0025:
+                        if wear_on:
+                            cost += wear.per_kwh(soc, export / dt) * export
+                        soc -= export / eff
+                        export_kw = export / dt
+                # Surplus the battery does not take, and battery export, earn the feed-in price
+                grid_kw += solar_kw - export_kw
+                if grid_kw < 0:
+                    cost += max(grid_kw, -self.export_limit) * self.export_price[s] * dt
+            soc = max(self.min_kwh, min(self.max_kwh, soc))
+            cost += max(0.0, grid_kw) * self.price[s] * dt
+            if self.critical[s] and soc < self.critical_kwh:
+                shortfall += (self.critical_kwh - soc) * dt
+        return cost - (soc - self.soc0) * self.stored_value + shortfall * SHORTFALL_PENALTY, on
+
+    def cost(self, profile: Sequence[float]) -> float:
+        return self.simulate(profile)[0]
+
+
+class _Search:
+    """Local search state over decision units."""
+
+    def __init__(self, model: PlanModel, constraints: SwitchingConstraints, initially_on: bool, seed: int) -> None:
+        self.model = model
+        self.constraints = constraints
+        self.initially_on = initially_on
+        self.rng = random.Random(seed)
+        self.quantum = max(0.1, model.max_charge * QUANTUM_SHARE)
+        unit = constraints.unit
+        # Decision units: aligned groups of slots (the first one may be partial)
+        self.units: List[range] = []
+        begin = model.start
+        while begin < model.end:
+            stop = min(model.end, (begin // unit + 1) * unit)
+            if any(model.cap[s] > ON_KW for s in range(begin, stop)):
+                self.units.append(range(begin, stop))
+            begin = stop
+        self.block_units = max(1, math.ceil(constraints.min_on_slots / unit))
+
+    def evaluate(self, profile: List[float]) -> Tuple[float, bool]:
+        cost, on = self.model.simulate(profile)
+        return cost, self.constraints.feasible(on, self.model.start, self.initially_on)
+
+    def set_unit(self, profile: List[float], index: int, kw: float) -> None:
+        for s in self.units[index]:
+            profile[s] = min(kw, self.model.cap[s])
+
+    def rounded(self, profile: Sequence[float]) -> List[float]:
+        """``profile`` with every unit fully on (at its mean power) or off."""
+        result = [0.0] * SLOTS_PER_DAY
+        for index, slots in enumerate(self.units):
+            powers = [profile[s] for s in slots if profile[s] > ON_KW]
+            if len(powers) * 2 >= len(slots):
+                self.set_unit(result, index, sum(powers) / len(powers))
+        return result
+
+    def unit_runs(self, profile: Sequence[float]) -> List[Tuple[int, int]]:
+        """Runs of consecutive on-units as ``(first, last + 1)`` unit indexes."""
+        on = [any(profile[s] > ON_KW for s in slots) for slots in self.units]
+        runs: List[Tuple[int, int]] = []
+        for index, value in enumerate(on):
+            contiguous = index > 0 and self.units[index - 1].stop == self.units[index].start
+            if value and runs and runs[-1][1] == index and contiguous:
+                runs[-1] = (runs[-1][0], index + 1)
+            elif value:
+                runs.append((index, index + 1))
+        return runs
+
+    def neighbour(self, best: List[float]) -> Optional[List[float]]:
+        candidate = list(best)
+        rng = self.rng
+        runs = self.unit_runs(candidate)
+        on_units = [i for first, last in runs for i in range(first, last)]
+        move = rng.random()
+        if move < 0.25 and len(on_units) > 1:
+            # Move charge power between two charging units
+            source, target = rng.sample(on_units, 2)
+            amount = min(self.quantum, min(candidate[s] for s in self.units[source]) - 0.1)
+            if amount <= 0:
+                return None
+            for s in self.units[source]:
+                candidate[s] -= amount
+            for s in self.units[target]:
+                candidate[s] = min(self.model.cap[s], candidate[s] + amount)
+        elif move < 0.45 and on_units:
+            # Nudge the power of one charging unit
+            index = rng.choice(on_units)
+            step = self.quantum if rng.random() < 0.5 else -self.quantum
+            for s in self.units[index]:
+                candidate[s] = min(self.model.cap[s], max(0.1, candidate[s] + step))
+        elif move < 0.6 and runs:
+            # Extend a run by one unit
+            first, last = rng.choice(runs)
+            index = first - 1 if rng.random() < 0.5 else last
+            if not 0 <= index < len(self.units):
+                return None
+            self.set_unit(candidate, index, max(candidate[s] for s in self.units[first]))
+        elif move < 0.7 and runs:
+            # Shrink a run by one unit
+            first, last = rng.choice(runs)
+            self.set_unit(candidate, first if rng.random() < 0.5 else last - 1, 0.0)
+        elif move < 0.85:
+            # Add a block of the minimum run length at full power
+            first = rng.randrange(len(self.units))
+            for index in range(first, min(len(self.units), first + self.block_units)):
+                self.set_unit(candidate, index, self.model.max_charge)
+        elif move < 0.93 and runs:
+            # Drop a run
+            first, last = rng.choice(runs)
+            for index in range(first, last):
+                self.set_unit(candidate, index, 0.0)
+        elif runs:
+            # Shift a run by one unit
+            first, last = rng.choice(runs)
+            powers = [candidate[self.units[i][0]] for i in range(first, last)]
+            shift = 1 if rng.random() < 0.5 else -1
+            if not (0 <= first + shift and last + shift <= len(self.units)):
+                return None
+            for index in range(first, last):
+                self.set_unit(candidate, index, 0.0)
+            for offset, kw in enumerate(powers):
+                self.set_unit(candidate, first + shift + offset, kw)
+        else:
+            return None
+        return candidate
+
+
+def local_search(
+    model: PlanModel,
+    starts: Sequence[Tuple[str, List[float]]],
+    budget_s: float,
+    constraints: SwitchingConstraints = SwitchingConstraints(),
+    initially_on: bool = False,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Improve the best feasible start until the budget expires or the search stalls.
+
+    Returns the best ``profile`` and its ``cost`` with the search statistics;
+    no grid charging is always a feasible start.
+    """
+    deadline = time.monotonic() + budget_s
+    search = _Search(model, constraints, initially_on, seed)
+    best_name, best, best_cost = "none", [0.0] * SLOTS_PER_DAY, model.cost([0.0] * SLOTS_PER_DAY)
+    for name, profile in starts:
+        profile = [min(kw, model.cap[s]) if s >= model.start else 0.0 for s, kw in enumerate(profile)]
+        for variant in (profile, search.rounded(profile)) if constraints.active else (profile,):
+            cost, feasible = search.evaluate(variant)
+            if feasible and cost < best_cost:
+                best_name, best, best_cost = name, variant, cost
+    start_cost = best_cost
+    iterations = accepted = stall = 0
+    while search.units and stall < STALL_MOVES:
+        # Checking the clock every few moves keeps its overhead out of the loop
+        if iterations % 16 == 0 and time.monotonic() >= deadline:
+            break
+        iterations += 1
+        candidate = search.neighbour(best)
+        if candidate is None:
+            stall += 1
+            continue
+        cost, feasible = search.evaluate(candidate)
+        if feasible and cost < best_cost - 1e-6:
+            best, best_cost = candidate, cost
+            accepted += 1
+            stall = 0
+        else:
+            stall += 1
+    return {
+        "profile": best,
+        "cost": best_cost,
+        "start": best_name,
+        "start_cost": start_cost,
+        "iterations": iterations,
+        "accepted_moves": accepted,
+        "converged": stall >= STALL_MOVES or not search.units,
+    }
+
+
+def improve_plan(
+    planner: Any,
+    args: tuple,
+    result: Tuple[List[Dict[str, Any]], Dict[str, Any]],
+    budget_s: float,
+    warm_start: Optional[Sequence[float]] = None,
+) -> Tuple[Any, Tuple[List[Dict[str, Any]], Dict[str, Any]], Dict[str, Any]]:
+    """Search for a cheaper grid-charging plan than ``result`` within ``budget_s``.
+
+    ``planner`` is the planner that produced ``result``.  Returns ``(planner,
+    result, summary)``; the planner and result are the inputs unless the
+    optimized plan is better or the only one meeting the switching constraints.
+    """
+    started = time.monotonic()
+    budget_s = max(0.0, min(float(budget_s), MAX_BUDGET_S))
+    constraints = SwitchingConstraints.from_config(planner.config)
+    initially_on = bool(getattr(planner, "_initial_charging_state", False))
+    schedule = result[0]
+    model = PlanModel(planner, schedule)
+    start = planner.current_slot
+
+    def check(profile: Sequence[float]) -> Tuple[float, bool, int]:
+        on = [kw > ON_KW for kw in profile]
+        return (model.cost(profile), constraints.feasible(on, start, initially_on),
+                switch_events(on, start, initially_on))
+
+    planned = grid_charge_profile(schedule, start)
+    planned_cost, planned_feasible, planned_events = check(planned)
+    starts = [("planner", planned)]
+    if warm_start:
+        previous = [float(kw) if s >= start else 0.0 for s, kw in enumerate(list(warm_start)[:SLOTS_PER_DAY])]
+        starts.append(("previous_plan", previous + [0.0] * (SLOTS_PER_DAY - len(previous))))
+
+    # Leave part of the budget to turn the profile into a schedule
+    found = local_search(
+        model, starts, budget_s * 0.8 - (time.monotonic() - started), constraints, initially_on, seed=start,
+    )
+    summary: Dict[str, Any] = {
+        "budget_ms": round(budget_s * 1000.0, 1),
+        "constraints": constraints.as_dict(),
+        "start": found["start"],
+        "iterations": found["iterations"],
+        "accepted_moves": found["accepted_moves"],
+        "converged": found["converged"],
+        "planner_cost": round(planned_cost, 2),
+        "planner_feasible": planned_feasible,
+        "planner_switch_events": planned_events,
+        "start_cost": round(found["start_cost"], 2),
+        "best_cost": round(found["cost"], 2),
+        "applied": False,
+    }
+    chosen, chosen_result = planner, result
+    if found["cost"] < planned_cost - 0.01 or not planned_feasible:
+        optimized = planner.copy_with_config(planner.config)
+        optimized_result = optimized.replan_with_allocation(found["profile"], *args)
+        optimized.grid_charge_allocation = None
+        realized_cost, realized_feasible, realized_events = check(grid_charge_profile(optimized_result[0], start))
+        summary.update(realized_cost=round(realized_cost, 2), realized_feasible=realized_feasible)
+        if realized_feasible and (realized_cost < planned_cost - 0.01 or not planned_feasible):
+            chosen, chosen_result = optimized, optimized_result
+            summary.update(applied=True, switch_events=realized_events)
+    summary["improvement"] = round(planned_cost - summary["realized_cost"], 2) if summary["applied"] else 0.0
+    summary["elapsed_ms"] = round((time.monotonic() - started) * 1000.0, 1)
+    _LOGGER.debug("Plan optimizer: %s", summary)
+    return chosen, chosen_result, summary
+
+
+def repair_plan(
+    planner: Any,
+    args: tuple,
+    result: Tuple[List[Dict[str, Any]], Dict[str, Any]],
+) -> Tuple[Any, Tuple[List[Dict[str, Any]], Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Make ``result`` meet the switching constraints without a search.
+
+    Returns ``(planner, result, summary)`` like :func:`improve_plan`; the
+    summary is None when no switching limit is set or the plan already meets
+    the constraints.  Full-hour charging alone (the default) is left to the
+    charging strategies, as without the optimizer before.
+    """
+    constraints = SwitchingConstraints.from_config(planner.config)
+    initially_on = bool(getattr(planner, "_initial_charging_state", False))
+    start = planner.current_slot
+    profile = grid_charge_profile(result[0], start)
+    on = [kw > ON_KW for kw in profile]
+    if not constraints.limits_switching or constraints.feasible(on, start, initially_on):
+        return planner, result, None
+    started = time.monotonic()
+    summary: Dict[str, Any] = {
+        "constraints": constraints.as_dict(),
+        "planner_feasible": False,
+        "planner_switch_events": switch_events(on, start, initially_on),
+        "repair_attempts": 0,
+        "applied": False,
+    }
+    chosen, chosen_result = planner, result
+    blocked = [False] * SLOTS_PER_DAY
+    for attempt in range(1, REPAIR_ATTEMPTS + 1):
+        # Widen the runs, avoiding slots a re-plan did not charge in although
+        # granted (solar surplus, full battery); the last attempt only trims
+        pattern = repair(constraints, on, start, initially_on, widen=attempt < REPAIR_ATTEMPTS, blocked=blocked)
+        # Spread the energy charged in each repaired run over the run, so a
+        # longer run charges at lower power instead of filling the battery early
+        allocation = [0.0] * SLOTS_PER_DAY
+        for begin, stop in charge_runs(pattern, start):
+            power_kw = sum(profile[begin:stop]) / (stop - begin)
+            if power_kw > ON_KW:
+                allocation[begin:stop] = [power_kw] * (stop - begin)
+        repaired = planner.copy_with_config(planner.config)
+        repaired_result = repaired.replan_with_allocation(allocation, *args)
+        repaired.grid_charge_allocation = None
+        profile = grid_charge_profile(repaired_result[0], start)
+        on = [kw > ON_KW for kw in profile]
+        summary["repair_attempts"] = attempt
+        if constraints.feasible(on, start, initially_on):
+            chosen, chosen_result = repaired, repaired_result
+            summary.update(applied=True, switch_events=switch_events(on, start, initially_on))
+            break
+        for slot in range(start, SLOTS_PER_DAY):
+            blocked[slot] = blocked[slot] or (allocation[slot] > 0 and not on[slot])
+    else:
+        # A re-plan that still breaks the constraints is no better than the planner's own
+        _LOGGER.debug("Could not make the charging plan meet the switching constraints %s", constraints.as_dict())
+    summary["elapsed_ms"] = round((time.monotonic() - started) * 1000.0, 1)
+    _LOGGER.debug("Plan repair: %s", summary)
+    return chosen, chosen_result, summary
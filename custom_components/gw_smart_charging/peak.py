@@ -0,0 +1,161 @@
+"""Site grid-import peak tracking for capacity tariffs.
+
+Capacity tariffs bill the highest 15-minute average grid import of the
+month (CZK per kW).  ``PeakTracker`` integrates grid import readings into
+the open 15-minute window and keeps the monthly maximum; every sample is
+O(1) and the state is a handful of numbers, persisted in the plan snapshot.
+
+The planner gets the monthly peak as a free level: importing up to it costs
+nothing extra, every kW above it costs the tariff once for the rest of the
+month.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+SLOT_MINUTES = 15
+# Sampling gaps longer than this are not integrated (HA restart, sensor outage)
+MAX_SAMPLE_GAP = timedelta(minutes=SLOT_MINUTES)
+# A window is only counted when at least this share of it was observed
+MIN_WINDOW_COVERAGE = 0.5
+
+
+def slot_net_import_kw(slot: Dict[str, Any]) -> float:
+    """Return the planned net grid import of a schedule slot (kW, negative = export).
+
+    House load minus PV plus battery charge (discharge is negative), plus
+    deferrable loads placed in the slot.
+    """
+    return (
+        float(slot.get("load_kW", 0.0))
+        - float(slot.get("pv_power_kW", 0.0))
+        + float(slot.get("planned_charge_kW", 0.0))
+        + float(slot.get("deferrable_kW", 0.0))
+    )
+
+
+def slot_grid_import_kw(slot: Dict[str, Any]) -> float:
+    """Return the planned grid import of a schedule slot (kW); export counts as zero."""
+    return max(0.0, slot_net_import_kw(slot))
+
+
+class PeakTracker:
+    """Streaming monthly maximum of the 15-minute average grid import."""
+
+    def __init__(self) -> None:
+        self._month: Optional[str] = None
+        self._peak_kw: float = 0.0
+        self._peak_at: Optional[str] = None
+        self._windows: int = 0
+        # Open 15-minute window
+        self._window_start: Optional[datetime] = None
+        self._window_kwh: float = 0.0
+        self._window_seconds: float = 0.0
+        self._last_time: Optional[datetime] = None
+        self._last_kw: float = 0.0
+
+    def monthly_peak_kw(self, now: datetime) -> float:
+        """Return the highest completed 15-minute average import in the month of ``now``."""
+        return self._peak_kw if self._month == now.strftime("%Y-%m") else 0.0
+
+    def add_sample(self, now: datetime, import_kw: float) -> bool:
+        """Integrate a grid import reading (kW); returns True when the monthly peak rose."""
+        import_kw = max(0.0, import_kw)
+        last_time, last_kw = self._last_time, self._last_kw
+        self._last_time, self._last_kw = now, import_kw
+        self._roll_month(now)
+        raised = False
+
+        window_start = now.replace(minute=(now.minute // SLOT_MINUTES) * SLOT_MINUTES, second=0, microsecond=0)
+        if last_time is None or now <= last_time or now - last_time > MAX_SAMPLE_GAP:
+            # Nothing to integrate; drop a window we cannot complete reliably
+            if self._window_start != window_start:
+                self._reset_window(window_start)
+            return False
+
+        # The previous reading holds until this one (sensors report on change)
+        if self._window_start is not None and window_start != self._window_start:
+            boundary = window_start
+            self._integrate(max(last_time, self._window_start), boundary, last_kw)
+            raised = self._close_window()
+            self._reset_window(window_start)
+            self._integrate(boundary, now, last_kw)
+        else:
+            if self._window_start is None:
+                self._reset_window(window_start)
+            self._integrate(last_time, now, last_kw)
+        return raised
+
+    def reset_sampling(self) -> None:
+        """Forget the open window (e.g. the grid import sensor was replaced)."""
+        self._last_time = None
+        self._last_kw = 0.0
+        self._window_start = None
+        self._window_kwh = 0.0
+        self._window_seconds = 0.0
+
+    def _integrate(self, start: datetime, end: datetime, kw: float) -> None:
+        seconds = max(0.0, (end - start).total_seconds())
+        self._window_kwh += kw * seconds / 3600.0
+        self._window_seconds += seconds
+
+    def _reset_window(self, start: datetime) -> None:
+        self._window_start = start
+        self._window_kwh = 0.0
+        self._window_seconds = 0.0
+
+    def _close_window(self) -> bool:
+        """Finish the open window; returns True when it set a new monthly peak."""
+        if self._window_start is None or self._window_seconds < MIN_WINDOW_COVERAGE * SLOT_MINUTES * 60:
+            return False
+        avg_kw = self._window_kwh * 3600.0 / self._window_seconds
+        self._windows += 1
+        if avg_kw <= self._peak_kw:
+            return False
+        self._peak_kw = round(avg_kw, 3)
+        self._peak_at = self._window_start.isoformat()
+        _LOGGER.info("New monthly grid import peak %.2f kW (15 min from %s)", self._peak_kw, self._peak_at)
+        return True
+
+    def _roll_month(self, now: datetime) -> None:
+        month = now.strftime("%Y-%m")
+        if month != self._month:
+            if self._month is not None:
+                _LOGGER.info("Grid import peak for %s was %.2f kW", self._month, self._peak_kw)
+            self._month = month
+            self._peak_kw = 0.0
+            self._peak_at = None
+            self._windows = 0
+
+    def summary(self) -> Dict[str, Any]:
+        """Return the monthly peak for diagnostics."""
+        return {
+            "month": self._month,
+            "peak_kw": self._peak_kw,
+            "peak_at": self._peak_at,
+            "windows": self._windows,
+        }
+
+    # ---------- persistence ----------
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Serialise the monthly peak (the open window is not kept)."""
+        return {"month": self._month, "peak_kw": self._peak_kw, "peak_at": self._peak_at,
+                "windows": self._windows}
+
+    def load_dict(self, data: Optional[Dict[str, Any]]) -> None:
+        """Restore state saved by :meth:`as_dict`; a past month is ignored on the next sample."""
+        if not data:
+            return
+        try:
+            self._month = str(data["month"]) if data.get("month") else None
+            self._peak_kw = max(0.0, float(data.get("peak_kw", 0.0)))
+            self._peak_at = data.get("peak_at")
+            self._windows = int(data.get("windows", 0))
+        except (TypeError, ValueError):
+            _LOGGER.warning("Ignoring corrupt grid peak data")
+            self._month, self._peak_kw, self._peak_at, self._windows = None, 0.0, None, 0
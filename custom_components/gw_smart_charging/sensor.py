@@ -12,6 +12,7 @@ from homeassistant.helpers.entity import DeviceInfo
 
 from .const import DOMAIN, DEFAULT_NAME
 from .coordinator import GWSmartCoordinator
+from .fleet import entry_entity_ids
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -20,7 +21,7 @@ def get_device_info(entry: ConfigEntry) -> DeviceInfo:
     """Return device info for the integration."""
     return DeviceInfo(
         identifiers={(DOMAIN, entry.entry_id)},
-        name=DEFAULT_NAME,
+        name=entry.title or DEFAULT_NAME,
         manufacturer="Martin Rak",
         model="Smart Battery Charging Controller",
         sw_version="2.3.0",
@@ -351,6 +352,29 @@ class GWSmartDiagnosticsSensor(CoordinatorEntity, SensorEntity):
             "next_charge_price": next_charge_slot.get("price_czk_kwh", 0.0) if next_charge_slot else 0.0,
             "forecast_confidence": data.get("forecast_confidence", {}),
             "forecast_source": data.get("forecast_source", "unknown"),
+            "forecast_bias_correction": data.get("forecast_bias_correction", {}),
+            "forecast_sources": data.get("forecast_sources", []),
+            "ingest_stats": data.get("ingest_stats", {}),
+            "actuation_stats": data.get("actuation_stats", {}),
+            "actuation_verification": data.get("actuation_verification", {}),
+            "charge_setpoint": data.get("charge_setpoint", {}),
+            "refresh_stats": data.get("refresh_stats", {}),
+            "stale_reason": data.get("stale_reason"),
+            "nanogreen": data.get("nanogreen", {}),
+            "restored_at": data.get("restored_at"),
+            "deferrable_plan": data.get("deferrable_plan", {}),
+            "site_import": data.get("site_import", {}),
+            "battery_wear": data.get("battery_wear", {}),
+            "soc_estimate": data.get("soc_estimate", {}),
+            "fleet": data.get("fleet"),
+            "fleet_allocation": data.get("fleet_allocation"),
+            "stochastic": data.get("stochastic"),
+            "optimizer": data.get("optimizer"),
+            "worker": data.get("worker"),
+            "tuning_suggestion": data.get("tuning_suggestion"),
+            # Entry and sibling entity ids, so cards work with several entries
+            "entry_id": self._entry.entry_id,
+            "entities": entry_entity_ids(self.hass, self._entry.entry_id),
             # Real-time battery metrics
             "battery_power_w": battery_metrics.get("battery_power_w", 0.0),
             "battery_power_kw": battery_metrics.get("battery_power_kw", 0.0),
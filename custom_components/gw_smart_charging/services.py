@@ -1,32 +1,136 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, List
-from datetime import datetime
+from functools import partial
+from typing import Any, Dict, List, Mapping, Tuple
+from datetime import datetime, timedelta
 
 from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+import homeassistant.helpers.config_validation as cv
+import homeassistant.util.dt as dt_util
 import voluptuous as vol
 
-from .const import DOMAIN
+from .backtest import ALL_STRATEGIES, build_days, load_csv, run_backtest
+from .const import CONF_LOAD_SENSOR, CONF_PRICE_SENSOR, CONF_PV_POWER_SENSOR, CONF_SOC_SENSOR, DATA_TUNING, DOMAIN
+from .fleet import get_coordinators
+from .ingest import POWER_UNITS
+from .tuning import DEFAULT_MAX_CANDIDATES, TuningCache, tune
+from .whatif import MAX_SCENARIOS, SCENARIO_OPTIONS, strategy_scenarios
 
 _LOGGER = logging.getLogger(__name__)
 
 SERVICE_OPTIMIZE = "optimize_now"
 SERVICE_APPLY = "apply_schedule_now"
 SERVICE_GET_CHARGING_SCHEDULE = "get_charging_schedule"
+SERVICE_RUN_BACKTEST = "run_backtest"
+SERVICE_TUNE_PARAMETERS = "tune_parameters"
+SERVICE_WHAT_IF = "what_if"
+
+ATTR_ENTRY_ID = "entry_id"
+ATTR_DAYS = "days"
+ATTR_FILE = "file"
+ATTR_STRATEGIES = "strategies"
+ATTR_MAX_CANDIDATES = "max_candidates"
+ATTR_SCENARIOS = "scenarios"
+
+# Every service can target one config entry; without a target it acts on all
+SERVICE_SCHEMA = vol.Schema({vol.Optional(ATTR_ENTRY_ID): cv.string})
+
+HISTORY_SCHEMA = SERVICE_SCHEMA.extend({
+    vol.Optional(ATTR_DAYS, default=30): vol.All(vol.Coerce(int), vol.Range(min=1, max=366)),
+    vol.Optional(ATTR_FILE): cv.string,
+})
+BACKTEST_SCHEMA = HISTORY_SCHEMA.extend({
+    vol.Optional(ATTR_STRATEGIES): vol.All(cv.ensure_list, [vol.In(ALL_STRATEGIES)]),
+})
+TUNING_SCHEMA = HISTORY_SCHEMA.extend({
+    vol.Optional(ATTR_MAX_CANDIDATES, default=DEFAULT_MAX_CANDIDATES): vol.All(
+        vol.Coerce(int), vol.Range(min=1, max=2000)
+    ),
+})
+SCENARIO_SCHEMA = vol.Schema({
+    vol.Optional("name"): cv.string,
+    vol.Required("overrides"): {vol.In(SCENARIO_OPTIONS): vol.Any(bool, int, float, cv.string)},
+})
+WHAT_IF_SCHEMA = SERVICE_SCHEMA.extend({
+    vol.Optional(ATTR_STRATEGIES): vol.All(cv.ensure_list, [vol.In(ALL_STRATEGIES)]),
+    vol.Optional(ATTR_SCENARIOS): vol.All(cv.ensure_list, [SCENARIO_SCHEMA], vol.Length(max=MAX_SCENARIOS)),
+})
+
+
+async def _async_recorder_series(
+    hass: HomeAssistant, config: Mapping[str, Any], days: int
+) -> Dict[str, List[Tuple[datetime, float]]]:
+    """Read hourly mean statistics of the price, PV, load and SOC sensors (pv/load in kW by their unit).
+
+    Raises ``ValueError`` when the price sensor keeps no long-term statistics.
+    """
+    from homeassistant.components.recorder import get_instance, statistics
+
+    sensors = {
+        "price": config.get(CONF_PRICE_SENSOR),
+        "pv": config.get(CONF_PV_POWER_SENSOR),
+        "load": config.get(CONF_LOAD_SENSOR),
+        "soc": config.get(CONF_SOC_SENSOR),
+    }
+    statistic_ids = {entity_id for entity_id in sensors.values() if entity_id}
+    recorder = get_instance(hass)
+    metadata = await recorder.async_add_executor_job(
+        partial(statistics.get_metadata, hass, statistic_ids=statistic_ids)
+    )
+    if sensors["price"] not in metadata:
+        raise ValueError(
+            f"Price sensor {sensors['price']} has no long-term statistics (it needs a state_class)"
+        )
+    end = dt_util.start_of_local_day()
+    start = end - timedelta(days=days)
+    rows = await recorder.async_add_executor_job(
+        statistics.statistics_during_period, hass, start, end, statistic_ids, "hour", None, {"mean"},
+    )
+    # Power statistics keep the sensor's unit; unitless ones are taken as W like before
+    scale = {}
+    for name in ("pv", "load"):
+        unit = metadata[sensors[name]][1].get("unit_of_measurement") if sensors[name] in metadata else None
+        scale[name] = 1.0 / POWER_UNITS.get(unit, 1000.0)
+    series: Dict[str, List[Tuple[datetime, float]]] = {}
+    for name, entity_id in sensors.items():
+        series[name] = []
+        for row in rows.get(entity_id, []) if entity_id else []:
+            if row.get("mean") is None:
+                continue
+            started = row["start"]
+            if not isinstance(started, datetime):  # newer recorders return a timestamp
+                started = dt_util.utc_from_timestamp(started)
+            series[name].append((dt_util.as_local(started).replace(tzinfo=None), row["mean"] * scale.get(name, 1.0)))
+    return series
+
+
+def _target_coordinators(hass: HomeAssistant, call: ServiceCall) -> Dict[str, Any]:
+    """Return the coordinators a service call targets (all when no entry_id is given)."""
+    coordinators = get_coordinators(hass)
+    entry_id = call.data.get(ATTR_ENTRY_ID)
+    if entry_id is None:
+        return coordinators
+    if entry_id not in coordinators:
+        _LOGGER.warning("Service %s: unknown or not loaded entry %s", call.service, entry_id)
+        return {}
+    return {entry_id: coordinators[entry_id]}
 
 
 async def async_setup_services(hass: HomeAssistant) -> None:
-    """Register services for the integration."""
+    """Register services for the integration (once for all entries)."""
+    if hass.services.has_service(DOMAIN, SERVICE_GET_CHARGING_SCHEDULE):
+        return
 
     async def _optimize(call: ServiceCall) -> None:
         _LOGGER.info("Service optimize_now called: %s", call.data)
-        # placeholder - trigger immediate recalculation
-        # Real implementation should call coordinator methods / algorithms.
+        for coordinator in _target_coordinators(hass, call).values():
+            await coordinator.async_request_refresh()
 
     async def _apply(call: ServiceCall) -> None:
         _LOGGER.info("Service apply_schedule_now called: %s", call.data)
-        # placeholder - apply schedule to switches
+        for coordinator in _target_coordinators(hass, call).values():
+            await coordinator.async_apply_schedule_now()
 
     async def _get_charging_schedule(call: ServiceCall) -> ServiceResponse:
         """Get detailed battery charging schedule for automations.
@@ -37,18 +141,29 @@ async def async_setup_services(hass: HomeAssistant) -> None:
         - Planned grid consumption hours (favorable prices)
         - Current activity and state changes
         - Historical consumption optimization data
+
+        With several entries and no ``entry_id`` the responses are returned
+        per entry under ``entries``.
         """
         _LOGGER.info("Service get_charging_schedule called")
         
-        # Get first available coordinator from DOMAIN data
-        coordinators = hass.data.get(DOMAIN, {})
+        coordinators = _target_coordinators(hass, call)
+        if not coordinators and ATTR_ENTRY_ID in call.data:
+            return {"error": f"Unknown entry_id {call.data[ATTR_ENTRY_ID]}"}
         if not coordinators:
             _LOGGER.warning("No coordinators available")
             return {"error": "No integration instance found"}
-        
-        # Use first coordinator (typically there's only one)
-        coordinator = next(iter(coordinators.values()))
-        
+        if len(coordinators) == 1:
+            return _schedule_response(next(iter(coordinators.values())))
+        return {
+            "entries": {
+                entry_id: {"title": coordinator.entry.title, **_schedule_response(coordinator)}
+                for entry_id, coordinator in coordinators.items()
+            }
+        }
+
+    def _schedule_response(coordinator) -> Dict[str, Any]:
+        """Build the get_charging_schedule response of one entry."""
         # Get schedule data
         data = coordinator.data or {}
         schedule: List[Dict[str, Any]] = data.get("schedule", [])
@@ -142,6 +257,9 @@ async def async_setup_services(hass: HomeAssistant) -> None:
         
         # Find solar charging periods
         solar_charging_periods = group_periods(schedule, "mode", "solar_charge")
+
+        # Find battery-to-grid export periods (planned with an export limit)
+        battery_export_periods = group_periods(schedule, "mode", "battery_export")
         
         # Find periods with grid import (when load > PV + battery)
         # These are slots where battery is discharging but not enough to cover load
@@ -169,7 +287,9 @@ async def async_setup_services(hass: HomeAssistant) -> None:
         total_solar_charge_kwh = 0.0
         total_battery_discharge_kwh = 0.0
         total_grid_import_kwh = 0.0
+        total_grid_export_kwh = 0.0
         total_cost_czk = 0.0
+        total_export_revenue_czk = 0.0
         
         for slot in schedule:
             charge_kw = slot.get("planned_charge_kW", 0.0)
@@ -183,8 +303,11 @@ async def async_setup_services(hass: HomeAssistant) -> None:
                 total_cost_czk += kwh * price
             elif mode == "solar_charge" and charge_kw > 0:
                 total_solar_charge_kwh += charge_kw * interval_hours
-            elif mode == "battery_discharge" and charge_kw < 0:
+            elif mode in ("battery_discharge", "battery_export") and charge_kw < 0:
                 total_battery_discharge_kwh += abs(charge_kw) * interval_hours
+            export_kwh = slot.get("grid_export_kW", 0.0) * interval_hours
+            total_grid_export_kwh += export_kwh
+            total_export_revenue_czk += export_kwh * slot.get("export_price_czk_kwh", 0.0)
         
         # Prepare response
         response = {
@@ -200,12 +323,15 @@ async def async_setup_services(hass: HomeAssistant) -> None:
             "grid_charging_periods": grid_charging_periods,
             "battery_discharge_periods": battery_discharge_periods,
             "solar_charging_periods": solar_charging_periods,
+            "battery_export_periods": battery_export_periods,
             "grid_import_slots": grid_import_periods,
             "daily_statistics": {
                 "total_grid_charge_kwh": round(total_grid_charge_kwh, 3),
                 "total_solar_charge_kwh": round(total_solar_charge_kwh, 3),
                 "total_battery_discharge_kwh": round(total_battery_discharge_kwh, 3),
                 "estimated_grid_cost_czk": round(total_cost_czk, 2),
+                "total_grid_export_kwh": round(total_grid_export_kwh, 3),
+                "estimated_export_revenue_czk": round(total_export_revenue_czk, 2),
                 "grid_charging_periods_count": len(grid_charging_periods),
                 "solar_charging_periods_count": len(solar_charging_periods),
                 "battery_discharge_periods_count": len(battery_discharge_periods),
@@ -238,15 +364,122 @@ async def async_setup_services(hass: HomeAssistant) -> None:
             "last_update": data.get("last_update", "never"),
             "automation_active": coordinator.config.get("enable_automation", True),
             "last_script_state": coordinator._last_script_state,
+            "entry_id": coordinator.entry.entry_id,
         }
         
         return response
 
-    hass.services.async_register(DOMAIN, SERVICE_OPTIMIZE, _optimize)
-    hass.services.async_register(DOMAIN, SERVICE_APPLY, _apply)
+    async def _async_history(call: ServiceCall) -> Tuple[Any, Any, Any]:
+        """Return ``(coordinator, days, source)`` for a history service, or an error response."""
+        coordinators = _target_coordinators(hass, call)
+        if not coordinators:
+            return None, {"error": f"Unknown entry_id {call.data[ATTR_ENTRY_ID]}" if ATTR_ENTRY_ID in call.data
+                          else "No integration instance found"}, None
+        coordinator = next(iter(coordinators.values()))
+        days = call.data.get(ATTR_DAYS, 30)
+        if ATTR_FILE in call.data:
+            path = hass.config.path(call.data[ATTR_FILE])
+            if not hass.config.is_allowed_path(path):
+                return None, {"error": f"Access to {path} is not allowed (allowlist_external_dirs)"}, None
+            try:
+                series = await hass.async_add_executor_job(load_csv, path)
+            except (OSError, ValueError) as err:
+                return None, {"error": f"Cannot read {path}: {err}"}, None
+            source = path
+        else:
+            try:
+                series = await _async_recorder_series(hass, coordinator.config, days)
+            except (ImportError, KeyError) as err:
+                return None, {"error": f"Recorder statistics are not available: {err}"}, None
+            except ValueError as err:
+                return None, {"error": str(err)}, None
+            source = "recorder"
+        history = (await hass.async_add_executor_job(build_days, series))[-days:]
+        if not history:
+            return None, {"error": "No complete days of price, PV and load history"}, None
+        return coordinator, history, source
+
+    async def _run_backtest(call: ServiceCall) -> ServiceResponse:
+        """Compare all charging strategies on recorded (or exported) history.
+
+        Uses the targeted entry's settings (the first entry without ``entry_id``).
+        """
+        coordinator, history, source = await _async_history(call)
+        if coordinator is None:
+            return history
+        entry_id = coordinator.entry.entry_id
+        _LOGGER.info("Backtesting %d days from %s for entry %s", len(history), source, entry_id)
+        result = await hass.async_add_executor_job(
+            run_backtest, dict(coordinator.config), history, call.data.get(ATTR_STRATEGIES)
+        )
+        _LOGGER.info("Backtest finished in %.1f s:\n%s", result["elapsed_s"], result["table"])
+        return {"entry_id": entry_id, "source": source, **result}
+
+    async def _tune_parameters(call: ServiceCall) -> ServiceResponse:
+        """Search price thresholds, hysteresis and SOC targets on recorded history.
+
+        The recommended settings are offered in the entry's options flow.
+        """
+        coordinator, history, source = await _async_history(call)
+        if coordinator is None:
+            return history
+        entry_id = coordinator.entry.entry_id
+        cache = hass.data.setdefault(DATA_TUNING, TuningCache())
+        _LOGGER.info("Tuning parameters on %d days from %s for entry %s", len(history), source, entry_id)
+        result = await hass.async_add_executor_job(
+            tune, dict(coordinator.config), history, cache, call.data.get(ATTR_MAX_CANDIDATES, DEFAULT_MAX_CANDIDATES)
+        )
+        recommended, current = result["recommended"], result["current"]
+        if recommended["parameters"] != current["parameters"]:
+            coordinator.tuning_suggestion = {
+                "parameters": recommended["parameters"],
+                "grid_cost": recommended["grid_cost"],
+                "current_grid_cost": current["grid_cost"],
+                "days": result["days"],
+                "created": dt_util.now().isoformat(),
+            }
+        else:
+            coordinator.tuning_suggestion = None
+        return {"entry_id": entry_id, "source": source, **result}
+
+    async def _what_if(call: ServiceCall) -> ServiceResponse:
+        """Re-plan the current inputs under every strategy or the given overrides.
+
+        ``scenarios`` (lists of option overrides) replace the strategy
+        comparison; ``strategies`` limits it.  The live plan is not changed.
+        """
+        coordinators = _target_coordinators(hass, call)
+        if not coordinators:
+            return {"error": f"Unknown entry_id {call.data[ATTR_ENTRY_ID]}" if ATTR_ENTRY_ID in call.data
+                    else "No integration instance found"}
+        scenarios = call.data.get(ATTR_SCENARIOS) or strategy_scenarios(call.data.get(ATTR_STRATEGIES))
+        responses: Dict[str, Any] = {}
+        for entry_id, coordinator in coordinators.items():
+            result = await coordinator.async_what_if(scenarios)
+            responses[entry_id] = result if result is not None else {"error": "No plan computed yet"}
+        if len(responses) == 1:
+            entry_id, response = next(iter(responses.items()))
+            return {"entry_id": entry_id, **response}
+        return {"entries": responses}
+
+    hass.services.async_register(DOMAIN, SERVICE_OPTIMIZE, _optimize, schema=SERVICE_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_APPLY, _apply, schema=SERVICE_SCHEMA)
     hass.services.async_register(
         DOMAIN, 
         SERVICE_GET_CHARGING_SCHEDULE, 
         _get_charging_schedule,
+        schema=SERVICE_SCHEMA,
         supports_response=SupportsResponse.ONLY
     )
+    hass.services.async_register(
+        DOMAIN, SERVICE_RUN_BACKTEST, _run_backtest,
+        schema=BACKTEST_SCHEMA, supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_TUNE_PARAMETERS, _tune_parameters,
+        schema=TUNING_SCHEMA, supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_WHAT_IF, _what_if,
+        schema=WHAT_IF_SCHEMA, supports_response=SupportsResponse.ONLY,
+    )
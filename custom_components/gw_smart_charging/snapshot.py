@@ -0,0 +1,89 @@
+"""Persisted plan snapshot for warm start after a Home Assistant restart.
+
+The snapshot holds the last computed plan (coordinator data), the actuation
+and hysteresis state, ML history and ingestion cache metadata.  It is restored
+before the platforms are set up, so entities have a valid state immediately,
+the first cycle after a restart does not re-fire a charging script whose state
+did not change, and the first full refresh can be deferred until Home
+Assistant has started.
+
+Writes are throttled: actuation changes are saved within seconds, everything
+else at most every ``PERIODIC_SAVE_DELAY`` seconds (and on shutdown).
+"""
+from __future__ import annotations
+
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, STORAGE_VERSION
+
+_LOGGER = logging.getLogger(__name__)
+
+# A restored plan older than this is not shown - a fresh refresh is required
+SNAPSHOT_MAX_AGE = timedelta(hours=6)
+URGENT_SAVE_DELAY = 10
+PERIODIC_SAVE_DELAY = 900
+# Per-entry stores (``entry_store``); all are deleted with the config entry
+STORE_SNAPSHOT = "snapshot"
+STORE_PV_BIAS = "pv_bias"
+ENTRY_STORES = (STORE_SNAPSHOT, STORE_PV_BIAS)
+
+
+def entry_store(hass: HomeAssistant, entry_id: str, name: str) -> Store:
+    """Return the ``name`` store of a config entry (one of ``ENTRY_STORES``)."""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.{name}")
+
+
+async def async_remove_entry_stores(hass: HomeAssistant, entry_id: str) -> None:
+    """Delete every store of a removed config entry."""
+    for name in ENTRY_STORES:
+        await entry_store(hass, entry_id, name).async_remove()
+
+
+class PlanSnapshotStore:
+    """Load and throttle-save the coordinator snapshot for one config entry."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self._store = entry_store(hass, entry_id, STORE_SNAPSHOT)
+        self._next_periodic_save: float = 0.0
+
+    async def async_load(self) -> Optional[Dict[str, Any]]:
+        """Return the stored snapshot, or None when missing or unreadable."""
+        try:
+            data = await self._store.async_load()
+        except Exception as e:
+            _LOGGER.warning("Failed to load plan snapshot: %s", e)
+            return None
+        return data if isinstance(data, dict) else None
+
+    def schedule_save(self, data_func: Callable[[], Dict[str, Any]], urgent: bool = False) -> None:
+        """Schedule a write; ``data_func`` is evaluated at write time."""
+        now = time.monotonic()
+        if urgent:
+            self._store.async_delay_save(data_func, URGENT_SAVE_DELAY)
+            self._next_periodic_save = now + PERIODIC_SAVE_DELAY
+        elif now >= self._next_periodic_save:
+            # Store keeps the pending write for the final-write on shutdown
+            self._store.async_delay_save(data_func, PERIODIC_SAVE_DELAY)
+            self._next_periodic_save = now + PERIODIC_SAVE_DELAY
+
+
+def snapshot_is_fresh(snapshot: Dict[str, Any]) -> bool:
+    """Return True when the stored plan can be shown as the current plan.
+
+    The schedule is indexed by time of day, so it must be from today and
+    not older than ``SNAPSHOT_MAX_AGE``.
+    """
+    try:
+        saved_at = datetime.fromisoformat(snapshot["saved_at"])
+        saved_local_date = snapshot["saved_local_date"]
+    except (KeyError, TypeError, ValueError):
+        return False
+    if saved_local_date != datetime.now().date().isoformat():
+        return False
+    return datetime.now(timezone.utc) - saved_at <= SNAPSHOT_MAX_AGE
@@ -0,0 +1,181 @@
+"""Battery SOC estimate fusing the SOC sensor with integrated battery power.
+
+GoodWe SOC readings come in whole percent and lag the battery, so planning
+from them starts up to a percent (and a few minutes) off.  ``SocEstimator``
+is a one-state Kalman filter on the stored energy (kWh):
+
+* predict - every battery power reading integrates the previous one over
+  the time since (sensors report on change, so a reading holds until the
+  next), with the configured efficiency as in the planner; the variance
+  grows with the integrated energy (power sensor error) and with time
+  (self-discharge, BMS drift),
+* update - every SOC reading corrects the estimate.  A reading stepping by
+  one resolution step from the previous one says the true SOC just crossed
+  the boundary between the two, which is sharper than the reading
+  itself; other readings count with their quantisation error.
+
+Both steps are O(1) per sensor event.  The filter only runs while battery
+power is being reported: with no power reading yet, or none within
+``MAX_POWER_HOLD_S``, a SOC reading is taken as is, so without a power
+sensor the estimate is exactly the SOC sensor.
+"""
+from __future__ import annotations
+
+import logging
+import math
+from typing import Any, Dict, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+# Relative error of the battery power sensor, per kWh integrated
+POWER_ERROR = 0.03
+# Unmodelled drift (self-discharge, BMS recalibration), % of capacity per hour
+DRIFT_PCT_PER_HOUR = 0.2
+# Reading noise of the SOC sensor on top of its resolution (%, one sigma)
+SOC_SENSOR_SIGMA_PCT = 0.2
+# A power reading is integrated for at most this long (sensor outage, restart)
+MAX_POWER_HOLD_S = 900.0
+
+
+def _resolution_pct(soc_pct: float) -> float:
+    """Resolution step of a SOC reading: 1 % for whole numbers, else 0.1 %."""
+    return 1.0 if float(soc_pct).is_integer() else 0.1
+
+
+class SocEstimator:
+    """Streaming SOC estimate (kWh) with its variance."""
+
+    def __init__(self, capacity_kwh: float = 1.0, efficiency: float = 1.0) -> None:
+        self.capacity_kwh = max(0.1, capacity_kwh)
+        self.efficiency = min(1.0, max(0.5, efficiency))
+        self._soc_kwh: Optional[float] = None
+        self._variance = 0.0  # kWh²
+        self._time: Optional[float] = None  # monotonic seconds of the estimate
+        self._power_kw: Optional[float] = None  # last battery power, positive = discharge
+        self._power_time: Optional[float] = None
+        self._reading_pct: Optional[float] = None
+        self._reading_time: Optional[float] = None
+        self._stats = {"power_events": 0, "soc_events": 0, "boundary_updates": 0, "direct_updates": 0}
+        self._last_innovation_pct = 0.0
+
+    def configure(self, capacity_kwh: float, efficiency: float) -> None:
+        """Apply battery settings; the estimate is kept as a share of capacity."""
+        capacity_kwh = max(0.1, capacity_kwh)
+        if self._soc_kwh is not None and capacity_kwh != self.capacity_kwh:
+            scale = capacity_kwh / self.capacity_kwh
+            self._soc_kwh *= scale
+            self._variance *= scale * scale
+        self.capacity_kwh = capacity_kwh
+        self.efficiency = min(1.0, max(0.5, efficiency))
+
+    @property
+    def initialized(self) -> bool:
+        return self._soc_kwh is not None
+
+    def reset(self) -> None:
+        """Forget the estimate and readings (a sensor was replaced)."""
+        self._soc_kwh = None
+        self._variance = 0.0
+        self._time = None
+        self._power_kw = None
+        self._power_time = None
+        self._reading_pct = None
+        self._reading_time = None
+
+    # ---------- events ----------
+
+    def add_power(self, now: float, power_kw: float) -> None:
+        """Battery power reading (kW, positive = discharge, negative = charge)."""
+        self._predict(now)
+        self._power_kw = power_kw
+        self._power_time = now
+        self._stats["power_events"] += 1
+
+    def add_soc(self, now: float, soc_pct: float) -> None:
+        """SOC sensor reading (%)."""
+        soc_pct = min(100.0, max(0.0, soc_pct))
+        if soc_pct == self._reading_pct:
+            return  # attribute-only change; a repeated reading carries no new information
+        self._stats["soc_events"] += 1
+        previous = self._reading_pct
+        self._reading_pct, self._reading_time = soc_pct, now
+        if self._soc_kwh is None or not self._power_fresh(now):
+            # Nothing to fuse with: the reading is the best estimate
+            self._soc_kwh = soc_pct / 100.0 * self.capacity_kwh
+            self._variance = self._pct_to_kwh2(_resolution_pct(soc_pct) ** 2 / 12.0 + SOC_SENSOR_SIGMA_PCT ** 2)
+            self._time = now
+            self._last_innovation_pct = 0.0
+            self._stats["direct_updates"] += 1
+            return
+        self._predict(now)
+        step = _resolution_pct(soc_pct)
+        if previous is not None and abs(abs(soc_pct - previous) - step) < 1e-6:
+            # Just crossed the boundary between the two readings
+            measured_pct = (soc_pct + previous) / 2.0
+            variance_pct = (0.1 * step) ** 2 + SOC_SENSOR_SIGMA_PCT ** 2
+            self._stats["boundary_updates"] += 1
+        else:
+            measured_pct = soc_pct
+            variance_pct = step ** 2 / 12.0 + SOC_SENSOR_SIGMA_PCT ** 2
+        measured = measured_pct / 100.0 * self.capacity_kwh
+        noise = self._pct_to_kwh2(variance_pct)
+        gain = self._variance / (self._variance + noise)
+        innovation = measured - self._soc_kwh
+        self._soc_kwh = min(self.capacity_kwh, max(0.0, self._soc_kwh + gain * innovation))
+        self._variance *= 1.0 - gain
+        self._last_innovation_pct = 100.0 * innovation / self.capacity_kwh
+        _LOGGER.debug("SOC reading %.1f %% moved the estimate by %.2f %% (gain %.2f)",
+                      soc_pct, self._last_innovation_pct * gain, gain)
+
+    def _power_fresh(self, now: float) -> bool:
+        """Return True while the last battery power reading is still integrated."""
+        return self._power_time is not None and now - self._power_time <= MAX_POWER_HOLD_S
+
+    def _predict(self, now: float) -> None:
+        """Advance the estimate to ``now`` with the held battery power."""
+        if self._soc_kwh is None or self._time is None or now <= self._time:
+            return
+        dt = now - self._time
+        held = 0.0
+        if self._power_kw is not None and self._power_time is not None:
+            held = max(0.0, min(now, self._power_time + MAX_POWER_HOLD_S) - max(self._time, self._power_time))
+        unknown = dt - held
+        if held > 0:
+            kwh = self._power_kw * held / 3600.0
+            # Discharge takes kwh / eff from the cells, charging stores kwh * eff
+            delta = -kwh / self.efficiency if kwh > 0 else -kwh * self.efficiency
+            self._soc_kwh = min(self.capacity_kwh, max(0.0, self._soc_kwh + delta))
+            self._variance += (POWER_ERROR * delta) ** 2
+        if unknown > 0 and self._power_kw:
+            # The last reading may or may not have continued
+            self._variance += (self._power_kw * unknown / 3600.0) ** 2 / 3.0
+        drift_kwh = DRIFT_PCT_PER_HOUR / 100.0 * self.capacity_kwh
+        self._variance += drift_kwh * drift_kwh * dt / 3600.0
+        self._time = now
+
+    def _pct_to_kwh2(self, variance_pct: float) -> float:
+        scale = self.capacity_kwh / 100.0
+        return variance_pct * scale * scale
+
+    # ---------- results ----------
+
+    def soc_frac(self, now: float) -> Optional[float]:
+        """Return the estimated SOC (0-1) at ``now``, None before the first SOC reading."""
+        self._predict(now)
+        if self._soc_kwh is None:
+            return None
+        return min(1.0, max(0.0, self._soc_kwh / self.capacity_kwh))
+
+    def summary(self, now: float) -> Dict[str, Any]:
+        """Return the estimate, its uncertainty and counters for diagnostics."""
+        frac = self.soc_frac(now)
+        sigma_kwh = math.sqrt(self._variance) if frac is not None else None
+        return {
+            "soc_pct": round(frac * 100.0, 2) if frac is not None else None,
+            "soc_kwh": round(self._soc_kwh, 3) if self._soc_kwh is not None else None,
+            "sigma_pct": round(100.0 * sigma_kwh / self.capacity_kwh, 2) if sigma_kwh is not None else None,
+            "sensor_soc_pct": self._reading_pct,
+            "sensor_age_s": round(now - self._reading_time) if self._reading_time is not None else None,
+            "last_innovation_pct": round(self._last_innovation_pct, 2),
+            **self._stats,
+        }
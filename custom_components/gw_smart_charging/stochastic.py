@@ -0,0 +1,299 @@
+"""Stochastic plan selection under PV and load forecast uncertainty.
+
+The planner's own schedule assumes the forecast is right.  In stochastic mode
+a handful of candidate plans (the planner with its target and critical-hours
+SOC raised or lowered) are replayed against a few hundred sampled PV and load
+scenarios in one vectorized NumPy pass (candidates x scenarios x slots).  The
+candidate with the lowest expected grid cost wins, subject to the share of
+scenarios in which the battery falls below the critical-hours SOC staying
+under the configured risk limit; when no candidate meets the limit, the
+least risky one is used.
+
+Scenario spread comes from the forecast confidence score and the learned
+historical error of the forecast sources: a lognormal factor per scenario
+(cloudy day vs. sunny day) times AR(1) slot noise (passing clouds).
+
+NumPy is declared in the manifest requirements (Home Assistant core
+installs it too).  Where it still cannot be imported (a stripped-down
+install) the deterministic plan is kept, with a warning, and the
+diagnostics sensor reports ``stochastic.available: false``.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - a manifest requirement; see available()
+    np = None
+
+from .const import (
+    CONF_BATTERY_CAPACITY,
+    CONF_CHARGE_EFFICIENCY,
+    CONF_CRITICAL_HOURS_SOC,
+    CONF_EXPORT_LIMIT,
+    CONF_MAX_CHARGE_POWER,
+    CONF_MAX_SOC,
+    CONF_MIN_SOC,
+    CONF_TARGET_SOC,
+    DEFAULT_BATTERY_CAPACITY,
+    DEFAULT_CHARGE_EFFICIENCY,
+    DEFAULT_CRITICAL_HOURS_SOC,
+    DEFAULT_EXPORT_LIMIT,
+    DEFAULT_MAX_CHARGE_POWER,
+    DEFAULT_MAX_SOC,
+    DEFAULT_MIN_SOC,
+    DEFAULT_TARGET_SOC,
+)
+from .degradation import WearModel
+
+_LOGGER = logging.getLogger(__name__)
+
+SLOTS_PER_DAY = 96
+SLOT_HOURS = 0.25
+DEFAULT_SCENARIOS = 300
+# Wall-clock budget for candidate planning plus evaluation (well inside the plan stage budget)
+DEFAULT_BUDGET_S = 2.0
+# Relative spread bounds of the PV scenarios; load forecasts are steadier
+MIN_PV_SPREAD = 0.05
+MAX_PV_SPREAD = 0.8
+DEFAULT_LOAD_SPREAD = 0.15
+# Slot-to-slot correlation of the noise around the daily factor
+SLOT_CORRELATION = 0.9
+# SOC this far (kWh) under the critical-hours SOC counts as a shortfall
+SHORTFALL_TOLERANCE_KWH = 0.05
+# Candidate SOC offsets (percentage points) around the configured targets
+TARGET_OFFSETS = (0.0, -20.0, -10.0, 10.0, 20.0)
+CRITICAL_OFFSETS = (0.0, 10.0, 20.0)
+
+
+def available() -> bool:
+    return np is not None
+
+
+def uncertainty_settings(
+    confidence: Optional[float],
+    source_errors: Sequence[Optional[float]],
+    risk_limit_pct: float,
+    scenarios: int = DEFAULT_SCENARIOS,
+    budget_s: float = DEFAULT_BUDGET_S,
+) -> Dict[str, float]:
+    """Return the planner's ``uncertainty`` settings (a JSON-friendly dict).
+
+    The PV spread is the learned relative daily error of the forecast
+    sources when known, else derived from the confidence score (a score of
+    0.8 means about 20 % spread).
+    """
+    errors = [float(e) for e in source_errors if e is not None]
+    if errors:
+        pv_spread = sum(errors) / len(errors)
+    else:
+        pv_spread = 1.0 - float(confidence if confidence is not None else 0.5)
+    return {
+        "pv_spread": round(min(MAX_PV_SPREAD, max(MIN_PV_SPREAD, pv_spread)), 3),
+        "load_spread": DEFAULT_LOAD_SPREAD,
+        "risk_limit": max(0.0, min(1.0, float(risk_limit_pct) / 100.0)),
+        "scenarios": int(scenarios),
+        "budget_s": float(budget_s),
+    }
+
+
+def candidate_overrides(config: Mapping[str, Any]) -> List[Dict[str, float]]:
+    """Target / critical-hours SOC variations to plan, the unchanged config first."""
+    min_soc = float(config.get(CONF_MIN_SOC, DEFAULT_MIN_SOC))
+    max_soc = float(config.get(CONF_MAX_SOC, DEFAULT_MAX_SOC))
+    target = float(config.get(CONF_TARGET_SOC, DEFAULT_TARGET_SOC))
+    critical = float(config.get(CONF_CRITICAL_HOURS_SOC, DEFAULT_CRITICAL_HOURS_SOC))
+    overrides: List[Dict[str, float]] = []
+    seen = set()
+    for critical_offset in CRITICAL_OFFSETS:
+        for target_offset in TARGET_OFFSETS:
+            values = (
+                min(max_soc, max(min_soc, target + target_offset)),
+                min(max_soc, max(min_soc, critical + critical_offset)),
+            )
+            if values in seen:
+                continue
+            seen.add(values)
+            if values == (target, critical):
+                overrides.insert(0, {})
+            else:
+                overrides.append({CONF_TARGET_SOC: values[0], CONF_CRITICAL_HOURS_SOC: values[1]})
+    return overrides
+
+
+def sample_scenarios(
+    forecast: Sequence[float], loads: Sequence[float], uncertainty: Mapping[str, float], seed: int = 0,
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Return ``(pv, load)`` arrays of shape (scenarios, 96) around the forecasts."""
+    rng = np.random.default_rng(seed)
+    count = int(uncertainty["scenarios"])
+    pv_base = np.zeros(SLOTS_PER_DAY)
+    load_base = np.zeros(SLOTS_PER_DAY)
+    pv_base[:min(len(forecast), SLOTS_PER_DAY)] = forecast[:SLOTS_PER_DAY]
+    load_base[:min(len(loads), SLOTS_PER_DAY)] = loads[:SLOTS_PER_DAY]
+
+    def factors(spread: float, slots: int) -> "np.ndarray":
+        # Lognormal day factor (mean 1) times mean-one AR(1) slot noise
+        day = rng.lognormal(-0.5 * spread ** 2, spread, size=(count, 1))
+        shocks = rng.normal(0.0, 0.5 * spread * np.sqrt(1.0 - SLOT_CORRELATION ** 2), size=(count, slots))
+        noise = np.empty_like(shocks)
+        noise[:, 0] = rng.normal(0.0, 0.5 * spread, size=count)
+        for slot in range(1, slots):
+            noise[:, slot] = SLOT_CORRELATION * noise[:, slot - 1] + shocks[:, slot]
+        return np.clip(day * (1.0 + noise), 0.0, None)
+
+    pv = pv_base * factors(float(uncertainty["pv_spread"]), pv_base.size)
+    load = load_base * factors(float(uncertainty["load_spread"]), load_base.size)
+    return pv, load
+
+
+def evaluate_plans(
+    config: Mapping[str, Any],
+    schedules: Sequence[Sequence[Mapping[str, Any]]],
+    pv: "np.ndarray",
+    load: "np.ndarray",
+    current_slot: int,
+    initial_soc_frac: float,
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Replay each schedule's grid charging in every scenario.
+
+    Solar surplus charges and deficits discharge the battery like in the
+    planner; grid charging follows the plan (limited by the room left).
+    The cost includes battery wear, less feed-in revenue with an export
+    limit, and is net of the SOC change valued at the average price, so a
+    plan does not look cheap just by leaving the battery empty.  Returns
+    ``(expected_cost, shortfall_risk)`` per schedule.
+    """
+    capacity = float(config.get(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY))
+    max_charge = float(config.get(CONF_MAX_CHARGE_POWER, DEFAULT_MAX_CHARGE_POWER))
+    eff = float(config.get(CONF_CHARGE_EFFICIENCY, DEFAULT_CHARGE_EFFICIENCY)) or 1.0
+    min_kwh = capacity * float(config.get(CONF_MIN_SOC, DEFAULT_MIN_SOC)) / 100.0
+    max_kwh = capacity * float(config.get(CONF_MAX_SOC, DEFAULT_MAX_SOC)) / 100.0
+    critical_kwh = capacity * float(config.get(CONF_CRITICAL_HOURS_SOC, DEFAULT_CRITICAL_HOURS_SOC)) / 100.0
+
+    slots = range(current_slot, min(len(schedules[0]), pv.shape[1]))
+    grid = np.array([
+        [float(slot["planned_charge_kW"]) if str(slot.get("mode", "")).startswith("grid_charge") else 0.0
+         for slot in schedule[:pv.shape[1]]]
+        for schedule in schedules
+    ])  # (candidates, slots)
+    prices = np.array([float(slot.get("price_czk_kwh", 0.0)) for slot in schedules[0][:pv.shape[1]]])
+    critical = [bool(slot.get("is_critical_hour")) for slot in schedules[0][:pv.shape[1]]]
+    export_limit = float(config.get(CONF_EXPORT_LIMIT, DEFAULT_EXPORT_LIMIT) or 0.0)
+    if export_limit > 0:
+        export_prices = np.array([float(slot.get("export_price_czk_kwh", 0.0)) for slot in schedules[0][:pv.shape[1]]])
+        # Planned battery-to-grid export (kW beyond the house's own deficit), replayed per scenario
+        battery_export = np.array([
+            [float(slot.get("grid_export_kW", 0.0)) if slot.get("mode") == "battery_export" else 0.0
+             for slot in schedule[:pv.shape[1]]]
+            for schedule in schedules
+        ])
+    wear = WearModel.from_config(config)
+    if wear.active:
+        soc_factor = np.array(wear.soc_factor)
+        rate_factor = np.array(wear.rate_factor)
+
+        def wear_per_kwh(soc_kwh: "np.ndarray", power_kw: "np.ndarray") -> "np.ndarray":
+            soc_index = np.clip(np.rint(soc_kwh / wear.capacity_kwh * 100.0), 0, 100).astype(int)
+            rate_index = np.clip(np.rint(power_kw / wear.rate_step_kw), 0, len(rate_factor) - 1).astype(int)
+            return wear.cost_per_kwh * soc_factor[soc_index] * rate_factor[rate_index]
+
+    soc = np.full((len(schedules), pv.shape[0]), capacity * initial_soc_frac)
+    cost = np.zeros_like(soc)
+    shortfall = np.zeros(soc.shape, dtype=bool)
+    for s in slots:
+        net = load[:, s] - pv[:, s]  # (scenarios,)
+        surplus_kwh = np.minimum(np.maximum(-net, 0.0), max_charge) * SLOT_HOURS
+        solar = np.minimum(surplus_kwh, np.maximum(max_kwh - soc, 0.0) / eff)
+        deficit_kwh = np.minimum(np.maximum(net, 0.0), max_charge) * SLOT_HOURS
+        discharge = np.minimum(deficit_kwh, np.maximum(soc - min_kwh, 0.0))
+        if wear.active:
+            # Like the planner, hold the battery where discharging costs more wear than it saves
+            discharge = np.where(prices[s] < wear_per_kwh(soc, deficit_kwh / SLOT_HOURS), 0.0, discharge)
+            cost += (wear_per_kwh(soc, solar / SLOT_HOURS) * solar
+                     + wear_per_kwh(soc, discharge / SLOT_HOURS) * discharge)
+        soc = soc + solar * eff - discharge / eff
+        charge = np.minimum(grid[:, s:s + 1], np.maximum(max_kwh - soc, 0.0) / (SLOT_HOURS * eff))
+        if wear.active:
+            cost += wear_per_kwh(soc, charge) * charge * SLOT_HOURS
+        soc = soc + charge * SLOT_HOURS * eff
+        grid_kw = net + charge - discharge / SLOT_HOURS
+        if export_limit > 0:
+            floor_kwh = max(min_kwh, critical_kwh) if critical[s] else min_kwh
+            export = np.where(charge > 0, 0.0, np.minimum(
+                battery_export[:, s:s + 1] * SLOT_HOURS, np.maximum(soc - floor_kwh, 0.0) * eff
+            ))
+            if wear.active:
+                cost += wear_per_kwh(soc, export / SLOT_HOURS) * export
+            soc = soc - export / eff
+            # Unstored surplus and battery export earn the feed-in price, up to the export limit
+            grid_kw = grid_kw + solar / SLOT_HOURS - export / SLOT_HOURS
+            cost -= np.minimum(np.maximum(-grid_kw, 0.0), export_limit) * export_prices[s] * SLOT_HOURS
+        soc = np.clip(soc, min_kwh, max_kwh)
+        cost += np.maximum(grid_kw, 0.0) * prices[s] * SLOT_HOURS
+        if critical[s]:
+            shortfall |= soc < critical_kwh - SHORTFALL_TOLERANCE_KWH
+    # Energy left over (or borrowed) displaces later import at about the average price
+    remaining = prices[current_slot:]
+    stored_value = float(remaining[remaining > 0].mean()) if (remaining > 0).any() else 0.0
+    cost -= (soc - capacity * initial_soc_frac) * stored_value
+    return cost.mean(axis=1), shortfall.mean(axis=1)
+
+
+def choose_plan(planner: Any, args: tuple) -> Tuple[Any, Tuple[List[Dict[str, Any]], Dict[str, Any]], Dict[str, Any]]:
+    """Plan the candidates with copies of ``planner`` and pick the best under uncertainty.
+
+    Returns ``(chosen planner, its compute_plan result, summary)``.  The
+    first candidate is the unchanged configuration; candidates are planned
+    until the budget is half spent, the rest goes to the evaluation.
+    """
+    started = time.monotonic()
+    uncertainty = planner.uncertainty
+    budget_s = float(uncertainty.get("budget_s", DEFAULT_BUDGET_S))
+    forecast, _prices, loads = args[0], args[1], args[2]
+
+    planners: List[Any] = []
+    results: List[Tuple[List[Dict[str, Any]], Dict[str, Any]]] = []
+    overrides = candidate_overrides(planner.config)
+    for candidate in overrides:
+        if planners and time.monotonic() - started > budget_s / 2:
+            break
+        run = planner.copy_with_config({**planner.config, **candidate})
+        results.append(run.compute_plan_deterministic(*args))
+        planners.append(run)
+
+    pv, load = sample_scenarios(forecast, loads, uncertainty, seed=planner.current_slot)
+    costs, risks = evaluate_plans(
+        planner.config, [schedule for schedule, _plan in results], pv, load,
+        planner.current_slot, planner.initial_soc_frac,
+    )
+    risk_limit = float(uncertainty.get("risk_limit", 0.1))
+    feasible = [i for i in range(len(results)) if risks[i] <= risk_limit]
+    if feasible:
+        best = min(feasible, key=lambda i: (costs[i], i))
+    else:
+        best = min(range(len(results)), key=lambda i: (risks[i], costs[i], i))
+    elapsed = time.monotonic() - started
+    summary = {
+        "scenarios": int(pv.shape[0]),
+        "candidates": len(results),
+        "candidates_skipped": len(overrides) - len(results),
+        "pv_spread": uncertainty.get("pv_spread"),
+        "load_spread": uncertainty.get("load_spread"),
+        "risk_limit": risk_limit,
+        "chosen": overrides[best],
+        "expected_cost": round(float(costs[best]), 2),
+        "shortfall_risk": round(float(risks[best]), 3),
+        "deterministic_expected_cost": round(float(costs[0]), 2),
+        "deterministic_shortfall_risk": round(float(risks[0]), 3),
+        "risk_limit_met": bool(feasible),
+        "elapsed_ms": round(elapsed * 1000.0, 1),
+        "budget_ms": round(budget_s * 1000.0, 1),
+    }
+    if elapsed > budget_s:
+        _LOGGER.warning("Stochastic planning took %.2fs (budget %.2fs)", elapsed, budget_s)
+    _LOGGER.debug("Stochastic planning: %s", summary)
+    return planners[best], results[best], summary
@@ -20,7 +20,7 @@ def get_device_info(entry: ConfigEntry) -> DeviceInfo:
     """Return device info for the integration."""
     return DeviceInfo(
         identifiers={(DOMAIN, entry.entry_id)},
-        name=DEFAULT_NAME,
+        name=entry.title or DEFAULT_NAME,
         manufacturer="GW Energy Solutions",
         model="Smart Battery Charging Controller",
         sw_version="1.9.0",
@@ -120,13 +120,11 @@ class GWSmartChargingSwitch(CoordinatorEntity, SwitchEntity):
         self._is_on = True
         self.async_write_ha_state()
         
-        # If automation enabled, call the charging ON script
+        # If automation enabled, queue the charging ON script (shares the
+        # coordinator's actuation key, so it never races a scheduled call)
         if self.coordinator.config.get(CONF_ENABLE_AUTOMATION, True):
-            charging_on_script = self.coordinator.config.get(CONF_CHARGING_ON_SCRIPT)
-            if charging_on_script:
-                await self.hass.services.async_call(
-                    "script", "turn_on", {"entity_id": charging_on_script}, blocking=True
-                )
+            self.coordinator.submit_charging_script(True)
+            self.coordinator.setpoint.update(self.coordinator.charge_setpoint_kw({}, True))
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """Turn the switch off (disable charging)."""
@@ -134,10 +132,8 @@ class GWSmartChargingSwitch(CoordinatorEntity, SwitchEntity):
         self._is_on = False
         self.async_write_ha_state()
         
-        # If automation enabled, call the charging OFF script
+        # If automation enabled, queue the charging OFF script (shares the
+        # coordinator's actuation key, so it never races a scheduled call)
         if self.coordinator.config.get(CONF_ENABLE_AUTOMATION, True):
-            charging_off_script = self.coordinator.config.get(CONF_CHARGING_OFF_SCRIPT)
-            if charging_off_script:
-                await self.hass.services.async_call(
-                    "script", "turn_on", {"entity_id": charging_off_script}, blocking=True
-                )
+            self.coordinator.submit_charging_script(False)
+            self.coordinator.setpoint.update(self.coordinator.charge_setpoint_kw({}, False))
@@ -51,6 +51,8 @@ TRANSLATIONS = {
         "mode_grid_charge": "Grid Charging",
         "mode_solar_charge": "Solar Charging",
         "mode_battery_discharge": "Battery Discharge",
+        "mode_battery_export": "Battery Export",
+        "mode_solar_export": "Solar Export",
         "mode_self_consume": "Self Consumption",
         "mode_idle": "Idle",
         
@@ -115,6 +117,8 @@ TRANSLATIONS = {
         "mode_grid_charge": "Nabíjení ze sítě",
         "mode_solar_charge": "Nabíjení ze solárů",
         "mode_battery_discharge": "Vybíjení baterie",
+        "mode_battery_export": "Prodej z baterie",
+        "mode_solar_export": "Přetok do sítě",
         "mode_self_consume": "Vlastní spotřeba",
         "mode_idle": "Nečinný",
         
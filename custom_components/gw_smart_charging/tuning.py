@@ -0,0 +1,226 @@
+"""Parameter tuning of the price thresholds, hysteresis and SOC targets.
+
+Candidates are combinations of ``always_charge_price``, ``never_charge_price``,
+``price_hysteresis_pct``, ``target_soc_pct`` and ``critical_hours_soc_pct``
+around the entry's current values.  Each candidate is replayed over the
+recorded days with the entry's strategy (``backtest.simulate_block``);
+candidates run in chunks in the backtest process pool.  When the grid is
+larger than the candidate budget a seeded random sample of it is searched
+(the current settings are always included).
+
+Results are cached by a hash of the candidate and of the history and the
+rest of the configuration, so repeated runs only evaluate new candidates.
+The report is the Pareto front of grid cost versus battery throughput
+(energy discharged), and a recommendation: the cheapest point on the front
+that does not cycle the battery more than the current settings.
+"""
+from __future__ import annotations
+
+import hashlib
+import itertools
+import json
+import logging
+import math
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .backtest import BacktestDay, run_tasks, simulate_block
+from .const import (
+    CONF_ALWAYS_CHARGE_PRICE,
+    CONF_BATTERY_CAPACITY,
+    CONF_CHARGING_STRATEGY,
+    CONF_CRITICAL_HOURS_SOC,
+    CONF_MAX_SOC,
+    CONF_MIN_SOC,
+    CONF_NEVER_CHARGE_PRICE,
+    CONF_PRICE_HYSTERESIS,
+    CONF_TARGET_SOC,
+    DEFAULT_ALWAYS_CHARGE_PRICE,
+    DEFAULT_BATTERY_CAPACITY,
+    DEFAULT_CHARGING_STRATEGY,
+    DEFAULT_CRITICAL_HOURS_SOC,
+    DEFAULT_MAX_SOC,
+    DEFAULT_MIN_SOC,
+    DEFAULT_NEVER_CHARGE_PRICE,
+    DEFAULT_PRICE_HYSTERESIS,
+    DEFAULT_TARGET_SOC,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+TUNED_PARAMETERS = (
+    CONF_ALWAYS_CHARGE_PRICE,
+    CONF_NEVER_CHARGE_PRICE,
+    CONF_PRICE_HYSTERESIS,
+    CONF_TARGET_SOC,
+    CONF_CRITICAL_HOURS_SOC,
+)
+DEFAULT_MAX_CANDIDATES = 200
+# Candidates per pool task
+CHUNK_CANDIDATES = 8
+CACHE_SIZE = 20000
+
+
+def parameter_grid(config: Mapping[str, Any]) -> Dict[str, List[float]]:
+    """Return the values tried per parameter, around the current settings."""
+    always = float(config.get(CONF_ALWAYS_CHARGE_PRICE, DEFAULT_ALWAYS_CHARGE_PRICE))
+    never = float(config.get(CONF_NEVER_CHARGE_PRICE, DEFAULT_NEVER_CHARGE_PRICE))
+    hysteresis = float(config.get(CONF_PRICE_HYSTERESIS, DEFAULT_PRICE_HYSTERESIS))
+    min_soc = float(config.get(CONF_MIN_SOC, DEFAULT_MIN_SOC))
+    max_soc = float(config.get(CONF_MAX_SOC, DEFAULT_MAX_SOC))
+
+    def soc_values(current: float, options: Sequence[float]) -> List[float]:
+        return sorted({current} | {v for v in options if min_soc < v <= max_soc})
+
+    return {
+        CONF_ALWAYS_CHARGE_PRICE: sorted({round(always * f, 2) for f in (0.6, 0.8, 1.0, 1.2)}),
+        CONF_NEVER_CHARGE_PRICE: sorted({round(never * f, 2) for f in (0.8, 1.0, 1.2, 1.4)}),
+        CONF_PRICE_HYSTERESIS: sorted({hysteresis, 0.0, 5.0, 10.0}),
+        CONF_TARGET_SOC: soc_values(float(config.get(CONF_TARGET_SOC, DEFAULT_TARGET_SOC)), (60.0, 80.0, 95.0)),
+        CONF_CRITICAL_HOURS_SOC: soc_values(
+            float(config.get(CONF_CRITICAL_HOURS_SOC, DEFAULT_CRITICAL_HOURS_SOC)), (40.0, 60.0, 80.0)
+        ),
+    }
+
+
+def current_parameters(config: Mapping[str, Any]) -> Dict[str, float]:
+    defaults = {
+        CONF_ALWAYS_CHARGE_PRICE: DEFAULT_ALWAYS_CHARGE_PRICE,
+        CONF_NEVER_CHARGE_PRICE: DEFAULT_NEVER_CHARGE_PRICE,
+        CONF_PRICE_HYSTERESIS: DEFAULT_PRICE_HYSTERESIS,
+        CONF_TARGET_SOC: DEFAULT_TARGET_SOC,
+        CONF_CRITICAL_HOURS_SOC: DEFAULT_CRITICAL_HOURS_SOC,
+    }
+    return {key: float(config.get(key, default)) for key, default in defaults.items()}
+
+
+def candidates(config: Mapping[str, Any], max_candidates: int, seed: int = 0) -> List[Dict[str, float]]:
+    """Return the grid (or a seeded sample of it), current settings first."""
+    grid = parameter_grid(config)
+    combos = [
+        dict(zip(TUNED_PARAMETERS, values))
+        for values in itertools.product(*(grid[key] for key in TUNED_PARAMETERS))
+        if values[1] > values[0]  # never_charge above always_charge
+    ]
+    current = current_parameters(config)
+    combos = [combo for combo in combos if combo != current]
+    if len(combos) > max_candidates - 1:
+        combos = random.Random(seed).sample(combos, max(0, max_candidates - 1))
+    return [current] + combos
+
+
+def history_key(config: Mapping[str, Any], days: Sequence[BacktestDay]) -> str:
+    """Hash of the history and of the settings that are not tuned."""
+    digest = hashlib.sha1()
+    fixed = {key: value for key, value in config.items() if key not in TUNED_PARAMETERS}
+    digest.update(json.dumps(fixed, sort_keys=True, default=str).encode())
+    for day in days:
+        digest.update(day.day.isoformat().encode())
+        for values in (day.prices, day.pv_kw, day.load_kw):
+            digest.update(values.tobytes())
+        digest.update(repr(day.soc_start).encode())
+    return digest.hexdigest()
+
+
+def candidate_key(params: Mapping[str, float], history: str) -> str:
+    return hashlib.sha1(f"{history}:{json.dumps(params, sort_keys=True)}".encode()).hexdigest()
+
+
+class TuningCache:
+    """LRU of candidate results by parameter hash (shared by tuning runs)."""
+
+    def __init__(self, size: int = CACHE_SIZE) -> None:
+        self._size = size
+        self._entries: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, float]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, value: Dict[str, float]) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _evaluate(task: Tuple[Mapping[str, Any], Sequence[Dict[str, float]], Sequence[BacktestDay]]) -> List[Dict[str, float]]:
+    config, chunk, days = task
+    strategy = config.get(CONF_CHARGING_STRATEGY, DEFAULT_CHARGING_STRATEGY)
+    return [simulate_block({**config, **params}, strategy, days) for params in chunk]
+
+
+def pareto_front(rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rows not beaten on both grid cost and throughput, cheapest first."""
+    front: List[Dict[str, Any]] = []
+    best_throughput = math.inf
+    for row in sorted(rows, key=lambda r: (r["grid_cost"], r["throughput_kwh"])):
+        if row["throughput_kwh"] < best_throughput:
+            front.append(row)
+            best_throughput = row["throughput_kwh"]
+    return front
+
+
+def tune(
+    config: Mapping[str, Any],
+    days: Sequence[BacktestDay],
+    cache: Optional[TuningCache] = None,
+    max_candidates: int = DEFAULT_MAX_CANDIDATES,
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Search the parameter grid over ``days``; returns the Pareto front and a recommendation."""
+    started = time.monotonic()
+    config = dict(config)
+    cache = cache if cache is not None else TuningCache()
+    history = history_key(config, days)
+    searched = candidates(config, max_candidates)
+    keys = [candidate_key(params, history) for params in searched]
+    todo = [params for params, key in zip(searched, keys) if cache.get(key) is None]
+
+    chunks = [todo[i:i + CHUNK_CANDIDATES] for i in range(0, len(todo), CHUNK_CANDIDATES)]
+    outputs, parallel = run_tasks(_evaluate, [(config, chunk, days) for chunk in chunks],
+                                  workers, len(todo) * len(days))
+    for chunk, totals_list in zip(chunks, outputs):
+        for params, totals in zip(chunk, totals_list):
+            cache.put(candidate_key(params, history), totals)
+
+    capacity = float(config.get(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY)) or 1.0
+    rows = []
+    for params, key in zip(searched, keys):
+        totals = cache.get(key)
+        rows.append({
+            "parameters": params,
+            "grid_cost": round(totals["grid_cost"], 2),
+            "savings": round(totals["baseline_cost"] - totals["grid_cost"], 2),
+            "throughput_kwh": round(totals["discharged_kwh"], 1),
+            "grid_charged_kwh": round(totals["grid_charged_kwh"], 1),
+            "cycles": round(totals["discharged_kwh"] / capacity, 1),
+        })
+    current = rows[0]
+    front = pareto_front(rows)
+    gentler = [row for row in front if row["throughput_kwh"] <= current["throughput_kwh"]]
+    recommended = min(gentler or front, key=lambda row: row["grid_cost"])
+    _LOGGER.info(
+        "Tuning: %d candidates (%d cached) over %d days, front of %d; best %.2f vs current %.2f",
+        len(searched), len(searched) - len(todo), len(days), len(front),
+        recommended["grid_cost"], current["grid_cost"],
+    )
+    return {
+        "days": len(days),
+        "candidates": len(searched),
+        "grid_size": math.prod(len(values) for values in parameter_grid(config).values()),
+        "evaluated": len(todo),
+        "cached": len(searched) - len(todo),
+        "parallel": parallel,
+        "current": current,
+        "recommended": recommended,
+        "pareto": front,
+        "elapsed_s": round(time.monotonic() - started, 2),
+    }
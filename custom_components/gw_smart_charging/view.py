@@ -2,7 +2,9 @@
 from __future__ import annotations
 
 import logging
-from typing import Any
+from html import escape
+from http import HTTPStatus
+from typing import Any, Optional
 from datetime import datetime
 import json
 
@@ -11,6 +13,7 @@ from homeassistant.components.http import HomeAssistantView
 from homeassistant.core import HomeAssistant
 
 from .const import DOMAIN, CONF_LANGUAGE, DEFAULT_LANGUAGE
+from .fleet import entity_ids_with_defaults, get_coordinators
 from .translations import get_translation, get_all_translations
 
 _LOGGER = logging.getLogger(__name__)
@@ -20,6 +23,7 @@ class GWSmartChargingDashboardView(HomeAssistantView):
     """Provide a dashboard for GW Smart Charging integration."""
 
     url = f"/api/{DOMAIN}/dashboard"
+    extra_urls = [f"/api/{DOMAIN}/dashboard/{{entry_id}}"]
     name = f"api:{DOMAIN}:dashboard"
     requires_auth = False
 
@@ -27,14 +31,18 @@ class GWSmartChargingDashboardView(HomeAssistantView):
         """Initialize the dashboard view."""
         self.hass = hass
 
-    async def get(self, request):
-        """Return the dashboard HTML."""
+    async def get(self, request, entry_id: Optional[str] = None):
+        """Return the dashboard HTML of one entry (the first one by default)."""
         
         # Get all integration data
-        integration_data = self.hass.data.get(DOMAIN, {})
+        integration_data = get_coordinators(self.hass)
+        entry_id = entry_id or request.query.get("entry_id")
+        if entry_id and entry_id not in integration_data:
+            return web.Response(text=f"Unknown entry {entry_id}", status=HTTPStatus.NOT_FOUND)
+        entry_id = entry_id or next(iter(integration_data), None)
         
         # Build HTML dashboard
-        html = self._build_dashboard_html(integration_data)
+        html = self._build_dashboard_html(integration_data, entry_id)
         
         return web.Response(
             text=html,
@@ -42,17 +50,18 @@ class GWSmartChargingDashboardView(HomeAssistantView):
             charset="utf-8",
         )
     
-    def _build_dashboard_html(self, integration_data: dict) -> str:
-        """Build the dashboard HTML."""
+    def _build_dashboard_html(self, integration_data: dict, selected_entry_id: Optional[str] = None) -> str:
+        """Build the dashboard HTML for the selected entry."""
         
         import json
         
-        # Get language preference from first coordinator config
+        # Get language preference from the selected coordinator config
         language = DEFAULT_LANGUAGE
-        for entry_id, coordinator in integration_data.items():
-            if hasattr(coordinator, 'config'):
-                language = coordinator.config.get(CONF_LANGUAGE, DEFAULT_LANGUAGE)
-                break
+        selected = integration_data.get(selected_entry_id)
+        if hasattr(selected, 'config'):
+            language = selected.config.get(CONF_LANGUAGE, DEFAULT_LANGUAGE)
+        # Entity ids of the selected entry (second entries get suffixed ids)
+        ids = entity_ids_with_defaults(self.hass, selected_entry_id)
         
         # Get all translations for selected language
         t = get_all_translations(language)
@@ -67,9 +76,11 @@ class GWSmartChargingDashboardView(HomeAssistantView):
                 data = coordinator.data or {}
                 
                 # Count entities
+                title = escape(coordinator.entry.title) if hasattr(coordinator, 'entry') else f"{entry_id[:8]}..."
+                marker = " ◀" if entry_id == selected_entry_id else ""
                 entities_html += f"""
                 <div class="integration-instance">
-                    <h3>Integration Instance: {entry_id[:8]}...</h3>
+                    <h3><a href="/api/{DOMAIN}/dashboard/{entry_id}">Integration Instance: {title}</a>{marker}</h3>
                     <div class="status-badge">Status: {data.get('status', 'unknown')}</div>
                     <div class="last-update">Last Update: {data.get('last_update', 'never')}</div>
                 </div>
@@ -88,27 +99,27 @@ class GWSmartChargingDashboardView(HomeAssistantView):
         
         # Get schedule data from sensor state
         schedule_data = []
-        schedule_entity = self.hass.states.get('sensor.gw_smart_charging_schedule')
+        schedule_entity = self.hass.states.get(ids['schedule'])
         if schedule_entity and schedule_entity.attributes:
             schedule_data = schedule_entity.attributes.get('schedule', [])
         
         # Get SOC forecast data for charts
         soc_forecast_data = []
-        soc_entity = self.hass.states.get('sensor.gw_smart_charging_soc_forecast')
+        soc_entity = self.hass.states.get(ids['soc_forecast'])
         if soc_entity and soc_entity.attributes:
             soc_forecast_data = soc_entity.attributes.get('soc_forecast', [])
         
         # Get forecast and price data for charts
         forecast_data = []
         price_data = []
-        forecast_entity = self.hass.states.get('sensor.gw_smart_charging_forecast')
+        forecast_entity = self.hass.states.get(ids['forecast'])
         if forecast_entity and forecast_entity.attributes:
             forecast_data = forecast_entity.attributes.get('forecast_15min', [])
             price_data = forecast_entity.attributes.get('price_15min', [])
         
         # Get switch state
         switch_state = "unknown"
-        switch_entity = self.hass.states.get('switch.gw_smart_charging_auto_charging')
+        switch_entity = self.hass.states.get(ids['auto_charging'])
         if switch_entity:
             switch_state = switch_entity.state
         
@@ -119,7 +130,7 @@ class GWSmartChargingDashboardView(HomeAssistantView):
         test_mode = "N/A"
         next_charge_time = "N/A"
         
-        diagnostics_entity = self.hass.states.get('sensor.gw_smart_charging_diagnostics')
+        diagnostics_entity = self.hass.states.get(ids['diagnostics'])
         if diagnostics_entity and diagnostics_entity.attributes:
             diagnostics_data = diagnostics_entity.attributes
             current_strategy = diagnostics_data.get('charging_strategy', 'Unknown')
@@ -127,7 +138,7 @@ class GWSmartChargingDashboardView(HomeAssistantView):
             test_mode = diagnostics_data.get('test_mode', False)
             
         # Get next charge information
-        next_charge_entity = self.hass.states.get('sensor.gw_smart_charging_next_charge')
+        next_charge_entity = self.hass.states.get(ids['next_charge'])
         if next_charge_entity:
             next_charge_time = next_charge_entity.state
         
@@ -626,7 +637,7 @@ class GWSmartChargingDashboardView(HomeAssistantView):
                     <div style="margin-top: 20px; padding: 15px; background: #f0f7ff; border-left: 4px solid #2196F3; border-radius: 4px;">
                         <p style="margin: 0; color: #1976D2;">
                             <strong>💡 Recommendation:</strong> Start with "Dynamic" strategy. It works well for most scenarios. 
-                            Use test mode to compare different strategies before committing to one.
+                            Call the <code>gw_smart_charging.what_if</code> service to compare all strategies on the current prices and forecast before committing to one.
                         </p>
                     </div>
                 </div>
@@ -726,9 +737,9 @@ class GWSmartChargingDashboardView(HomeAssistantView):
                                 <div style="padding: 10px; margin-top: 5px; background: white; border-radius: 4px;">
                                     <p><strong>Goal:</strong> Compare different charging strategies</p>
                                     <ol style="margin: 5px 0; padding-left: 20px;">
-                                        <li>Enable test mode</li>
-                                        <li>Try "4 Lowest Hours" strategy, note the scheduled times</li>
-                                        <li>Switch to "Dynamic" strategy, compare the schedule</li>
+                                        <li>Call the <code>gw_smart_charging.what_if</code> service (Developer Tools → Actions)</li>
+                                        <li>Compare cost and charge slots of every strategy in the response</li>
+                                        <li>Add <code>scenarios</code> to try other thresholds or SOC targets</li>
                                         <li>Check which provides better SOC forecast</li>
                                         <li>Choose the strategy that fits your needs</li>
                                     </ol>
@@ -821,7 +832,7 @@ class GWSmartChargingDashboardView(HomeAssistantView):
                         </div>
                         <div class="entity-item">
                             <div class="entity-name">Solar Forecast</div>
-                            <div class="entity-id">sensor.gw_smart_charging_forecast</div>
+                            <div class="entity-id">{ids['forecast']}</div>
                         </div>
                         <div class="entity-item">
                             <div class="entity-name">Electricity Price</div>
@@ -829,15 +840,15 @@ class GWSmartChargingDashboardView(HomeAssistantView):
                         </div>
                         <div class="entity-item">
                             <div class="entity-name">Charging Schedule</div>
-                            <div class="entity-id">sensor.gw_smart_charging_schedule</div>
+                            <div class="entity-id">{ids['schedule']}</div>
                         </div>
                         <div class="entity-item">
                             <div class="entity-name">SOC Forecast</div>
-                            <div class="entity-id">sensor.gw_smart_charging_soc_forecast</div>
+                            <div class="entity-id">{ids['soc_forecast']}</div>
                         </div>
                         <div class="entity-item">
                             <div class="entity-name">Battery Power (Real-time)</div>
-                            <div class="entity-id">sensor.gw_smart_charging_battery_power</div>
+                            <div class="entity-id">{ids['battery_power']}</div>
                         </div>
                         <div class="entity-item">
                             <div class="entity-name">Today's Battery Charge</div>
@@ -849,7 +860,7 @@ class GWSmartChargingDashboardView(HomeAssistantView):
                         </div>
                         <div class="entity-item">
                             <div class="entity-name">Diagnostics</div>
-                            <div class="entity-id">sensor.gw_smart_charging_diagnostics</div>
+                            <div class="entity-id">{ids['diagnostics']}</div>
                         </div>
                         <div class="entity-item">
                             <div class="entity-name">Series Sensors (for charting)</div>
@@ -1105,7 +1116,7 @@ class GWSmartChargingDashboardView(HomeAssistantView):
                 // Toggle integration on/off
                 async function toggleIntegration(activate) {{
                     const statusDiv = document.getElementById('control-status');
-                    const entityId = 'switch.gw_smart_charging_auto_charging';
+                    const entityId = '{ids['auto_charging']}';
                     
                     try {{
                         const token = getAuthToken();
@@ -1258,3 +1269,51 @@ class GWSmartChargingDashboardView(HomeAssistantView):
         """
         
         return html
+
+
+class GWSmartChargingDataView(HomeAssistantView):
+    """JSON plan data per config entry, for cards and external tools."""
+
+    url = f"/api/{DOMAIN}/data"
+    extra_urls = [f"/api/{DOMAIN}/data/{{entry_id}}"]
+    name = f"api:{DOMAIN}:data"
+    requires_auth = True
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the data view."""
+        self.hass = hass
+
+    async def get(self, request, entry_id: Optional[str] = None):
+        """Return the entry list, or the plan of one entry."""
+        coordinators = get_coordinators(self.hass)
+        if entry_id is None:
+            return self.json({
+                "entries": [
+                    {
+                        "entry_id": eid,
+                        "title": coordinator.entry.title,
+                        "status": (coordinator.data or {}).get("status", "unknown"),
+                        "last_update": (coordinator.data or {}).get("last_update"),
+                        "dashboard_url": f"/api/{DOMAIN}/dashboard/{eid}",
+                        "data_url": f"/api/{DOMAIN}/data/{eid}",
+                    }
+                    for eid, coordinator in coordinators.items()
+                ]
+            })
+        coordinator = coordinators.get(entry_id)
+        if coordinator is None:
+            return self.json_message(f"Unknown entry {entry_id}", HTTPStatus.NOT_FOUND)
+        data = coordinator.data or {}
+        return self.json({
+            "entry_id": entry_id,
+            "title": coordinator.entry.title,
+            "entities": entity_ids_with_defaults(self.hass, entry_id),
+            **{
+                key: data.get(key)
+                for key in (
+                    "status", "last_update", "schedule", "timestamps", "forecast_15min",
+                    "price_15min", "load_15min", "battery_metrics", "grid_metrics",
+                    "deferrable_plan", "site_import",
+                )
+            },
+        })
@@ -0,0 +1,206 @@
+"""What-if planning: the current inputs under other strategies or settings.
+
+The coordinator keeps the inputs of its last planning run (``PlanInputs``).
+A what-if request re-plans those inputs once per scenario, each with a fresh
+planner, and summarizes the plans side by side::
+
+    run_scenarios(config, inputs, [
+        {"name": "dynamic", "overrides": {"charging_strategy": "dynamic"}},
+        {"name": "cheap", "overrides": {"always_charge_price": 1.0}},
+    ])
+
+Nothing here touches coordinator or actuation state; the live plan is only
+replaced by the coordinator's own refresh.  Scenarios are planned alone,
+without the allocation of a shared grid connection.
+"""
+from __future__ import annotations
+
+import calendar
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .backtest import ALL_STRATEGIES
+from .const import (
+    CONF_ALWAYS_CHARGE_PRICE,
+    CONF_BATTERY_CAPACITY,
+    CONF_BATTERY_WEAR_COST,
+    CONF_CAPACITY_TARIFF,
+    CONF_CHARGE_EFFICIENCY,
+    CONF_CHARGING_STRATEGY,
+    CONF_CRITICAL_HOURS_END,
+    CONF_CRITICAL_HOURS_SOC,
+    CONF_CRITICAL_HOURS_START,
+    CONF_EXPORT_LIMIT,
+    CONF_EXPORT_PRICE,
+    CONF_MAX_CHARGE_POWER,
+    CONF_MAX_SOC,
+    CONF_MIN_SOC,
+    CONF_NEVER_CHARGE_PRICE,
+    CONF_PRICE_HYSTERESIS,
+    CONF_SITE_POWER_LIMIT,
+    CONF_TARGET_SOC,
+    DEFAULT_CHARGING_STRATEGY,
+)
+from .deferrable import DeferrableLoad
+from .degradation import WearModel, schedule_wear
+from .engine import ChargingPlanner, quiet_planning
+
+_LOGGER = logging.getLogger(__name__)
+
+SLOT_HOURS = 0.25
+# Options a scenario may override (the ones the planner reads)
+SCENARIO_OPTIONS = (
+    CONF_CHARGING_STRATEGY,
+    CONF_ALWAYS_CHARGE_PRICE,
+    CONF_NEVER_CHARGE_PRICE,
+    CONF_PRICE_HYSTERESIS,
+    CONF_MIN_SOC,
+    CONF_MAX_SOC,
+    CONF_TARGET_SOC,
+    CONF_CRITICAL_HOURS_START,
+    CONF_CRITICAL_HOURS_END,
+    CONF_CRITICAL_HOURS_SOC,
+    CONF_BATTERY_CAPACITY,
+    CONF_MAX_CHARGE_POWER,
+    CONF_CHARGE_EFFICIENCY,
+    CONF_SITE_POWER_LIMIT,
+    CONF_CAPACITY_TARIFF,
+    CONF_BATTERY_WEAR_COST,
+    CONF_EXPORT_PRICE,
+    CONF_EXPORT_LIMIT,
+)
+MAX_SCENARIOS = 50
+
+
+@dataclass(frozen=True)
+class PlanInputs:
+    """Everything one planning run reads besides the configuration."""
+
+    forecast: Tuple[float, ...]
+    prices: Tuple[float, ...]
+    loads: Tuple[float, ...]
+    current_slot: int
+    initial_soc_frac: float
+    last_charging_state: bool
+    nanogreen_active: bool = False
+    monthly_peak_kw: float = 0.0
+    deferrable: Tuple[DeferrableLoad, ...] = ()
+    delivered_kwh: Mapping[str, float] = field(default_factory=dict)
+    planned_at: str = ""
+    # Feed-in price per slot from the export price sensor (empty = the fixed price)
+    export_prices: Tuple[float, ...] = ()
+
+    def planner(self, config: Mapping[str, Any]) -> ChargingPlanner:
+        planner = ChargingPlanner(
+            config,
+            current_slot=self.current_slot,
+            initial_soc_frac=self.initial_soc_frac,
+            last_charging_state=self.last_charging_state,
+            nanogreen_active=self.nanogreen_active,
+            monthly_peak_kw=self.monthly_peak_kw,
+        )
+        planner.export_prices = list(self.export_prices) or None
+        if self.planned_at:
+            day = date.fromisoformat(self.planned_at[:10])
+            planner.billing_days_left = calendar.monthrange(day.year, day.month)[1] - day.day + 1
+        return planner
+
+    def args(self) -> tuple:
+        """``compute_plan`` arguments (fresh lists, the planner may modify them)."""
+        return (list(self.forecast), list(self.prices), list(self.loads),
+                list(self.deferrable), dict(self.delivered_kwh))
+
+
+def strategy_scenarios(strategies: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """One scenario per strategy (all strategies by default)."""
+    return [
+        {"name": strategy, "overrides": {CONF_CHARGING_STRATEGY: strategy}}
+        for strategy in (strategies or ALL_STRATEGIES)
+    ]
+
+
+def summarize_plan(planner: ChargingPlanner, schedule: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Costs, export revenue, energy and charge/discharge slots of a plan from the current slot on."""
+    remaining = schedule[planner.current_slot:]
+    cost = import_kwh = charged_kwh = discharged_kwh = 0.0
+    charge_slots: List[str] = []
+    discharge_slots: List[str] = []
+    for slot in remaining:
+        grid_kw = float(slot.get("grid_import_kW", 0.0))
+        charge_kw = float(slot.get("planned_charge_kW", 0.0))
+        cost += grid_kw * float(slot.get("price_czk_kwh", 0.0)) * SLOT_HOURS
+        import_kwh += grid_kw * SLOT_HOURS
+        if str(slot.get("mode", "")).startswith("grid_charge"):
+            charged_kwh += charge_kw * SLOT_HOURS
+            charge_slots.append(slot.get("time", str(slot.get("slot"))))
+        elif charge_kw < 0:
+            discharged_kwh -= charge_kw * SLOT_HOURS
+            discharge_slots.append(slot.get("time", str(slot.get("slot"))))
+    site = planner.import_summary(schedule)
+    wear = schedule_wear(WearModel.from_config(planner.config), schedule, planner.current_slot)
+    return {
+        "grid_cost": round(cost, 2),
+        "capacity_cost": site["capacity_cost"],
+        "wear_cost": wear["wear_cost"],
+        "export_revenue": site["export_revenue"],
+        "total_cost": round(cost + site["capacity_cost"] + wear["wear_cost"] - site["export_revenue"], 2),
+        "grid_import_kwh": round(import_kwh, 2),
+        "grid_export_kwh": site["planned_export_kwh"],
+        "grid_charged_kwh": round(charged_kwh, 2),
+        "discharged_kwh": round(discharged_kwh, 2),
+        "planned_peak_kw": site["planned_peak_kw"],
+        "soc_end_pct": schedule[-1].get("soc_pct_end") if schedule else None,
+        "charge_slots": charge_slots,
+        "discharge_slots": discharge_slots,
+    }
+
+
+def run_scenarios(
+    config: Mapping[str, Any],
+    inputs: PlanInputs,
+    scenarios: Sequence[Mapping[str, Any]],
+) -> Dict[str, Any]:
+    """Plan ``inputs`` once per scenario; rows ranked by total cost.
+
+    ``current`` is the running configuration planned the same way, so the
+    rows compare like with like (``vs_current`` is the difference).
+    """
+    started = time.monotonic()
+
+    def plan(overrides: Mapping[str, Any]) -> Dict[str, Any]:
+        planner = inputs.planner({**config, **overrides})
+        schedule, _deferrable = planner.compute_plan(*inputs.args())
+        return summarize_plan(planner, schedule)
+
+    # Planner runs log their summary (and per-strategy warnings); keep what-if
+    # runs quiet in this executor thread only
+    with quiet_planning():
+        current = {
+            "name": "current",
+            "strategy": config.get(CONF_CHARGING_STRATEGY, DEFAULT_CHARGING_STRATEGY),
+            **plan({}),
+        }
+        rows = []
+        for index, scenario in enumerate(scenarios[:MAX_SCENARIOS]):
+            overrides = dict(scenario.get("overrides") or {})
+            rows.append({
+                "name": scenario.get("name") or f"scenario_{index + 1}",
+                "overrides": overrides,
+                "strategy": overrides.get(CONF_CHARGING_STRATEGY,
+                                          config.get(CONF_CHARGING_STRATEGY, DEFAULT_CHARGING_STRATEGY)),
+                **plan(overrides),
+            })
+    rows.sort(key=lambda row: row["total_cost"])
+    for row in rows:
+        row["vs_current"] = round(row["total_cost"] - current["total_cost"], 2)
+    return {
+        "planned_at": inputs.planned_at,
+        "current_slot": inputs.current_slot,
+        "initial_soc_pct": round(inputs.initial_soc_frac * 100.0, 1),
+        "current": current,
+        "scenarios": rows,
+        "elapsed_ms": round((time.monotonic() - started) * 1000.0, 1),
+    }
@@ -0,0 +1,338 @@
+"""Out-of-process planning worker.
+
+With the ``planner_worker`` option set, the coordinator sends the planner
+inputs (config, SOC, forecast, prices, loads, deferrable loads) to a worker
+process and gets the schedule back, so expensive planning never runs in
+Home Assistant's event loop or executor:
+
+- ``local`` starts a worker next to Home Assistant, listening on 127.0.0.1;
+- ``host:port`` uses a worker started elsewhere::
+
+      python custom_components/gw_smart_charging/worker.py --listen 0.0.0.0:8765
+
+The protocol is one JSON object per line over TCP.  Connections are pooled
+and every request is time-limited; on timeout or error the worker is left
+alone for a while (a local one is restarted) and the coordinator plans
+in-process instead.
+
+This module only imports the standard library at the top, so it runs as a
+script without Home Assistant; the planning modules are loaded on demand.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import dataclasses
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+import types
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+LOCAL = "local"
+# Per request on top of the planner's search budget (optimizer, stochastic
+# selection); leaves room for the in-process fallback within the plan budget
+WORKER_TIMEOUT = 8.0  # seconds
+SPAWN_TIMEOUT = 10.0  # seconds
+# After a failure the worker is not asked again for this long
+BACKOFF = 60.0  # seconds
+POOL_SIZE = 4
+STREAM_LIMIT = 8 * 1024 * 1024  # bytes per JSON line
+PARENT_CHECK_INTERVAL = 5.0  # seconds
+
+# Planner inputs sent with a job and run state read back after it
+PLANNER_FIELDS = ("current_slot", "initial_soc_frac", "last_charging_state", "nanogreen_active", "monthly_peak_kw")
+# Planner attributes set after construction
+PLANNER_SETTINGS = ("uncertainty", "optimizer_budget_s", "warm_start", "export_prices", "billing_days_left")
+RESULT_FIELDS = ("last_charging_state", "planned_peak_kw", "import_limited_slots", "never_charge_threshold",
+                 "stochastic", "optimization", "battery_export")
+
+
+class WorkerUnavailable(Exception):
+    """The worker did not return a plan; plan in-process instead."""
+
+
+# ---------- job encoding ----------
+
+def planner_job(planner: Any, args: tuple) -> Dict[str, Any]:
+    """Encode ``planner.compute_plan(*args)`` as a worker request."""
+    forecast, prices, loads, *rest = args
+    deferrable = [dataclasses.asdict(load) for load in (rest[0] if rest else ())]
+    delivered = rest[1] if len(rest) > 1 else None
+    return {
+        "op": "plan",
+        "config": dict(planner.config),
+        "planner": {field: getattr(planner, field) for field in PLANNER_FIELDS},
+        "settings": {field: getattr(planner, field) for field in PLANNER_SETTINGS},
+        "args": [list(forecast), list(prices), list(loads), deferrable, delivered],
+    }
+
+
+def apply_result(planner: Any, response: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Copy the worker's run state onto ``planner`` and return ``(schedule, plan)``."""
+    for field, value in response.get("state", {}).items():
+        if field in RESULT_FIELDS:
+            setattr(planner, field, value)
+    return response["schedule"], response["plan"]
+
+
+def _planning_modules():
+    """Return ``(engine, deferrable)``, also when this file runs as a script."""
+    if __package__:
+        from . import deferrable, engine
+        return engine, deferrable
+    package_dir = Path(__file__).resolve().parent
+    package = f"{package_dir.parent.name}.{package_dir.name}"
+    for name, path in ((package_dir.parent.name, package_dir.parent), (package, package_dir)):
+        if name not in sys.modules:
+            # Skip the integration's __init__ (it needs Home Assistant)
+            module = types.ModuleType(name)
+            module.__path__ = [str(path)]
+            sys.modules[name] = module
+    return importlib.import_module(f"{package}.engine"), importlib.import_module(f"{package}.deferrable")
+
+
+def run_job(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one worker request (in the worker process)."""
+    if request.get("op") == "ping":
+        return {"ok": True, "pid": os.getpid()}
+    if request.get("op") != "plan":
+        return {"ok": False, "error": f"unknown op {request.get('op')!r}"}
+    engine, deferrable = _planning_modules()
+    forecast, prices, loads, loads_spec, delivered = request["args"]
+    planner = engine.ChargingPlanner(request["config"], **request["planner"])
+    for field, value in request.get("settings", {}).items():
+        if field in PLANNER_SETTINGS:
+            setattr(planner, field, value)
+    schedule, plan = planner.compute_plan(
+        forecast, prices, loads, [deferrable.DeferrableLoad(**spec) for spec in loads_spec], delivered
+    )
+    return {
+        "ok": True,
+        "schedule": schedule,
+        "plan": plan,
+        "state": {field: getattr(planner, field) for field in RESULT_FIELDS},
+    }
+
+
+# ---------- worker process ----------
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    loop = asyncio.get_running_loop()
+    try:
+        while line := await reader.readline():
+            try:
+                response = await loop.run_in_executor(None, run_job, json.loads(line))
+            except Exception as err:  # reported to the client, the worker keeps serving
+                _LOGGER.exception("Planning job failed")
+                response = {"ok": False, "error": f"{type(err).__name__}: {err}"}
+            writer.write(json.dumps(response, default=str).encode() + b"\n")
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str, port: int, parent_pid: Optional[int] = None) -> None:
+    """Serve planning requests until the parent process (if given) exits."""
+    server = await asyncio.start_server(_handle, host, port, limit=STREAM_LIMIT)
+    bound_host, bound_port = server.sockets[0].getsockname()[:2]
+    # The spawning client reads the address from the first line
+    print(f"LISTENING {bound_host} {bound_port}", flush=True)
+    async with server:
+        if parent_pid is None:
+            await server.serve_forever()
+        while os.getppid() == parent_pid:
+            await asyncio.sleep(PARENT_CHECK_INTERVAL)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="GW Smart Charging planning worker")
+    parser.add_argument("--listen", default="127.0.0.1:8765", help="host:port (port 0 = any free port)")
+    parser.add_argument("--parent-pid", type=int, default=None, help="exit when this process is gone")
+    parser.add_argument("--verbose", action="store_true", help="log planner details")
+    options = parser.parse_args(argv)
+    host, _, port = options.listen.rpartition(":")
+    logging.basicConfig(level=logging.INFO if options.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(serve(host or "127.0.0.1", int(port), options.parent_pid))
+
+
+# ---------- client ----------
+
+class PlannerWorkerClient:
+    """Pooled, time-limited connection to a planning worker."""
+
+    def __init__(self, address: str) -> None:
+        self.address = address
+        self._host: Optional[str] = None
+        self._port: Optional[int] = None
+        if address != LOCAL:
+            host, _, port = address.rpartition(":")
+            self._host, self._port = host or "127.0.0.1", int(port)
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._spawn_lock: Optional[asyncio.Lock] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._down_until = 0.0
+        self._stats: Dict[str, Any] = {
+            "requests": 0, "completed": 0, "timeouts": 0, "errors": 0, "fallbacks": 0,
+            "restarts": 0, "last_ms": None, "mean_ms": None, "last_error": None,
+        }
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    async def async_plan(self, planner: Any, *args: Any) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Run ``planner.compute_plan(*args)`` in the worker; raises WorkerUnavailable."""
+        if not self.available:
+            raise WorkerUnavailable("backing off after a failure")
+        stats = self._stats
+        stats["requests"] += 1
+        started = time.monotonic()
+        try:
+            response = await asyncio.wait_for(
+                self._request(planner_job(planner, args)), WORKER_TIMEOUT + planner.search_budget_s
+            )
+        except asyncio.TimeoutError as err:
+            stats["timeouts"] += 1
+            await self._failed("timeout")
+            raise WorkerUnavailable("timeout") from err
+        except (OSError, ValueError, KeyError, WorkerUnavailable) as err:
+            stats["errors"] += 1
+            await self._failed(str(err) or type(err).__name__)
+            raise WorkerUnavailable(str(err)) from err
+        elapsed_ms = (time.monotonic() - started) * 1000.0
+        stats["completed"] += 1
+        stats["last_ms"] = round(elapsed_ms, 1)
+        mean = stats["mean_ms"]
+        stats["mean_ms"] = round(elapsed_ms if mean is None else mean + (elapsed_ms - mean) / stats["completed"], 1)
+        return apply_result(planner, response)
+
+    def record_fallback(self) -> None:
+        self._stats["fallbacks"] += 1
+
+    async def _request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(POOL_SIZE)
+        async with self._slots:
+            reader, writer = self._idle.pop() if self._idle else await self._connect()
+            try:
+                writer.write(json.dumps(payload, default=str).encode() + b"\n")
+                await writer.drain()
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError("worker closed the connection")
+                response = json.loads(line)
+            except BaseException:
+                # A connection with a request in flight cannot be reused
+                writer.close()
+                raise
+            self._idle.append((reader, writer))
+        if not response.get("ok"):
+            raise WorkerUnavailable(response.get("error") or "worker error")
+        return response
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        if self.address == LOCAL:
+            await self._ensure_process()
+        return await asyncio.open_connection(self._host, self._port, limit=STREAM_LIMIT)
+
+    async def _ensure_process(self) -> None:
+        """Start the local worker unless it is running."""
+        if self._spawn_lock is None:
+            self._spawn_lock = asyncio.Lock()
+        async with self._spawn_lock:
+            if self._process is not None and self._process.returncode is None:
+                return
+            self._process = await asyncio.create_subprocess_exec(
+                sys.executable, str(Path(__file__).resolve()),
+                "--listen", "127.0.0.1:0", "--parent-pid", str(os.getpid()),
+                stdout=asyncio.subprocess.PIPE,
+            )
+            line = await asyncio.wait_for(self._process.stdout.readline(), SPAWN_TIMEOUT)
+            try:
+                _, host, port = line.decode().split()
+                self._host, self._port = host, int(port)
+            except ValueError as err:
+                await self._stop_process()
+                raise OSError(f"worker did not start: {line!r}") from err
+            _LOGGER.info("Started planner worker (pid %s) on %s:%s", self._process.pid, self._host, self._port)
+
+    async def _failed(self, reason: str) -> None:
+        """Back off; a local worker is restarted so a runaway job does not linger."""
+        self._stats["last_error"] = reason
+        self._down_until = time.monotonic() + BACKOFF
+        _LOGGER.warning("Planner worker %s failed (%s), planning in-process for %.0f s", self.address, reason, BACKOFF)
+        self._close_idle()
+        if self.address == LOCAL and self._process is not None:
+            self._stats["restarts"] += 1
+            await self._stop_process()
+
+    def _close_idle(self) -> None:
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+    async def _stop_process(self) -> None:
+        process, self._process = self._process, None
+        if process is None or process.returncode is not None:
+            return
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), 5.0)
+        except asyncio.TimeoutError:
+            process.kill()
+
+    async def async_close(self) -> None:
+        self._close_idle()
+        await self._stop_process()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "address": self.address,
+            "available": self.available,
+            "pid": self._process.pid if self._process is not None and self._process.returncode is None else None,
+        }
+
+
+class WorkerRegistry:
+    """Worker clients shared by the config entries using the same address."""
+
+    def __init__(self) -> None:
+        self._clients: Dict[str, PlannerWorkerClient] = {}
+        self._owners: Dict[str, Set[str]] = {}
+
+    def acquire(self, address: str, owner: str) -> PlannerWorkerClient:
+        if address not in self._clients:
+            self._clients[address] = PlannerWorkerClient(address)
+        self._owners.setdefault(address, set()).add(owner)
+        return self._clients[address]
+
+    def release(self, address: str, owner: str) -> Optional[PlannerWorkerClient]:
+        """Drop ``owner``; returns the client to close when nobody uses it any more."""
+        owners = self._owners.get(address)
+        if owners is None:
+            return None
+        owners.discard(owner)
+        if owners:
+            return None
+        del self._owners[address]
+        return self._clients.pop(address, None)
+
+    @property
+    def owners(self) -> Set[str]:
+        return set().union(*self._owners.values()) if self._owners else set()
+
+
+if __name__ == "__main__":
+    main()
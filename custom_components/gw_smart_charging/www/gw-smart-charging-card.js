@@ -40,13 +40,16 @@ class GWSmartChargingCard extends HTMLElement {
       return;
     }
 
-    // Get all related entities
-    const forecastEntity = this._hass.states['sensor.gw_smart_charging_forecast'];
-    const scheduleEntity = this._hass.states['sensor.gw_smart_charging_schedule'];
-    const socEntity = this._hass.states['sensor.gw_smart_charging_soc_forecast'];
-    const batteryPowerEntity = this._hass.states['sensor.gw_smart_charging_battery_power'];
-    const dailyStatsEntity = this._hass.states['sensor.gw_smart_charging_daily_statistics'];
-    const switchEntity = this._hass.states['switch.gw_smart_charging_auto_charging'];
+    // Get all related entities of the same config entry (the diagnostics
+    // sensor publishes their ids, so several instances each get their own card)
+    const siblings = entity.attributes.entities || {};
+    const related = (role, fallback) => this._hass.states[siblings[role] || fallback];
+    const forecastEntity = related('forecast', 'sensor.gw_smart_charging_forecast');
+    const scheduleEntity = related('schedule', 'sensor.gw_smart_charging_schedule');
+    const socEntity = related('soc_forecast', 'sensor.gw_smart_charging_soc_forecast');
+    const batteryPowerEntity = related('battery_power', 'sensor.gw_smart_charging_battery_power');
+    const dailyStatsEntity = related('daily_statistics', 'sensor.gw_smart_charging_daily_statistics');
+    const switchEntity = related('auto_charging', 'switch.gw_smart_charging_auto_charging');
 
     const batteryMetrics = entity.attributes.battery_power_w !== undefined ? entity.attributes : {};
     const currentSoc = batteryPowerEntity?.attributes?.current_soc_pct || entity.attributes.battery_soc_pct || 0;
@@ -188,6 +191,14 @@ class GWSmartChargingCard extends HTMLElement {
           background: #ff5722;
           color: white;
         }
+        .mode-battery_export {
+          background: #9c27b0;
+          color: white;
+        }
+        .mode-solar_export {
+          background: #ffeb3b;
+          color: black;
+        }
         .mode-self_consume {
           background: #4caf50;
           color: white;
@@ -377,6 +388,14 @@ class GWSmartChargingCard extends HTMLElement {
           actionClass = 'action-discharge';
           actionIcon = '🔋';
           actionText = 'Battery Discharge';
+        } else if (mode === 'battery_export') {
+          actionClass = 'action-discharge';
+          actionIcon = '📤';
+          actionText = 'Battery Export';
+        } else if (mode === 'solar_export') {
+          actionClass = 'action-solar';
+          actionIcon = '📤';
+          actionText = 'Solar Export';
         }
         
         if (actionText) {
@@ -0,0 +1,43 @@
+"""Load the integration's pure modules without Home Assistant.
+
+The package ``__init__`` sets up the Home Assistant integration; the
+planning and parsing modules under test do not need it, so the package is
+registered as a plain namespace (as in ``benchmarks/``).
+"""
+from __future__ import annotations
+
+import sys
+import types
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pytest
+
+PACKAGE = "custom_components.gw_smart_charging"
+PACKAGE_DIR = Path(__file__).resolve().parents[1] / "custom_components" / "gw_smart_charging"
+
+for _name, _path in (("custom_components", PACKAGE_DIR.parent), (PACKAGE, PACKAGE_DIR)):
+    if _name not in sys.modules:
+        _module = types.ModuleType(_name)
+        _module.__path__ = [str(_path)]
+        sys.modules[_name] = _module
+
+
+@dataclass
+class FakeState:
+    """The parts of a Home Assistant ``State`` the parsers read."""
+
+    entity_id: str
+    state: str
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    last_updated: Optional[datetime] = None
+
+
+@pytest.fixture
+def make_state():
+    def factory(entity_id: str, state: Any, **attributes: Any) -> FakeState:
+        return FakeState(entity_id, str(state), attributes, datetime.now())
+
+    return factory
@@ -0,0 +1,69 @@
+"""Splitting a shared grid connection between the batteries behind it."""
+from __future__ import annotations
+
+import pytest
+
+from custom_components.gw_smart_charging.allocation import (
+    SLOT_HOURS,
+    ChargeRequest,
+    allocate_connection,
+    charge_blocks,
+    connection_of,
+)
+from custom_components.gw_smart_charging.const import CONF_CONNECTION_GROUP, CONF_CONNECTION_LIMIT
+
+
+def request(key, need_kwh, max_kw=5.0, soc_frac=0.5, start=0, deadline=8, prices=None, slots=8):
+    return ChargeRequest(
+        key, need_kwh, max_kw, soc_frac, start, deadline,
+        eligible=[True] * slots, prices=prices or [1.0] * slots,
+    )
+
+
+def test_connection_of():
+    assert connection_of({}) is None
+    assert connection_of({CONF_CONNECTION_GROUP: " street ", CONF_CONNECTION_LIMIT: "17"}) == ("street", 17.0)
+    assert connection_of({CONF_CONNECTION_GROUP: "street", CONF_CONNECTION_LIMIT: "x"}) == ("street", 0.0)
+
+
+def test_charge_blocks_end_at_the_next_discharge():
+    modes = ["grid_charge", "grid_charge", "self_use", "battery_discharge", "battery_discharge",
+             "grid_charge_pv", "self_use", "self_use"]
+    schedule = [{"mode": mode, "planned_charge_kW": 4.0 if mode.startswith("grid") else 0.0} for mode in modes]
+    assert charge_blocks(schedule, 0) == [(0, 3, 2.0), (3, 8, 1.0)]
+    assert charge_blocks(schedule, 4) == [(4, 8, 1.0)]
+
+
+def test_cheapest_slots_within_the_capacity():
+    prices = [3.0, 1.0, 2.0, 1.0, 4.0, 4.0, 4.0, 4.0]
+    allocation, unmet = allocate_connection([request("a", 2.0, prices=prices)], [4.0] * 8, 0)
+    assert allocation["a"] == [0.0, 4.0, 0.0, 4.0, 0.0, 0.0, 0.0, 0.0]
+    assert unmet == {}
+
+
+def test_urgent_requests_are_served_first_and_the_limit_holds():
+    # "b" must be done by slot 2 and needs every kW it can get there; "a" can wait
+    requests = [request("a", 3.0, max_kw=4.0), request("b", 2.0, max_kw=4.0, deadline=2)]
+    capacity = [5.0] * 8
+    allocation, unmet = allocate_connection(requests, capacity, 0)
+    assert allocation["b"][:2] == [4.0, 4.0]
+    assert sum(allocation["a"]) * SLOT_HOURS == pytest.approx(3.0)
+    for s in range(8):
+        assert allocation["a"][s] + allocation["b"][s] <= capacity[s] + 1e-9
+    assert unmet == {}
+
+
+def test_lower_soc_wins_a_tie():
+    requests = [request("full", 0.5, soc_frac=0.8, deadline=1), request("empty", 0.5, soc_frac=0.2, deadline=1)]
+    allocation, unmet = allocate_connection(requests, [3.0] * 8, 0)
+    assert allocation["empty"][0] == 2.0
+    assert allocation["full"][0] == 1.0
+    assert unmet == {"full": 0.25}
+
+
+def test_no_charging_before_the_current_slot_or_in_ineligible_slots():
+    eligible = [True, True, False, True, True, True, True, True]
+    req = ChargeRequest("a", 2.0, 2.0, 0.5, 0, 4, eligible, [0.0, 0.0, 0.0, 5.0] + [1.0] * 4)
+    allocation, unmet = allocate_connection([req], [9.0, 9.0, 9.0, 9.0, 9.0, 9.0, -1.0, 9.0], 1)
+    assert allocation["a"] == [0.0, 2.0, 0.0, 2.0, 0.0, 0.0, 0.0, 0.0]
+    assert unmet == {"a": 1.0}
@@ -0,0 +1,43 @@
+"""Grid charging under a capacity tariff on the monthly import peak."""
+from __future__ import annotations
+
+from custom_components.gw_smart_charging.const import CONF_CAPACITY_TARIFF, CONF_SITE_POWER_LIMIT
+from custom_components.gw_smart_charging.whatif import PlanInputs
+
+# About 40 EUR per kW and year
+TARIFF_CZK_KW_MONTH = 80.0
+
+
+def _grid_charged_kwh(planned_at, tariff=TARIFF_CZK_KW_MONTH, monthly_peak_kw=0.0):
+    # Cheap night, dear day, a small house load and no PV
+    inputs = PlanInputs(
+        forecast=(0.0,) * 96,
+        prices=tuple(1.0 if slot < 24 else 5.0 for slot in range(96)),
+        loads=(0.3,) * 96,
+        current_slot=0,
+        initial_soc_frac=0.2,
+        last_charging_state=False,
+        monthly_peak_kw=monthly_peak_kw,
+        planned_at=planned_at,
+    )
+    planner = inputs.planner({CONF_CAPACITY_TARIFF: tariff, CONF_SITE_POWER_LIMIT: 0.0})
+    schedule, _ = planner.compute_plan(*inputs.args())
+    return sum(s["planned_charge_kW"] for s in schedule if s["mode"].startswith("grid_charge")) * 0.25, planner
+
+
+def test_tariff_does_not_stop_charging_at_the_start_of_the_month():
+    free, _ = _grid_charged_kwh("2026-06-01T00:00:00", tariff=0.0)
+    charged, planner = _grid_charged_kwh("2026-06-01T00:00:00")
+    assert free > 5.0
+    assert charged == free
+    assert planner.billing_days_left == 30
+    assert planner.charge_peak_kw > 3.0
+
+
+def test_peak_is_not_raised_for_one_night_at_the_end_of_the_month():
+    charged, planner = _grid_charged_kwh("2026-06-30T00:00:00")
+    assert planner.billing_days_left == 1
+    assert charged < 1.0
+    # Up to the peak already paid for, charging stays free
+    paid, _ = _grid_charged_kwh("2026-06-30T00:00:00", monthly_peak_kw=4.0)
+    assert paid > 5.0
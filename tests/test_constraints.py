@@ -0,0 +1,142 @@
+"""Switching constraints and their repair, and their use on the planner's own plan."""
+from __future__ import annotations
+
+import random
+
+import pytest
+
+from custom_components.gw_smart_charging.const import (
+    CONF_FULL_HOUR_CHARGING,
+    CONF_MAX_SWITCH_EVENTS,
+    CONF_MIN_OFF_MINUTES,
+    CONF_MIN_ON_MINUTES,
+)
+from custom_components.gw_smart_charging.constraints import (
+    SwitchingConstraints,
+    charge_runs,
+    repair,
+    switch_events,
+)
+from custom_components.gw_smart_charging.engine import ChargingPlanner
+from custom_components.gw_smart_charging.optimizer import ON_KW, grid_charge_profile
+
+
+def pattern(*runs, length=96):
+    on = [False] * length
+    for begin, stop in runs:
+        on[begin:stop] = [True] * (stop - begin)
+    return on
+
+
+def test_from_config_rounds_minutes_up_to_slots():
+    constraints = SwitchingConstraints.from_config({
+        CONF_MIN_ON_MINUTES: 40, CONF_MIN_OFF_MINUTES: "30", CONF_MAX_SWITCH_EVENTS: "x",
+        CONF_FULL_HOUR_CHARGING: True,
+    })
+    assert constraints == SwitchingConstraints(min_on_slots=3, min_off_slots=2, full_hour=True, max_switch_events=0)
+    assert constraints.active
+    assert not SwitchingConstraints.from_config({CONF_FULL_HOUR_CHARGING: False}).active
+    assert not SwitchingConstraints.from_config({}).limits_switching
+
+
+def test_feasible_rules():
+    constraints = SwitchingConstraints(min_on_slots=4, min_off_slots=2)
+    assert constraints.feasible(pattern((8, 12), (14, 18)), 0)
+    assert not constraints.feasible(pattern((8, 11)), 0)  # too short
+    assert not constraints.feasible(pattern((8, 12), (13, 17)), 0)  # pause too short
+    # An ongoing run may stop early, and a run may end with the day
+    assert constraints.feasible(pattern((0, 2)), 0, initially_on=True)
+    assert constraints.feasible(pattern((94, 96)), 0)
+
+
+def test_switch_events_count_the_initial_state():
+    on = pattern((4, 8))
+    assert switch_events(on, 0) == 2
+    assert switch_events(on, 0, initially_on=True) == 3
+    assert switch_events(pattern((0, 96)), 0, initially_on=True) == 0
+
+
+def test_repair_widens_to_whole_hours():
+    constraints = SwitchingConstraints(full_hour=True)
+    assert charge_runs(repair(constraints, pattern((9, 10)), 0), 0) == [(8, 12)]
+
+
+def test_repair_extends_short_runs_and_closes_short_pauses():
+    constraints = SwitchingConstraints(min_on_slots=4, min_off_slots=3)
+    repaired = repair(constraints, pattern((10, 11), (16, 18)), 0)
+    assert charge_runs(repaired, 0) == [(10, 20)]
+
+
+def test_repair_closes_the_shortest_pauses_for_too_many_switch_events():
+    constraints = SwitchingConstraints(max_switch_events=4)
+    repaired = repair(constraints, pattern((4, 6), (8, 10), (30, 32)), 0)
+    assert charge_runs(repaired, 0) == [(4, 10), (30, 32)]
+    # A pause that cannot charge stays; the shortest run goes instead
+    blocked = pattern((7, 8), (20, 21))
+    repaired = repair(SwitchingConstraints(max_switch_events=2), pattern((4, 6), (8, 11), (30, 32)), 0,
+                      blocked=blocked)
+    assert charge_runs(repaired, 0) == [(8, 11)]
+
+
+def test_repair_joins_the_ongoing_run():
+    constraints = SwitchingConstraints(max_switch_events=1)
+    repaired = repair(constraints, pattern((6, 10)), 4, initially_on=True)
+    assert charge_runs(repaired, 4) == [(4, 10)]
+
+
+def test_repair_does_not_widen_into_blocked_slots():
+    constraints = SwitchingConstraints(min_on_slots=4)
+    blocked = pattern((12, 13))
+    # Forward is blocked: the run grows backward instead
+    assert charge_runs(repair(constraints, pattern((10, 12)), 0, blocked=blocked), 0) == [(8, 12)]
+    # No room either way: the run is dropped
+    blocked = pattern((9, 10), (12, 13))
+    assert charge_runs(repair(constraints, pattern((10, 12)), 0, blocked=blocked), 0) == []
+
+
+def test_repair_without_widening_only_removes_charging():
+    constraints = SwitchingConstraints(min_on_slots=4, full_hour=True)
+    repaired = repair(constraints, pattern((2, 9), (20, 22)), 0, widen=False)
+    assert charge_runs(repaired, 0) == [(4, 8)]
+
+
+@pytest.mark.parametrize("widen", [True, False])
+def test_repair_is_always_feasible_and_keeps_feasible_patterns(widen):
+    rng = random.Random(46)
+    for _ in range(3000):
+        constraints = SwitchingConstraints(
+            min_on_slots=rng.choice([0, 2, 4, 6]), min_off_slots=rng.choice([0, 2, 4]),
+            full_hour=rng.random() < 0.5, max_switch_events=rng.choice([0, 0, 2, 4]),
+        )
+        on = [rng.random() < rng.choice([0.05, 0.2, 0.5]) for _ in range(96)]
+        blocked = [not charging and rng.random() < 0.1 for charging in on]
+        start, initially_on = rng.randrange(96), rng.random() < 0.5
+        repaired = repair(constraints, on, start, initially_on, widen=widen, blocked=blocked)
+        assert constraints.feasible(repaired, start, initially_on)
+        assert not any(r and b for r, b in zip(repaired, blocked))
+        if not widen:
+            assert all(on[slot] for slot in range(96) if repaired[slot])
+        if constraints.feasible(on, start, initially_on):
+            assert repaired[start:] == on[start:]
+
+
+def _plan(config):
+    # Cheap hours in short blocks through the night, dear evening, no PV
+    prices = [1.0 if (i // 4) % 3 == 0 and i < 28 else (2.5 if i < 40 else 6.0) for i in range(96)]
+    planner = ChargingPlanner(config, current_slot=1, initial_soc_frac=0.12)
+    schedule, _ = planner.compute_plan([0.0] * 96, prices, [0.4] * 96)
+    return planner, [kw > ON_KW for kw in grid_charge_profile(schedule, 1)]
+
+
+def test_planner_plan_meets_the_constraints_without_the_optimizer():
+    config = {
+        CONF_FULL_HOUR_CHARGING: True, CONF_MIN_ON_MINUTES: 60, CONF_MIN_OFF_MINUTES: 60, CONF_MAX_SWITCH_EVENTS: 2,
+    }
+    unconstrained, free_on = _plan({CONF_FULL_HOUR_CHARGING: True})
+    assert not SwitchingConstraints.from_config(config).feasible(free_on, 1)
+    planner, on = _plan(config)
+    assert planner.optimizer_budget_s == 0
+    assert SwitchingConstraints.from_config(config).feasible(on, 1)
+    assert any(on)
+    assert planner.optimization["repair"]["applied"]
+    assert unconstrained.optimization is None
@@ -0,0 +1,62 @@
+"""Parsing and price-ranked scheduling of deferrable loads."""
+from __future__ import annotations
+
+from custom_components.gw_smart_charging.deferrable import (
+    DeferrableLoad,
+    parse_deferrable_loads,
+    schedule_deferrable_loads,
+)
+
+
+def schedule(prices, load_kw=0.5, pv_kw=0.0):
+    return [{"price_czk_kwh": price, "load_kW": load_kw, "pv_power_kW": pv_kw} for price in prices]
+
+
+def test_parse_deferrable_loads():
+    loads = parse_deferrable_loads(
+        "switch.boiler: 2 kW, 3 kWh, 06:00-20:00; switch.pool = 0.8kW,1.6 kWh\n"
+        "switch.bad: 2 kWh; switch.boiler: 1 kW, 1 kWh; switch.late: 1 kW, 1 kWh, 20:00-06:00"
+    )
+    assert loads == [
+        DeferrableLoad("switch.boiler", 2.0, 3.0, 24, 80),
+        DeferrableLoad("switch.pool", 0.8, 1.6, 0, 96),
+    ]
+    assert parse_deferrable_loads(None) == []
+
+
+def test_loads_take_the_cheapest_slots_in_their_window():
+    prices = [5.0, 1.0, 4.0, 2.0, 3.0, 1.5, 0.5, 6.0]
+    plan = schedule_deferrable_loads([DeferrableLoad("switch.boiler", 2.0, 1.0, 0, 6)], schedule(prices), 0)
+    entry = plan["switch.boiler"]
+    assert entry["slots"] == [1, 5]  # slot 6 is cheapest but past the deadline
+    assert entry["scheduled_kwh"] == 1.0
+    assert entry["unmet_kwh"] == 0.0
+    assert entry["grid_cost"] == round(0.5 * 1.0 + 0.5 * 1.5, 2)
+
+
+def test_pv_surplus_is_free_and_delivered_energy_counts():
+    slots = schedule([2.0] * 8)
+    slots[4]["pv_power_kW"] = 3.0
+    plan = schedule_deferrable_loads(
+        [DeferrableLoad("switch.boiler", 2.0, 1.5, 0, 8)], slots, 0, delivered_kwh={"switch.boiler": 1.0},
+    )
+    assert plan["switch.boiler"]["slots"] == [4]
+    assert plan["switch.boiler"]["grid_cost"] == 0.0
+    assert slots[4]["deferrable_kW"] == 2.0
+    assert slots[4]["deferrable_loads"] == ["switch.boiler"]
+
+
+def test_site_limit_and_tightest_load_first():
+    prices = [1.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0]
+    loads = [
+        DeferrableLoad("switch.pool", 2.0, 1.0, 0, 8),
+        DeferrableLoad("switch.boiler", 2.0, 1.0, 0, 2),
+    ]
+    slots = schedule(prices)
+    plan = schedule_deferrable_loads(loads, slots, 1, site_limit_kw=3.0)
+    # The boiler only has slot 1 left and gets it; the pool moves on, one load per slot
+    assert plan["switch.boiler"]["slots"] == [1]
+    assert plan["switch.boiler"]["unmet_kwh"] == 0.5
+    assert plan["switch.pool"]["slots"] == [2, 3]
+    assert all(slot["load_kW"] + slot["deferrable_kW"] <= 3.0 for slot in slots)
+    assert slots[0]["deferrable_kW"] == 0.0
@@ -0,0 +1,84 @@
+"""Fleet batches hand the plans of entries with a planner worker to the worker."""
+from __future__ import annotations
+
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from custom_components.gw_smart_charging import worker  # noqa: E402
+from custom_components.gw_smart_charging.engine import ChargingPlanner  # noqa: E402
+from custom_components.gw_smart_charging.fleet import FleetPlanner  # noqa: E402
+
+
+class FakeHass:
+    """The parts of ``HomeAssistant`` the fleet uses."""
+
+    def __init__(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.data = {}
+        self.executor_jobs = 0
+
+    async def async_add_executor_job(self, func, *args):
+        self.executor_jobs += 1
+        return await self.loop.run_in_executor(None, func, *args)
+
+    def async_create_task(self, coro):
+        return self.loop.create_task(coro)
+
+    def async_create_background_task(self, coro, name):
+        return self.loop.create_task(coro)
+
+
+def _coordinator(entry_id, planner_worker):
+    return SimpleNamespace(
+        entry=SimpleNamespace(entry_id=entry_id), update_interval=timedelta(minutes=2),
+        config={}, data=None, fleet=None, planner_worker=planner_worker,
+    )
+
+
+def test_fleet_plans_in_the_configured_worker(monkeypatch):
+    received = []
+
+    def run_job(request):
+        received.append(request["op"])
+        return real_run_job(request)
+
+    real_run_job = worker.run_job
+    monkeypatch.setattr(worker, "run_job", run_job)
+
+    async def scenario():
+        server = await asyncio.start_server(worker._handle, "127.0.0.1", 0)
+        host, port = server.sockets[0].getsockname()[:2]
+        client = worker.PlannerWorkerClient(f"{host}:{port}")
+        hass = FakeHass()
+        fleet = FleetPlanner(hass)
+        coordinator = _coordinator("entry_a", client)
+        fleet.register(coordinator)
+        assert coordinator.fleet is fleet
+        planner = ChargingPlanner({}, current_slot=0, initial_soc_frac=0.5)
+        try:
+            schedule, _plan = await asyncio.wait_for(
+                fleet.async_plan("entry_a", planner, [0.0] * 96, [2.0] * 96, [0.5] * 96), 30
+            )
+        finally:
+            await client.async_close()
+            server.close()
+            await server.wait_closed()
+        return schedule, client.stats(), hass.executor_jobs
+
+    schedule, stats, executor_jobs = asyncio.run(scenario())
+    assert received == ["plan"]
+    assert len(schedule) == 96
+    assert stats["completed"] == 1 and stats["fallbacks"] == 0
+    assert executor_jobs == 0
+
+
+def test_search_budget_follows_the_optimizer_cap():
+    planner = ChargingPlanner({}, current_slot=0, initial_soc_frac=0.5)
+    assert planner.search_budget_s == 0.0
+    planner.optimizer_budget_s = 60.0
+    assert planner.search_budget_s == 10.0  # the optimizer's own cap
@@ -0,0 +1,65 @@
+"""Blending and summing several PV forecast entities, and learning their accuracy."""
+from __future__ import annotations
+
+from array import array
+from datetime import date, datetime
+
+import pytest
+
+from custom_components.gw_smart_charging.forecast_fusion import (
+    DEFAULT_ARRAY,
+    ForecastFusion,
+    FusionInput,
+    parse_forecast_sources,
+)
+from custom_components.gw_smart_charging.ingest import Timeline
+
+DAY = date(2026, 6, 1)
+
+
+def source(entity_id, kw, array_name=DEFAULT_ARRAY, confidence=1.0, hours=(10, 11)):
+    timestamps = tuple(datetime(DAY.year, DAY.month, DAY.day, hour) for hour in hours)
+    timeline = Timeline(timestamps, array("d", [kw] * len(hours)), "kW", 60, "watts_map")
+    return FusionInput(array_name, entity_id, timeline, confidence, [DAY])
+
+
+def test_parse_forecast_sources():
+    assert parse_forecast_sources("sensor.a, south=sensor.b\nwest = sensor.c,, sensor.a") == [
+        (DEFAULT_ARRAY, "sensor.a"), ("south", "sensor.b"), ("west", "sensor.c"),
+    ]
+    assert parse_forecast_sources(["sensor.a", "=sensor.b"]) == [(DEFAULT_ARRAY, "sensor.a"), (DEFAULT_ARRAY, "sensor.b")]
+    assert parse_forecast_sources(None) == []
+
+
+def test_same_array_blends_and_arrays_add_up():
+    fusion = ForecastFusion()
+    fused, details = fusion.fuse([source("sensor.a", 2.0), source("sensor.b", 4.0), source("sensor.w", 1.0, "west")], DAY)
+    assert fused[40:48] == [4.0] * 8  # (2 + 4) / 2 + 1
+    assert fused[:40] == [0.0] * 40 and fused[48:] == [0.0] * 48
+    assert [d["energy_kwh"] for d in details] == [4.0, 8.0, 2.0]
+    # Confidence weights the blend
+    fused, _ = fusion.fuse([source("sensor.a", 2.0, confidence=3.0), source("sensor.b", 4.0)], DAY)
+    assert fused[40] == 2.5
+
+
+def test_sources_without_the_day_are_skipped():
+    other = source("sensor.b", 4.0)._replace(dates=[date(2026, 6, 2)])
+    fused, details = ForecastFusion().fuse([source("sensor.a", 2.0), other], DAY)
+    assert fused[40] == 2.0
+    assert [d["entity_id"] for d in details] == ["sensor.a"]
+
+
+def test_accurate_providers_gain_weight_and_state_round_trips():
+    fusion = ForecastFusion()
+    fusion.fuse([source("sensor.a", 2.0), source("sensor.b", 4.0), source("sensor.w", 1.0, "west")], DAY)
+    # Site totals implied: a 8 - 6 + 4 = 6, b 8 - 6 + 8 = 10, w 8 - 2 + 2 = 8 kWh
+    assert not fusion.record_actual(DAY, 0.1)
+    assert fusion.record_actual(DAY, 6.0)
+    assert fusion.weight("sensor.a", 1.0) > fusion.weight("sensor.w", 1.0) > fusion.weight("sensor.b", 1.0)
+    assert not fusion.record_actual(DAY, 6.0)  # each day is scored once
+
+    restored = ForecastFusion()
+    restored.load_dict(fusion.as_dict())
+    assert restored.weight("sensor.b", 1.0) == pytest.approx(fusion.weight("sensor.b", 1.0))
+    restored.load_dict({"error": {"sensor.a": "x"}})
+    assert restored.as_dict() == {"error": {}, "estimates": {}}
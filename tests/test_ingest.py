@@ -0,0 +1,156 @@
+"""Shape and unit parsing of the time-series ingestion layer."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from custom_components.gw_smart_charging import ingest as ingest_module
+from custom_components.gw_smart_charging.ingest import (
+    KIND_ENERGY,
+    KIND_PERCENT,
+    KIND_POWER,
+    KIND_PRICE,
+    SharedTimelineCache,
+    TimelineIngestor,
+    _scale_for_unit,
+    read_scalar,
+)
+
+
+def _watts_map(kw: float = 2.0):
+    start = datetime.now().replace(hour=10, minute=0, second=0, microsecond=0)
+    return {(start + timedelta(minutes=15 * i)).isoformat(): kw * 1000.0 for i in range(8)}
+
+
+@pytest.mark.parametrize(
+    "kind, unit, divisor",
+    [
+        (KIND_POWER, "kW", 1.0),
+        (KIND_POWER, "W", 1000.0),
+        (KIND_POWER, "kWh", None),
+        (KIND_POWER, "Wh", None),
+        (KIND_ENERGY, "kWh", 1.0),
+        (KIND_ENERGY, "Wh", 1000.0),
+        (KIND_ENERGY, "kW", None),
+        (KIND_PRICE, "CZK/MWh", 1000.0),
+        (KIND_PRICE, "CZK/kWh", 1.0),
+    ],
+)
+def test_scale_for_unit_matches_units_exactly(kind, unit, divisor):
+    assert _scale_for_unit(kind, unit) == divisor
+
+
+def test_scalar_energy_total_is_not_a_power_timeline(make_state):
+    ingest = TimelineIngestor()
+    state = make_state("sensor.pv_forecast_today", 12.3, unit_of_measurement="kWh")
+    assert ingest.get(state, KIND_POWER) is None
+
+
+def test_scalar_power_units(make_state):
+    ingest = TimelineIngestor()
+    assert ingest.get(make_state("sensor.load_w", 1500), KIND_POWER).scalar == pytest.approx(1.5)
+    assert ingest.get(make_state("sensor.load_kw", 1.5, unit_of_measurement="kW"), KIND_POWER).scalar == 1.5
+
+
+def test_scalar_energy_in_wh(make_state):
+    ingest = TimelineIngestor()
+    timeline = ingest.get(make_state("sensor.daily_load", 8500, unit_of_measurement="Wh"), KIND_ENERGY)
+    assert timeline.scalar == pytest.approx(8.5)
+
+
+def test_watts_map_parses_to_kw(make_state):
+    timeline = TimelineIngestor().get(make_state("sensor.pv", 0, watts=_watts_map(2.0)), KIND_POWER)
+    assert timeline.shape == "watts_map"
+    assert timeline.resolution == 15
+    assert list(timeline.values) == [2.0] * 8
+
+
+def test_richer_shape_wins_after_scalar_fallback(make_state):
+    cache = SharedTimelineCache()
+    ingest = TimelineIngestor(cache, "entry")
+    first = ingest.get(make_state("sensor.pv", 1500), KIND_POWER)
+    assert first.shape == "scalar_total"
+    assert cache.shape_hint("sensor.pv", KIND_POWER) is None
+
+    second = ingest.get(make_state("sensor.pv", 1500, watts=_watts_map()), KIND_POWER)
+    assert second.shape == "watts_map"
+
+
+def test_hint_is_dropped_when_attribute_keys_change(make_state):
+    cache = SharedTimelineCache()
+    ingest = TimelineIngestor(cache, "entry")
+    hourly = make_state("sensor.pv", 0, hourly=[1.0] * 24)
+    assert ingest.get(hourly, KIND_POWER).shape == "hourly_list"
+    assert cache.shape_hint("sensor.pv", KIND_POWER)[0] == "hourly_list"
+
+    richer = make_state("sensor.pv", 0, hourly=[1.0] * 24, watts=_watts_map())
+    assert ingest.get(richer, KIND_POWER).shape == "watts_map"
+    assert cache.shape_hint("sensor.pv", KIND_POWER) == ("watts_map", frozenset({"hourly", "watts"}))
+
+
+def test_shape_hints_round_trip_without_fallback(make_state):
+    ingest = TimelineIngestor(SharedTimelineCache(), "entry")
+    ingest.get(make_state("sensor.pv", 0, watts=_watts_map()), KIND_POWER)
+    ingest.get(make_state("sensor.price", 2.5), KIND_PRICE)
+    hints = ingest.shape_hints()
+    assert hints == [["sensor.pv", KIND_POWER, "watts_map", ["watts"]]]
+
+    restored_cache = SharedTimelineCache()
+    restored = TimelineIngestor(restored_cache, "entry")
+    restored.restore_shape_hints(hints + [["sensor.price", KIND_PRICE, "scalar_total", []],
+                                          ["sensor.old", KIND_POWER, "watts_map"]])
+    assert restored_cache.shape_hint("sensor.pv", KIND_POWER) == ("watts_map", frozenset({"watts"}))
+    assert restored_cache.shape_hint("sensor.price", KIND_PRICE) is None
+    assert restored_cache.shape_hint("sensor.old", KIND_POWER) is None
+
+
+def test_price_map_in_mwh(make_state):
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    prices = {(start + timedelta(hours=h)).isoformat(): 2000.0 + h for h in range(24)}
+    timeline = TimelineIngestor().get(
+        make_state("sensor.price", 2.0, prices=prices, unit_of_measurement="CZK/MWh"), KIND_PRICE
+    )
+    assert timeline.shape == "price_map"
+    assert timeline.to_slots(96)[:4] == [2.0] * 4
+
+
+def test_parsed_once_per_state(make_state):
+    ingest = TimelineIngestor()
+    state = make_state("sensor.pv", 0, watts=_watts_map())
+    ingest.get(state, KIND_POWER)
+    ingest.get(state, KIND_POWER)
+    assert (ingest.hits, ingest.misses) == (1, 1)
+
+
+@pytest.mark.parametrize(
+    "kind, value, unit, expected",
+    [
+        (KIND_POWER, 1500.0, "W", 1.5),
+        (KIND_POWER, 1.5, "kW", 1.5),
+        (KIND_POWER, 1500.0, None, 1.5),
+        (KIND_POWER, -2.0, "kW", -2.0),
+        (KIND_POWER, 12.0, "kWh", None),
+        (KIND_ENERGY, 8500.0, "Wh", 8.5),
+        (KIND_PERCENT, 57.0, "%", 57.0),
+        (KIND_POWER, "unavailable", "W", None),
+    ],
+)
+def test_read_scalar_converts_by_unit(make_state, kind, value, unit, expected):
+    attributes = {"unit_of_measurement": unit} if unit else {}
+    assert read_scalar(make_state("sensor.x", value, **attributes), kind) == (
+        pytest.approx(expected) if expected is not None else None
+    )
+
+
+def test_positional_shapes_move_to_the_new_day(make_state, monkeypatch):
+    ingest = TimelineIngestor()
+    state = make_state("sensor.pv_hourly", 0, hourly=[1.0] * 24)
+    today = datetime.now().date()
+    assert ingest.get(state, KIND_POWER).dates() == [today]
+
+    class Tomorrow(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) + timedelta(days=1)
+
+    monkeypatch.setattr(ingest_module, "datetime", Tomorrow)
+    assert ingest.get(state, KIND_POWER).dates() == [today + timedelta(days=1)]
@@ -0,0 +1,45 @@
+"""The PV bias corrector learns from PV power converted by the sensor's unit."""
+from __future__ import annotations
+
+from functools import partial
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from custom_components.gw_smart_charging.const import CONF_PV_POWER_SENSOR  # noqa: E402
+from custom_components.gw_smart_charging.coordinator import GWSmartCoordinator  # noqa: E402
+
+
+class RecordingBias:
+    def __init__(self) -> None:
+        self.samples = []
+
+    def add_production_sample(self, now, pv_kw):
+        self.samples.append(pv_kw)
+        return False
+
+
+def _coordinator(states):
+    coordinator = SimpleNamespace(
+        config={CONF_PV_POWER_SENSOR: "sensor.pv_power"},
+        hass=SimpleNamespace(states=SimpleNamespace(get=states.get)),
+        _pv_bias=RecordingBias(),
+    )
+    coordinator._read_sensor = partial(GWSmartCoordinator._read_sensor, coordinator)
+    return coordinator
+
+
+@pytest.mark.parametrize("value, unit", [(2.5, "kW"), (2500, "W"), (2500, None)])
+def test_pv_production_sample_in_kw(make_state, value, unit):
+    attributes = {"unit_of_measurement": unit} if unit else {}
+    coordinator = _coordinator({"sensor.pv_power": make_state("sensor.pv_power", value, **attributes)})
+    GWSmartCoordinator._sample_pv_production(coordinator)
+    assert coordinator._pv_bias.samples == [pytest.approx(2.5)]
+
+
+def test_unavailable_pv_sensor_is_not_sampled(make_state):
+    coordinator = _coordinator({"sensor.pv_power": make_state("sensor.pv_power", "unavailable")})
+    assert not GWSmartCoordinator._sample_pv_production(coordinator)
+    assert coordinator._pv_bias.samples == []
@@ -0,0 +1,41 @@
+"""Quiet planner runs (what-if, backtests) only silence their own thread."""
+from __future__ import annotations
+
+import logging
+import threading
+
+from custom_components.gw_smart_charging.engine import _LOGGER, quiet_planning
+
+
+def test_quiet_planning_is_scoped_to_the_thread(caplog):
+    caplog.set_level(logging.DEBUG, logger=_LOGGER.name)
+    level = _LOGGER.level
+    inside = threading.Event()
+    release = threading.Event()
+
+    def quiet_run():
+        with quiet_planning():
+            _LOGGER.warning("what-if warning")
+            _LOGGER.error("what-if error")
+            inside.set()
+            release.wait(5)
+
+    worker = threading.Thread(target=quiet_run)
+    worker.start()
+    assert inside.wait(5)
+    _LOGGER.info("live plan")
+    release.set()
+    worker.join(5)
+    _LOGGER.warning("after")
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages == ["what-if error", "live plan", "after"]
+    assert _LOGGER.level == level
+
+
+def test_quiet_planning_nests():
+    with quiet_planning():
+        with quiet_planning():
+            pass
+        assert not _LOGGER.filters[0].filter(logging.makeLogRecord({"levelno": logging.INFO}))
+    assert _LOGGER.filters[0].filter(logging.makeLogRecord({"levelno": logging.INFO}))
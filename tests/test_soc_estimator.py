@@ -0,0 +1,100 @@
+"""SOC estimate from SOC readings and integrated battery power."""
+import random
+
+import pytest
+
+from custom_components.gw_smart_charging.soc_estimator import MAX_POWER_HOLD_S, SocEstimator
+
+
+def test_no_reading_no_estimate():
+    estimator = SocEstimator(10.0, 0.95)
+    assert estimator.soc_frac(0.0) is None
+    assert not estimator.initialized
+
+
+def test_soc_only_follows_the_sensor():
+    estimator = SocEstimator(10.0, 0.95)
+    # 50 -> 80 % over two hours, one reading per percent
+    for step in range(31):
+        estimator.add_soc(step * 240.0, 50.0 + step)
+    assert estimator.soc_frac(31 * 240.0) == pytest.approx(0.80)
+
+
+def test_soc_only_steady_rise():
+    estimator = SocEstimator(10.0, 0.95)
+    for quarter in range(17):
+        estimator.add_soc(quarter * 900.0, 50.0 + 2.0 * quarter)
+    assert estimator.soc_frac(16 * 900.0) * 100.0 == pytest.approx(82.0)
+
+
+def test_stale_power_reading_falls_back_to_sensor():
+    estimator = SocEstimator(10.0, 0.95)
+    estimator.add_soc(0.0, 50.0)
+    estimator.add_power(0.0, 0.0)
+    estimator.add_soc(MAX_POWER_HOLD_S + 600.0, 70.0)
+    assert estimator.soc_frac(MAX_POWER_HOLD_S + 600.0) == pytest.approx(0.70)
+
+
+def test_power_is_integrated_between_readings():
+    estimator = SocEstimator(10.0, 1.0)
+    estimator.add_soc(0.0, 50.0)
+    estimator.add_power(0.0, -2.0)  # charging 2 kW
+    # 15 minutes later, no new SOC reading: +0.5 kWh
+    assert estimator.soc_frac(900.0) == pytest.approx(0.55)
+
+
+def test_efficiency_is_applied_like_the_planner():
+    estimator = SocEstimator(10.0, 0.9)
+    estimator.add_soc(0.0, 50.0)
+    estimator.add_power(0.0, 1.8)  # discharging 1.8 kW for 15 min takes 0.45 / 0.9 kWh
+    assert estimator.soc_frac(900.0) == pytest.approx(0.45)
+
+
+def test_power_is_held_at_most_max_hold():
+    estimator = SocEstimator(10.0, 1.0)
+    estimator.add_soc(0.0, 50.0)
+    estimator.add_power(0.0, -2.0)
+    assert estimator.soc_frac(MAX_POWER_HOLD_S * 4) == pytest.approx(0.5 + 2.0 * MAX_POWER_HOLD_S / 3600.0 / 10.0)
+
+
+def test_fusion_beats_the_coarse_sensor():
+    rng = random.Random(3)
+    capacity, eff = 10.0, 0.95
+    true_kwh = 4.0
+    estimator = SocEstimator(capacity, eff)
+    reading = round(true_kwh / capacity * 100)
+    estimator.add_soc(0.0, reading)
+    errors_estimate, errors_sensor = [], []
+    now = 0.0
+    for step in range(2400):  # 10 s steps
+        now += 10.0
+        power = -3.0 if step < 800 else (1.5 if step < 1600 else 0.0)
+        true_kwh += (-power * eff if power < 0 else -power / eff) * 10.0 / 3600.0
+        true_kwh = min(capacity, max(0.0, true_kwh))
+        # Power sensor with a 5 % gain error, SOC sensor in whole percent every 5 minutes
+        estimator.add_power(now, power * (1.0 + rng.gauss(0.05, 0.02)))
+        if step % 30 == 0:
+            new = round(true_kwh / capacity * 100)
+            if new != reading:
+                reading = new
+                estimator.add_soc(now, reading)
+        errors_estimate.append(abs(estimator.soc_frac(now) * capacity - true_kwh))
+        errors_sensor.append(abs(reading / 100.0 * capacity - true_kwh))
+    assert sum(errors_estimate) < 0.6 * sum(errors_sensor)
+    summary = estimator.summary(now)
+    assert summary["boundary_updates"] > 0
+    assert 0.0 < summary["sigma_pct"] < 1.0
+
+
+def test_repeated_reading_is_ignored():
+    estimator = SocEstimator(10.0, 0.95)
+    estimator.add_soc(0.0, 50.0)
+    estimator.add_soc(60.0, 50.0)
+    assert estimator.summary(60.0)["soc_events"] == 1
+
+
+def test_capacity_change_keeps_the_share():
+    estimator = SocEstimator(10.0, 0.95)
+    estimator.add_soc(0.0, 40.0)
+    estimator.configure(20.0, 0.95)
+    assert estimator.soc_frac(0.0) == pytest.approx(0.40)